@@ -0,0 +1,197 @@
+"""
+DeepSeek 网关压测
+~~~~~~~~~~~~~~~
+
+在独立进程中启动本地模拟上游和网关，以指定的并发数发送普通和流式对话请求，
+统计吞吐量、延迟分位数、流式首字节延迟，以及缓存和请求合并为上游节省的请求数。
+
+运行方式::
+
+    python benchmarks/gateway_load_test.py --requests 2000 --concurrency 100
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List, Optional
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def wait_ready(session: aiohttp.ClientSession, url: str) -> None:
+    """
+    等待服务开始监听
+
+    Args:
+        session: aiohttp会话
+        url: 探测地址
+    """
+    for _ in range(200):
+        try:
+            async with session.get(url):
+                return
+        except aiohttp.ClientError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"服务启动失败: {url}")
+
+
+def spawn(args: List[str], env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    """
+    启动子进程
+
+    Args:
+        args: 命令行参数
+        env: 额外的环境变量
+
+    Returns:
+        子进程
+    """
+    return subprocess.Popen([sys.executable] + args, cwd=ROOT, env={**os.environ, **(env or {})})
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """
+    计算分位数
+
+    Args:
+        samples: 样本
+        p: 分位数，0到1之间
+
+    Returns:
+        分位数对应的值
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+async def run_load(args: argparse.Namespace, gateway_url: str, upstream_url: str) -> Dict[str, Any]:
+    """
+    执行压测
+
+    Args:
+        args: 命令行参数
+        gateway_url: 网关地址
+        upstream_url: 模拟上游地址
+
+    Returns:
+        压测结果
+    """
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await wait_ready(session, f"{upstream_url}/stats")
+        await wait_ready(session, f"{gateway_url}/metrics")
+        await session.delete(f"{upstream_url}/stats")
+
+        latencies: List[float] = []
+        ttfts: List[float] = []
+        errors = 0
+        semaphore = asyncio.Semaphore(args.concurrency)
+        rng = random.Random(0)
+
+        async def one(index: int) -> None:
+            nonlocal errors
+            stream = rng.random() < args.stream_ratio
+            # 一部分请求使用少量固定的问题和temperature=0，可以命中缓存或与进行中的请求合并
+            if rng.random() < args.duplicate_ratio:
+                prompt, temperature = f"常见问题 {rng.randrange(args.distinct)}", 0
+            else:
+                prompt, temperature = f"问题 {index}", 0.7
+            body = {
+                "model": "deepseek-chat",
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": temperature,
+                "stream": stream,
+            }
+
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    async with session.post(f"{gateway_url}/v1/chat/completions", json=body) as response:
+                        if response.status != 200:
+                            errors += 1
+                            await response.read()
+                            return
+                        if stream:
+                            first = True
+                            async for _ in response.content.iter_any():
+                                if first:
+                                    ttfts.append(time.perf_counter() - started)
+                                    first = False
+                        else:
+                            await response.read()
+                except aiohttp.ClientError:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+        async with session.get(f"{upstream_url}/stats") as response:
+            upstream = await response.json()
+        async with session.get(f"{gateway_url}/metrics") as response:
+            metrics = await response.json()
+
+    return {
+        "requests": args.requests,
+        "errors": errors,
+        "requests_per_second": args.requests / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "stream_ttft_p50_ms": percentile(ttfts, 0.5) * 1000,
+        "upstream_requests": upstream["requests"],
+        "upstream_connections": upstream["connections"],
+        "cache": metrics.get("cache"),
+        "single_flight": metrics.get("single_flight"),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="在本地模拟上游上压测DeepSeek网关")
+    parser.add_argument("--requests", type=int, default=2000, help="总请求数")
+    parser.add_argument("--concurrency", type=int, default=100, help="并发数")
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="流式请求所占的比例")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="可缓存的重复请求所占的比例")
+    parser.add_argument("--distinct", type=int, default=20, help="重复请求中不同问题的数量")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟上游首个token前的延迟（秒）")
+    parser.add_argument("--tokens", type=int, default=32, help="模拟上游每个回答的token数")
+    parser.add_argument("--upstream-port", type=int, default=8767)
+    parser.add_argument("--gateway-port", type=int, default=8768)
+    parser.add_argument("--gateway-args", default="--raw", help="传递给网关的其他参数")
+    args = parser.parse_args(argv)
+
+    upstream_url = f"http://127.0.0.1:{args.upstream_port}"
+    gateway_url = f"http://127.0.0.1:{args.gateway_port}"
+    processes = [
+        spawn([
+            "benchmarks/mock_upstream.py", "--port", str(args.upstream_port),
+            "--latency", str(args.latency), "--tokens", str(args.tokens),
+        ]),
+        spawn(
+            ["-m", "deepseek.gateway", "--port", str(args.gateway_port)] + args.gateway_args.split(),
+            env={"DEEPSEEK_API_KEY": "sk-load-test", "DEEPSEEK_API_BASE_URL": upstream_url},
+        ),
+    ]
+    try:
+        result = asyncio.run(run_load(args, gateway_url, upstream_url))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    for name, value in result.items():
+        print(f"{name:<22}{value:.1f}" if isinstance(value, float) else f"{name:<22}{value}")
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
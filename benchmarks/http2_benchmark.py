@@ -0,0 +1,141 @@
+"""
+DeepSeek HTTP/2 基准测试
+~~~~~~~~~~~~~~~~~~~~~~
+
+在本地模拟上游上比较HTTP/1.1和HTTP/2：以相同的并发数发送流式对话和文件列表请求，
+统计吞吐量、延迟分位数以及服务端看到的连接数。
+
+运行方式::
+
+    python benchmarks/http2_benchmark.py --requests 400 --concurrency 64
+
+也可以通过 ``--base-url`` 指向已经运行的模拟上游（需要支持 ``/stats`` 接口）。
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from deepseek import DeepSeekClient  # noqa: E402
+from mock_upstream import MockUpstream, serve  # noqa: E402
+
+
+def start_mock_upstream(port: int, latency: float, tokens: int) -> str:
+    """
+    在后台线程中启动模拟上游
+
+    Args:
+        port: 监听端口
+        latency: 首个token前的延迟（秒）
+        tokens: 每个回答包含的token数
+
+    Returns:
+        模拟上游的基础URL
+    """
+    app = MockUpstream(latency=latency, tokens=tokens)
+    threading.Thread(target=serve, args=(app, "127.0.0.1", port), daemon=True).start()
+
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{base_url}/stats")
+            return base_url
+        except httpx.TransportError:
+            time.sleep(0.05)
+    raise RuntimeError("模拟上游启动失败")
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """
+    计算分位数
+
+    Args:
+        samples: 样本
+        p: 分位数，0到1之间
+
+    Returns:
+        分位数对应的值
+    """
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def run_once(base_url: str, http2: bool, requests: int, concurrency: int, file_ratio: float) -> Dict[str, Any]:
+    """
+    以指定协议执行一轮测试
+
+    Args:
+        base_url: 模拟上游的基础URL
+        http2: 是否启用HTTP/2
+        requests: 总请求数
+        concurrency: 并发数
+        file_ratio: 文件列表请求所占的比例
+
+    Returns:
+        测试结果
+    """
+    client = DeepSeekClient(api_key="sk-benchmark", base_url=base_url, http2=http2)
+    file_every = int(1 / file_ratio) if file_ratio > 0 else 0
+
+    def one(index: int) -> float:
+        started = time.perf_counter()
+        if file_every and index % file_every == 0:
+            client.list_files()
+        else:
+            client.complete([{"role": "user", "content": f"benchmark {index}"}], stream=True)
+        return time.perf_counter() - started
+
+    # 预热一次，避免把首次建立连接的时间计入结果
+    one(1)
+    httpx.delete(f"{base_url}/stats")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    stats = httpx.delete(f"{base_url}/stats").json()
+    return {
+        "protocol": "HTTP/2" if http2 else "HTTP/1.1",
+        "requests_per_second": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "connections": stats["connections"],
+        "http_versions": stats["http_versions"],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="比较HTTP/1.1和HTTP/2的吞吐量、延迟和连接数")
+    parser.add_argument("--base-url", help="已运行的模拟上游地址，缺省时在本进程内启动")
+    parser.add_argument("--port", type=int, default=8765, help="内置模拟上游的监听端口")
+    parser.add_argument("--requests", type=int, default=400, help="每轮的总请求数")
+    parser.add_argument("--concurrency", type=int, default=64, help="并发数")
+    parser.add_argument("--file-ratio", type=float, default=0.1, help="文件列表请求所占的比例")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟上游首个token前的延迟（秒）")
+    parser.add_argument("--tokens", type=int, default=32, help="模拟上游每个回答的token数")
+    args = parser.parse_args(argv)
+
+    base_url = args.base_url or start_mock_upstream(args.port, args.latency, args.tokens)
+
+    print(f"{'协议':<10}{'请求/秒':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'连接数':>8}")
+    for http2 in (False, True):
+        result = run_once(base_url, http2, args.requests, args.concurrency, args.file_ratio)
+        print(
+            f"{result['protocol']:<10}{result['requests_per_second']:>10.1f}"
+            f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['connections']:>8}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
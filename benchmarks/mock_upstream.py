@@ -0,0 +1,297 @@
+"""
+DeepSeek 本地模拟上游
+~~~~~~~~~~~~~~~~~~
+
+一个不依赖任何框架的ASGI应用，模拟DeepSeek的对话补全、模型列表和文件接口，供基准测试和压测使用。
+通过hypercorn运行，同时支持HTTP/1.1和明文HTTP/2（h2c，先验知识方式），
+接受gzip和zstd编码的请求体。
+
+运行方式::
+
+    python benchmarks/mock_upstream.py --port 8000 --latency 0.05 --tokens 32
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+import os
+import sys
+import uuid
+from typing import Dict, Any, List, Optional, Iterable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deepseek.compression import decompress_bytes  # noqa: E402
+
+
+class MockUpstream:
+    """模拟DeepSeek API的ASGI应用"""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        tokens: int = 32,
+        token_interval: float = 0.0,
+        request_encodings: Iterable[str] = ("gzip", "zstd"),
+    ):
+        """
+        初始化模拟上游
+
+        Args:
+            latency: 返回首个token前的延迟（秒）
+            tokens: 每个回答包含的token数
+            token_interval: 流式响应中两个token之间的间隔（秒）
+            request_encodings: 接受的请求体编码，其他编码的请求返回415
+        """
+        self.latency = latency
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.request_encodings = set(request_encodings)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.connections = set()
+        self.requests = 0
+        self.request_bytes = 0
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        path = scope["path"]
+        if path.startswith("/v1/") and not path.startswith("/v1/files"):
+            path = path[3:]
+        method = scope["method"]
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        if path == "/stats":
+            await self._json(send, self._stats(reset=method == "DELETE"))
+            return
+
+        self.requests += 1
+        self.request_bytes += len(body)
+        if scope.get("client"):
+            self.connections.add((scope.get("http_version"), tuple(scope["client"])))
+
+        headers = dict(scope.get("headers") or [])
+        encoding = headers.get(b"content-encoding", b"").decode("latin-1").lower()
+        if encoding:
+            if encoding not in self.request_encodings:
+                await self._json(send, {"error": {"message": f"unsupported content-encoding: {encoding}"}}, status=415)
+                return
+            body = decompress_bytes(body, encoding)
+
+        if path == "/chat/completions" and method == "POST":
+            await self._chat(send, json.loads(body or b"{}"))
+        elif path == "/models":
+            await self._json(send, {"object": "list", "data": [{"id": "deepseek-chat", "object": "model"}]})
+        elif path == "/v1/files" and method == "POST":
+            file_id = f"file-{uuid.uuid4().hex[:12]}"
+            self.files[file_id] = {"id": file_id, "object": "file", "bytes": len(body), "created_at": int(time.time())}
+            await self._json(send, self.files[file_id])
+        elif path == "/v1/files":
+            await self._json(send, {"object": "list", "data": list(self.files.values())})
+        elif path.startswith("/v1/files/"):
+            file_id = path.rsplit("/", 1)[-1]
+            if file_id not in self.files:
+                await self._json(send, {"error": {"message": "file not found"}}, status=404)
+            elif method == "DELETE":
+                del self.files[file_id]
+                await self._json(send, {"id": file_id, "deleted": True})
+            else:
+                await self._json(send, self.files[file_id])
+        else:
+            await self._json(send, {"error": {"message": "not found"}}, status=404)
+
+    def _stats(self, reset: bool) -> Dict[str, Any]:
+        stats = {
+            "requests": self.requests,
+            "request_bytes": self.request_bytes,
+            "connections": len(self.connections),
+            "http_versions": sorted({version for version, _ in self.connections if version}),
+        }
+        if reset:
+            self.requests = 0
+            self.request_bytes = 0
+            self.connections.clear()
+        return stats
+
+    async def _chat(self, send: Any, request: Dict[str, Any]) -> None:
+        model = request.get("model", "deepseek-chat")
+        words = [f"w{i} " for i in range(self.tokens)]
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            # JSON输出模式返回一个包含字符串数组的对象，流式响应中按token拆分
+            words = ['{"items": ['] + [f'"w{i}", ' for i in range(self.tokens - 1)] + [f'"w{self.tokens - 1}"]}}']
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", [])) // 4 + 1
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": self.tokens,
+            "total_tokens": prompt_tokens + self.tokens,
+            "prompt_cache_hit_tokens": 0,
+            "prompt_cache_miss_tokens": prompt_tokens,
+        }
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        tool_calls = self._tool_calls(request)
+
+        await asyncio.sleep(self.latency)
+
+        if not request.get("stream"):
+            if tool_calls:
+                message = {"role": "assistant", "content": "", "tool_calls": tool_calls}
+            else:
+                message = {"role": "assistant", "content": "".join(words)}
+            await self._json(send, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": index,
+                        "message": message,
+                        "finish_reason": "tool_calls" if tool_calls else "stop",
+                    }
+                    for index in range(request.get("n") or 1)
+                ],
+                "usage": usage,
+            })
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")],
+        })
+
+        def frame(choices: List[Dict[str, Any]], extra: Optional[Dict[str, Any]] = None) -> bytes:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+            }
+            if extra:
+                chunk.update(extra)
+            return b"data: " + json.dumps(chunk).encode() + b"\n\n"
+
+        if tool_calls:
+            # 与DeepSeek一致，先返回工具调用的名称，参数分段返回
+            for index, call in enumerate(tool_calls):
+                arguments = call["function"]["arguments"]
+                head = {"index": index, "id": call["id"], "type": "function",
+                        "function": {"name": call["function"]["name"], "arguments": ""}}
+                body = frame([{"index": 0, "delta": {"tool_calls": [head]}, "finish_reason": None}])
+                for start in range(0, len(arguments), 8):
+                    part = {"index": index, "function": {"arguments": arguments[start:start + 8]}}
+                    body += frame([{"index": 0, "delta": {"tool_calls": [part]}, "finish_reason": None}])
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+            words = []
+
+        for word in words:
+            data = frame([{"index": 0, "delta": {"content": word}, "finish_reason": None}])
+            await send({"type": "http.response.body", "body": data, "more_body": True})
+            if self.token_interval:
+                await asyncio.sleep(self.token_interval)
+
+        tail = frame([{"index": 0, "delta": {}, "finish_reason": "tool_calls" if tool_calls else "stop"}])
+        tail += frame([], {"usage": usage})
+        tail += b"data: [DONE]\n\n"
+        await send({"type": "http.response.body", "body": tail, "more_body": False})
+
+    @staticmethod
+    def _tool_calls(request: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        模拟模型的工具调用：请求带有工具且最后一条消息不是工具结果时，并行调用每个工具
+
+        必填参数的值为参数名，用于检查参数的传递。
+
+        Args:
+            request: 对话请求
+
+        Returns:
+            工具调用列表，不需要调用工具时为空
+        """
+        messages = request.get("messages") or [{}]
+        if not request.get("tools") or request.get("tool_choice") == "none" or messages[-1].get("role") == "tool":
+            return []
+        calls = []
+        for tool in request["tools"]:
+            function = tool.get("function", {})
+            required = function.get("parameters", {}).get("required", [])
+            calls.append({
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {
+                    "name": function.get("name"),
+                    "arguments": json.dumps({name: name for name in required}),
+                },
+            })
+        return calls
+
+    async def _json(self, send: Any, payload: Dict[str, Any], status: int = 200) -> None:
+        body = json.dumps(payload).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def serve(app: MockUpstream, host: str, port: int) -> None:
+    """
+    使用hypercorn运行模拟上游
+
+    Args:
+        app: 模拟上游应用
+        host: 监听地址
+        port: 监听端口
+    """
+    try:
+        from hypercorn.asyncio import serve as hypercorn_serve
+        from hypercorn.config import Config
+    except ImportError:
+        raise ImportError("运行模拟上游需要安装hypercorn: pip install hypercorn")
+
+    config = Config()
+    config.bind = [f"{host}:{port}"]
+    config.keep_alive_timeout = 60
+    config.loglevel = "WARNING"
+
+    # 在后台线程中运行时无法注册信号处理器，改为永不触发的关闭条件
+    kwargs = {}
+    if threading.current_thread() is not threading.main_thread():
+        kwargs["shutdown_trigger"] = lambda: asyncio.Event().wait()
+    asyncio.run(hypercorn_serve(app, config, **kwargs))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DeepSeek本地模拟上游")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.05, help="返回首个token前的延迟（秒）")
+    parser.add_argument("--tokens", type=int, default=32, help="每个回答包含的token数")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="流式token之间的间隔（秒）")
+    parser.add_argument("--reject-encoding", action="store_true", help="拒绝所有压缩的请求体，返回415")
+    args = parser.parse_args()
+
+    encodings = () if args.reject_encoding else ("gzip", "zstd")
+    serve(MockUpstream(args.latency, args.tokens, args.token_interval, encodings), args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
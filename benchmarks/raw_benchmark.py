@@ -0,0 +1,105 @@
+"""
+DeepSeek 原始响应模式基准测试
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+比较SDK路径和原始响应模式每次调用消耗的客户端CPU时间。模拟上游运行在独立进程中，
+因此 ``time.process_time`` 只统计客户端自身的解析和序列化开销。
+
+运行方式::
+
+    python benchmarks/raw_benchmark.py --requests 500 --tokens 200
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deepseek import DeepSeekClient  # noqa: E402
+from deepseek import raw  # noqa: E402
+
+
+def spawn_mock_upstream(port: int, tokens: int) -> subprocess.Popen:
+    """
+    在独立进程中启动无延迟的模拟上游
+
+    Args:
+        port: 监听端口
+        tokens: 每个回答包含的token数
+
+    Returns:
+        模拟上游进程
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_upstream.py")
+    process = subprocess.Popen([
+        sys.executable, script, "--port", str(port), "--latency", "0", "--tokens", str(tokens),
+    ])
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats")
+            return process
+        except httpx.TransportError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("模拟上游启动失败")
+
+
+def measure(client: DeepSeekClient, requests: int, stream: bool) -> Dict[str, float]:
+    """
+    顺序执行请求并统计CPU时间和耗时
+
+    Args:
+        client: 客户端
+        requests: 请求数
+        stream: 是否使用流式请求
+
+    Returns:
+        每次调用的平均CPU时间和耗时（微秒）
+    """
+    messages = [{"role": "user", "content": "classify this sentence"}]
+    client.complete(messages, stream=stream)
+
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    for _ in range(requests):
+        client.complete(messages, stream=stream)
+    return {
+        "cpu_us": (time.process_time() - cpu_started) / requests * 1e6,
+        "wall_us": (time.perf_counter() - wall_started) / requests * 1e6,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="比较SDK路径和原始响应模式的客户端CPU开销")
+    parser.add_argument("--port", type=int, default=8766, help="模拟上游的监听端口")
+    parser.add_argument("--requests", type=int, default=500, help="每种模式的请求数")
+    parser.add_argument("--tokens", type=int, default=200, help="每个回答包含的token数（流式数据块数）")
+    args = parser.parse_args(argv)
+
+    process = spawn_mock_upstream(args.port, args.tokens)
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        print(f"JSON解码器: {'orjson' if raw.orjson is not None else 'json'}")
+        print(f"{'模式':<10}{'流式':<6}{'CPU(us/次)':>12}{'耗时(us/次)':>14}")
+        for stream in (False, True):
+            for raw_mode in (False, True):
+                client = DeepSeekClient(api_key="sk-benchmark", base_url=base_url, raw_mode=raw_mode)
+                result = measure(client, args.requests, stream)
+                print(
+                    f"{'raw' if raw_mode else 'sdk':<10}{'是' if stream else '否':<6}"
+                    f"{result['cpu_us']:>12.0f}{result['wall_us']:>14.0f}"
+                )
+    finally:
+        process.terminate()
+        process.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
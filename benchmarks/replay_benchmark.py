@@ -0,0 +1,150 @@
+"""
+DeepSeek 离线回放基准测试
+~~~~~~~~~~~~~~~~~~~~~~
+
+从cassette回放录制的响应，离线测量客户端的吞吐量、CPU开销和内存占用，不访问API也不产生费用。
+
+没有指定 ``--cassette`` 时先在本地模拟上游上录制一份cassette；也可以用RecordingTransport
+录制真实API的请求后在这里回放::
+
+    python benchmarks/replay_benchmark.py --requests 2000 --concurrency 16 --speed 0
+    python benchmarks/replay_benchmark.py --cassette recorded.jsonl.gz --speed 10 --stream --match path
+
+回放默认只匹配请求体相同的记录；回放其他对话录制的cassette时使用 ``--match path`` 按路径匹配。
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deepseek import DeepSeekClient  # noqa: E402
+from deepseek.cassette import RecordingTransport, ReplayTransport  # noqa: E402
+
+from raw_benchmark import spawn_mock_upstream  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "classify this sentence"}]
+
+
+def record(path: str, port: int, tokens: int) -> None:
+    """
+    在本地模拟上游上录制普通和流式响应各一次
+
+    Args:
+        path: cassette文件路径
+        port: 模拟上游的监听端口
+        tokens: 每个回答包含的token数
+    """
+    process = spawn_mock_upstream(port, tokens)
+    try:
+        client = DeepSeekClient(
+            api_key="sk-benchmark", base_url=f"http://127.0.0.1:{port}", transport=RecordingTransport(path)
+        )
+        client.complete(MESSAGES)
+        client.complete(MESSAGES, stream=True)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def replay(
+    cassette: str, requests: int, concurrency: int, speed: float, stream: bool, raw_mode: bool, match: str = "body"
+) -> Dict[str, Any]:
+    """
+    并发回放请求并统计吞吐量、CPU时间和内存峰值
+
+    Args:
+        cassette: cassette文件路径
+        requests: 请求数
+        concurrency: 并发数
+        speed: 回放速度倍数，0表示不等待
+        stream: 是否使用流式请求
+        raw_mode: 是否使用原始响应模式
+        match: 回放的匹配方式，body或path
+
+    Returns:
+        统计结果
+    """
+    transport = ReplayTransport(cassette, speed=speed, match=match)
+    client = DeepSeekClient(
+        api_key="sk-benchmark", base_url="http://replay.invalid", raw_mode=raw_mode, transport=transport
+    )
+    client.complete(MESSAGES, stream=stream)
+
+    latencies: List[float] = []
+
+    def _call(_: int) -> None:
+        started = time.perf_counter()
+        client.complete(MESSAGES, stream=stream)
+        latencies.append(time.perf_counter() - started)
+
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_call, range(requests)))
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+    latencies.sort()
+
+    # tracemalloc会显著拖慢分配内存的代码，内存峰值单独用少量请求测量
+    tracemalloc.start()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_call, range(min(requests, concurrency * 4))))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "throughput": requests / wall,
+        "cpu_us": cpu / requests * 1e6,
+        "p50_ms": latencies[len(latencies) // 2] * 1e3,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3,
+        "peak_kb": peak / 1024,
+        "unmatched": transport.unmatched,
+        "fallbacks": transport.fallbacks,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="离线回放cassette，测量客户端吞吐量和内存占用")
+    parser.add_argument("--cassette", help="cassette文件路径，不指定时先在本地模拟上游上录制")
+    parser.add_argument("--port", type=int, default=8770, help="录制时模拟上游的监听端口")
+    parser.add_argument("--tokens", type=int, default=200, help="录制时每个回答包含的token数")
+    parser.add_argument("--requests", type=int, default=1000, help="回放的请求数")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发数")
+    parser.add_argument("--speed", type=float, default=0.0, help="回放速度倍数，0表示不等待")
+    parser.add_argument("--stream", action="store_true", help="只测量流式请求")
+    parser.add_argument(
+        "--match", choices=ReplayTransport.MATCH_MODES, default="body", help="回放的匹配方式，path在请求体不同时按路径匹配"
+    )
+    args = parser.parse_args(argv)
+
+    cassette = args.cassette
+    if cassette is None:
+        cassette = os.path.join(tempfile.mkdtemp(prefix="deepseek-cassette-"), "mock.jsonl.gz")
+        record(cassette, args.port, args.tokens)
+        print(f"已录制: {cassette} ({os.path.getsize(cassette)} 字节)")
+
+    print(f"{'模式':<6}{'流式':<6}{'吞吐(次/秒)':>12}{'CPU(us/次)':>12}{'P50(ms)':>10}{'P99(ms)':>10}{'内存峰值(KB)':>14}")
+    for stream in ((True,) if args.stream else (False, True)):
+        for raw_mode in (False, True):
+            result = replay(cassette, args.requests, args.concurrency, args.speed, stream, raw_mode, args.match)
+            print(
+                f"{'raw' if raw_mode else 'sdk':<6}{'是' if stream else '否':<6}"
+                f"{result['throughput']:>12.0f}{result['cpu_us']:>12.0f}"
+                f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['peak_kb']:>14.0f}"
+            )
+            if result["unmatched"]:
+                print(f"  警告: {result['unmatched']} 个请求在cassette中没有匹配的记录")
+            if result["fallbacks"]:
+                print(f"  提示: {result['fallbacks']} 个请求的请求体与录制时不同，按路径回放")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+DeepSeek token计数基准测试
+~~~~~~~~~~~~~~~~~~~~~~~
+
+模拟一段不断增长的中英文混合对话，统计每轮计算整个对话token数的耗时：首次计数需要对所有消息分词，
+之后每轮只有新消息需要分词。同时在本地模拟上游上测量一次对话请求的耗时作为对比。
+
+运行方式::
+
+    python benchmarks/tokenizer_benchmark.py --turns 100
+
+设置 ``DEEPSEEK_TOKENIZER_PATH`` 时测量tokenizer.json分词器，否则测量估算器。
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deepseek import DeepSeekClient  # noqa: E402
+from deepseek.conversation import Conversation  # noqa: E402
+from deepseek.tokenizer import TokenCounter, get_token_counter  # noqa: E402
+
+from raw_benchmark import spawn_mock_upstream  # noqa: E402
+
+CHINESE = "深度求索发布的模型在数学推理和代码生成任务上表现出色，支持长上下文和函数调用。"
+ENGLISH = "The quick brown fox jumps over the lazy dog while the model streams tokens back. "
+
+
+def make_message(rng: random.Random, chars: int) -> str:
+    """
+    生成一条中英文混合的消息
+
+    Args:
+        rng: 随机数生成器
+        chars: 大约的字符数
+
+    Returns:
+        消息文本
+    """
+    parts = []
+    size = 0
+    while size < chars:
+        part = rng.choice((CHINESE, ENGLISH)) + str(rng.randrange(100000))
+        parts.append(part)
+        size += len(part)
+    return "".join(parts)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="测量对话token计数的耗时")
+    parser.add_argument("--turns", type=int, default=100, help="对话轮数")
+    parser.add_argument("--chars", type=int, default=600, help="每条消息的字符数")
+    parser.add_argument("--port", type=int, default=8769, help="模拟上游的监听端口")
+    parser.add_argument("--requests", type=int, default=50, help="测量请求耗时的请求数")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    messages = [make_message(rng, args.chars) for _ in range(args.turns * 2)]
+    tokenizer = get_token_counter().tokenizer
+    print(f"分词器: {tokenizer.name}")
+
+    # 不使用缓存时，每轮都对整个对话重新分词
+    cold = TokenCounter(tokenizer, cache_size=0)
+    conversation = Conversation("你是一个乐于助人的助手。")
+    started = time.perf_counter()
+    for i in range(args.turns):
+        conversation.add_user_message(messages[2 * i])
+        conversation.count_tokens(cold)
+        conversation.add_assistant_message(messages[2 * i + 1])
+    uncached = (time.perf_counter() - started) / args.turns
+
+    counter = TokenCounter(tokenizer)
+    conversation = Conversation("你是一个乐于助人的助手。")
+    started = time.perf_counter()
+    for i in range(args.turns):
+        conversation.add_user_message(messages[2 * i])
+        total = conversation.count_tokens(counter)
+        conversation.add_assistant_message(messages[2 * i + 1])
+    cached = (time.perf_counter() - started) / args.turns
+
+    started = time.perf_counter()
+    counter.count_batch(messages)
+    batch = time.perf_counter() - started
+
+    process = spawn_mock_upstream(args.port, 32)
+    try:
+        client = DeepSeekClient(api_key="sk-benchmark", base_url=f"http://127.0.0.1:{args.port}")
+        request = [{"role": "user", "content": messages[0]}]
+        client.complete(request)
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            client.complete(request)
+        request_latency = (time.perf_counter() - started) / args.requests
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(f"对话轮数: {args.turns}，最终token数: {total}")
+    print(f"{'每轮计数（不缓存）':<20}{uncached * 1e6:>10.0f} us")
+    print(f"{'每轮计数（按消息缓存）':<20}{cached * 1e6:>10.0f} us")
+    print(f"{'批量计数（全部缓存）':<20}{batch * 1e6:>10.0f} us")
+    print(f"{'本地上游请求耗时':<20}{request_latency * 1e6:>10.0f} us")
+    print(f"缓存计数耗时占本地请求耗时的 {cached / request_latency:.2%}，真实API的请求耗时通常还要高出两个数量级")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
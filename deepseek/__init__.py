@@ -10,6 +10,7 @@ DeepSeek Python 客户端
 
 from .client import DeepSeekClient
 from .config import DeepSeekConfig
+from .exceptions import DeepSeekError, DeepSeekAPIError
 
 __version__ = '0.1.0'
-__all__ = ['DeepSeekClient', 'DeepSeekConfig'] 
\ No newline at end of file
+__all__ = ['DeepSeekClient', 'DeepSeekConfig', 'DeepSeekError', 'DeepSeekAPIError'] 
\ No newline at end of file
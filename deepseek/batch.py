@@ -0,0 +1,426 @@
+"""
+DeepSeek 批量任务
+~~~~~~~~~~~~~~
+
+从JSONL文件中逐行读取请求，以有限的并发调用对话接口，并在每个请求完成时立即把结果写入输出JSONL。
+已完成请求的ID记录在检查点文件中，中断后重新运行会跳过检查点和输出文件中已完成的请求，不会重复调用
+和计费；同一个ID在输入中出现多次时只执行第一次。无法解析的输入行和失败的请求写入失败记录文件，不会中断整个任务。
+
+输入文件每行一个JSON对象，支持以下字段：
+
+- ``id``: 请求ID，缺省时使用行号
+- ``messages``: 完整的消息列表；或者使用 ``prompt`` 和可选的 ``system`` 字段
+- ``params``: 传递给对话接口的其他参数，例如 ``temperature``、``max_tokens``
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, Future, wait
+from typing import Dict, Any, Optional, List, Callable, Iterator, Set, Tuple, TextIO
+
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+from tqdm import tqdm
+
+from .client import DeepSeekClient
+from .concurrency import is_overload_error
+from .exceptions import DeepSeekAPIError
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    判断批量任务中的失败是否值得重试
+
+    Args:
+        error: 异常对象
+
+    Returns:
+        过载、服务端错误以及网络错误返回True
+    """
+    # 截止时间、取消以及输入记录错误等情况不重试
+    if not isinstance(error, DeepSeekAPIError):
+        return False
+    status_code = error.status_code
+    return status_code is None or status_code >= 500 or is_overload_error(error)
+
+
+def iter_requests(
+    input_path: str,
+    on_error: Optional[Callable[[str, ValueError], None]] = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    逐行读取输入文件中的请求
+
+    Args:
+        input_path: 输入JSONL文件路径
+        on_error: 处理无效行的函数，参数为行号和异常；提供时跳过该行继续读取，否则抛出异常
+
+    Yields:
+        (请求ID, 请求内容)
+
+    Raises:
+        ValueError: 没有提供on_error时，某一行不是有效的JSON对象
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("应为JSON对象")
+            except ValueError as e:
+                error = ValueError(f"输入文件第{line_number}行不是有效的JSON: {e}")
+                if on_error is None:
+                    raise error from e
+                on_error(str(line_number), error)
+                continue
+            yield str(record.get("id", line_number)), record
+
+
+def build_messages(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    根据输入记录构造消息列表
+
+    Args:
+        record: 输入记录
+
+    Returns:
+        消息列表
+    """
+    if "messages" in record:
+        return record["messages"]
+    if "prompt" not in record:
+        raise ValueError("输入记录缺少messages或prompt字段")
+
+    messages = []
+    if record.get("system"):
+        messages.append({"role": "system", "content": record["system"]})
+    messages.append({"role": "user", "content": record["prompt"]})
+    return messages
+
+
+class BatchRunner:
+    """JSONL批量任务执行器"""
+
+    def __init__(
+        self,
+        client: DeepSeekClient,
+        max_workers: int = 8,
+        retries: int = 3,
+        params: Optional[Dict[str, Any]] = None,
+        show_progress: bool = True,
+    ):
+        """
+        初始化批量任务执行器
+
+        重试由执行器按指数退避进行，客户端应以max_retries=0创建，否则每次尝试还会被客户端重试，
+        一个请求最多发送retries * (max_retries + 1)次。
+
+        Args:
+            client: DeepSeekClient实例，多个线程共享其连接池和并发限制器
+            max_workers: 同时进行的最大请求数
+            retries: 过载或服务端错误时的最大尝试次数
+            params: 所有请求共用的默认API参数，输入记录中的params优先
+            show_progress: 是否显示进度条
+        """
+        self.client = client
+        self.max_workers = max_workers
+        self.retries = max(retries, 1)
+        self.params = params or {}
+        self.show_progress = show_progress
+
+    def run(
+        self,
+        input_path: str,
+        output_path: str,
+        checkpoint_path: Optional[str] = None,
+        errors_path: Optional[str] = None,
+        resume: bool = True,
+    ) -> Dict[str, int]:
+        """
+        执行批量任务
+
+        Args:
+            input_path: 输入JSONL文件路径
+            output_path: 输出JSONL文件路径，结果按完成顺序追加写入
+            checkpoint_path: 检查点文件路径，默认为输出文件路径加.checkpoint
+            errors_path: 失败记录文件路径，默认为输出文件路径加.errors
+            resume: 是否跳过检查点和输出文件中已完成的请求；为False时会清空已有的输出、检查点和失败记录
+
+        Returns:
+            包含完成、跳过、失败数量和token用量的统计信息
+        """
+        checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+        errors_path = errors_path or f"{output_path}.errors"
+
+        if resume:
+            _truncate_partial_line(output_path)
+            # 输出先于检查点写入，进程在两次写入之间崩溃时输出中会有检查点缺少的ID
+            completed = self._load_checkpoint(checkpoint_path) | self._load_output_ids(output_path)
+        else:
+            completed = set()
+            for path in (output_path, checkpoint_path, errors_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        summary = {
+            "completed": 0,
+            "skipped": 0,
+            "failed": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+
+        with open(output_path, "a", encoding="utf-8") as output, \
+                open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+                open(errors_path, "a", encoding="utf-8") as errors, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                tqdm(unit="req", desc="批量请求", disable=not self.show_progress) as pbar:
+
+            in_flight: Dict[Future, str] = {}
+            # 最多同时持有两倍并发数的未完成请求，使内存占用与输入规模无关
+            max_pending = self.max_workers * 2
+
+            def _invalid_line(line_id: str, error: ValueError) -> None:
+                summary["failed"] += 1
+                errors.write(json.dumps({"id": line_id, "error": str(error)}, ensure_ascii=False) + "\n")
+                errors.flush()
+                pbar.update(1)
+
+            for request_id, record in iter_requests(input_path, on_error=_invalid_line):
+                if request_id in completed:
+                    summary["skipped"] += 1
+                    pbar.update(1)
+                    continue
+                # 提交时即记为已处理，输入中重复的ID不会再次调用
+                completed.add(request_id)
+
+                if len(in_flight) >= max_pending:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    self._drain(done, in_flight, output, checkpoint, errors, summary, pbar)
+
+                in_flight[executor.submit(self._run_one, record)] = request_id
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                self._drain(done, in_flight, output, checkpoint, errors, summary, pbar)
+
+        return summary
+
+    def _run_one(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        执行单个请求，过载或服务端错误时按指数退避重试
+
+        Args:
+            record: 输入记录
+
+        Returns:
+            输出记录（不含ID）
+        """
+        messages = build_messages(record)
+        params = {**self.params, **record.get("params", {})}
+
+        retrying = Retrying(
+            stop=stop_after_attempt(self.retries),
+            wait=wait_exponential_jitter(initial=1, max=30),
+            retry=retry_if_exception(is_retryable_error),
+            reraise=True,
+        )
+        result = retrying(self.client.complete, messages, **params)
+
+        output = {
+            "content": result.content,
+            "finish_reason": result.finish_reason,
+            "model": result.model,
+        }
+        if result.reasoning_content:
+            output["reasoning_content"] = result.reasoning_content
+        if result.usage is not None:
+            output["usage"] = result.usage.to_dict()
+        return output
+
+    def _drain(
+        self,
+        done: Set[Future],
+        in_flight: Dict[Future, str],
+        output: TextIO,
+        checkpoint: TextIO,
+        errors: TextIO,
+        summary: Dict[str, int],
+        pbar: tqdm,
+    ) -> None:
+        """
+        写出已完成请求的结果
+
+        先写入并刷新输出文件，再记录检查点，保证检查点中的ID一定已经有对应的输出；两次写入之间崩溃时，
+        续跑根据输出文件补齐检查点缺少的ID。
+
+        Args:
+            done: 已完成的Future
+            in_flight: 进行中的请求
+            output: 输出文件
+            checkpoint: 检查点文件
+            errors: 失败记录文件
+            summary: 统计信息
+            pbar: 进度条
+        """
+        for future in done:
+            request_id = in_flight.pop(future)
+            try:
+                record = future.result()
+            except Exception as e:
+                summary["failed"] += 1
+                errors.write(json.dumps({"id": request_id, "error": str(e)}, ensure_ascii=False) + "\n")
+                errors.flush()
+            else:
+                output.write(json.dumps({"id": request_id, **record}, ensure_ascii=False) + "\n")
+                output.flush()
+                checkpoint.write(request_id + "\n")
+                checkpoint.flush()
+
+                summary["completed"] += 1
+                usage = record.get("usage")
+                if usage:
+                    summary["prompt_tokens"] += usage["prompt_tokens"]
+                    summary["completion_tokens"] += usage["completion_tokens"]
+            pbar.update(1)
+
+    @staticmethod
+    def _load_checkpoint(checkpoint_path: str) -> Set[str]:
+        """
+        读取检查点中已完成的请求ID
+
+        Args:
+            checkpoint_path: 检查点文件路径
+
+        Returns:
+            已完成的请求ID集合
+        """
+        if not os.path.exists(checkpoint_path):
+            return set()
+
+        _truncate_partial_line(checkpoint_path)
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            return {line.rstrip("\n") for line in f if line.strip()}
+
+    @staticmethod
+    def _load_output_ids(output_path: str) -> Set[str]:
+        """
+        读取输出文件中已有结果的请求ID
+
+        Args:
+            output_path: 输出文件路径，末尾未写完的行需要已经截掉
+
+        Returns:
+            已有结果的请求ID集合
+        """
+        if not os.path.exists(output_path):
+            return set()
+
+        ids = set()
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    ids.add(str(json.loads(line)["id"]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return ids
+
+
+def _truncate_partial_line(path: str) -> None:
+    """
+    截掉文件末尾因进程崩溃而未写完的一行
+
+    Args:
+        path: 文件路径
+    """
+    if not os.path.exists(path):
+        return
+
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+
+        # 向前查找最后一个换行符
+        position = size
+        block = 4096
+        while position > 0:
+            start = max(position - block, 0)
+            f.seek(start)
+            data = f.read(position - start)
+            index = data.rfind(b"\n")
+            if index >= 0:
+                f.truncate(start + index + 1)
+                return
+            position = start
+        f.truncate(0)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    批量任务命令行入口
+
+    Args:
+        argv: 命令行参数，默认读取sys.argv
+
+    Returns:
+        进程退出码
+    """
+    parser = argparse.ArgumentParser(
+        prog="deepseek-batch",
+        description="从JSONL文件批量调用DeepSeek对话接口，支持断点续跑",
+    )
+    parser.add_argument("input", help="输入JSONL文件")
+    parser.add_argument("output", help="输出JSONL文件")
+    parser.add_argument("--workers", type=int, default=8, help="同时进行的最大请求数")
+    parser.add_argument("--retries", type=int, default=3, help="过载或服务端错误时的最大尝试次数")
+    parser.add_argument("--model", help="使用的模型名称")
+    parser.add_argument("--temperature", type=float, help="温度参数")
+    parser.add_argument("--max-tokens", type=int, help="生成的最大token数")
+    parser.add_argument("--checkpoint", help="检查点文件路径，默认为输出文件加.checkpoint")
+    parser.add_argument("--errors", help="失败记录文件路径，默认为输出文件加.errors")
+    parser.add_argument("--no-resume", action="store_true", help="忽略已有检查点，重新执行全部请求")
+    parser.add_argument("--adaptive", action="store_true", help="根据延迟和429/503响应自动调整并发数")
+    parser.add_argument("--quiet", action="store_true", help="不显示进度条")
+    args = parser.parse_args(argv)
+
+    # 重试由BatchRunner负责，客户端不再重试，避免两层重试叠加
+    client = DeepSeekClient(model=args.model, adaptive_concurrency=args.adaptive or None, max_retries=0)
+
+    params: Dict[str, Any] = {}
+    if args.temperature is not None:
+        params["temperature"] = args.temperature
+    if args.max_tokens is not None:
+        params["max_tokens"] = args.max_tokens
+
+    runner = BatchRunner(
+        client,
+        max_workers=args.workers,
+        retries=args.retries,
+        params=params,
+        show_progress=not args.quiet,
+    )
+    summary = runner.run(
+        args.input,
+        args.output,
+        checkpoint_path=args.checkpoint,
+        errors_path=args.errors,
+        resume=not args.no_resume,
+    )
+
+    print(json.dumps(summary, ensure_ascii=False))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
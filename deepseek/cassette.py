@@ -0,0 +1,321 @@
+"""
+DeepSeek 请求录制与回放
+~~~~~~~~~~~~~~~~~~~~
+
+可插拔的httpx传输层，用于离线的压测和回归测试。
+
+``RecordingTransport`` 把经过它的真实请求和响应写入磁盘上的cassette文件，流式响应的每个数据块
+都记录相对于请求开始的时间；``ReplayTransport`` 从cassette中按请求匹配响应，可以按原始节奏、
+加速或不等待地回放，整个过程不访问网络，也不产生API费用。默认只回放方法、路径和请求体都相同的记录，
+请求体变化的请求返回404，回归测试可以发现请求内容的改变。
+
+cassette是gzip压缩的JSON Lines文件，每行记录一次请求和响应。请求只保存方法、路径和请求体的摘要，
+不保存请求头，API密钥不会写入文件。
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any, Optional, List, Iterator, Tuple
+
+import httpx
+
+from .compression import decompress_bytes
+
+# 不写入cassette的响应头：回放时由httpx重新计算或与本次连接无关
+_SKIPPED_HEADERS = {"set-cookie", "content-length", "transfer-encoding", "connection", "keep-alive", "date"}
+
+
+def _json_body(request: httpx.Request) -> Tuple[bytes, Any]:
+    """读取请求体，压缩的请求体先解压，返回原始字节和解析出的JSON（不是JSON时为None）"""
+    body = request.read()
+    encoding = request.headers.get("content-encoding")
+    if body and encoding in ("gzip", "zstd"):
+        try:
+            body = decompress_bytes(body, encoding)
+        except Exception:
+            pass
+    if body and request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            return body, json.loads(body)
+        except ValueError:
+            pass
+    return body, None
+
+
+def body_digest(request: httpx.Request) -> str:
+    """
+    计算请求体的摘要，压缩的请求体先解压，JSON请求体按键排序后计算，不受压缩和序列化方式的影响
+
+    Args:
+        request: 请求
+
+    Returns:
+        十六进制摘要
+    """
+    body, data = _json_body(request)
+    if data is not None:
+        body = json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def _wants_stream(request: httpx.Request) -> bool:
+    """请求是否要求流式响应"""
+    _, data = _json_body(request)
+    return isinstance(data, dict) and bool(data.get("stream"))
+
+
+def _is_stream(interaction: "Interaction") -> bool:
+    """录制的响应是否为流式响应"""
+    return any(k.lower() == "content-type" and v.startswith("text/event-stream") for k, v in interaction.headers)
+
+
+def _encode_chunk(chunk: bytes) -> Any:
+    # 文本数据块直接保存为字符串，压缩前更紧凑，也便于查看
+    try:
+        return chunk.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(chunk).decode("ascii")}
+
+
+def _decode_chunk(chunk: Any) -> bytes:
+    if isinstance(chunk, str):
+        return chunk.encode("utf-8")
+    return base64.b64decode(chunk["b64"])
+
+
+class Interaction:
+    """一次录制的请求和响应"""
+
+    __slots__ = ("method", "path", "digest", "status", "headers", "chunks")
+
+    def __init__(
+        self,
+        method: str,
+        path: str,
+        digest: str,
+        status: int,
+        headers: List[Tuple[str, str]],
+        chunks: List[Tuple[float, bytes]],
+    ):
+        """
+        初始化记录
+
+        Args:
+            method: HTTP方法
+            path: 请求路径（包含查询参数）
+            digest: 请求体的摘要
+            status: 响应状态码
+            headers: 响应头
+            chunks: 响应体的数据块，每项为(相对于请求开始的秒数, 数据)
+        """
+        self.method = method
+        self.path = path
+        self.digest = digest
+        self.status = status
+        self.headers = headers
+        self.chunks = chunks
+
+    def to_json(self) -> Dict[str, Any]:
+        """转换为cassette中的一行"""
+        return {
+            "method": self.method,
+            "path": self.path,
+            "digest": self.digest,
+            "status": self.status,
+            "headers": self.headers,
+            "chunks": [[round(offset, 4), _encode_chunk(chunk)] for offset, chunk in self.chunks],
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Interaction":
+        """从cassette中的一行恢复记录"""
+        return cls(
+            data["method"],
+            data["path"],
+            data["digest"],
+            data["status"],
+            [tuple(header) for header in data["headers"]],
+            [(offset, _decode_chunk(chunk)) for offset, chunk in data["chunks"]],
+        )
+
+
+def load_cassette(path: str) -> List[Interaction]:
+    """
+    读取cassette文件
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        按录制顺序排列的记录
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [Interaction.from_json(json.loads(line)) for line in f if line.strip()]
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """转发响应体并记录每个数据块的到达时间"""
+
+    def __init__(self, stream: httpx.SyncByteStream, started: float, on_close: Any):
+        self._stream = stream
+        self._started = started
+        self._on_close = on_close
+        self._chunks: List[Tuple[float, bytes]] = []
+        self._closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            self._chunks.append((time.monotonic() - self._started, chunk))
+            yield chunk
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._stream.close()
+        self._on_close(self._chunks)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """转发请求到真实传输层，并把请求和响应追加到cassette文件"""
+
+    def __init__(self, path: str, transport: Optional[httpx.BaseTransport] = None):
+        """
+        初始化录制传输层
+
+        Args:
+            path: cassette文件路径，已存在时在末尾追加
+            transport: 实际发送请求的传输层，默认为httpx.HTTPTransport()
+        """
+        self.path = path
+        self.transport = transport or httpx.HTTPTransport()
+        self.recorded = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        digest = body_digest(request)
+        started = time.monotonic()
+        response = self.transport.handle_request(request)
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in _SKIPPED_HEADERS]
+
+        def save(chunks: List[Tuple[float, bytes]]) -> None:
+            interaction = Interaction(request.method, request.url.raw_path.decode("ascii"), digest,
+                                      response.status_code, headers, chunks)
+            self._append(interaction)
+
+        # 响应体被读完或关闭后才写入，未读完就关闭的流式响应只记录已经收到的部分
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, started, save),
+            extensions=response.extensions,
+        )
+
+    def _append(self, interaction: Interaction) -> None:
+        line = json.dumps(interaction.to_json(), ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            # 每次追加一个gzip成员，进程意外退出时已写入的记录仍然可以读取
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+            self.recorded += 1
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    """按录制时的节奏返回数据块"""
+
+    def __init__(self, chunks: List[Tuple[float, bytes]], speed: float):
+        self._chunks = chunks
+        self._speed = speed
+
+    def __iter__(self) -> Iterator[bytes]:
+        started = time.monotonic()
+        for offset, chunk in self._chunks:
+            if self._speed:
+                delay = started + offset / self._speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield chunk
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """从cassette中匹配请求并回放响应，不访问网络"""
+
+    MATCH_MODES = ("body", "path")
+
+    def __init__(self, cassette: Any, speed: float = 1.0, match: str = "body"):
+        """
+        初始化回放传输层
+
+        同一请求有多条记录时依次轮流返回，因此少量录制的请求可以支撑任意数量的压测请求。
+
+        Args:
+            cassette: cassette文件路径，或load_cassette返回的记录列表
+            speed: 回放速度倍数，1表示按录制时的节奏，0表示不等待
+            match: "body"只匹配方法、路径和请求体都相同的记录，没有匹配的请求返回404；
+                "path"在请求体不同时改为回放方法和路径相同的记录，这类请求计入fallbacks，适合只关心吞吐量的压测
+
+        Raises:
+            ValueError: 不支持的匹配方式
+        """
+        if match not in self.MATCH_MODES:
+            raise ValueError(f"不支持的匹配方式: {match}，可选值为body或path")
+        interactions = load_cassette(cassette) if isinstance(cassette, (str, os.PathLike)) else list(cassette)
+        self.speed = speed
+        self.match = match
+        self.interactions = interactions
+        self.replayed = 0
+        self.unmatched = 0
+        # 请求体不同、按路径回放的请求数
+        self.fallbacks = 0
+        self._exact: Dict[Tuple[str, str, str], List[Interaction]] = defaultdict(list)
+        # 按路径回放时只使用响应类型相同的记录，流式请求不会收到普通JSON响应
+        self._by_path: Dict[Tuple[str, str, bool], List[Interaction]] = defaultdict(list)
+        for interaction in interactions:
+            self._exact[(interaction.method, interaction.path, interaction.digest)].append(interaction)
+            self._by_path[(interaction.method, interaction.path, _is_stream(interaction))].append(interaction)
+        self._cursors: Dict[Any, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _match(self, request: httpx.Request) -> Optional[Interaction]:
+        method, path = request.method, request.url.raw_path.decode("ascii")
+        lookups = [((method, path, body_digest(request)), self._exact)]
+        if self.match == "path":
+            lookups.append(((method, path, _wants_stream(request)), self._by_path))
+        for key, index in lookups:
+            candidates = index.get(key)
+            if candidates:
+                with self._lock:
+                    cursor = self._cursors[key]
+                    self._cursors[key] = cursor + 1
+                    self.replayed += 1
+                    if index is self._by_path:
+                        self.fallbacks += 1
+                return candidates[cursor % len(candidates)]
+        with self._lock:
+            self.unmatched += 1
+        return None
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        interaction = self._match(request)
+        if interaction is None:
+            body = json.dumps(
+                {"error": {"message": f"cassette中没有匹配的请求: {request.method} {request.url.path}"}}, ensure_ascii=False
+            )
+            return httpx.Response(404, headers={"content-type": "application/json"}, content=body.encode("utf-8"))
+
+        return httpx.Response(
+            interaction.status,
+            headers=interaction.headers,
+            stream=_ReplayStream(interaction.chunks, self.speed),
+        )
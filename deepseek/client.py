@@ -5,17 +5,96 @@ DeepSeek 核心客户端
 提供与DeepSeek API交互的核心功能，整合深度思考、联网搜索、对话和文件处理等功能。
 """
 
+import asyncio
+import contextvars
+import functools
+import hashlib
 import json
-from typing import Dict, Any, Optional, List, Union
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Dict, Any, Optional, List, Union, Iterator, Generator, Tuple, Awaitable, Callable
 
+import httpx
+import openai
 import requests
 from openai import OpenAI
 
+from .compression import CompressingTransport, resolve_encoding
+from .concurrency import AdaptiveLimiter
+from .endpoints import Endpoint, EndpointPool, Lease, is_failover_error
 from .config import DeepSeekConfig
 from .conversation import Conversation
+from .documents import DocumentError, DocumentStore
+from .exceptions import (
+    DeepSeekError, DeepSeekAPIError, DeadlineExceededError, RequestCancelledError, get_status_code
+)
 from .features.deep_thinking import DeepThinking
-from .features.web_search import WebSearch
+from .features.web_search import WebSearch, SearchProvider, HTTPSearchProvider
 from .files import FileManager
+from .hedging import HedgePolicy, hedged_stream
+from .ledger import UsageLedger, current_scope
+from .raw import RawChatClient, StreamAccumulator, frame_data, iter_sse_data, iter_sse_frames, parse_retry_after
+from .response import ChatResult, StreamDelta, Usage, tool_calls_from_api
+from .semantic_cache import SemanticCache
+from .structured import IncrementalJSONParser, JSONEvent, StructuredOutputError
+from .singleflight import SingleFlight, default_group, request_key
+from .tokenizer import get_token_counter
+from .tools import ToolRegistry
+from .timeouts import CancelToken, Deadline
+from .warmup import KeepAlive, dns_cache, open_connections
+
+# 保持空闲的连接数与最大连接数相同，并发请求结束后连接不会因超出空闲上限被关闭而反复重建
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=100)
+# OpenAI SDK自行创建客户端时使用的连接池限制
+_SDK_HTTP_LIMITS = httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+
+# 原始响应模式和设置总截止时间时由客户端重试，退避时间与SDK相同：0.5秒起每次加倍，最长8秒
+_RETRY_BASE_DELAY = 0.5
+_RETRY_MAX_DELAY = 8.0
+# 服务端通过Retry-After建议的等待时间不超过这个值时才采用，与SDK相同
+_RETRY_AFTER_MAX = 60.0
+# SDK会自动重试的状态码
+_RETRY_STATUS_CODES = (408, 409, 429)
+
+
+def _is_retryable(error: BaseException) -> bool:
+    """
+    判断请求的错误是否可以重试，与SDK自身的重试条件一致：连接错误、超时、408、409、429和5xx
+
+    Args:
+        error: SDK或原始响应模式抛出的异常
+
+    Returns:
+        是否可以重试
+    """
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return True
+    if isinstance(error, (openai.APIStatusError, DeepSeekAPIError)) and error.status_code is not None:
+        return error.status_code in _RETRY_STATUS_CODES or error.status_code >= 500
+    return False
+
+
+def _retry_delay(error: BaseException, attempt: int) -> float:
+    """
+    计算重试前的等待时间，优先采用服务端Retry-After建议的时间，否则指数退避
+
+    Args:
+        error: 上一次尝试的异常
+        attempt: 已经重试的次数
+
+    Returns:
+        等待时间（秒）
+    """
+    retry_after = None
+    if isinstance(error, openai.APIStatusError):
+        retry_after = parse_retry_after(error.response.headers)
+    elif isinstance(error, DeepSeekAPIError):
+        retry_after = error.retry_after
+    if retry_after is not None and 0 < retry_after <= _RETRY_AFTER_MAX:
+        return retry_after
+    return min(_RETRY_BASE_DELAY * 2 ** attempt, _RETRY_MAX_DELAY)
 
 
 class DeepSeekClient:
@@ -29,6 +108,33 @@ class DeepSeekClient:
         timeout: Optional[int] = None,
         deep_thinking: Optional[bool] = None,
         web_search: Optional[bool] = None,
+        reasoning_model: Optional[str] = None,
+        single_flight: Optional[bool] = None,
+        adaptive_concurrency: Optional[bool] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        stream_idle_timeout: Optional[float] = None,
+        total_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        endpoints: Optional[List[Union[Tuple[str, str], Dict[str, str]]]] = None,
+        hedging: Optional[bool] = None,
+        http2: Optional[bool] = None,
+        raw_mode: Optional[bool] = None,
+        web_search_url: Optional[str] = None,
+        search_provider: Optional[SearchProvider] = None,
+        documents_dir: Optional[str] = None,
+        semantic_cache: Optional[bool] = None,
+        semantic_cache_threshold: Optional[float] = None,
+        semantic_cache_system_prompts: Optional[List[Optional[str]]] = None,
+        transport: Optional[httpx.BaseTransport] = None,
+        ledger_path: Optional[str] = None,
+        tenant: Optional[str] = None,
+        ledger: Optional[UsageLedger] = None,
+        warmup_connections: Optional[int] = None,
+        keepalive_interval: Optional[float] = None,
+        keepalive_expiry: Optional[float] = None,
+        compression: Optional[str] = None,
+        compression_min_size: Optional[int] = None,
     ):
         """
         初始化DeepSeek客户端
@@ -40,6 +146,36 @@ class DeepSeekClient:
             timeout: API请求超时时间（秒）
             deep_thinking: 是否启用深度思考
             web_search: 是否启用联网搜索
+            reasoning_model: 深度思考模式下使用的推理模型
+            single_flight: 是否合并相同的并发请求
+            adaptive_concurrency: 是否根据延迟和429/503响应自动调整并发请求数
+            connect_timeout: 建立连接的超时时间（秒）
+            read_timeout: 等待响应数据的超时时间（秒），对话请求默认为600秒
+            stream_idle_timeout: 流式响应中两个数据块之间的最长间隔（秒）
+            total_timeout: 单次调用的总截止时间（秒）
+            max_retries: 对话请求遇到连接错误、超时、408、409、429和5xx时的最大重试次数，默认与OpenAI SDK相同为2次
+            endpoints: 额外的(base_url, api_key)端点列表，用于负载均衡和故障切换
+            hedging: 是否对迟迟没有首个token的请求发送对冲请求
+            http2: 是否使用HTTP/2，在少量连接上复用对话和文件请求
+            raw_mode: 是否绕过OpenAI SDK直接解析对话响应，降低每次调用的CPU开销
+            web_search_url: 联网搜索使用的搜索服务地址（兼容SearXNG的JSON接口）
+            search_provider: 自定义的搜索服务，优先于web_search_url
+            documents_dir: 上传文件的本地索引目录
+            semantic_cache: 是否对换了说法的相同问题复用之前的回答
+            semantic_cache_threshold: 语义缓存的余弦相似度阈值
+            semantic_cache_system_prompts: 允许使用语义缓存的系统提示词，None表示没有系统提示词；
+                默认只缓存没有系统提示词的对话
+            transport: 自定义的httpx传输层，对话和文件请求都经过它发送，
+                例如用cassette.RecordingTransport录制请求或用ReplayTransport离线回放
+            ledger_path: 用量账本的sqlite数据库路径，设置后记录每次调用的token用量和费用
+            tenant: 用量账本中调用默认所属的租户，可以用ledger.usage_scope按调用覆盖
+            ledger: 自定义的用量账本，优先于ledger_path，多个客户端可以共享同一个账本
+            warmup_connections: warmup预热时每个连接池建立的连接数
+            keepalive_interval: warmup之后后台探测的间隔（秒），应小于keepalive_expiry；None表示不探测
+            keepalive_expiry: 连接池中空闲连接的保留时间（秒），None表示使用httpx的默认值（5秒）
+            compression: 请求体的压缩编码，"zstd"、"gzip"或"auto"，需要服务端支持Content-Encoding；
+                可压缩的上传文件和超过compression_min_size的对话请求体会被压缩，默认不压缩
+            compression_min_size: 压缩请求体和上传文件的最小字节数
         """
         # 初始化配置
         self.config = DeepSeekConfig(
@@ -49,28 +185,447 @@ class DeepSeekClient:
             timeout=timeout,
             deep_thinking=deep_thinking,
             web_search=web_search,
+            reasoning_model=reasoning_model,
+            single_flight=single_flight,
+            adaptive_concurrency=adaptive_concurrency,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            stream_idle_timeout=stream_idle_timeout,
+            total_timeout=total_timeout,
+            max_retries=max_retries,
+            endpoints=endpoints,
+            hedging=hedging,
+            http2=http2,
+            raw_mode=raw_mode,
+            web_search_url=web_search_url,
+            documents_dir=documents_dir,
+            semantic_cache=semantic_cache,
+            semantic_cache_threshold=semantic_cache_threshold,
+            ledger_path=ledger_path,
+            tenant=tenant,
+            warmup_connections=warmup_connections,
+            keepalive_interval=keepalive_interval,
+            keepalive_expiry=keepalive_expiry,
+            compression=compression,
+            compression_min_size=compression_min_size,
         )
         
         # 初始化功能模块
-        self.deep_thinking = DeepThinking(enabled=self.config.deep_thinking)
-        self.web_search = WebSearch(enabled=self.config.web_search)
+        self.deep_thinking = DeepThinking(
+            enabled=self.config.deep_thinking,
+            model=self.config.reasoning_model
+        )
+        if search_provider is None and self.config.web_search_url:
+            search_provider = HTTPSearchProvider(self.config.web_search_url)
+        self.web_search = WebSearch(enabled=self.config.web_search, provider=search_provider)
+
+        # 上传文件的本地索引，对话引用文件时只注入与问题相关的文本块
+        self.documents = DocumentStore(self.config.documents_dir)
         
         # 初始化对话管理
         self.conversation = Conversation()
+
+        # token计数器，依次使用DEEPSEEK_TOKENIZER_PATH指定的分词器、deepseek-tokenizer包中打包的分词器，
+        # 都没有时按换算比例估算
+        self.token_counter = get_token_counter()
+
+        # 最近一次调用的token用量和推理内容
+        self.last_usage: Optional[Usage] = None
+        self.last_reasoning: Optional[str] = None
+
+        # 可供模型调用的工具，chat_with_tools并发执行模型返回的工具调用
+        self.tools = ToolRegistry()
+
+        # 最近一次chat_n生成的所有候选
+        self.last_candidates: List[ChatResult] = []
+
+        # 语义缓存，对白名单系统提示词下的单轮问答复用语义相同问题的回答
+        self.semantic_cache: Optional[SemanticCache] = (
+            SemanticCache(
+                threshold=self.config.semantic_cache_threshold,
+                system_prompts=semantic_cache_system_prompts,
+            )
+            if self.config.semantic_cache else None
+        )
+
+        # 用量账本，按租户累计token用量和费用，并在发送请求前检查预算
+        # 根据配置创建的账本由客户端关闭，传入的账本可能被多个客户端共享，关闭时只写入剩余的记录
+        self._owns_ledger = ledger is None and bool(self.config.ledger_path)
+        if self._owns_ledger:
+            ledger = UsageLedger(self.config.ledger_path)
+        self.ledger: Optional[UsageLedger] = ledger
+
+        # 请求去重，默认使用进程内共享的合并器，使多个客户端实例之间也能合并相同请求
+        self.single_flight: Optional[SingleFlight] = default_group if self.config.single_flight else None
         
+        # 对冲请求策略，记录最近的首token延迟并限制对冲带来的额外负载
+        self.hedge_policy: Optional[HedgePolicy] = HedgePolicy() if self.config.hedging else None
+
+        # 自适应并发控制，对话和文件请求共享同一个限制器
+        self.limiter: Optional[AdaptiveLimiter] = AdaptiveLimiter() if self.config.adaptive_concurrency else None
+
+        # 请求体的压缩编码，None表示不压缩
+        self.compression: Optional[str] = resolve_encoding(self.config.compression)
+
+        # 启用HTTP/2、原始响应模式、请求压缩或传入自定义传输层时，对话和文件请求共享同一个httpx客户端
+        self.transport = transport
+        self.http_client: Optional[httpx.Client] = (
+            self._create_http_client(self.config.base_url)
+            if self._shares_http_client() else None
+        )
+
         # 初始化文件管理
-        self.file_manager = FileManager(
-            api_key=self.config.api_key,
-            base_url=self.config.base_url,
-            timeout=self.config.timeout
+        self.file_manager = self._create_file_manager(
+            self.config.base_url, self.config.api_key, self.http_client
         )
         
         # 初始化OpenAI兼容客户端
-        self.client = OpenAI(
-            api_key=self.config.api_key,
-            base_url=self.config.base_url
+        self.client = self._create_openai_client(
+            self.config.base_url, self.config.api_key, self.http_client
+        )
+
+        # 绕过SDK直接发送对话请求的轻量客户端，用于原始响应模式和SSE透传
+        self.raw = self._create_raw_client(self.config.base_url, self.config.api_key, self.http_client)
+
+        # 配置了多个端点时，主端点和额外端点组成负载均衡池
+        self.pool: Optional[EndpointPool] = None
+        self._file_endpoints: Dict[str, Endpoint] = {}
+        if self.config.endpoints:
+            self.pool = self._create_endpoint_pool()
+
+        # warmup启动的后台保活任务，以及是否由该客户端替换了DNS解析
+        self._keepalive: Optional[KeepAlive] = None
+        self._installed_dns_cache = False
+
+    def _shares_http_client(self) -> bool:
+        """对话和文件请求是否共享同一个httpx客户端"""
+        return (
+            self.config.http2
+            or self.config.raw_mode
+            or self.compression is not None
+            or self.transport is not None
+        )
+
+    def _http_limits(self, limits: httpx.Limits = _HTTP_LIMITS) -> httpx.Limits:
+        """
+        应用配置的空闲连接保留时间
+
+        Args:
+            limits: 默认的连接池限制
+
+        Returns:
+            连接池限制
+        """
+        if self.config.keepalive_expiry is None:
+            return limits
+        return httpx.Limits(
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=self.config.keepalive_expiry,
+        )
+
+    def _create_http_client(self, base_url: str) -> httpx.Client:
+        """
+        创建httpx客户端，启用HTTP/2时在少量连接上复用请求
+
+        HTTPS端点通过ALPN协商HTTP/2；明文HTTP端点无法协商，直接以先验知识方式使用HTTP/2（h2c）。
+
+        Args:
+            base_url: API基础URL
+
+        Returns:
+            httpx客户端
+        """
+        transport = self.transport
+        if self.compression is not None:
+            # 压缩传输层需要包装实际发送请求的传输层，此时HTTP/2和连接池限制在下层传输层上设置
+            if transport is None:
+                transport = self._create_http_transport(base_url)
+            transport = CompressingTransport(transport, self.compression, self.config.compression_min_size)
+
+        if not self.config.http2:
+            return httpx.Client(
+                timeout=self.config.timeouts.to_httpx(),
+                limits=self._http_limits(),
+                transport=transport,
+            )
+
+        try:
+            return httpx.Client(
+                http1=not base_url.startswith("http://"),
+                http2=True,
+                timeout=self.config.timeouts.to_httpx(),
+                limits=self._http_limits(),
+                transport=transport,
+            )
+        except ImportError as e:
+            raise ImportError("启用HTTP/2需要安装h2: pip install 'httpx[http2]'") from e
+
+    def _create_http_transport(self, base_url: str) -> httpx.HTTPTransport:
+        """
+        创建按配置启用HTTP/2和连接池限制的传输层
+
+        Args:
+            base_url: API基础URL
+
+        Returns:
+            httpx传输层
+        """
+        try:
+            return httpx.HTTPTransport(
+                http1=not (self.config.http2 and base_url.startswith("http://")),
+                http2=self.config.http2,
+                limits=self._http_limits(),
+            )
+        except ImportError as e:
+            raise ImportError("启用HTTP/2需要安装h2: pip install 'httpx[http2]'") from e
+
+    def _create_openai_client(
+        self, base_url: str, api_key: str, http_client: Optional[httpx.Client] = None
+    ) -> OpenAI:
+        """
+        创建OpenAI兼容客户端
+
+        Args:
+            base_url: API基础URL
+            api_key: API密钥
+            http_client: 共享的httpx客户端，为None时由SDK自行创建
+
+        Returns:
+            OpenAI客户端
+        """
+        if http_client is None and self.config.keepalive_expiry is not None:
+            # SDK自行创建的客户端无法设置空闲连接的保留时间，改为按SDK的默认连接数创建
+            http_client = httpx.Client(
+                timeout=self.config.timeouts.to_httpx(),
+                limits=self._http_limits(_SDK_HTTP_LIMITS),
+                follow_redirects=True,
+            )
+        return OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=self.config.timeouts.to_httpx(),
+            # SDK的重试不知道总截止时间，设置total_timeout时由_call_sdk按剩余时间重试
+            max_retries=0 if self.config.timeouts.total is not None else self.config.max_retries,
+            http_client=http_client
+        )
+
+    def _create_file_manager(
+        self, base_url: str, api_key: str, http_client: Optional[httpx.Client] = None
+    ) -> FileManager:
+        """
+        创建文件管理器
+
+        Args:
+            base_url: API基础URL
+            api_key: API密钥
+            http_client: 共享的httpx客户端，为None时使用requests
+
+        Returns:
+            文件管理器
+        """
+        return FileManager(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=self.config.file_timeouts,
+            limiter=self.limiter,
+            http_client=http_client,
+            compression=self.compression,
+            compression_min_size=self.config.compression_min_size,
+        )
+
+    def _create_raw_client(
+        self, base_url: str, api_key: str, http_client: Optional[httpx.Client] = None
+    ) -> RawChatClient:
+        """
+        创建绕过SDK的轻量对话客户端
+
+        Args:
+            base_url: API基础URL
+            api_key: API密钥
+            http_client: 共享的httpx客户端，为None时在第一次使用（SSE透传或预热）时单独创建
+
+        Returns:
+            轻量对话客户端
+        """
+        return RawChatClient(
+            http_client, base_url, api_key, client_factory=functools.partial(self._create_http_client, base_url)
+        )
+
+    def _create_endpoint_pool(self) -> EndpointPool:
+        """
+        创建多端点负载均衡池并启动健康检查
+
+        Returns:
+            端点池
+        """
+        primary = Endpoint(self.config.base_url, self.config.api_key)
+        primary.client = self.client
+        primary.file_manager = self.file_manager
+        primary.raw = self.raw
+
+        endpoints = [primary]
+        for base_url, api_key in self.config.endpoints:
+            endpoint = Endpoint(base_url, api_key or self.config.api_key)
+            http_client = (
+                self._create_http_client(endpoint.base_url)
+                if self._shares_http_client() else None
+            )
+            endpoint.client = self._create_openai_client(endpoint.base_url, endpoint.api_key, http_client)
+            endpoint.file_manager = self._create_file_manager(endpoint.base_url, endpoint.api_key, http_client)
+            endpoint.raw = self._create_raw_client(endpoint.base_url, endpoint.api_key, http_client)
+            endpoints.append(endpoint)
+
+        pool = EndpointPool(endpoints)
+        # 使用开销最低的模型列表接口探测被摘除的端点
+        pool.start_health_checks(lambda endpoint: endpoint.client.models.list())
+        return pool
+
+    def _warmup_pings(self) -> List[Callable[[], Any]]:
+        """
+        获取每个连接池的探测函数，共享同一个httpx客户端的SDK、文件管理器和轻量客户端只探测一次
+
+        Returns:
+            探测函数列表
+        """
+        endpoints = self.pool.endpoints if self.pool is not None else [None]
+        pings: List[Callable[[], Any]] = []
+        for endpoint in endpoints:
+            client = endpoint.client if endpoint is not None else self.client
+            file_manager = endpoint.file_manager if endpoint is not None else self.file_manager
+            raw = endpoint.raw if endpoint is not None else self.raw
+            pings.append(client.models.list)
+            if file_manager.http_client is None:
+                pings.append(file_manager.ping)
+            if raw.http_client is not file_manager.http_client:
+                pings.append(raw.ping)
+        return pings
+
+    def warmup(
+        self,
+        connections: Optional[int] = None,
+        keepalive_interval: Optional[float] = None,
+        dns_ttl: Optional[float] = 300.0,
+    ) -> Dict[str, Any]:
+        """
+        在流量到来之前预热连接池
+
+        对每个端点的每个连接池并发发送connections个模型列表请求，提前完成DNS解析、TCP和TLS握手；
+        设置了keepalive_interval时在后台定期重复探测，使预热的连接不会因空闲超时被关闭。
+        探测间隔应小于连接池的空闲超时（keepalive_expiry，httpx默认为5秒）。
+
+        Args:
+            connections: 每个连接池建立的连接数，默认使用配置中的warmup_connections
+            keepalive_interval: 后台探测的间隔（秒），默认使用配置中的keepalive_interval，None表示不探测
+            dns_ttl: API主机DNS解析结果的缓存时间（秒），None表示不缓存；缓存替换了进程范围的
+                socket.getaddrinfo，调用close时恢复
+
+        Returns:
+            预热结果，包括成功的请求数、连接池数、错误信息和耗时
+
+        Raises:
+            Exception: 所有探测请求都失败时抛出第一个错误，例如密钥无效或端点不可达
+        """
+        connections = connections or self.config.warmup_connections
+        if keepalive_interval is None:
+            keepalive_interval = self.config.keepalive_interval
+        started = time.monotonic()
+
+        if dns_ttl is not None:
+            dns_cache.ttl = dns_ttl
+            self._installed_dns_cache = dns_cache.install() or self._installed_dns_cache
+            base_urls = [self.config.base_url] + [base_url for base_url, _ in self.config.endpoints]
+            for base_url in base_urls:
+                url = httpx.URL(base_url)
+                if url.host:
+                    try:
+                        dns_cache.resolve(url.host, url.port or (443 if url.scheme == "https" else 80))
+                    except OSError:
+                        # 解析失败由探测请求报告
+                        pass
+
+        pings = self._warmup_pings()
+        with ThreadPoolExecutor(max_workers=len(pings)) as executor:
+            results = list(executor.map(lambda ping: open_connections(ping, connections), pings))
+        opened = sum(count for count, _ in results)
+        errors = [error for _, pool_errors in results for error in pool_errors]
+        if opened == 0 and errors:
+            raise errors[0]
+
+        self.stop_keepalive()
+        if keepalive_interval:
+            self._keepalive = KeepAlive(pings, connections, keepalive_interval)
+            self._keepalive.start()
+
+        return {
+            "requests": opened,
+            "pools": len(pings),
+            "errors": [f"{type(error).__name__}: {error}" for error in errors],
+            "elapsed": time.monotonic() - started,
+        }
+
+    async def awarmup(
+        self,
+        connections: Optional[int] = None,
+        keepalive_interval: Optional[float] = None,
+        dns_ttl: Optional[float] = 300.0,
+    ) -> Dict[str, Any]:
+        """
+        在asyncio中预热连接池，参数与warmup相同
+
+        客户端只有同步的连接池，异步接口也通过线程池使用这些连接，因此这里在默认执行器中
+        运行同步的warmup，不会阻塞事件循环；没有单独的异步连接池需要预热。
+
+        Returns:
+            预热结果
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.warmup, connections, keepalive_interval, dns_ttl)
         )
 
+    def stop_keepalive(self) -> None:
+        """停止warmup启动的后台保活任务"""
+        if self._keepalive is not None:
+            self._keepalive.stop()
+            self._keepalive = None
+
+    def close(self) -> None:
+        """
+        释放客户端占用的资源
+
+        写入用量账本中剩余的记录，停止保活任务和端点的健康检查，恢复warmup替换的DNS解析，
+        关闭工具线程池和所有HTTP连接。关闭后不能再发送请求，重复调用没有影响。
+        """
+        self.stop_keepalive()
+        if self._installed_dns_cache:
+            # DNS缓存在进程范围内生效，由安装它的客户端恢复
+            dns_cache.uninstall()
+            self._installed_dns_cache = False
+        if self.ledger is not None:
+            if self._owns_ledger:
+                self.ledger.close()
+            else:
+                self.ledger.flush()
+        self.tools.close()
+        if self.pool is not None:
+            self.pool.stop_health_checks()
+            endpoints = [(endpoint.client, endpoint.file_manager, endpoint.raw) for endpoint in self.pool.endpoints]
+        else:
+            endpoints = [(self.client, self.file_manager, self.raw)]
+        # 共享的httpx客户端可以重复关闭
+        for client, file_manager, raw in endpoints:
+            client.close()
+            raw.close()
+            if file_manager.session is not None:
+                file_manager.session.close()
+
+    def __enter__(self) -> "DeepSeekClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
     def enable_deep_thinking(self) -> None:
         """启用深度思考功能"""
         self.deep_thinking.enable()
@@ -103,7 +658,7 @@ class DeepSeekClient:
         Args:
             message: 用户消息
             system_message: 系统消息，用于设置对话的上下文和指导模型行为
-            file_ids: 文件ID列表，用于引用上传的文件
+            file_ids: 文件ID列表，引用已建立本地索引的文件，只注入与问题相关的内容
             temperature: 温度参数，控制回答的随机性
             max_tokens: 生成的最大token数
             stream: 是否使用流式响应
@@ -112,160 +667,1566 @@ class DeepSeekClient:
         Returns:
             DeepSeek的回答
         """
-        # 如果提供了系统消息，更新对话中的系统消息
-        if system_message:
-            self.conversation.add_system_message(system_message)
-            
-        # 添加用户消息到对话
-        self.conversation.add_user_message(message)
-        
-        # 准备API调用参数
-        params = {
-            "model": self.config.model,
-            "temperature": temperature,
-            **kwargs
-        }
-        
-        # 如果指定了max_tokens，添加到参数中
-        if max_tokens:
-            params["max_tokens"] = max_tokens
-            
-        # 如果提供了文件ID，添加到参数中
-        if file_ids:
-            params["file_ids"] = file_ids
-            
-        # 获取消息列表
-        messages = self.conversation.get_messages()
-        
-        # 应用深度思考功能
-        messages = self.deep_thinking.apply_to_messages(messages)
-        params = self.deep_thinking.apply_to_params(params)
-        
-        # 应用联网搜索功能
-        messages = self.web_search.apply_to_messages(messages)
-        params = self.web_search.apply_to_params(params)
-        
+        cache_scope = self._semantic_cache_scope(system_message, file_ids, max_tokens, kwargs)
+        if cache_scope is not None:
+            cached = self.semantic_cache.lookup(message, cache_scope)
+            if cached is not None:
+                if system_message:
+                    self.conversation.add_system_message(system_message)
+                self.conversation.add_user_message(message)
+                self._record_result(ChatResult(cached, finish_reason="stop"))
+                return cached
+
+        messages, params = self._prepare_request(
+            message, system_message, file_ids, temperature, max_tokens, kwargs
+        )
+
         # 调用API
         if stream:
             # 流式响应处理
-            response_text = self._handle_streaming_response(messages, params)
+            result = self._handle_streaming_response(messages, params)
         else:
             # 普通响应处理
-            response_text = self._handle_normal_response(messages, params)
-            
-        # 添加助手回答到对话
-        self.conversation.add_assistant_message(response_text)
-        
-        return response_text
+            result = self._dispatch(messages, params)
 
-    def _handle_normal_response(self, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        self._record_result(result)
+
+        # 只缓存完整的回答，因长度限制被截断的回答不复用
+        if cache_scope is not None and result.finish_reason in (None, "stop"):
+            self.semantic_cache.store(message, cache_scope, result.content)
+
+        return result.content
+
+    def chat_with_tools(
+        self,
+        message: str,
+        system_message: Optional[str] = None,
+        tools: Optional[ToolRegistry] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        max_rounds: int = 8,
+        **kwargs
+    ) -> str:
         """
-        处理普通（非流式）API响应
+        与DeepSeek进行对话，自动执行模型请求的工具调用直到得到最终回答
+
+        模型在一轮中返回的多个工具调用并发执行，工具调用和紧凑的工具结果依次写入对话历史，
+        后续对话可以引用这些结果。达到max_rounds轮工具调用后要求模型不再调用工具、直接回答。
+        last_usage为所有轮次的用量之和。
 
         Args:
-            messages: 消息列表
-            params: API参数
+            message: 用户消息
+            system_message: 系统消息，用于设置对话的上下文和指导模型行为
+            tools: 工具注册表，默认使用client.tools
+            temperature: 温度参数，控制回答的随机性
+            max_tokens: 生成的最大token数
+            max_rounds: 最多执行的工具调用轮数
+            **kwargs: 其他参数
 
         Returns:
-            模型回答的文本
+            DeepSeek的最终回答
         """
+        registry = tools if tools is not None else self.tools
+
+        # 任意一轮失败时恢复原来的对话历史，不留下没有结果的工具调用
+        saved = self.conversation.fork()
         try:
-            response = self.client.chat.completions.create(
-                messages=messages,
-                **params
+            messages, params = self._prepare_request(
+                message, system_message, None, temperature, max_tokens, kwargs
             )
-            return response.choices[0].message.content or ""
-        except Exception as e:
-            error_msg = f"API调用失败: {str(e)}"
-            raise Exception(error_msg)
+            if len(registry):
+                params["tools"] = registry.schemas()
+
+            usages: List[Usage] = []
+            for round_index in range(max_rounds + 1):
+                if round_index == max_rounds and "tools" in params:
+                    params = {**params, "tool_choice": "none"}
+                result = self._dispatch(messages, params)
+                if result.usage is not None:
+                    usages.append(result.usage)
+                if not result.tool_calls or round_index == max_rounds:
+                    break
+                self._append_tool_round(messages, result, registry.execute(result.tool_calls))
+        except BaseException:
+            self.conversation = saved
+            raise
+
+        self._record_result(result, sum(usages[1:], usages[0]) if usages else None)
+        return result.content
 
-    def _handle_streaming_response(self, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    async def achat_with_tools(
+        self,
+        message: str,
+        system_message: Optional[str] = None,
+        tools: Optional[ToolRegistry] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        max_rounds: int = 8,
+        **kwargs
+    ) -> str:
         """
-        处理流式API响应
+        在asyncio中进行工具调用对话
+
+        API调用在默认线程池中执行；协程工具直接在当前事件循环中并发运行，普通工具在工具线程池中运行。
 
         Args:
-            messages: 消息列表
-            params: API参数
+            message: 用户消息
+            system_message: 系统消息，用于设置对话的上下文和指导模型行为
+            tools: 工具注册表，默认使用client.tools
+            temperature: 温度参数，控制回答的随机性
+            max_tokens: 生成的最大token数
+            max_rounds: 最多执行的工具调用轮数
+            **kwargs: 其他参数
 
         Returns:
-            模型回答的文本
+            DeepSeek的最终回答
         """
+        registry = tools if tools is not None else self.tools
+        loop = asyncio.get_running_loop()
+
+        saved = self.conversation.fork()
         try:
-            # 确保启用流式响应
-            params["stream"] = True
-            
-            # 调用流式API
-            response_stream = self.client.chat.completions.create(
-                messages=messages,
-                **params
+            messages, params = self._prepare_request(
+                message, system_message, None, temperature, max_tokens, kwargs
             )
-            
-            # 收集流式响应的内容
-            collected_content = ""
-            for chunk in response_stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    content_chunk = chunk.choices[0].delta.content
-                    collected_content += content_chunk
-                    # 可以在这里添加实时输出，例如：print(content_chunk, end="", flush=True)
-                    
-            return collected_content
-        except Exception as e:
-            error_msg = f"流式API调用失败: {str(e)}"
-            raise Exception(error_msg)
+            if len(registry):
+                params["tools"] = registry.schemas()
 
-    def upload_file(self, file_path: str, purpose: str = "assistants") -> str:
-        """
-        上传文件
+            usages: List[Usage] = []
+            for round_index in range(max_rounds + 1):
+                if round_index == max_rounds and "tools" in params:
+                    params = {**params, "tool_choice": "none"}
+                result = await loop.run_in_executor(
+                    None, contextvars.copy_context().run, self._dispatch, list(messages), params
+                )
+                if result.usage is not None:
+                    usages.append(result.usage)
+                if not result.tool_calls or round_index == max_rounds:
+                    break
+                self._append_tool_round(messages, result, await registry.aexecute(result.tool_calls))
+        except BaseException:
+            self.conversation = saved
+            raise
 
-        Args:
-            file_path: 文件路径
-            purpose: 文件用途
+        self._record_result(result, sum(usages[1:], usages[0]) if usages else None)
+        return result.content
 
-        Returns:
-            文件ID
+    def _append_tool_round(
+        self, messages: List[Dict[str, Any]], result: ChatResult, tool_messages: List[Dict[str, Any]]
+    ) -> None:
         """
-        return self.file_manager.upload_file(file_path, purpose)
+        把一轮工具调用和工具结果追加到对话历史和本次请求的消息列表
 
-    def list_files(self) -> List[Dict[str, Any]]:
+        Args:
+            messages: 本次请求的消息列表
+            result: 包含工具调用的对话结果
+            tool_messages: 工具结果消息
         """
-        列出所有上传的文件
+        assistant = {"role": "assistant", "content": result.content, "tool_calls": result.tool_calls}
+        for tool_message in (assistant, *tool_messages):
+            self.conversation.add_message(tool_message)
+            messages.append(tool_message)
 
-        Returns:
-            文件列表
+    def chat_n(
+        self,
+        message: str,
+        n: int = 3,
+        selector: Optional[Callable[[ChatResult], Union[bool, float]]] = None,
+        system_message: Optional[str] = None,
+        temperature: float = 1.0,
+        max_tokens: Optional[int] = None,
+        use_n_param: bool = False,
+        **kwargs
+    ) -> str:
         """
-        return self.file_manager.list_files()
+        为同一个问题生成多个候选回答，只把选中的回答写入对话历史
 
-    def get_file(self, file_id: str) -> Dict[str, Any]:
-        """
-        获取文件信息
+        默认并发发送n个流式请求，请求经过端点池、并发限制和对冲策略，但不参与请求去重。
+        selector对每个完成的候选返回True时立即采用该候选并取消其余请求；返回False表示拒绝；
+        返回数值时作为得分，全部完成后采用得分最高的候选。没有selector时采用第一个候选，
+        所有候选都被拒绝时采用最先完成的候选。
+
+        所有完成的候选保存在last_candidates中，last_usage为所有候选的用量之和。
 
         Args:
-            file_id: 文件ID
+            message: 用户消息
+            n: 候选数量
+            selector: 评价候选的函数
+            system_message: 系统消息
+            temperature: 温度参数，默认较高以得到不同的候选
+            max_tokens: 生成的最大token数
+            use_n_param: 是否改为使用API的n参数在一次请求中生成所有候选，此时无法提前停止
+            **kwargs: 其他参数
 
         Returns:
-            文件信息
+            选中的回答
         """
-        return self.file_manager.get_file(file_id)
+        if n < 1:
+            raise ValueError("n必须大于0")
 
-    def delete_file(self, file_id: str) -> bool:
+        # 在分支上准备请求，所有候选都失败时恢复原来的对话历史
+        saved = self.conversation.fork()
+        try:
+            messages, params = self._prepare_request(
+                message, system_message, None, temperature, max_tokens, kwargs
+            )
+            if use_n_param:
+                candidates = self._dispatch_choices(messages, {**params, "n": n})
+                chosen = self._select_candidate(candidates, selector)
+            else:
+                candidates, chosen = self._sample_concurrently(messages, params, n, selector)
+        except BaseException:
+            self.conversation = saved
+            raise
+
+        self.last_candidates = candidates
+        usages = [candidate.usage for candidate in candidates if candidate.usage is not None]
+        self._record_result(chosen, sum(usages[1:], usages[0]) if usages else None)
+        return chosen.content
+
+    @staticmethod
+    def _select_candidate(
+        candidates: List[ChatResult], selector: Optional[Callable[[ChatResult], Union[bool, float]]]
+    ) -> ChatResult:
         """
-        删除文件
+        从已完成的候选中选出回答
 
         Args:
-            file_id: 文件ID
+            candidates: 候选列表
+            selector: 评价候选的函数
 
         Returns:
-            是否删除成功
+            选中的候选
         """
-        return self.file_manager.delete_file(file_id)
+        if selector is None:
+            return candidates[0]
 
-    def clear_conversation(self, keep_system_message: bool = True) -> None:
+        best, best_score = None, None
+        for candidate in candidates:
+            score = selector(candidate)
+            if score is True:
+                return candidate
+            if score is False:
+                continue
+            if best_score is None or score > best_score:
+                best, best_score = candidate, score
+        return best or candidates[0]
+
+    def _sample_concurrently(
+        self,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        n: int,
+        selector: Optional[Callable[[ChatResult], Union[bool, float]]],
+    ) -> Tuple[List[ChatResult], ChatResult]:
         """
-        清除对话历史
+        并发发送n个流式请求，selector接受某个候选时取消其余请求
 
         Args:
-            keep_system_message: 是否保留系统消息
-        """
+            messages: 消息列表
+            params: API参数
+            n: 候选数量
+            selector: 评价候选的函数
+
+        Returns:
+            (按完成顺序排列的候选, 选中的候选)
+        """
+        # 每个候选使用独立的取消令牌，带取消令牌的请求不会被请求去重合并
+        tokens = [CancelToken() for _ in range(n)]
+        executor = ThreadPoolExecutor(max_workers=n, thread_name_prefix="deepseek-chat-n")
+        try:
+            # 在调用方的上下文中执行，被取消的候选的用量也记入调用方的租户
+            pending = {
+                executor.submit(
+                    contextvars.copy_context().run, self._handle_streaming_response, messages, params, token
+                )
+                for token in tokens
+            }
+            candidates: List[ChatResult] = []
+            scored: List[Tuple[float, int]] = []
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        candidate = future.result()
+                    except RequestCancelledError:
+                        continue
+                    except Exception as e:
+                        last_error = e
+                        continue
+
+                    candidates.append(candidate)
+                    score = selector(candidate) if selector is not None else None
+                    if score is True:
+                        # 被取消和取消前已经完成的候选的用量由各自的流式请求记录
+                        for token in tokens:
+                            token.cancel()
+                        return candidates, candidate
+                    if score is not None and score is not False:
+                        scored.append((score, len(candidates) - 1))
+        finally:
+            executor.shutdown(wait=False)
+
+        if not candidates:
+            raise last_error
+        if scored:
+            # 得分相同时采用先完成的候选
+            return candidates, candidates[max(scored, key=lambda item: (item[0], -item[1]))[1]]
+        return candidates, candidates[0]
+
+    def _semantic_cache_scope(
+        self,
+        system_message: Optional[str],
+        file_ids: Optional[List[str]],
+        max_tokens: Optional[int],
+        extra_params: Dict[str, Any],
+    ) -> Optional[int]:
+        """
+        判断本次对话能否使用语义缓存，并计算缓存范围
+
+        只有白名单系统提示词下的单轮问答可以使用：已有对话历史、引用文件、启用联网搜索
+        或传入其他API参数时，回答不只取决于问题本身，不使用缓存。
+
+        Args:
+            system_message: 本次传入的系统消息
+            file_ids: 文件ID列表
+            max_tokens: 生成的最大token数
+            extra_params: 其他API参数
+
+        Returns:
+            缓存范围的键，不能使用缓存时返回None
+        """
+        if self.semantic_cache is None or file_ids or extra_params or self.web_search.is_enabled():
+            return None
+
+        current_system = None
+        for history_message in self.conversation.get_messages():
+            if history_message["role"] != "system":
+                return None
+            current_system = history_message["content"]
+        system_prompt = system_message or current_system
+        if not self.semantic_cache.allows(system_prompt):
+            return None
+
+        model = self.deep_thinking.model if self.deep_thinking.is_enabled() else self.config.model
+        return SemanticCache.scope_key(model, system_prompt, max_tokens)
+
+    def complete(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        stream: bool = False,
+        cancel_token: Optional[CancelToken] = None,
+        **kwargs
+    ) -> ChatResult:
+        """
+        根据给定的消息列表进行一次补全，不读取也不修改客户端的对话历史
+
+        适合批量任务、调度器等多个独立请求共享同一个客户端的场景。
+
+        Args:
+            messages: 完整的消息列表
+            temperature: 温度参数，控制回答的随机性
+            max_tokens: 生成的最大token数
+            stream: 是否使用流式响应
+            cancel_token: 取消令牌，仅对流式响应生效
+            **kwargs: 其他参数
+
+        Returns:
+            对话结果
+        """
+        params = {
+            "model": self.config.model,
+            "temperature": temperature,
+            **kwargs
+        }
+        if max_tokens:
+            params["max_tokens"] = max_tokens
+
+        # 复制消息，避免功能模块修改调用方的数据
+        messages, params = self._apply_features([dict(m) for m in messages], params)
+
+        if stream:
+            return self._handle_streaming_response(messages, params, cancel_token)
+        return self._dispatch(messages, params)
+
+    def complete_choices(
+        self,
+        messages: List[Dict[str, Any]],
+        n: int,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        **kwargs
+    ) -> List[ChatResult]:
+        """
+        根据给定的消息列表在一次请求中生成n个候选回答，不读取也不修改客户端的对话历史
+
+        Args:
+            messages: 完整的消息列表
+            n: 候选数量
+            temperature: 温度参数，控制回答的随机性
+            max_tokens: 生成的最大token数
+            **kwargs: 其他参数
+
+        Returns:
+            按index排序的对话结果，所有候选的总用量记录在第一个结果中
+        """
+        if n < 1:
+            raise ValueError("n必须大于0")
+        params = {
+            "model": self.config.model,
+            "temperature": temperature,
+            "n": n,
+            **kwargs
+        }
+        if max_tokens:
+            params["max_tokens"] = max_tokens
+
+        messages, params = self._apply_features([dict(m) for m in messages], params)
+        return self._dispatch_choices(messages, params)
+
+    def complete_passthrough(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        cancel_token: Optional[CancelToken] = None,
+        **kwargs
+    ) -> Generator[bytes, None, ChatResult]:
+        """
+        根据给定的消息列表进行一次流式补全，原样返回SSE事件帧，不读取也不修改客户端的对话历史
+
+        Args:
+            messages: 完整的消息列表
+            temperature: 温度参数，控制回答的随机性
+            max_tokens: 生成的最大token数
+            cancel_token: 取消令牌
+            **kwargs: 其他参数
+
+        Yields:
+            原始SSE事件帧（包含结尾的空行）
+
+        Returns:
+            旁路解析得到的对话结果
+        """
+        params = {
+            "model": self.config.model,
+            "temperature": temperature,
+            **kwargs
+        }
+        if max_tokens:
+            params["max_tokens"] = max_tokens
+
+        messages, params = self._apply_features([dict(m) for m in messages], params)
+
+        try:
+            result = yield from self._dispatch_stream(messages, params, cancel_token, passthrough=True)
+        except DeepSeekError:
+            raise
+        except Exception as e:
+            error_msg = f"流式API调用失败: {str(e)}"
+            raise DeepSeekAPIError(error_msg, status_code=get_status_code(e)) from e
+
+        return result
+
+    async def achat(
+        self,
+        message: str,
+        system_message: Optional[str] = None,
+        file_ids: Optional[List[str]] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        **kwargs
+    ) -> str:
+        """
+        在asyncio中与DeepSeek进行对话
+
+        阻塞的API调用在默认线程池中执行；启用请求去重时，同一事件循环中的相同请求只调用一次上游。
+
+        Args:
+            message: 用户消息
+            system_message: 系统消息，用于设置对话的上下文和指导模型行为
+            file_ids: 文件ID列表，引用已建立本地索引的文件，只注入与问题相关的内容
+            temperature: 温度参数，控制回答的随机性
+            max_tokens: 生成的最大token数
+            **kwargs: 其他参数
+
+        Returns:
+            DeepSeek的回答
+        """
+        messages, params = self._prepare_request(
+            message, system_message, file_ids, temperature, max_tokens, kwargs
+        )
+
+        loop = asyncio.get_running_loop()
+
+        def _call() -> Awaitable[ChatResult]:
+            # 在调用方的上下文中执行，用量记入调用方的租户
+            return loop.run_in_executor(
+                None, contextvars.copy_context().run, self._handle_normal_response, messages, params
+            )
+
+        if self.single_flight is not None:
+            result = await self.single_flight.do_async(self._request_key(messages, params), _call)
+        else:
+            result = await _call()
+
+        self._record_result(result)
+
+        return result.content
+
+    def chat_stream(
+        self,
+        message: str,
+        system_message: Optional[str] = None,
+        file_ids: Optional[List[str]] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        cancel_token: Optional[CancelToken] = None,
+        **kwargs
+    ) -> Iterator[StreamDelta]:
+        """
+        以流式方式与DeepSeek进行对话，逐段返回推理过程和最终回答
+
+        推理内容和回答内容通过StreamDelta.channel区分，只有最终回答会被写入对话历史。
+        可以在其他线程中调用cancel_token.cancel()中止调用，连接会被立即关闭。
+
+        Args:
+            message: 用户消息
+            system_message: 系统消息，用于设置对话的上下文和指导模型行为
+            file_ids: 文件ID列表，引用已建立本地索引的文件，只注入与问题相关的内容
+            temperature: 温度参数，控制回答的随机性
+            max_tokens: 生成的最大token数
+            cancel_token: 取消令牌
+            **kwargs: 其他参数
+
+        Yields:
+            流式增量内容
+        """
+        messages, params = self._prepare_request(
+            message, system_message, file_ids, temperature, max_tokens, kwargs
+        )
+
+        try:
+            result = yield from self._dispatch_stream(messages, params, cancel_token)
+        except DeepSeekError:
+            raise
+        except Exception as e:
+            error_msg = f"流式API调用失败: {str(e)}"
+            raise DeepSeekAPIError(error_msg, status_code=get_status_code(e)) from e
+
+        self._record_result(result)
+
+    def chat_json_stream(
+        self,
+        message: str,
+        system_message: Optional[str] = None,
+        file_ids: Optional[List[str]] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        max_depth: Optional[int] = None,
+        cancel_token: Optional[CancelToken] = None,
+        **kwargs
+    ) -> Generator[JSONEvent, None, Any]:
+        """
+        以JSON输出模式流式对话，边接收边解析，逐个返回已经完成的字段和数组元素
+
+        默认设置response_format为json_object，提示词中需要要求模型输出JSON。输出出现语法错误时立即取消请求
+        并抛出StructuredOutputError，不再为无效的输出消耗token；出错或中途停止迭代时对话历史保持不变。
+
+        Args:
+            message: 用户消息
+            system_message: 系统消息，用于设置对话的上下文和指导模型行为
+            file_ids: 文件ID列表，引用已建立本地索引的文件，只注入与问题相关的内容
+            temperature: 温度参数，控制回答的随机性
+            max_tokens: 生成的最大token数
+            max_depth: 返回事件的最大深度，例如1表示只返回顶层的字段或元素；None表示返回所有深度的值
+            cancel_token: 取消令牌
+            **kwargs: 其他参数
+
+        Yields:
+            解析完成的值，最后一个事件的路径为空元组，值为整个文档
+
+        Returns:
+            解析得到的整个文档
+        """
+        kwargs.setdefault("response_format", {"type": "json_object"})
+        # 输出无效时需要取消上游请求，带取消令牌的请求不参与请求去重，不会影响其他调用方
+        token = cancel_token or CancelToken()
+        parser = IncrementalJSONParser(max_depth)
+
+        saved = self.conversation.fork()
+        result = None
+        try:
+            messages, params = self._prepare_request(
+                message, system_message, file_ids, temperature, max_tokens, kwargs
+            )
+            stream = self._dispatch_stream(messages, params, token)
+            try:
+                while True:
+                    try:
+                        delta = next(stream)
+                    except StopIteration as stop:
+                        result = stop.value
+                        break
+                    if not delta.is_reasoning:
+                        yield from parser.feed(delta.text)
+                # 因长度限制被截断的输出在这里报告为JSON不完整
+                yield from parser.close()
+            except StructuredOutputError:
+                token.cancel()
+                raise
+            finally:
+                stream.close()
+        except BaseException as e:
+            self.conversation = saved
+            if isinstance(e, Exception) and not isinstance(e, DeepSeekError):
+                error_msg = f"流式API调用失败: {str(e)}"
+                raise DeepSeekAPIError(error_msg, status_code=get_status_code(e)) from e
+            raise
+
+        self._record_result(result)
+        return parser.document
+
+    def chat_passthrough(
+        self,
+        message: str,
+        system_message: Optional[str] = None,
+        file_ids: Optional[List[str]] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        cancel_token: Optional[CancelToken] = None,
+        **kwargs
+    ) -> Iterator[bytes]:
+        """
+        以流式方式对话，原样返回上游的SSE事件帧
+
+        事件帧不经过解码和重新编码，可以直接写入下游连接；对话历史和token用量通过旁路解析照常记录。
+
+        Args:
+            message: 用户消息
+            system_message: 系统消息，用于设置对话的上下文和指导模型行为
+            file_ids: 文件ID列表，引用已建立本地索引的文件，只注入与问题相关的内容
+            temperature: 温度参数，控制回答的随机性
+            max_tokens: 生成的最大token数
+            cancel_token: 取消令牌
+            **kwargs: 其他参数
+
+        Yields:
+            原始SSE事件帧（包含结尾的空行）
+        """
+        messages, params = self._prepare_request(
+            message, system_message, file_ids, temperature, max_tokens, kwargs
+        )
+
+        try:
+            result = yield from self._dispatch_stream(messages, params, cancel_token, passthrough=True)
+        except DeepSeekError:
+            raise
+        except Exception as e:
+            error_msg = f"流式API调用失败: {str(e)}"
+            raise DeepSeekAPIError(error_msg, status_code=get_status_code(e)) from e
+
+        self._record_result(result)
+
+    def _prepare_request(
+        self,
+        message: str,
+        system_message: Optional[str],
+        file_ids: Optional[List[str]],
+        temperature: float,
+        max_tokens: Optional[int],
+        extra_params: Dict[str, Any],
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        更新对话历史并构造本次请求的消息列表和API参数
+
+        Args:
+            message: 用户消息
+            system_message: 系统消息
+            file_ids: 文件ID列表
+            temperature: 温度参数
+            max_tokens: 生成的最大token数
+            extra_params: 其他API参数
+
+        Returns:
+            消息列表和API参数
+        """
+        # 超出硬预算时在修改对话历史之前拒绝
+        if self.ledger is not None:
+            self.ledger.check(self._current_tenant()[0])
+
+        # 先确认引用的文件都已建立索引，避免出错时对话历史中留下没有回答的用户消息
+        for file_id in file_ids or ():
+            self.documents.get(file_id)
+
+        # 如果提供了系统消息，更新对话中的系统消息
+        if system_message:
+            self.conversation.add_system_message(system_message)
+
+        # 添加用户消息到对话
+        self.conversation.add_user_message(message)
+
+        # 准备API调用参数
+        params = {
+            "model": self.config.model,
+            "temperature": temperature,
+            **extra_params
+        }
+
+        # 如果指定了max_tokens，添加到参数中
+        if max_tokens:
+            params["max_tokens"] = max_tokens
+
+        # 获取消息列表
+        messages = self.conversation.get_messages()
+
+        # 对话接口不读取上传的文件，从本地索引中检索与问题相关的内容插入到本轮问题之前
+        if file_ids:
+            messages = self.documents.apply_to_messages(messages, file_ids, message)
+
+        return self._apply_features(messages, params)
+
+    def _apply_features(
+        self, messages: List[Dict[str, Any]], params: Dict[str, Any]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        将已启用的功能模块应用到消息列表和API参数
+
+        Args:
+            messages: 消息列表
+            params: API参数
+
+        Returns:
+            应用功能模块后的消息列表和API参数
+        """
+        # 应用深度思考功能
+        messages = self.deep_thinking.apply_to_messages(messages)
+        params = self.deep_thinking.apply_to_params(params)
+
+        # 应用联网搜索功能
+        messages = self.web_search.apply_to_messages(messages)
+        params = self.web_search.apply_to_params(params)
+
+        # 超出软预算时降级请求，超出硬预算时拒绝
+        if self.ledger is not None:
+            params = self.ledger.apply_budget(self._current_tenant()[0], params)
+
+        return messages, params
+
+    def _record_result(self, result: ChatResult, usage: Optional[Usage] = None) -> None:
+        """
+        记录一次对话调用的结果
+
+        推理内容只保存在last_reasoning中，不写入对话历史。
+
+        Args:
+            result: 对话结果
+            usage: 本次调用的总用量，一次调用包含多个请求时传入，默认为result.usage
+        """
+        # 用量在发出上游请求的地方记入用量账本，这里只更新last_usage
+        self.last_usage = usage if usage is not None else result.usage
+        self.last_reasoning = result.reasoning_content
+
+        # 添加助手回答到对话
+        self.conversation.add_assistant_message(result.content)
+
+    def _current_tenant(self) -> Tuple[str, Optional[str]]:
+        """
+        获取当前调用所属的租户和会话
+
+        Returns:
+            (租户, 会话)，没有通过usage_scope设置租户时使用客户端的默认租户
+        """
+        tenant, session = current_scope()
+        return tenant or self.config.tenant, session
+
+    def _record_usage(
+        self, usage: Optional[Usage], model: Optional[str], scope: Optional[Tuple[str, Optional[str]]] = None
+    ) -> None:
+        """
+        把一次调用的用量记入用量账本
+
+        Args:
+            usage: token用量，为None时（例如命中语义缓存）不记录
+            model: 实际使用的模型
+            scope: 用量所属的(租户, 会话)，默认为当前调用的租户
+        """
+        if self.ledger is not None and usage is not None:
+            tenant, session = scope or self._current_tenant()
+            self.ledger.record(usage, model, tenant, session)
+
+    def _record_partial_usage(
+        self,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        accumulator: StreamAccumulator,
+        scope: Tuple[str, Optional[str]],
+    ) -> None:
+        """
+        记录中途停止的流式请求的用量，例如被取消、超时、被放弃的对冲请求或下游断开的连接
+
+        上游只在最后一个数据块中返回用量，没有收到时按请求的消息和已收到的内容估算。
+
+        Args:
+            messages: 消息列表
+            params: API参数
+            accumulator: 已收到内容的累积器
+            scope: 用量所属的(租户, 会话)
+        """
+        if self.ledger is None:
+            return
+        usage = accumulator.usage
+        if usage is None:
+            prompt_tokens = self.token_counter.count_messages(messages)
+            reasoning_tokens = self.token_counter.count("".join(accumulator.reasoning_parts))
+            completion_tokens = reasoning_tokens + self.token_counter.count("".join(accumulator.content_parts))
+            usage = Usage(
+                prompt_tokens, completion_tokens, prompt_tokens + completion_tokens, reasoning_tokens
+            )
+        self._record_usage(usage, accumulator.model or params.get("model"), scope)
+
+    def _request_key(
+        self, messages: List[Dict[str, Any]], params: Dict[str, Any], passthrough: bool = False
+    ) -> str:
+        """
+        计算请求去重键
+
+        Args:
+            messages: 消息列表
+            params: API参数
+            passthrough: 是否为SSE透传请求，透传请求只与透传请求合并
+
+        Returns:
+            请求去重键，只有API密钥和租户都相同的请求才会合并
+        """
+        # 默认合并器在进程内共享，不同密钥或租户的请求不能共享结果，也不能只由其中一方计费
+        credential = hashlib.sha256((self.config.api_key or "").encode("utf-8")).hexdigest()
+        tenant = self._current_tenant()[0] or ""
+        scope = f"{self.config.base_url}#{credential}#{tenant}"
+        if passthrough:
+            scope += "#sse"
+        return request_key(messages, params, scope=scope)
+
+    def _dispatch(self, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> ChatResult:
+        """
+        发送普通请求，启用请求去重时合并相同的并发请求
+
+        启用对冲请求时改为在内部使用流式请求，以便观察首token延迟并及时取消落后的请求。
+
+        Args:
+            messages: 消息列表
+            params: API参数
+
+        Returns:
+            对话结果
+        """
+        if self.hedge_policy is not None:
+            return self._handle_streaming_response(messages, params)
+
+        if self.single_flight is None:
+            return self._handle_normal_response(messages, params)
+
+        return self.single_flight.do(
+            self._request_key(messages, params),
+            lambda: self._handle_normal_response(messages, params)
+        )
+
+    def _dispatch_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        cancel_token: Optional[CancelToken] = None,
+        passthrough: bool = False,
+    ) -> Generator[Union[StreamDelta, bytes], None, ChatResult]:
+        """
+        发送流式请求，启用请求去重时相同的并发请求共享同一个上游流
+
+        带取消令牌的请求不参与合并，以免取消一个调用方影响其他调用方。
+
+        Args:
+            messages: 消息列表
+            params: API参数
+            cancel_token: 取消令牌
+            passthrough: 是否原样返回SSE事件帧
+
+        Yields:
+            流式增量内容；透传模式下为原始SSE事件帧
+
+        Returns:
+            对话结果
+        """
+        if self.single_flight is None or cancel_token is not None:
+            return (yield from self._upstream_stream(messages, params, cancel_token, passthrough))
+
+        return (yield from self.single_flight.stream(
+            self._request_key(messages, params, passthrough),
+            lambda: self._upstream_stream(messages, params, passthrough=passthrough)
+        ))
+
+    def _upstream_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        cancel_token: Optional[CancelToken] = None,
+        passthrough: bool = False,
+    ) -> Generator[Union[StreamDelta, bytes], None, ChatResult]:
+        """
+        向上游发起流式请求，启用对冲请求时由对冲策略决定是否发出第二个请求
+
+        Args:
+            messages: 消息列表
+            params: API参数
+            cancel_token: 取消令牌
+            passthrough: 是否原样返回SSE事件帧
+
+        Returns:
+            流式请求的生成器
+        """
+        # 对冲请求在其他线程中读取，先取得调用方的租户，被放弃的请求也记入调用方的用量
+        scope = self._current_tenant()
+        if self.hedge_policy is None:
+            return self._iter_stream(messages, params, cancel_token, passthrough, scope)
+
+        return hedged_stream(
+            lambda token: self._iter_stream(messages, params, token, passthrough, scope),
+            self.hedge_policy,
+            cancel_token
+        )
+
+    def _handle_normal_response(self, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> ChatResult:
+        """
+        处理普通（非流式）API响应
+
+        上游调用完成后立即把用量记入用量账本。启用请求去重时只有实际发起调用的一方执行这里，
+        共享结果的其他调用方不会重复记录。
+
+        Args:
+            messages: 消息列表
+            params: API参数
+
+        Returns:
+            对话结果
+        """
+        try:
+            # 读取超时不超过总截止时间，调用方传入的timeout参数优先
+            deadline = Deadline(self.config.timeouts.total)
+            params = {"timeout": self.config.timeouts.to_httpx(deadline=deadline), **params}
+            with self._limiter_slot(deadline):
+                result = self._create_completion(deadline, messages=messages, **params)
+        except DeepSeekError:
+            raise
+        except Exception as e:
+            if deadline.expired():
+                raise DeadlineExceededError("请求超过了总截止时间") from e
+            error_msg = f"API调用失败: {str(e)}"
+            raise DeepSeekAPIError(error_msg, status_code=get_status_code(e)) from e
+
+        self._record_usage(result.usage, result.model)
+        return result
+
+    def _handle_streaming_response(
+        self,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        cancel_token: Optional[CancelToken] = None,
+    ) -> ChatResult:
+        """
+        处理流式API响应
+
+        Args:
+            messages: 消息列表
+            params: API参数
+            cancel_token: 取消令牌
+
+        Returns:
+            对话结果
+        """
+        try:
+            stream = self._dispatch_stream(messages, params, cancel_token)
+            while True:
+                try:
+                    next(stream)
+                    # 可以在这里添加实时输出，例如：print(delta.text, end="", flush=True)
+                except StopIteration as stop:
+                    return stop.value
+        except DeepSeekError:
+            raise
+        except Exception as e:
+            error_msg = f"流式API调用失败: {str(e)}"
+            raise DeepSeekAPIError(error_msg, status_code=get_status_code(e)) from e
+
+    def _iter_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        cancel_token: Optional[CancelToken] = None,
+        passthrough: bool = False,
+        scope: Optional[Tuple[str, Optional[str]]] = None,
+    ) -> Generator[Union[StreamDelta, bytes], None, ChatResult]:
+        """
+        调用流式API并按通道逐段返回增量内容
+
+        数据块之间的等待受stream_idle_timeout限制，整个调用受total_timeout限制；
+        提前退出、超时或取消时都会立即关闭连接。上游对中途停止的请求照常计费，
+        无论是否完成，请求的用量都在这里记入用量账本。
+
+        Args:
+            messages: 消息列表
+            params: API参数
+            cancel_token: 取消令牌
+            passthrough: 是否原样返回SSE事件帧
+            scope: 用量所属的(租户, 会话)，默认为当前调用的租户
+
+        Yields:
+            流式增量内容；透传模式下为原始SSE事件帧
+
+        Returns:
+            完整的对话结果
+        """
+        # 确保启用流式响应，并在最后一个数据块中返回用量
+        params = {**params, "stream": True}
+        params.setdefault("stream_options", {"include_usage": True})
+
+        deadline = Deadline(self.config.timeouts.total)
+        params.setdefault("timeout", self.config.timeouts.to_httpx(stream=True, deadline=deadline))
+
+        if cancel_token is not None:
+            cancel_token.check()
+        scope = scope or self._current_tenant()
+
+        # 启用并发限制时，整个流式读取过程都占用一个槽位，并以首个数据块的到达时间作为延迟
+        with self._limiter_slot(deadline) as slot:
+            # 调用流式API，使用端点池时读取完毕前一直占用所选端点
+            use_raw = passthrough or self.config.raw_mode
+            try:
+                response_stream, lease = self._open_stream(use_raw, deadline, messages=messages, **params)
+            except Exception as e:
+                if deadline.expired() and not isinstance(e, DeepSeekError):
+                    raise DeadlineExceededError("请求超过了总截止时间") from e
+                raise
+            if cancel_token is not None:
+                cancel_token.add_callback(response_stream.close)
+            # 读取超时只在发送请求时计算一次，数据块持续到达时不会触发；到达截止时间时直接关闭连接，
+            # 使等待中的读取立即结束
+            remaining = deadline.remaining()
+            timer = threading.Timer(remaining, response_stream.close) if remaining is not None else None
+            if timer is not None:
+                timer.daemon = True
+                timer.start()
+            error = None
+            accumulator = StreamAccumulator()
+            completed = False
+            try:
+                if passthrough:
+                    collect = self._collect_passthrough
+                elif use_raw:
+                    collect = self._collect_raw_stream
+                else:
+                    collect = self._collect_stream
+                result = yield from collect(response_stream, slot, deadline, cancel_token, accumulator)
+                completed = True
+            except Exception as e:
+                error = e
+                # 取消或到达截止时间时连接被关闭会导致读取异常，统一转换为取消或超时异常，
+                # 本地关闭连接导致的错误不会使端点被摘除
+                if cancel_token is not None and cancel_token.cancelled:
+                    error = RequestCancelledError("请求已取消")
+                    raise error from e
+                if deadline.expired() and not isinstance(e, DeadlineExceededError):
+                    error = DeadlineExceededError("请求超过了总截止时间")
+                    raise error from e
+                raise
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                if completed:
+                    self._record_usage(result.usage, result.model, scope)
+                else:
+                    self._record_partial_usage(messages, params, accumulator, scope)
+                if cancel_token is not None:
+                    cancel_token.remove_callback(response_stream.close)
+                response_stream.close()
+                if lease is not None:
+                    lease.release(error)
+        return result
+
+    def _dispatch_choices(self, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> List[ChatResult]:
+        """
+        发送一个非流式请求，返回所有候选回答（用于n > 1的请求）
+
+        Args:
+            messages: 消息列表
+            params: API参数
+
+        Returns:
+            对话结果列表
+        """
+        try:
+            deadline = Deadline(self.config.timeouts.total)
+            params = {"timeout": self.config.timeouts.to_httpx(deadline=deadline), **params}
+            with self._limiter_slot(deadline):
+                results = self._create_choices(deadline, messages=messages, **params)
+        except DeepSeekError:
+            raise
+        except Exception as e:
+            if deadline.expired():
+                raise DeadlineExceededError("请求超过了总截止时间") from e
+            error_msg = f"API调用失败: {str(e)}"
+            raise DeepSeekAPIError(error_msg, status_code=get_status_code(e)) from e
+
+        # 所有候选的总用量记录在第一个结果中
+        self._record_usage(results[0].usage, results[0].model)
+        return results
+
+    def _create_choices(self, deadline: Optional[Deadline] = None, **kwargs) -> List[ChatResult]:
+        """
+        调用对话补全接口并返回所有候选，使用端点池时在端点故障时自动切换
+
+        Args:
+            deadline: 总截止时间
+            **kwargs: 传递给SDK的参数
+
+        Returns:
+            对话结果列表
+        """
+        if self.pool is None:
+            return self._choices_on(self.client, self.raw, kwargs, deadline)
+        return self.pool.call(lambda endpoint: self._choices_on(endpoint.client, endpoint.raw, kwargs, deadline))
+
+    def _create_completion(self, deadline: Optional[Deadline] = None, **kwargs) -> ChatResult:
+        """
+        调用对话补全接口，使用端点池时在端点故障时自动切换
+
+        Args:
+            deadline: 总截止时间
+            **kwargs: 传递给SDK的参数
+
+        Returns:
+            对话结果
+        """
+        if self.pool is None:
+            return self._complete_on(self.client, self.raw, kwargs, deadline)
+        return self.pool.call(lambda endpoint: self._complete_on(endpoint.client, endpoint.raw, kwargs, deadline))
+
+    def _complete_on(
+        self, client: OpenAI, raw: RawChatClient, kwargs: Dict[str, Any], deadline: Optional[Deadline] = None
+    ) -> ChatResult:
+        """
+        在指定端点上发送非流式请求
+
+        Args:
+            client: 端点的OpenAI客户端
+            raw: 端点的轻量客户端，原始响应模式下使用
+            kwargs: 请求参数
+            deadline: 总截止时间
+
+        Returns:
+            对话结果
+        """
+        if self.config.raw_mode:
+            return self._call_with_retries(raw.create, kwargs, deadline)
+        return self._choices_on(client, raw, kwargs, deadline)[0]
+
+    def _choices_on(
+        self, client: OpenAI, raw: RawChatClient, kwargs: Dict[str, Any], deadline: Optional[Deadline] = None
+    ) -> List[ChatResult]:
+        """
+        在指定端点上发送非流式请求，返回所有候选
+
+        token用量是所有候选的总量，只记录在第一个结果中。
+
+        Args:
+            client: 端点的OpenAI客户端
+            raw: 端点的轻量客户端，原始响应模式下使用
+            kwargs: 请求参数
+            deadline: 总截止时间
+
+        Returns:
+            按index排序的对话结果
+        """
+        if self.config.raw_mode:
+            return self._call_with_retries(raw.create_choices, kwargs, deadline)
+
+        response = self._call_sdk(client.chat.completions.create, kwargs, deadline)
+        usage = Usage.from_api(response.usage)
+        return [
+            ChatResult(
+                content=choice.message.content or "",
+                reasoning_content=getattr(choice.message, "reasoning_content", None),
+                usage=usage if i == 0 else None,
+                finish_reason=choice.finish_reason,
+                model=response.model,
+                tool_calls=tool_calls_from_api(choice.message.tool_calls),
+            )
+            for i, choice in enumerate(sorted(response.choices, key=lambda choice: choice.index))
+        ]
+
+    def _open_stream(
+        self, use_raw: bool, deadline: Optional[Deadline] = None, **kwargs
+    ) -> Tuple[Any, Optional[Lease]]:
+        """
+        建立流式对话连接，使用端点池时在建立连接阶段失败会自动切换端点
+
+        Args:
+            use_raw: 是否绕过SDK直接发送请求
+            deadline: 总截止时间
+            **kwargs: 传递给SDK的参数
+
+        Returns:
+            (流式响应, 端点占用)，未使用端点池时占用为None；
+            绕过SDK时流式响应为尚未读取的httpx响应
+        """
+        def _open(client: OpenAI, raw: RawChatClient) -> Any:
+            if use_raw:
+                return self._call_with_retries(raw.open_stream, kwargs, deadline)
+            return self._call_sdk(client.chat.completions.create, kwargs, deadline)
+
+        if self.pool is None:
+            return _open(self.client, self.raw), None
+        return self.pool.call(lambda endpoint: _open(endpoint.client, endpoint.raw), hold=True)
+
+    def _limiter_slot(self, deadline: Deadline) -> Any:
+        """
+        启用并发限制时占用一个对话槽位，排队等待的时间计入总截止时间
+
+        Args:
+            deadline: 总截止时间
+
+        Returns:
+            上下文管理器，未启用并发限制时不做任何事
+        """
+        if self.limiter is None:
+            return nullcontext()
+        return self.limiter.slot("chat", deadline=deadline)
+
+    def _call_sdk(self, create: Callable[..., Any], kwargs: Dict[str, Any], deadline: Optional[Deadline]) -> Any:
+        """
+        调用SDK，设置了总截止时间时在这里按剩余时间重试
+
+        SDK的每次重试都使用完整的timeout，自动重试时实际耗时可能达到timeout的数倍。设置total_timeout时
+        客户端创建的SDK不自动重试，改为由_call_with_retries在剩余时间内重试。
+
+        Args:
+            create: SDK的接口方法
+            kwargs: 请求参数
+            deadline: 总截止时间，为None或不限制时直接调用，由SDK自动重试
+
+        Returns:
+            接口的返回值
+        """
+        if deadline is None or deadline.expires_at is None:
+            return create(**kwargs)
+        return self._call_with_retries(create, kwargs, deadline)
+
+    def _call_with_retries(
+        self, create: Callable[..., Any], kwargs: Dict[str, Any], deadline: Optional[Deadline]
+    ) -> Any:
+        """
+        按与SDK相同的重试策略调用，用于原始响应模式和设置了总截止时间的SDK调用
+
+        连接错误、超时、408、409、429和5xx最多重试max_retries次，优先按服务端的Retry-After等待，
+        否则指数退避。设置了总截止时间时每次尝试的超时不超过剩余时间，剩余时间不足以等待时不再重试。
+
+        Args:
+            create: 发送请求的方法
+            kwargs: 请求参数
+            deadline: 总截止时间
+
+        Returns:
+            方法的返回值
+        """
+        limited = deadline is not None and deadline.expires_at is not None
+        attempt = 0
+        while True:
+            if limited:
+                deadline.check()
+            try:
+                if limited:
+                    return create(**{**kwargs, "timeout": deadline.clamp(kwargs.get("timeout"))})
+                return create(**kwargs)
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if (
+                    attempt >= self.config.max_retries
+                    or not _is_retryable(e)
+                    or (limited and deadline.remaining() <= delay)
+                ):
+                    if limited and deadline.expired():
+                        raise DeadlineExceededError("请求超过了总截止时间") from e
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    def _collect_stream(
+        self,
+        response_stream: Any,
+        slot: Any = None,
+        deadline: Optional[Deadline] = None,
+        cancel_token: Optional[CancelToken] = None,
+        accumulator: Optional[StreamAccumulator] = None,
+    ) -> Generator[StreamDelta, None, ChatResult]:
+        """
+        读取SDK返回的流式响应，按通道逐段返回增量内容
+
+        Args:
+            response_stream: SDK返回的流式响应
+            slot: 并发限制器的槽位，用于记录首个数据块的到达时间
+            deadline: 总截止时间
+            cancel_token: 取消令牌
+            accumulator: 收集已收到内容的累积器，中途停止时调用方据此估算用量
+
+        Yields:
+            流式增量内容
+
+        Returns:
+            完整的对话结果
+        """
+        # 分别收集推理内容和回答内容
+        accumulator = accumulator if accumulator is not None else StreamAccumulator()
+        content_parts = accumulator.content_parts
+        reasoning_parts = accumulator.reasoning_parts
+        tool_calls = accumulator.tool_calls
+        for chunk in response_stream:
+            if slot is not None:
+                slot.mark_first_byte()
+            if cancel_token is not None:
+                cancel_token.check()
+            if deadline is not None:
+                deadline.check()
+            if chunk.usage:
+                accumulator.usage = Usage.from_api(chunk.usage)
+            if not chunk.choices:
+                continue
+
+            choice = chunk.choices[0]
+            reasoning_chunk = getattr(choice.delta, "reasoning_content", None)
+            if reasoning_chunk:
+                reasoning_parts.append(reasoning_chunk)
+                yield StreamDelta(StreamDelta.REASONING, reasoning_chunk)
+            if choice.delta.content:
+                content_parts.append(choice.delta.content)
+                yield StreamDelta(StreamDelta.CONTENT, choice.delta.content)
+            if choice.delta.tool_calls:
+                tool_calls.add(choice.delta.tool_calls)
+            if choice.finish_reason:
+                accumulator.finish_reason = choice.finish_reason
+            accumulator.model = chunk.model
+
+        return accumulator.result()
+
+    def _collect_raw_stream(
+        self,
+        response: httpx.Response,
+        slot: Any = None,
+        deadline: Optional[Deadline] = None,
+        cancel_token: Optional[CancelToken] = None,
+        accumulator: Optional[StreamAccumulator] = None,
+    ) -> Generator[StreamDelta, None, ChatResult]:
+        """
+        使用字节级SSE解析器读取原始流式响应
+
+        读取到响应结束而不是在[DONE]处中断，使HTTP/1.1连接可以放回连接池复用。
+
+        Args:
+            response: 尚未读取的httpx响应
+            slot: 并发限制器的槽位，用于记录首个数据块的到达时间
+            deadline: 总截止时间
+            cancel_token: 取消令牌
+            accumulator: 收集已收到内容的累积器，中途停止时调用方据此估算用量
+
+        Yields:
+            流式增量内容
+
+        Returns:
+            完整的对话结果
+        """
+        accumulator = accumulator if accumulator is not None else StreamAccumulator()
+        for data in iter_sse_data(response.iter_bytes()):
+            if slot is not None:
+                slot.mark_first_byte()
+            if cancel_token is not None:
+                cancel_token.check()
+            if deadline is not None:
+                deadline.check()
+            yield from accumulator.add(data)
+        return accumulator.result()
+
+    def _collect_passthrough(
+        self,
+        response: httpx.Response,
+        slot: Any = None,
+        deadline: Optional[Deadline] = None,
+        cancel_token: Optional[CancelToken] = None,
+        accumulator: Optional[StreamAccumulator] = None,
+    ) -> Generator[bytes, None, ChatResult]:
+        """
+        原样返回SSE事件帧，同时旁路解析出完整的对话结果
+
+        Args:
+            response: 尚未读取的httpx响应
+            slot: 并发限制器的槽位，用于记录首个数据块的到达时间
+            deadline: 总截止时间
+            cancel_token: 取消令牌
+            accumulator: 收集已收到内容的累积器，中途停止时调用方据此估算用量
+
+        Yields:
+            原始SSE事件帧
+
+        Returns:
+            完整的对话结果
+        """
+        accumulator = accumulator if accumulator is not None else StreamAccumulator()
+        for frame in iter_sse_frames(response.iter_bytes()):
+            if slot is not None:
+                slot.mark_first_byte()
+            if cancel_token is not None:
+                cancel_token.check()
+            if deadline is not None:
+                deadline.check()
+            data = frame_data(frame)
+            if data is not None:
+                accumulator.add(data)
+            yield frame
+        return accumulator.result()
+
+    def upload_file(self, file_path: str, purpose: str = "assistants") -> str:
+        """
+        上传文件，并在本地抽取文本建立索引，供对话时通过file_ids引用
+
+        不支持抽取文本的文件类型只上传，不建立索引。
+
+        Args:
+            file_path: 文件路径
+            purpose: 文件用途
+
+        Returns:
+            文件ID
+        """
+        if self.pool is None:
+            file_id = self.file_manager.upload_file(file_path, purpose)
+        else:
+            file_id, endpoint = self.pool.call(
+                lambda endpoint: (endpoint.file_manager.upload_file(file_path, purpose), endpoint)
+            )
+            # 文件只存在于上传时使用的端点上，记录下来以便后续操作路由到同一端点
+            self._file_endpoints[file_id] = endpoint
+
+        try:
+            self.documents.add_file(file_id, file_path)
+        except DocumentError:
+            pass
+        return file_id
+
+    def index_file(self, file_id: str, file_path: str) -> None:
+        """
+        为已上传的文件建立本地索引，例如在其他进程或机器上上传的文件
+
+        Args:
+            file_id: 文件ID
+            file_path: 文件的本地路径
+        """
+        self.documents.add_file(file_id, file_path)
+
+    def list_files(self) -> List[Dict[str, Any]]:
+        """
+        列出所有上传的文件
+
+        Returns:
+            文件列表
+        """
+        if self.pool is None:
+            return self.file_manager.list_files()
+
+        files = []
+        errors = []
+        for endpoint in self.pool.endpoints:
+            try:
+                endpoint_files = endpoint.file_manager.list_files()
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                errors.append(e)
+                continue
+            for file_info in endpoint_files:
+                if file_info.get("id"):
+                    self._file_endpoints[file_info["id"]] = endpoint
+            files.extend(endpoint_files)
+
+        # 只有所有端点都失败时才报错，部分端点不可用时返回其余端点的文件
+        if errors and len(errors) == len(self.pool.endpoints):
+            raise errors[-1]
+        return files
+
+    def get_file(self, file_id: str) -> Dict[str, Any]:
+        """
+        获取文件信息
+
+        Args:
+            file_id: 文件ID
+
+        Returns:
+            文件信息
+        """
+        return self._call_file_endpoint(file_id, lambda file_manager: file_manager.get_file(file_id))
+
+    def delete_file(self, file_id: str) -> bool:
+        """
+        删除文件
+
+        Args:
+            file_id: 文件ID
+
+        Returns:
+            是否删除成功
+        """
+        deleted = self._call_file_endpoint(file_id, lambda file_manager: file_manager.delete_file(file_id))
+        self._file_endpoints.pop(file_id, None)
+        self.documents.remove_file(file_id)
+        return deleted
+
+    def _call_file_endpoint(self, file_id: str, fn: Callable[[FileManager], Any]) -> Any:
+        """
+        在文件所在的端点上执行文件操作
+
+        文件所在端点未知时依次尝试各个端点，直到找到该文件。
+
+        Args:
+            file_id: 文件ID
+            fn: 接收文件管理器并执行操作的函数
+
+        Returns:
+            操作结果
+        """
+        if self.pool is None:
+            return fn(self.file_manager)
+
+        owner = self._file_endpoints.get(file_id)
+        if owner is not None:
+            return fn(owner.file_manager)
+
+        last_error: Optional[Exception] = None
+        for endpoint in self.pool.endpoints:
+            try:
+                result = fn(endpoint.file_manager)
+            except Exception as e:
+                if get_status_code(e) != 404 and not is_failover_error(e):
+                    raise
+                last_error = e
+                continue
+            self._file_endpoints[file_id] = endpoint
+            return result
+        raise last_error
+
+    def clear_conversation(self, keep_system_message: bool = True) -> None:
+        """
+        清除对话历史
+
+        Args:
+            keep_system_message: 是否保留系统消息
+        """
         self.conversation.clear_messages(keep_system_message)
 
     def get_conversation_messages(self) -> List[Dict[str, str]]:
@@ -275,4 +2236,19 @@ class DeepSeekClient:
         Returns:
             对话消息列表
         """
-        return self.conversation.get_messages() 
\ No newline at end of file
+        return self.conversation.get_messages()
+
+    def count_tokens(self, message: Optional[str] = None) -> int:
+        """
+        计算对话历史作为请求输入的token数
+
+        Args:
+            message: 尚未发送的用户消息，传入时一并计算
+
+        Returns:
+            token数
+        """
+        messages = self.conversation.get_messages()
+        if message is not None:
+            messages = messages + [{"role": "user", "content": message}]
+        return self.token_counter.count_messages(messages)
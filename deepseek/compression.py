@@ -0,0 +1,263 @@
+"""
+DeepSeek 请求压缩
+~~~~~~~~~~~~~~
+
+压缩上传的文件和较大的对话请求体，减少出口带宽占用，需要服务端（或本地代理）支持带
+``Content-Encoding`` 的请求。
+
+按请求体大小和MIME类型选择编码：文本、JSON、CSV等可压缩的类型超过阈值时使用zstd（需要安装
+zstandard）或gzip，图片、压缩包等已经压缩过的内容原样发送。上传的文件边读取边压缩，不会整个
+读入内存。服务端以415拒绝压缩的请求时，改为发送未压缩的请求体，之后不再压缩。
+"""
+
+import threading
+import zlib
+from typing import Dict, Any, Optional, Iterable, Iterator
+
+import httpx
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard是可选依赖
+    zstandard = None
+
+# 服务端不接受请求体编码时返回的状态码
+UNSUPPORTED_MEDIA_TYPE = 415
+
+# 除text/*以外可以压缩的MIME类型
+_COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/jsonl",
+    "application/xml",
+    "application/javascript",
+    "application/x-javascript",
+    "application/yaml",
+    "application/x-yaml",
+    "application/x-sh",
+    "application/sql",
+    "application/rtf",
+    "image/svg+xml",
+}
+
+ENCODINGS = ("zstd", "gzip")
+
+
+def is_compressible(mime_type: Optional[str]) -> bool:
+    """
+    判断MIME类型的内容是否值得压缩
+
+    Args:
+        mime_type: MIME类型，可以包含charset等参数
+
+    Returns:
+        是否可以压缩
+    """
+    if not mime_type:
+        return False
+    mime_type = mime_type.split(";", 1)[0].strip().lower()
+    return (
+        mime_type.startswith("text/")
+        or mime_type in _COMPRESSIBLE_TYPES
+        or mime_type.endswith("+json")
+        or mime_type.endswith("+xml")
+    )
+
+
+def resolve_encoding(encoding: Optional[str]) -> Optional[str]:
+    """
+    解析配置的压缩编码
+
+    Args:
+        encoding: "zstd"、"gzip"或"auto"（安装了zstandard时使用zstd，否则使用gzip），None或空字符串表示不压缩
+
+    Returns:
+        实际使用的编码，不压缩时为None
+
+    Raises:
+        ValueError: 不支持的编码
+        ImportError: 使用zstd但没有安装zstandard
+    """
+    if not encoding:
+        return None
+    encoding = encoding.lower()
+    if encoding == "auto":
+        return "zstd" if zstandard is not None else "gzip"
+    if encoding not in ENCODINGS:
+        raise ValueError(f"不支持的压缩编码: {encoding}，可选值为zstd、gzip或auto")
+    if encoding == "zstd" and zstandard is None:
+        raise ImportError("使用zstd压缩需要安装zstandard: pip install 'deepseek-client[zstd]'")
+    return encoding
+
+
+def choose_encoding(encoding: Optional[str], size: Optional[int], mime_type: Optional[str], min_size: int) -> Optional[str]:
+    """
+    根据大小和MIME类型决定请求体是否压缩
+
+    Args:
+        encoding: 已解析的压缩编码，None表示不压缩
+        size: 请求体的字节数
+        mime_type: 请求体或文件的MIME类型
+        min_size: 压缩的最小字节数
+
+    Returns:
+        使用的编码，不压缩时为None
+    """
+    if encoding is None or size is None or size < min_size or not is_compressible(mime_type):
+        return None
+    return encoding
+
+
+class Compressor:
+    """流式压缩器"""
+
+    def __init__(self, encoding: str):
+        """
+        初始化压缩器
+
+        Args:
+            encoding: "zstd"或"gzip"
+        """
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        else:
+            # wbits=31输出gzip格式，头部不包含时间戳，相同输入的压缩结果相同
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """压缩一段数据，返回已经可以输出的部分"""
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        """结束压缩，返回剩余的数据"""
+        return self._compressor.flush()
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    """
+    压缩完整的数据
+
+    Args:
+        data: 原始数据
+        encoding: "zstd"或"gzip"
+
+    Returns:
+        压缩后的数据
+    """
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress_bytes(data: bytes, encoding: str) -> bytes:
+    """
+    解压完整的数据
+
+    Args:
+        data: 压缩后的数据
+        encoding: "zstd"或"gzip"
+
+    Returns:
+        原始数据
+    """
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ImportError("解压zstd需要安装zstandard: pip install 'deepseek-client[zstd]'")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return zlib.decompress(data, 47)
+
+
+def iter_compressed(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """
+    逐块压缩数据流
+
+    Args:
+        chunks: 原始数据块
+        encoding: "zstd"或"gzip"
+
+    Yields:
+        压缩后的数据块，压缩器尚未输出数据时跳过
+    """
+    compressor = Compressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressingTransport(httpx.BaseTransport):
+    """压缩较大的JSON请求体后交给下层传输层发送"""
+
+    def __init__(self, transport: httpx.BaseTransport, encoding: str, min_size: int = 1024):
+        """
+        初始化压缩传输层
+
+        Args:
+            transport: 实际发送请求的传输层
+            encoding: "zstd"或"gzip"
+            min_size: 压缩的最小字节数
+        """
+        self.transport = transport
+        self.encoding = encoding
+        self.min_size = min_size
+        self.enabled = True
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        content_type = request.headers.get("content-type")
+        if (
+            not self.enabled
+            or request.method != "POST"
+            or "content-encoding" in request.headers
+            or not is_compressible(content_type)
+        ):
+            return self.transport.handle_request(request)
+        # 先判断类型再读取请求体，multipart上传等流式请求体不会被读入内存
+        body = request.read()
+        encoding = choose_encoding(self.encoding, len(body), content_type, self.min_size)
+        if encoding is None:
+            return self.transport.handle_request(request)
+
+        compressed = compress_bytes(body, encoding)
+        if len(compressed) >= len(body):
+            return self.transport.handle_request(request)
+
+        headers = request.headers.copy()
+        headers["Content-Encoding"] = encoding
+        headers["Content-Length"] = str(len(compressed))
+        compressed_request = httpx.Request(
+            request.method, request.url, headers=headers, content=compressed, extensions=request.extensions
+        )
+        response = self.transport.handle_request(compressed_request)
+        if response.status_code == UNSUPPORTED_MEDIA_TYPE:
+            # 服务端不接受压缩的请求体，丢弃这次响应并按原样重新发送
+            response.close()
+            self.enabled = False
+            return self.transport.handle_request(request)
+
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(compressed)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取压缩统计
+
+        Returns:
+            压缩的请求数、压缩前后的字节数以及是否仍在压缩
+        """
+        return {
+            "enabled": self.enabled,
+            "compressed": self.compressed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+    def close(self) -> None:
+        self.transport.close()
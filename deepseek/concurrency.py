@@ -0,0 +1,280 @@
+"""
+DeepSeek 自适应并发控制
+~~~~~~~~~~~~~~~~~~~
+
+根据观察到的延迟和429/503响应，使用AIMD（加性增、乘性减）策略动态调整允许的并发请求数，
+使批量任务自动运行在接近服务端实际容量的并发度上。
+
+只有不随请求内容变化的延迟才能反映拥塞：流式对话的首个数据块延迟、文件元数据请求的响应时间。
+不同操作的延迟相差很大，按操作类型分别统计基线；非流式对话的耗时取决于生成长度，上传的耗时
+取决于文件大小，这些请求只根据429/503调整并发数。
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Callable
+
+from .exceptions import DeadlineExceededError, get_status_code
+from .timeouts import Deadline
+
+# 表示服务端过载的HTTP状态码
+OVERLOAD_STATUS_CODES = (429, 503)
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    判断异常是否表示服务端过载
+
+    Args:
+        error: 异常对象
+
+    Returns:
+        是否为429/503等过载错误
+    """
+    return get_status_code(error) in OVERLOAD_STATUS_CODES
+
+
+class _Slot:
+    """一个已获取的并发槽位"""
+
+    __slots__ = ("started_at", "latency", "overloaded", "kind")
+
+    def __init__(self, kind: str):
+        self.started_at = time.monotonic()
+        self.latency: Optional[float] = None
+        self.overloaded = False
+        self.kind = kind
+
+    def mark_first_byte(self) -> None:
+        """记录首个响应数据到达的时间作为本次请求的延迟，没有记录的请求不参与延迟统计"""
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started_at
+
+
+class _LatencyWindow:
+    """一种操作最近的延迟样本"""
+
+    __slots__ = ("samples", "smoothed")
+
+    def __init__(self, size: int):
+        self.samples = deque(maxlen=size)
+        self.smoothed: Optional[float] = None
+
+    def add(self, latency: float) -> None:
+        self.samples.append(latency)
+        if self.smoothed is None:
+            self.smoothed = latency
+        else:
+            self.smoothed += 0.2 * (latency - self.smoothed)
+
+    def congested(self, tolerance: float) -> bool:
+        """平滑延迟是否超过基线延迟的tolerance倍，样本不足10个时不判断"""
+        return len(self.samples) >= 10 and self.smoothed > min(self.samples) * tolerance
+
+
+class AdaptiveLimiter:
+    """AIMD自适应并发限制器"""
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: Optional[float] = 2.0,
+        window: int = 100,
+    ):
+        """
+        初始化自适应并发限制器
+
+        Args:
+            initial_limit: 初始并发上限
+            min_limit: 并发上限的最小值
+            max_limit: 并发上限的最大值
+            backoff_ratio: 检测到过载时并发上限的缩减比例
+            latency_tolerance: 同一种操作的平滑延迟超过其基线延迟的倍数时视为拥塞，为None时只根据429/503调整
+            window: 每种操作计算基线延迟所使用的最近样本数
+        """
+        if not 0 < backoff_ratio < 1:
+            raise ValueError("backoff_ratio必须在0和1之间")
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._waiting = 0
+        self.window = window
+        self._latencies: Dict[str, _LatencyWindow] = {}
+        self._last_decrease = 0.0
+        self._successes = 0
+        self._overloads = 0
+        self._decreases = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """当前允许的并发请求数"""
+        return int(self._limit)
+
+    def acquire(self, timeout: Optional[float] = None, kind: str = "chat") -> _Slot:
+        """
+        获取一个并发槽位，达到上限时阻塞等待
+
+        Args:
+            timeout: 最长等待时间（秒），为None时一直等待
+            kind: 操作类型，每种操作的延迟分别统计
+
+        Returns:
+            并发槽位，使用完毕后必须调用release释放
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._waiting += 1
+            try:
+                while self._in_flight >= int(self._limit):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("等待并发槽位超时")
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._in_flight += 1
+        return _Slot(kind)
+
+    def release(self, slot: _Slot) -> None:
+        """
+        释放并发槽位，并根据本次调用的结果调整并发上限
+
+        Args:
+            slot: acquire返回的并发槽位
+        """
+        now = time.monotonic()
+        with self._condition:
+            utilized = self._in_flight >= int(self._limit)
+            self._in_flight -= 1
+
+            if slot.overloaded:
+                self._overloads += 1
+                self._decrease(now, fallback=now - slot.started_at)
+            else:
+                self._successes += 1
+                latencies = None
+                if slot.latency is not None:
+                    latencies = self._latencies.get(slot.kind)
+                    if latencies is None:
+                        latencies = self._latencies[slot.kind] = _LatencyWindow(self.window)
+                    latencies.add(slot.latency)
+
+                if (
+                    self.latency_tolerance is not None
+                    and latencies is not None
+                    and latencies.congested(self.latency_tolerance)
+                ):
+                    self._decrease(now, latencies.smoothed)
+                elif utilized:
+                    # 只有并发上限被用满时才增加，每个上限周期大约增加1
+                    self._limit = min(self._limit + 1.0 / self._limit, float(self.max_limit))
+
+            self._condition.notify_all()
+
+    def _decrease(self, now: float, cooldown: Optional[float] = None, fallback: float = 0.0) -> None:
+        """
+        乘性缩减并发上限，同一个延迟周期内最多缩减一次
+
+        Args:
+            now: 当前时间
+            cooldown: 两次缩减的最短间隔（秒），默认为各种操作中最长的平滑延迟
+            fallback: 还没有延迟样本时使用的最短间隔（秒）
+        """
+        if cooldown is None:
+            cooldown = max((window.smoothed for window in self._latencies.values()), default=fallback)
+        if now - self._last_decrease < cooldown:
+            return
+        self._limit = max(self._limit * self.backoff_ratio, float(self.min_limit))
+        self._last_decrease = now
+        self._decreases += 1
+
+    def slot(self, kind: str = "chat", deadline: Optional[Deadline] = None) -> "_LimiterContext":
+        """
+        以上下文管理器的方式获取并发槽位
+
+        上下文中抛出429/503异常时会自动视为过载；也可以设置slot.overloaded标记过载。
+        调用slot.mark_first_byte()记录延迟，没有记录延迟的请求只根据429/503调整并发数。
+
+        Args:
+            kind: 操作类型，每种操作的延迟分别统计
+            deadline: 总截止时间，排队等待槽位的时间也计入其中
+
+        Returns:
+            上下文管理器
+
+        Raises:
+            DeadlineExceededError: 到达截止时间时仍未获得槽位
+        """
+        return _LimiterContext(self, kind, deadline)
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在并发限制下调用函数
+
+        调用的耗时包含整个响应的生成时间，不作为延迟样本，只根据429/503调整并发数。
+
+        Args:
+            fn: 要调用的函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            函数返回值
+        """
+        with self.slot():
+            return fn(*args, **kwargs)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        获取并发控制的运行指标
+
+        Returns:
+            包含当前并发上限、进行中请求数、排队数和每种操作的延迟统计的字典
+        """
+        with self._condition:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "latency": {
+                    kind: {"baseline": min(window.samples), "smoothed": window.smoothed}
+                    for kind, window in self._latencies.items()
+                },
+                "successes": self._successes,
+                "overloads": self._overloads,
+                "decreases": self._decreases,
+            }
+
+
+class _LimiterContext:
+    """AdaptiveLimiter.slot返回的上下文管理器"""
+
+    def __init__(self, limiter: AdaptiveLimiter, kind: str, deadline: Optional[Deadline] = None):
+        self.limiter = limiter
+        self.kind = kind
+        self.deadline = deadline
+        self.slot: Optional[_Slot] = None
+
+    def __enter__(self) -> _Slot:
+        timeout = self.deadline.remaining() if self.deadline is not None else None
+        try:
+            self.slot = self.limiter.acquire(timeout=timeout, kind=self.kind)
+        except TimeoutError as e:
+            raise DeadlineExceededError("等待并发槽位时超过了总截止时间") from e
+        return self.slot
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        if exc_value is not None and is_overload_error(exc_value):
+            self.slot.overloaded = True
+        self.limiter.release(self.slot)
+        return False
@@ -6,9 +6,14 @@ DeepSeek 配置管理
 """
 
 import os
-from typing import Optional
+from typing import Optional, List, Tuple, Union, Dict
 from dotenv import load_dotenv
 
+from .timeouts import Timeouts
+
+# 对话请求默认的读取超时（秒），与OpenAI SDK的默认值相同
+CHAT_READ_TIMEOUT = 600.0
+
 # 尝试加载.env文件中的环境变量
 load_dotenv()
 
@@ -24,6 +29,29 @@ class DeepSeekConfig:
         timeout: Optional[int] = None,
         deep_thinking: Optional[bool] = None,
         web_search: Optional[bool] = None,
+        reasoning_model: Optional[str] = None,
+        single_flight: Optional[bool] = None,
+        adaptive_concurrency: Optional[bool] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        stream_idle_timeout: Optional[float] = None,
+        total_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        endpoints: Optional[List[Union[Tuple[str, str], Dict[str, str]]]] = None,
+        hedging: Optional[bool] = None,
+        http2: Optional[bool] = None,
+        raw_mode: Optional[bool] = None,
+        web_search_url: Optional[str] = None,
+        documents_dir: Optional[str] = None,
+        semantic_cache: Optional[bool] = None,
+        semantic_cache_threshold: Optional[float] = None,
+        ledger_path: Optional[str] = None,
+        tenant: Optional[str] = None,
+        warmup_connections: Optional[int] = None,
+        keepalive_interval: Optional[float] = None,
+        keepalive_expiry: Optional[float] = None,
+        compression: Optional[str] = None,
+        compression_min_size: Optional[int] = None,
     ):
         """
         初始化DeepSeek配置
@@ -35,14 +63,52 @@ class DeepSeekConfig:
             timeout: API请求超时时间（秒）
             deep_thinking: 是否启用深度思考
             web_search: 是否启用联网搜索
+            reasoning_model: 深度思考模式下使用的推理模型
+            single_flight: 是否合并相同的并发请求
+            adaptive_concurrency: 是否根据延迟和429/503响应自动调整并发请求数
+            connect_timeout: 建立连接的超时时间（秒）
+            read_timeout: 等待响应数据的超时时间（秒），对话请求默认为600秒，文件请求默认与timeout相同
+            stream_idle_timeout: 流式响应中两个数据块之间的最长间隔（秒），默认与read_timeout相同，未设置read_timeout时与timeout相同
+            total_timeout: 单次调用的总截止时间（秒），默认不限制
+            max_retries: 对话请求遇到连接错误、超时、408、409、429和5xx时的最大重试次数，默认与OpenAI SDK相同为2次
+            endpoints: 额外的(base_url, api_key)端点列表，用于负载均衡和故障切换
+            hedging: 是否对迟迟没有首个token的请求发送对冲请求
+            http2: 是否使用HTTP/2，在少量连接上复用对话和文件请求
+            raw_mode: 是否绕过OpenAI SDK直接解析对话响应，降低每次调用的CPU开销
+            web_search_url: 联网搜索使用的搜索服务地址（兼容SearXNG的JSON接口）
+            documents_dir: 上传文件的本地索引目录
+            semantic_cache: 是否对换了说法的相同问题复用之前的回答
+            semantic_cache_threshold: 语义缓存的余弦相似度阈值
+            ledger_path: 用量账本的sqlite数据库路径，设置后记录每次调用的token用量和费用
+            tenant: 用量账本中调用默认所属的租户
+            warmup_connections: warmup预热时每个连接池建立的连接数
+            keepalive_interval: warmup之后后台探测的间隔（秒），应小于keepalive_expiry；None表示不探测
+            keepalive_expiry: 连接池中空闲连接的保留时间（秒），None表示使用httpx的默认值（5秒）
+            compression: 请求体的压缩编码，"zstd"、"gzip"或"auto"，需要服务端支持Content-Encoding；默认不压缩
+            compression_min_size: 压缩请求体和上传文件的最小字节数
         """
         # 优先使用传入的参数，其次使用环境变量，最后使用默认值
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
+
+        # 额外的端点，格式为"base_url|api_key"，多个端点以逗号分隔，省略密钥时使用主密钥
+        self.endpoints = self._parse_endpoints(endpoints, "DEEPSEEK_ENDPOINTS")
+        if not self.api_key and self.endpoints:
+            self.api_key = self.endpoints[0][1]
+
         if not self.api_key:
             raise ValueError("API密钥未提供。请通过参数传入或在环境变量中设置DEEPSEEK_API_KEY。")
 
         self.base_url = base_url or os.getenv("DEEPSEEK_API_BASE_URL", "https://api.deepseek.com")
         self.model = model or os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+        self.reasoning_model = reasoning_model or os.getenv("DEEPSEEK_REASONING_MODEL", "deepseek-reasoner")
+        self.web_search_url = web_search_url or os.getenv("WEB_SEARCH_URL")
+        self.documents_dir = (
+            documents_dir
+            or os.getenv("DEEPSEEK_DOCUMENTS_DIR")
+            or os.path.join(os.path.expanduser("~"), ".cache", "deepseek", "documents")
+        )
+        self.ledger_path = ledger_path or os.getenv("DEEPSEEK_LEDGER_PATH") or None
+        self.tenant = tenant or os.getenv("DEEPSEEK_TENANT") or "default"
         
         # 转换timeout为整数
         timeout_str = os.getenv("API_TIMEOUT", "30") if timeout is None else str(timeout)
@@ -50,10 +116,49 @@ class DeepSeekConfig:
             self.timeout = int(timeout_str)
         except ValueError:
             self.timeout = 30
-            
+
+        # 分阶段超时，未设置时由timeout推导。推理模型的非流式请求在生成结束前不返回任何数据，
+        # 对话请求的读取超时默认与OpenAI SDK相同，为600秒；文件请求仍使用timeout
+        read = self._parse_float(read_timeout, "API_READ_TIMEOUT", None)
+        connect = self._parse_float(connect_timeout, "API_CONNECT_TIMEOUT", min(float(self.timeout), 10.0))
+        total = self._parse_float(total_timeout, "API_TOTAL_TIMEOUT", None)
+        self.timeouts = Timeouts(
+            connect=connect,
+            read=read if read is not None else CHAT_READ_TIMEOUT,
+            idle=self._parse_float(
+                stream_idle_timeout, "API_STREAM_IDLE_TIMEOUT", read if read is not None else float(self.timeout)
+            ),
+            total=total,
+        )
+        self.file_timeouts = Timeouts(
+            connect=connect,
+            read=read if read is not None else float(self.timeout),
+            total=total,
+        )
+        # SDK路径和原始响应模式使用相同的重试次数
+        self.max_retries = int(self._parse_float(max_retries, "API_MAX_RETRIES", 2))
+
         # 转换布尔值配置
         self.deep_thinking = self._parse_bool(deep_thinking, "DEEP_THINKING_ENABLED", False)
         self.web_search = self._parse_bool(web_search, "WEB_SEARCH_ENABLED", False)
+        self.single_flight = self._parse_bool(single_flight, "SINGLE_FLIGHT_ENABLED", False)
+        self.adaptive_concurrency = self._parse_bool(adaptive_concurrency, "ADAPTIVE_CONCURRENCY_ENABLED", False)
+        self.hedging = self._parse_bool(hedging, "HEDGING_ENABLED", False)
+        self.http2 = self._parse_bool(http2, "HTTP2_ENABLED", False)
+        self.raw_mode = self._parse_bool(raw_mode, "RAW_MODE_ENABLED", False)
+        self.semantic_cache = self._parse_bool(semantic_cache, "SEMANTIC_CACHE_ENABLED", False)
+        self.semantic_cache_threshold = self._parse_float(
+            semantic_cache_threshold, "SEMANTIC_CACHE_THRESHOLD", 0.95
+        )
+
+        # 连接预热和保活
+        self.warmup_connections = int(self._parse_float(warmup_connections, "WARMUP_CONNECTIONS", 4))
+        self.keepalive_interval = self._parse_float(keepalive_interval, "KEEPALIVE_INTERVAL", None)
+        self.keepalive_expiry = self._parse_float(keepalive_expiry, "API_KEEPALIVE_EXPIRY", None)
+
+        # 请求体压缩
+        self.compression = compression or os.getenv("REQUEST_COMPRESSION") or None
+        self.compression_min_size = int(self._parse_float(compression_min_size, "COMPRESSION_MIN_SIZE", 1024))
 
     def _parse_bool(self, value: Optional[bool], env_var: str, default: bool) -> bool:
         """
@@ -76,6 +181,59 @@ class DeepSeekConfig:
             
         return default
 
+    def _parse_endpoints(
+        self, value: Optional[List[Union[Tuple[str, str], Dict[str, str]]]], env_var: str
+    ) -> List[Tuple[str, Optional[str]]]:
+        """
+        解析端点配置，优先使用传入的参数，其次使用环境变量
+
+        Args:
+            value: 传入的端点列表，元素为(base_url, api_key)元组或包含base_url和api_key的字典
+            env_var: 环境变量名
+
+        Returns:
+            (base_url, api_key)列表，未指定密钥的端点api_key为None
+        """
+        if value is not None:
+            return [
+                (item["base_url"], item.get("api_key")) if isinstance(item, dict) else (item[0], item[1])
+                for item in value
+            ]
+
+        env_value = os.getenv(env_var, "")
+        endpoints = []
+        for entry in env_value.split(","):
+            entry = entry.strip()
+            if not entry:
+                continue
+            base_url, _, key = entry.partition("|")
+            endpoints.append((base_url.strip(), key.strip() or None))
+        return endpoints
+
+    def _parse_float(self, value: Optional[float], env_var: str, default: Optional[float]) -> Optional[float]:
+        """
+        解析浮点数配置，优先使用传入的参数，其次使用环境变量，最后使用默认值
+
+        Args:
+            value: 传入的数值
+            env_var: 环境变量名
+            default: 默认值
+
+        Returns:
+            解析后的数值
+        """
+        if value is not None:
+            return float(value)
+
+        env_value = os.getenv(env_var)
+        if env_value:
+            try:
+                return float(env_value)
+            except ValueError:
+                pass
+
+        return default
+
     def to_dict(self) -> dict:
         """
         将配置转换为字典
@@ -87,9 +245,30 @@ class DeepSeekConfig:
             "api_key": self.api_key,
             "base_url": self.base_url,
             "model": self.model,
+            "reasoning_model": self.reasoning_model,
             "timeout": self.timeout,
+            "timeouts": self.timeouts.to_dict(),
+            "file_timeouts": self.file_timeouts.to_dict(),
+            "max_retries": self.max_retries,
+            "endpoints": [base_url for base_url, _ in self.endpoints],
             "deep_thinking": self.deep_thinking,
             "web_search": self.web_search,
+            "single_flight": self.single_flight,
+            "adaptive_concurrency": self.adaptive_concurrency,
+            "hedging": self.hedging,
+            "http2": self.http2,
+            "raw_mode": self.raw_mode,
+            "web_search_url": self.web_search_url,
+            "documents_dir": self.documents_dir,
+            "semantic_cache": self.semantic_cache,
+            "semantic_cache_threshold": self.semantic_cache_threshold,
+            "ledger_path": self.ledger_path,
+            "tenant": self.tenant,
+            "warmup_connections": self.warmup_connections,
+            "keepalive_interval": self.keepalive_interval,
+            "keepalive_expiry": self.keepalive_expiry,
+            "compression": self.compression,
+            "compression_min_size": self.compression_min_size,
         }
 
     def __repr__(self) -> str:
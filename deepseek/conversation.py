@@ -3,9 +3,42 @@ DeepSeek 对话管理
 ~~~~~~~~~~~~~
 
 管理与DeepSeek的对话，包括消息历史记录和上下文处理。
+
+对话历史保存为只追加的消息链，每个节点指向上一条消息。``fork()`` 得到的分支与原对话共享
+已有的消息节点，追加消息只创建一个新节点，消息列表在发送请求时才按需展开，
+因此大量分支占用的内存只与它们各自新增的消息成正比。
 """
 
-from typing import Dict, Any, Optional, List, Union
+from typing import Dict, Any, Optional, List, Iterable
+
+from .tokenizer import TokenCounter, get_token_counter
+
+
+class _MessageNode:
+    """消息链中的一个节点，创建后不再修改，可以被多个分支共享"""
+
+    __slots__ = ("message", "parent", "length")
+
+    def __init__(self, message: Dict[str, Any], parent: Optional["_MessageNode"]):
+        self.message = message
+        self.parent = parent
+        self.length = parent.length + 1 if parent is not None else 1
+
+
+def _build_chain(messages: Iterable[Dict[str, Any]]) -> Optional[_MessageNode]:
+    """
+    由消息列表构造消息链
+
+    Args:
+        messages: 消息列表
+
+    Returns:
+        最后一条消息的节点，消息列表为空时返回None
+    """
+    tail = None
+    for message in messages:
+        tail = _MessageNode(message, tail)
+    return tail
 
 
 class Conversation:
@@ -18,26 +51,88 @@ class Conversation:
         Args:
             system_message: 系统消息，用于设置对话的上下文和指导模型行为
         """
-        self.messages = []
+        # 系统消息单独保存，替换系统消息不影响共享的消息链
+        self._system: Optional[Dict[str, Any]] = None
+        self._tail: Optional[_MessageNode] = None
+        # 最近一次展开的消息列表，对话变化时失效
+        self._materialized: Optional[List[Dict[str, Any]]] = None
         if system_message:
             self.add_system_message(system_message)
 
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """
+        对话的消息列表
+
+        每次访问返回新的列表，修改列表本身不会影响对话；消息字典可能被多个分支共享，不要就地修改。
+        """
+        return list(self._materialize())
+
+    @messages.setter
+    def messages(self, messages: List[Dict[str, Any]]) -> None:
+        messages = list(messages)
+        self._system = None
+        if messages and messages[0].get("role") == "system":
+            self._system = messages.pop(0)
+        self._tail = _build_chain(messages)
+        self._materialized = None
+
+    def _materialize(self) -> List[Dict[str, Any]]:
+        """
+        沿消息链展开消息列表，结果缓存到对话下一次变化
+
+        Returns:
+            消息列表（内部缓存，调用方不能修改）
+        """
+        if self._materialized is None:
+            chain = []
+            node = self._tail
+            while node is not None:
+                chain.append(node.message)
+                node = node.parent
+            if self._system is not None:
+                chain.append(self._system)
+            chain.reverse()
+            self._materialized = chain
+        return self._materialized
+
+    def __len__(self) -> int:
+        return (self._tail.length if self._tail is not None else 0) + (self._system is not None)
+
+    def fork(self) -> "Conversation":
+        """
+        创建对话的分支
+
+        分支与原对话共享已有的消息，之后双方各自追加的消息互不影响，创建分支的开销与对话长度无关。
+
+        Returns:
+            新的对话
+        """
+        branch = Conversation.__new__(Conversation)
+        branch._system = self._system
+        branch._tail = self._tail
+        branch._materialized = self._materialized
+        return branch
+
     def add_system_message(self, content: str) -> None:
         """
-        添加系统消息
+        添加系统消息，已有系统消息时替换
 
         Args:
             content: 消息内容
         """
-        # 检查是否已有系统消息
-        for i, message in enumerate(self.messages):
-            if message["role"] == "system":
-                # 更新现有的系统消息
-                self.messages[i] = {"role": "system", "content": content}
-                return
+        self._system = {"role": "system", "content": content}
+        self._materialized = None
 
-        # 如果没有系统消息，添加一个
-        self.messages.insert(0, {"role": "system", "content": content})
+    def add_message(self, message: Dict[str, Any]) -> None:
+        """
+        追加一条消息
+
+        Args:
+            message: 消息，追加后不要再修改
+        """
+        self._tail = _MessageNode(message, self._tail)
+        self._materialized = None
 
     def add_user_message(self, content: str) -> None:
         """
@@ -46,7 +141,7 @@ class Conversation:
         Args:
             content: 消息内容
         """
-        self.messages.append({"role": "user", "content": content})
+        self.add_message({"role": "user", "content": content})
 
     def add_assistant_message(self, content: str) -> None:
         """
@@ -55,7 +150,7 @@ class Conversation:
         Args:
             content: 消息内容
         """
-        self.messages.append({"role": "assistant", "content": content})
+        self.add_message({"role": "assistant", "content": content})
 
     def get_messages(self) -> List[Dict[str, str]]:
         """
@@ -73,13 +168,18 @@ class Conversation:
         Args:
             keep_system_message: 是否保留系统消息
         """
-        if keep_system_message:
-            # 保留系统消息
-            system_messages = [m for m in self.messages if m["role"] == "system"]
-            self.messages = system_messages
-        else:
-            # 清除所有消息
-            self.messages = []
+        self._tail = None
+        if not keep_system_message:
+            self._system = None
+        self._materialized = None
+
+    def _last_message(self, role: str) -> Optional[str]:
+        node = self._tail
+        while node is not None:
+            if node.message["role"] == role:
+                return node.message["content"]
+            node = node.parent
+        return None
 
     def get_last_user_message(self) -> Optional[str]:
         """
@@ -88,10 +188,7 @@ class Conversation:
         Returns:
             最后一条用户消息的内容，如果没有则返回None
         """
-        for message in reversed(self.messages):
-            if message["role"] == "user":
-                return message["content"]
-        return None
+        return self._last_message("user")
 
     def get_last_assistant_message(self) -> Optional[str]:
         """
@@ -100,10 +197,7 @@ class Conversation:
         Returns:
             最后一条助手消息的内容，如果没有则返回None
         """
-        for message in reversed(self.messages):
-            if message["role"] == "assistant":
-                return message["content"]
-        return None
+        return self._last_message("assistant")
 
     def truncate_messages(self, max_messages: int = 10) -> None:
         """
@@ -112,17 +206,50 @@ class Conversation:
         Args:
             max_messages: 保留的最大消息数量
         """
-        if len(self.messages) <= max_messages:
+        if len(self) <= max_messages:
+            return
+
+        # 保留系统消息和最近的非系统消息
+        system_count = 1 if self._system is not None else 0
+        history = self._materialize()[system_count:]
+        self._tail = _build_chain(history[-max_messages + system_count:])
+        self._materialized = None
+
+    def count_tokens(self, counter: Optional[TokenCounter] = None) -> int:
+        """
+        计算整个对话作为请求输入的token数
+
+        每条消息的token数按内容缓存，对话增长时只有新消息需要分词。
+
+        Args:
+            counter: token计数器，为None时使用共享的计数器
+
+        Returns:
+            token数
+        """
+        return (counter or get_token_counter()).count_messages(self._materialize())
+
+    def truncate_to_tokens(self, max_tokens: int, counter: Optional[TokenCounter] = None) -> None:
+        """
+        从最早的非系统消息开始删除，直到对话的token数不超过max_tokens
+
+        系统消息和最后一条消息始终保留。
+
+        Args:
+            max_tokens: 对话允许的最大token数
+            counter: token计数器，为None时使用共享的计数器
+        """
+        counter = counter or get_token_counter()
+        messages = self._materialize()
+        total = counter.count_messages(messages)
+        if total <= max_tokens:
             return
 
-        # 保留系统消息
-        system_messages = [m for m in self.messages if m["role"] == "system"]
-        
-        # 获取非系统消息
-        non_system_messages = [m for m in self.messages if m["role"] != "system"]
-        
-        # 保留最近的非系统消息
-        recent_non_system_messages = non_system_messages[-max_messages + len(system_messages):]
-        
-        # 合并系统消息和最近的非系统消息
-        self.messages = system_messages + recent_non_system_messages 
\ No newline at end of file
+        system_count = 1 if self._system is not None else 0
+        history = messages[system_count:]
+        start = 0
+        while total > max_tokens and start < len(history) - 1:
+            total -= counter.count_message(history[start])
+            start += 1
+        self._tail = _build_chain(history[start:])
+        self._materialized = None
@@ -0,0 +1,514 @@
+"""
+DeepSeek 本地文档检索
+~~~~~~~~~~~~~~~~~~
+
+对话接口不会读取上传的文件，文件问答需要把文档内容放进提示词。本模块在本地流式抽取文件文本并切分为
+文本块，为每个文件建立BM25倒排索引并持久化到磁盘，提问时只把最相关的几个文本块注入提示词，
+使提示词长度和检索耗时取决于问题而不是文档大小。
+
+每个文件在索引目录中保存两个以文件ID的SHA-256摘要命名的文件：``<摘要>.chunks`` 按顺序存放所有文本块的
+UTF-8文本，``<摘要>.index.json.gz`` 存放倒排表、文本块长度和偏移量。检索时只加载倒排表，
+命中的文本块按偏移量从磁盘读取。
+"""
+
+import gzip
+import hashlib
+import json
+import math
+import os
+import threading
+import zipfile
+from array import array
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Iterable, Iterator, Tuple
+from xml.etree import ElementTree
+
+from .exceptions import DeepSeekError
+from .features.web_search import extract_text as extract_html
+from .retrieval import Passage, format_passages, inject_context, pack_passages, split_passages, tokenize
+
+# 插入在本轮问题之前的文档资料说明
+CONTEXT_HEADER = "以下是从用户提供的文件中检索到的相关内容，回答时请优先依据这些内容，并用[编号]注明出处："
+
+# 按纯文本读取的文件扩展名
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".markdown", ".rst", ".csv", ".tsv", ".json", ".jsonl", ".xml", ".yaml", ".yml",
+    ".log", ".ini", ".cfg", ".toml", ".py", ".js", ".ts", ".java", ".c", ".cpp", ".h", ".go", ".rs",
+    ".sql", ".sh",
+}
+HTML_EXTENSIONS = {".html", ".htm"}
+
+# 纯文本文件每次读取的字符数
+_READ_SIZE = 64 * 1024
+_INDEX_VERSION = 1
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class DocumentError(DeepSeekError):
+    """文件无法抽取文本或没有本地索引"""
+
+
+def _iter_text_file(path: str) -> Iterator[str]:
+    """
+    按块读取纯文本文件，每个块在换行处结束，避免把段落截断在两个块之间
+
+    Args:
+        path: 文件路径
+
+    Yields:
+        文本块
+    """
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as file:
+        pending = ""
+        while True:
+            data = file.read(_READ_SIZE)
+            if not data:
+                break
+            pending += data
+            cut = pending.rfind("\n")
+            if cut >= 0:
+                yield pending[:cut + 1]
+                pending = pending[cut + 1:]
+        if pending:
+            yield pending
+
+
+def _iter_pdf(path: str) -> Iterator[str]:
+    """
+    逐页抽取PDF文本
+
+    Args:
+        path: 文件路径
+
+    Yields:
+        每一页的文本
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError("解析PDF需要安装pypdf: pip install pypdf") from e
+
+    for page in PdfReader(path).pages:
+        text = page.extract_text() or ""
+        if text:
+            yield text + "\n\n"
+
+
+def _iter_docx(path: str) -> Iterator[str]:
+    """
+    逐段落抽取Word文档文本，增量解析document.xml，不把整个XML树载入内存
+
+    Args:
+        path: 文件路径
+
+    Yields:
+        每个段落的文本
+    """
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as xml:
+        parts: List[str] = []
+        for event, element in ElementTree.iterparse(xml, events=("end",)):
+            if element.tag == f"{_WORD_NS}t" and element.text:
+                parts.append(element.text)
+            elif element.tag == f"{_WORD_NS}tab":
+                parts.append("\t")
+            elif element.tag == f"{_WORD_NS}p":
+                if parts:
+                    yield "".join(parts) + "\n"
+                    parts = []
+                element.clear()
+
+
+def iter_document_text(path: str) -> Iterator[str]:
+    """
+    根据扩展名流式抽取文件文本
+
+    Args:
+        path: 文件路径
+
+    Yields:
+        文本块，段落之间以换行分隔
+
+    Raises:
+        DocumentError: 不支持的文件类型
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in TEXT_EXTENSIONS:
+        return _iter_text_file(path)
+    if extension == ".pdf":
+        return _iter_pdf(path)
+    if extension == ".docx":
+        return _iter_docx(path)
+    if extension in HTML_EXTENSIONS:
+        with open(path, "r", encoding="utf-8", errors="replace") as file:
+            title, text = extract_html(file.read())
+        return iter([f"{title}\n\n{text}" if title else text])
+    raise DocumentError(f"不支持抽取文本的文件类型: {extension or os.path.basename(path)}")
+
+
+def chunk_text(blocks: Iterable[str], max_chars: int = 800) -> Iterator[str]:
+    """
+    将流式读取的文本块合并、切分为大小接近max_chars的文本块
+
+    相邻的短段落合并到同一个文本块中，过长的段落在句子边界处切分。
+
+    Args:
+        blocks: 文本块
+        max_chars: 每个文本块的最大字符数
+
+    Yields:
+        文本块
+    """
+    current: List[str] = []
+    size = 0
+    for block in blocks:
+        for passage in split_passages(block, max_chars):
+            if current and size + len(passage) + 1 > max_chars:
+                yield "\n".join(current)
+                current = []
+                size = 0
+            current.append(passage)
+            size += len(passage) + 1
+    if current:
+        yield "\n".join(current)
+
+
+class DocumentIndex:
+    """单个文件的BM25倒排索引"""
+
+    def __init__(self, name: str, chunks_path: str, k1: float = 1.5, b: float = 0.75):
+        """
+        初始化空索引，通过build或load填充
+
+        Args:
+            name: 文件名，作为检索结果的标题
+            chunks_path: 文本块文件的路径
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        self.name = name
+        self.chunks_path = chunks_path
+        self.k1 = k1
+        self.b = b
+        # 检索词到(文本块编号, 词频)倒排表的映射
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.lengths = array("I")
+        # 第i个文本块在文本块文件中的字节范围为offsets[i]到offsets[i + 1]
+        self.offsets = array("Q", [0])
+        self.avg_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @classmethod
+    def build(cls, name: str, chunks: Iterable[str], chunks_path: str) -> "DocumentIndex":
+        """
+        流式建立索引，文本块边读边写入文本块文件，内存中只保留倒排表
+
+        文本块先写入临时文件，全部写完后再替换，建立索引失败时不会破坏已有的文本块文件。
+
+        Args:
+            name: 文件名
+            chunks: 文本块
+            chunks_path: 文本块文件的路径
+
+        Returns:
+            索引
+        """
+        index = cls(name, chunks_path)
+        temp_path = f"{chunks_path}.tmp"
+        with open(temp_path, "wb") as file:
+            for chunk_id, chunk in enumerate(chunks):
+                data = chunk.encode("utf-8")
+                file.write(data)
+                index.offsets.append(index.offsets[-1] + len(data))
+
+                terms = tokenize(chunk)
+                index.lengths.append(len(terms))
+                for term, count in Counter(terms).items():
+                    entry = index.postings.get(term)
+                    if entry is None:
+                        entry = index.postings[term] = (array("I"), array("I"))
+                    entry[0].append(chunk_id)
+                    entry[1].append(count)
+        os.replace(temp_path, chunks_path)
+        index.avg_length = sum(index.lengths) / len(index.lengths) if index.lengths else 0.0
+        return index
+
+    def save(self, path: str) -> None:
+        """
+        将倒排表写入磁盘，先写临时文件再替换，避免读到写了一半的索引
+
+        Args:
+            path: 索引文件路径
+        """
+        payload = {
+            "version": _INDEX_VERSION,
+            "name": self.name,
+            "lengths": self.lengths.tolist(),
+            "offsets": self.offsets.tolist(),
+            "postings": {term: [ids.tolist(), tfs.tolist()] for term, (ids, tfs) in self.postings.items()},
+        }
+        temp_path = f"{path}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as file:
+            json.dump(payload, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str, chunks_path: str) -> "DocumentIndex":
+        """
+        从磁盘加载倒排表
+
+        Args:
+            path: 索引文件路径
+            chunks_path: 文本块文件的路径
+
+        Returns:
+            索引
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            payload = json.load(file)
+        if payload.get("version") != _INDEX_VERSION:
+            raise DocumentError(f"索引版本不兼容: {path}")
+
+        index = cls(payload["name"], chunks_path)
+        index.lengths = array("I", payload["lengths"])
+        index.offsets = array("Q", payload["offsets"])
+        index.postings = {
+            term: (array("I", ids), array("I", tfs)) for term, (ids, tfs) in payload["postings"].items()
+        }
+        index.avg_length = sum(index.lengths) / len(index.lengths) if index.lengths else 0.0
+        return index
+
+    def scores(self, query: List[str]) -> Dict[int, float]:
+        """
+        计算包含查询词的文本块的BM25得分，只遍历查询词的倒排表
+
+        Args:
+            query: 查询的检索词列表
+
+        Returns:
+            文本块编号到得分的映射
+        """
+        scores: Dict[int, float] = {}
+        n = len(self.lengths)
+        avg_length = self.avg_length
+        if not n or not avg_length:
+            return scores
+
+        for term in set(query):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            ids, tfs = entry
+            idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            for chunk_id, tf in zip(ids, tfs):
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def read_chunks(self, chunk_ids: List[int]) -> Dict[int, str]:
+        """
+        按偏移量从文本块文件读取指定的文本块
+
+        Args:
+            chunk_ids: 文本块编号
+
+        Returns:
+            文本块编号到文本的映射
+        """
+        chunks = {}
+        with open(self.chunks_path, "rb") as file:
+            for chunk_id in sorted(chunk_ids):
+                start, end = self.offsets[chunk_id], self.offsets[chunk_id + 1]
+                file.seek(start)
+                chunks[chunk_id] = file.read(end - start).decode("utf-8")
+        return chunks
+
+    def search(self, query: str, top_k: int = 5) -> List[Passage]:
+        """
+        检索与查询最相关的文本块
+
+        Args:
+            query: 查询文本
+            top_k: 返回的文本块数
+
+        Returns:
+            按得分从高到低排序的段落
+        """
+        scores = self.scores(tokenize(query))
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        chunks = self.read_chunks([chunk_id for chunk_id, _ in best])
+        return [
+            Passage(chunks[chunk_id], self.name, f"{self.name}#{chunk_id + 1}", score)
+            for chunk_id, score in best
+        ]
+
+
+class DocumentStore:
+    """按文件ID管理本地文档索引"""
+
+    def __init__(
+        self,
+        directory: str,
+        chunk_chars: int = 800,
+        top_k: int = 5,
+        token_budget: int = 2000,
+        max_loaded: int = 32,
+    ):
+        """
+        初始化文档索引库
+
+        Args:
+            directory: 索引目录，首次建立索引时创建
+            chunk_chars: 每个文本块的最大字符数
+            top_k: 每个问题从每个文件中检索的文本块数
+            token_budget: 注入提示词的文档内容的token预算
+            max_loaded: 内存中最多保留的已加载索引数
+        """
+        self.directory = directory
+        self.chunk_chars = chunk_chars
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.max_loaded = max_loaded
+        self._loaded: "OrderedDict[str, DocumentIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 最近一次检索注入的文本块
+        self.last_sources: List[Passage] = []
+
+    def _paths(self, file_id: str) -> Tuple[str, str]:
+        """
+        获取文件ID对应的索引文件和文本块文件路径
+
+        Args:
+            file_id: 文件ID
+
+        Returns:
+            (索引文件路径, 文本块文件路径)
+        """
+        # 使用摘要而不是替换特殊字符后的ID作为文件名，不同的ID不会对应同一个文件
+        digest = hashlib.sha256(file_id.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, digest)
+        return f"{base}.index.json.gz", f"{base}.chunks"
+
+    def add_file(self, file_id: str, file_path: str) -> DocumentIndex:
+        """
+        抽取文件文本并建立索引
+
+        Args:
+            file_id: 文件ID
+            file_path: 文件路径
+
+        Returns:
+            建立的索引
+
+        Raises:
+            DocumentError: 不支持的文件类型
+        """
+        blocks = iter_document_text(file_path)
+        os.makedirs(self.directory, exist_ok=True)
+        index_path, chunks_path = self._paths(file_id)
+        index = DocumentIndex.build(
+            os.path.basename(file_path), chunk_text(blocks, self.chunk_chars), chunks_path
+        )
+        index.save(index_path)
+        with self._lock:
+            self._remember(file_id, index)
+        return index
+
+    def _remember(self, file_id: str, index: DocumentIndex) -> None:
+        self._loaded[file_id] = index
+        self._loaded.move_to_end(file_id)
+        while len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+
+    def has_file(self, file_id: str) -> bool:
+        """
+        检查文件是否已建立索引
+
+        Args:
+            file_id: 文件ID
+
+        Returns:
+            是否已建立索引
+        """
+        return file_id in self._loaded or os.path.exists(self._paths(file_id)[0])
+
+    def get(self, file_id: str) -> DocumentIndex:
+        """
+        获取文件的索引，未加载时从磁盘加载
+
+        Args:
+            file_id: 文件ID
+
+        Returns:
+            索引
+
+        Raises:
+            DocumentError: 文件没有本地索引
+        """
+        with self._lock:
+            index = self._loaded.get(file_id)
+            if index is not None:
+                self._loaded.move_to_end(file_id)
+                return index
+
+        index_path, chunks_path = self._paths(file_id)
+        if not os.path.exists(index_path):
+            raise DocumentError(f"文件没有本地索引，请先通过upload_file或index_file建立索引: {file_id}")
+        index = DocumentIndex.load(index_path, chunks_path)
+        with self._lock:
+            self._remember(file_id, index)
+        return index
+
+    def remove_file(self, file_id: str) -> None:
+        """
+        删除文件的索引
+
+        Args:
+            file_id: 文件ID
+        """
+        with self._lock:
+            self._loaded.pop(file_id, None)
+        for path in self._paths(file_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def search(self, file_ids: List[str], query: str) -> List[Passage]:
+        """
+        在多个文件中检索，并在token预算内选出最相关的文本块
+
+        Args:
+            file_ids: 文件ID列表
+            query: 查询文本
+
+        Returns:
+            选中的文本块
+        """
+        passages = []
+        for file_id in file_ids:
+            passages.extend(self.get(file_id).search(query, self.top_k))
+        passages.sort(key=lambda passage: passage.score, reverse=True)
+        return pack_passages(passages, self.token_budget)
+
+    def apply_to_messages(
+        self, messages: List[Dict[str, Any]], file_ids: List[str], query: str
+    ) -> List[Dict[str, Any]]:
+        """
+        检索文件中与问题相关的内容，作为系统消息插入到最后一条用户消息之前
+
+        Args:
+            messages: 原始消息列表
+            file_ids: 文件ID列表
+            query: 查询文本，通常为本轮的用户消息
+
+        Returns:
+            注入文档内容后的消息列表，原有的消息对象不会被修改
+        """
+        passages = self.search(file_ids, query)
+        self.last_sources = passages
+        if not passages:
+            return messages
+        return inject_context(messages, format_passages(passages, CONTEXT_HEADER))
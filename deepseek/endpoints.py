@@ -0,0 +1,331 @@
+"""
+DeepSeek 多端点负载均衡
+~~~~~~~~~~~~~~~~~~~~
+
+管理多组API端点和密钥，按最少进行中请求数分配负载，对连续失败的端点进行熔断摘除，
+并通过健康检查恢复；对话和文件请求失败时透明地切换到其他端点。
+"""
+
+import random
+import threading
+import time
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+import httpx
+import openai
+import requests
+
+from .exceptions import DeadlineExceededError, RequestCancelledError, get_status_code
+
+# 熔断器状态
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+# 连接失败、超时等传输层错误，说明端点本身不可用
+_TRANSPORT_ERRORS = (
+    httpx.TransportError,
+    openai.APIConnectionError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+
+def is_failover_error(error: BaseException) -> bool:
+    """
+    判断失败是否由端点本身引起，可以切换到其他端点重试
+
+    只有传输层错误（连接失败、超时）以及鉴权失败（密钥失效）、限流和服务端错误可以切换；
+    其余4xx错误、调用方取消或超过截止时间，以及参数错误等程序异常换端点也不会成功，
+    直接抛出且不影响端点的健康状态。
+
+    Args:
+        error: 异常对象
+
+    Returns:
+        是否可以切换端点
+    """
+    if isinstance(error, (RequestCancelledError, DeadlineExceededError)):
+        return False
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code in (401, 403, 429) or status_code >= 500
+    # 客户端可能把传输层错误包装为其他异常，沿显式的原因链查找
+    while error is not None:
+        if isinstance(error, _TRANSPORT_ERRORS):
+            return True
+        error = error.__cause__
+    return False
+
+
+class Endpoint:
+    """一组API端点和密钥"""
+
+    def __init__(self, base_url: str, api_key: str):
+        """
+        初始化端点
+
+        Args:
+            base_url: API基础URL
+            api_key: 该端点使用的API密钥
+        """
+        self.base_url = base_url
+        self.api_key = api_key
+
+        # 由DeepSeekClient绑定的OpenAI客户端、文件管理器和原始响应模式的轻量客户端
+        self.client: Any = None
+        self.file_manager: Any = None
+        self.raw: Any = None
+
+        self.outstanding = 0
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejection_count = 0
+        self.probing = False
+        self.total_requests = 0
+        self.total_failures = 0
+
+    @property
+    def name(self) -> str:
+        """用于日志和指标的端点名称，隐藏密钥"""
+        return f"{self.base_url}#{self.api_key[-4:]}"
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.name!r}, state={self.state!r}, outstanding={self.outstanding})"
+
+
+class Lease:
+    """一次对端点的占用，结束时必须调用release记录结果"""
+
+    __slots__ = ("pool", "endpoint", "released")
+
+    def __init__(self, pool: "EndpointPool", endpoint: Endpoint):
+        self.pool = pool
+        self.endpoint = endpoint
+        self.released = False
+
+    def release(self, error: Optional[BaseException] = None) -> None:
+        """
+        释放端点并记录本次调用的结果
+
+        Args:
+            error: 调用失败时的异常，成功时为None
+        """
+        if not self.released:
+            self.released = True
+            self.pool._release(self.endpoint, error)
+
+
+class EndpointPool:
+    """多端点负载均衡池"""
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        failure_threshold: int = 3,
+        ejection_seconds: float = 30.0,
+        max_ejection_seconds: float = 300.0,
+    ):
+        """
+        初始化端点池
+
+        Args:
+            endpoints: 端点列表
+            failure_threshold: 连续失败多少次后熔断摘除端点
+            ejection_seconds: 首次摘除的时长（秒），之后每次摘除时长翻倍
+            max_ejection_seconds: 摘除时长的上限（秒）
+        """
+        if not endpoints:
+            raise ValueError("端点池至少需要一个端点")
+
+        self.endpoints = endpoints
+        self.failure_threshold = failure_threshold
+        self.ejection_seconds = ejection_seconds
+        self.max_ejection_seconds = max_ejection_seconds
+
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def _available(self, endpoint: Endpoint, now: float) -> bool:
+        """
+        判断端点当前是否可以接收请求，需要在持有锁时调用
+
+        熔断时长结束后进入半开状态，只放行一个探测请求。
+
+        Args:
+            endpoint: 端点
+            now: 当前时间
+
+        Returns:
+            是否可用
+        """
+        if endpoint.state == STATE_CLOSED:
+            return True
+        if now < endpoint.ejected_until or endpoint.probing:
+            return False
+        return True
+
+    def acquire(self, exclude: Tuple[Endpoint, ...] = ()) -> Lease:
+        """
+        选择进行中请求最少的可用端点
+
+        所有端点都被摘除时选择最早恢复的端点，避免整体不可用。
+
+        Args:
+            exclude: 本次调用中已经失败过的端点
+
+        Returns:
+            端点占用
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [
+                endpoint for endpoint in self.endpoints
+                if endpoint not in exclude and self._available(endpoint, now)
+            ]
+            if candidates:
+                fewest = min(endpoint.outstanding for endpoint in candidates)
+                endpoint = random.choice([e for e in candidates if e.outstanding == fewest])
+            else:
+                remaining = [e for e in self.endpoints if e not in exclude] or self.endpoints
+                endpoint = min(remaining, key=lambda e: e.ejected_until)
+
+            if endpoint.state != STATE_CLOSED:
+                endpoint.state = STATE_HALF_OPEN
+                endpoint.probing = True
+            endpoint.outstanding += 1
+            endpoint.total_requests += 1
+
+        return Lease(self, endpoint)
+
+    def _release(self, endpoint: Endpoint, error: Optional[BaseException]) -> None:
+        """
+        释放端点并更新熔断状态
+
+        Args:
+            endpoint: 端点
+            error: 调用失败时的异常
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.probing = False
+            if error is None or (get_status_code(error) is not None and not is_failover_error(error)):
+                # 端点返回了响应，即使是4xx也说明端点可用
+                self._mark_healthy(endpoint)
+                return
+            if not is_failover_error(error):
+                # 取消、截止时间和程序异常与端点无关，不改变健康状态
+                return
+
+            endpoint.total_failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.state == STATE_HALF_OPEN or endpoint.consecutive_failures >= self.failure_threshold:
+                self._eject(endpoint)
+
+    def _mark_healthy(self, endpoint: Endpoint) -> None:
+        """
+        将端点恢复为正常状态，需要在持有锁时调用
+
+        Args:
+            endpoint: 端点
+        """
+        endpoint.state = STATE_CLOSED
+        endpoint.consecutive_failures = 0
+        endpoint.ejection_count = 0
+
+    def _eject(self, endpoint: Endpoint) -> None:
+        """
+        熔断摘除端点，需要在持有锁时调用
+
+        Args:
+            endpoint: 端点
+        """
+        duration = min(self.ejection_seconds * (2 ** endpoint.ejection_count), self.max_ejection_seconds)
+        endpoint.state = STATE_OPEN
+        endpoint.ejected_until = time.monotonic() + duration
+        endpoint.ejection_count += 1
+
+    def call(self, fn: Callable[[Endpoint], Any], hold: bool = False) -> Any:
+        """
+        在选出的端点上执行调用，端点故障时切换到其他端点
+
+        Args:
+            fn: 接收端点并发起调用的函数
+            hold: 是否在返回后继续占用端点（例如流式响应），为True时返回(结果, 占用)
+
+        Returns:
+            调用结果；hold为True时返回(结果, 占用)，调用方读取完毕后需要释放占用
+        """
+        tried: Tuple[Endpoint, ...] = ()
+        while True:
+            lease = self.acquire(exclude=tried)
+            try:
+                result = fn(lease.endpoint)
+            except Exception as e:
+                lease.release(e)
+                tried += (lease.endpoint,)
+                if not is_failover_error(e) or len(tried) >= len(self.endpoints):
+                    raise
+                continue
+
+            if hold:
+                return result, lease
+            lease.release()
+            return result
+
+    def start_health_checks(self, check: Callable[[Endpoint], Any], interval: float = 10.0) -> None:
+        """
+        启动后台健康检查，定期探测被摘除的端点，探测成功后立即恢复
+
+        Args:
+            check: 对端点发起探测请求的函数，失败时抛出异常
+            interval: 探测间隔（秒）
+        """
+        if self._health_thread is not None:
+            return
+
+        def _run() -> None:
+            while not self._stop_event.wait(interval):
+                with self._lock:
+                    ejected = [e for e in self.endpoints if e.state != STATE_CLOSED]
+                for endpoint in ejected:
+                    try:
+                        check(endpoint)
+                    except Exception:
+                        continue
+                    with self._lock:
+                        self._mark_healthy(endpoint)
+
+        self._health_thread = threading.Thread(target=_run, name="deepseek-health-check", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self) -> None:
+        """停止后台健康检查"""
+        self._stop_event.set()
+        if self._health_thread is not None:
+            self._health_thread.join()
+            self._health_thread = None
+        self._stop_event.clear()
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        """
+        获取各端点的运行指标
+
+        Returns:
+            每个端点的状态、进行中请求数和失败统计
+        """
+        with self._lock:
+            return [
+                {
+                    "endpoint": endpoint.name,
+                    "state": endpoint.state,
+                    "outstanding": endpoint.outstanding,
+                    "consecutive_failures": endpoint.consecutive_failures,
+                    "total_requests": endpoint.total_requests,
+                    "total_failures": endpoint.total_failures,
+                }
+                for endpoint in self.endpoints
+            ]
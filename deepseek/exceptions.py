@@ -0,0 +1,79 @@
+"""
+DeepSeek 异常定义
+~~~~~~~~~~~~~~
+
+定义客户端抛出的异常类型。所有异常都继承自Exception，原有捕获Exception的代码无需修改。
+"""
+
+from typing import Optional
+
+
+class DeepSeekError(Exception):
+    """DeepSeek客户端异常基类"""
+
+
+class DeepSeekAPIError(DeepSeekError):
+    """API调用失败"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        """
+        初始化API调用异常
+
+        Args:
+            message: 错误信息
+            status_code: HTTP状态码，无法获取时为None
+            retry_after: 服务端通过Retry-After建议的重试等待时间（秒），没有时为None
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(DeepSeekError):
+    """请求无法在截止时间前完成"""
+
+
+class RequestCancelledError(DeepSeekError):
+    """请求已被调用方取消"""
+
+
+class BudgetExceededError(DeepSeekError):
+    """租户的累计用量已达到硬预算，请求在发送前被拒绝"""
+
+    def __init__(self, tenant: str, spent: float, limit: float, metric: str = "tokens"):
+        """
+        初始化预算超限异常
+
+        Args:
+            tenant: 租户
+            spent: 已用的token数或费用
+            limit: 硬预算
+            metric: 预算的计量方式，"tokens"或"cost"
+        """
+        unit = "美元" if metric == "cost" else "tokens"
+        super().__init__(f"租户 {tenant} 已超出预算: {spent:g} / {limit:g} {unit}")
+        self.tenant = tenant
+        self.spent = spent
+        self.limit = limit
+        self.metric = metric
+
+
+def get_status_code(error: BaseException) -> Optional[int]:
+    """
+    从异常及其原因链中获取HTTP状态码
+
+    Args:
+        error: 异常对象
+
+    Returns:
+        HTTP状态码，无法获取时返回None
+    """
+    while error is not None:
+        status_code = getattr(error, "status_code", None)
+        if status_code is None:
+            response = getattr(error, "response", None)
+            status_code = getattr(response, "status_code", None)
+        if isinstance(status_code, int):
+            return status_code
+        error = error.__cause__ or error.__context__
+    return None
@@ -6,6 +6,13 @@ DeepSeek 功能模块
 """
 
 from .deep_thinking import DeepThinking
-from .web_search import WebSearch
+from .web_search import WebSearch, SearchProvider, SearchResult, LocalSearchProvider, HTTPSearchProvider
 
-__all__ = ['DeepThinking', 'WebSearch'] 
\ No newline at end of file
+__all__ = [
+    'DeepThinking',
+    'WebSearch',
+    'SearchProvider',
+    'SearchResult',
+    'LocalSearchProvider',
+    'HTTPSearchProvider',
+] 
\ No newline at end of file
@@ -2,23 +2,38 @@
 DeepSeek 深度思考功能
 ~~~~~~~~~~~~~~~~~
 
-实现DeepSeek的深度思考功能，使模型能够进行更深入的分析和推理。
+实现DeepSeek的深度思考功能，切换到推理模型，使模型在回答前先输出思维链进行推理。
 """
 
 from typing import Dict, Any, Optional, List
 
+# 默认的推理模型
+REASONING_MODEL = "deepseek-reasoner"
+
+# 推理模型不支持的参数，其中logprobs和top_logprobs会直接导致请求报错
+UNSUPPORTED_PARAMS = (
+    "temperature",
+    "top_p",
+    "presence_penalty",
+    "frequency_penalty",
+    "logprobs",
+    "top_logprobs",
+)
+
 
 class DeepThinking:
     """DeepSeek深度思考功能类"""
 
-    def __init__(self, enabled: bool = False):
+    def __init__(self, enabled: bool = False, model: str = REASONING_MODEL):
         """
         初始化深度思考功能
 
         Args:
             enabled: 是否启用深度思考
+            model: 深度思考模式下使用的推理模型
         """
         self.enabled = enabled
+        self.model = model
 
     def enable(self):
         """启用深度思考功能"""
@@ -41,41 +56,22 @@ class DeepThinking:
         """
         将深度思考功能应用到消息中
 
+        推理模型要求历史消息中不能包含reasoning_content字段，这里会将其移除，
+        避免思维链内容被回传导致上下文膨胀。
+
         Args:
             messages: 原始消息列表
 
         Returns:
             应用深度思考后的消息列表
         """
-        if not self.enabled:
+        if not any("reasoning_content" in message for message in messages):
             return messages
 
-        # 深度思考模式下，在系统消息中添加指令
-        system_message_found = False
-        deep_thinking_instruction = (
-            "请进行深度思考，分析问题的各个方面，考虑不同的观点和可能性，"
-            "提供深入的见解和全面的回答。在回答前，请先思考问题的本质、"
-            "相关因素、潜在影响和可能的解决方案。"
-        )
-
-        modified_messages = []
-        for message in messages:
-            if message["role"] == "system":
-                # 修改现有的系统消息
-                system_message_found = True
-                content = message["content"]
-                if deep_thinking_instruction not in content:
-                    message["content"] = f"{content}\n\n{deep_thinking_instruction}"
-            modified_messages.append(message)
-
-        # 如果没有系统消息，添加一个
-        if not system_message_found:
-            modified_messages.insert(0, {
-                "role": "system",
-                "content": deep_thinking_instruction
-            })
-
-        return modified_messages
+        return [
+            {key: value for key, value in message.items() if key != "reasoning_content"}
+            for message in messages
+        ]
 
     def apply_to_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -90,19 +86,11 @@ class DeepThinking:
         if not self.enabled:
             return params
 
-        # 深度思考模式下，可以调整模型参数
-        modified_params = params.copy()
-        
-        # 增加temperature以鼓励更多样化的思考
-        if "temperature" in modified_params:
-            # 适度增加temperature，但不超过1.0
-            modified_params["temperature"] = min(modified_params["temperature"] * 1.2, 1.0)
-        else:
-            modified_params["temperature"] = 0.8
-            
-        # 增加max_tokens以允许更长的回答
-        if "max_tokens" in modified_params:
-            # 增加max_tokens，但不超过模型限制
-            modified_params["max_tokens"] = int(modified_params["max_tokens"] * 1.5)
-        
-        return modified_params 
\ No newline at end of file
+        # 深度思考模式下切换到推理模型，并移除推理模型不支持的采样参数
+        modified_params = {
+            key: value for key, value in params.items()
+            if key not in UNSUPPORTED_PARAMS
+        }
+        modified_params["model"] = self.model
+
+        return modified_params
@@ -2,23 +2,277 @@
 DeepSeek 联网搜索功能
 ~~~~~~~~~~~~~~~~~
 
-实现DeepSeek的联网搜索功能，使模型能够获取互联网上的最新信息。
+在调用模型前检索互联网上的最新信息：通过可替换的搜索服务获取结果，在限定时间内并发抓取网页正文，
+抽取并去重段落，按与问题的相关性在token预算内插入到本轮问题之前。搜索结果和网页都会缓存一段时间。
+只抓取解析到公网地址的http(s)网页，重定向的每一跳都会重新检查。
 """
 
-from typing import Dict, Any, Optional, List
+import ipaddress
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+
+import httpx
+
+from ..retrieval import (
+    BM25,
+    Passage,
+    TTLCache,
+    format_passages,
+    inject_context,
+    last_user_text,
+    pack_passages,
+    rank_passages,
+    split_passages,
+    tokenize,
+)
+
+# 插入在本轮问题之前的参考资料说明
+CONTEXT_HEADER = "以下是联网搜索得到的参考资料，回答时请优先依据这些资料，并用[编号]注明引用的来源："
+
+# 抓取网页时最多跟随的重定向次数
+MAX_REDIRECTS = 5
+
+
+class SearchResult:
+    """一条搜索结果"""
+
+    __slots__ = ("title", "url", "snippet", "content")
+
+    def __init__(self, title: str, url: str, snippet: str = "", content: Optional[str] = None):
+        """
+        初始化搜索结果
+
+        Args:
+            title: 标题
+            url: 网页地址
+            snippet: 搜索服务返回的摘要
+            content: 完整正文，搜索服务已经提供正文时无需再抓取网页
+        """
+        self.title = title
+        self.url = url
+        self.snippet = snippet
+        self.content = content
+
+    def __repr__(self) -> str:
+        return f"SearchResult({self.title!r}, {self.url!r})"
+
+
+class SearchProvider:
+    """搜索服务接口，子类需要实现search方法"""
+
+    def search(self, query: str, max_results: int = 5) -> List[SearchResult]:
+        """
+        搜索
+
+        Args:
+            query: 查询文本
+            max_results: 最多返回的结果数
+
+        Returns:
+            搜索结果列表
+        """
+        raise NotImplementedError
+
+
+class LocalSearchProvider(SearchProvider):
+    """离线搜索服务，在给定的文档集合中按BM25检索，适合测试和无法访问外网的环境"""
+
+    def __init__(self, documents: Iterable[Dict[str, str]]):
+        """
+        初始化离线搜索服务
+
+        Args:
+            documents: 文档列表，每个文档包含title、url和content字段
+        """
+        self.documents = [
+            SearchResult(doc.get("title", ""), doc.get("url", ""), doc.get("content", "")[:200], doc.get("content", ""))
+            for doc in documents
+        ]
+        self._bm25 = BM25([tokenize(f"{doc.title} {doc.content}") for doc in self.documents])
+
+    def search(self, query: str, max_results: int = 5) -> List[SearchResult]:
+        scores = self._bm25.scores(tokenize(query))
+        ranked = sorted(zip(scores, range(len(scores))), reverse=True)
+        return [self.documents[i] for score, i in ranked[:max_results] if score > 0]
+
+
+class HTTPSearchProvider(SearchProvider):
+    """通过返回JSON的搜索接口检索，兼容SearXNG的 ``/search?format=json`` 接口"""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str] = None,
+        timeout: float = 5.0,
+        http_client: Optional[httpx.Client] = None,
+    ):
+        """
+        初始化搜索服务
+
+        Args:
+            base_url: 搜索服务地址
+            api_key: 搜索服务的密钥，以Bearer方式发送
+            timeout: 搜索请求的超时时间（秒）
+            http_client: httpx客户端，为None时单独创建
+        """
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.timeout = timeout
+        self.http_client = http_client or httpx.Client(timeout=timeout)
+
+    def search(self, query: str, max_results: int = 5) -> List[SearchResult]:
+        response = self.http_client.get(
+            f"{self.base_url}/search",
+            params={"q": query, "format": "json"},
+            headers=self.headers,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return [
+            SearchResult(item.get("title", ""), item.get("url", ""), item.get("content") or item.get("snippet", ""))
+            for item in response.json().get("results", [])[:max_results]
+            if item.get("url")
+        ]
+
+
+class _TextExtractor(HTMLParser):
+    """从HTML中抽取标题和正文，跳过脚本、样式和导航等非正文内容"""
+
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form"}
+    BLOCK_TAGS = {"p", "div", "section", "article", "li", "br", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "pre"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.parts: List[str] = []
+        self._skip_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag == "title":
+            self._in_title = False
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data: str) -> None:
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self.parts.append(data)
+
+
+def extract_text(html: str) -> Tuple[str, str]:
+    """
+    从HTML中抽取标题和正文
+
+    Args:
+        html: HTML文本
+
+    Returns:
+        (标题, 正文)
+    """
+    extractor = _TextExtractor()
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except Exception:
+        pass
+    return extractor.title.strip(), "".join(extractor.parts)
+
+
+def is_public_url(url: str) -> bool:
+    """
+    判断网址是否可以抓取
+
+    搜索结果中的网址不可信，指向内网、本机或链路本地地址（例如云服务的元数据接口）的网址不能抓取。
+
+    Args:
+        url: 网页地址
+
+    Returns:
+        协议为http(s)且主机的所有解析地址都是公网地址时返回True
+    """
+    try:
+        parsed = httpx.URL(url)
+    except Exception:
+        return False
+    if parsed.scheme not in ("http", "https") or not parsed.host:
+        return False
+
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        infos = socket.getaddrinfo(parsed.host, port, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError):
+        return False
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            return False
+    return bool(infos)
 
 
 class WebSearch:
     """DeepSeek联网搜索功能类"""
 
-    def __init__(self, enabled: bool = False):
+    def __init__(
+        self,
+        enabled: bool = False,
+        provider: Optional[SearchProvider] = None,
+        max_results: int = 5,
+        fetch_pages: bool = True,
+        fetch_timeout: float = 3.0,
+        token_budget: int = 1500,
+        passage_chars: int = 400,
+        cache_ttl: float = 600.0,
+        max_page_bytes: int = 1_000_000,
+    ):
         """
         初始化联网搜索功能
 
         Args:
             enabled: 是否启用联网搜索
+            provider: 搜索服务，为None时不进行检索
+            max_results: 每次检索使用的搜索结果数
+            fetch_pages: 是否抓取网页正文，为False时只使用搜索摘要
+            fetch_timeout: 抓取网页的总等待时间（秒），超时的网页使用搜索摘要代替
+            token_budget: 注入提示词的参考资料的token预算
+            passage_chars: 每个段落的最大字符数
+            cache_ttl: 搜索结果和网页的缓存时间（秒）
+            max_page_bytes: 每个网页最多读取的字节数
         """
         self.enabled = enabled
+        self.provider = provider
+        self.max_results = max_results
+        self.fetch_pages = fetch_pages
+        self.fetch_timeout = fetch_timeout
+        self.token_budget = token_budget
+        self.passage_chars = passage_chars
+        self.max_page_bytes = max_page_bytes
+
+        self._search_cache = TTLCache(max_size=256, ttl=cache_ttl)
+        self._page_cache = TTLCache(max_size=1024, ttl=cache_ttl)
+        self._http_client: Optional[httpx.Client] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # 最近一次检索注入的段落和检索失败的原因
+        self.last_sources: List[Passage] = []
+        self.last_error: Optional[Exception] = None
 
     def enable(self):
         """启用联网搜索功能"""
@@ -37,66 +291,166 @@ class WebSearch:
         """
         return self.enabled
 
+    def search(self, query: str) -> List[SearchResult]:
+        """
+        调用搜索服务，相同的查询在缓存有效期内只搜索一次
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            搜索结果列表
+        """
+        key = (query, self.max_results)
+        results = self._search_cache.get(key)
+        if results is None:
+            results = self.provider.search(query, self.max_results)
+            self._search_cache.set(key, results)
+        return results
+
+    def _fetch_page(self, url: str) -> Optional[Tuple[str, str]]:
+        """
+        抓取网页并抽取标题和正文，结果写入缓存
+
+        Args:
+            url: 网页地址
+
+        Returns:
+            (标题, 正文)，抓取失败、地址不是公网地址或不是文本网页时返回None
+        """
+        page = None
+        target = url
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                if not is_public_url(target):
+                    break
+                with self._http_client.stream("GET", target) as response:
+                    if response.is_redirect:
+                        target = str(response.url.join(response.headers["location"]))
+                        continue
+                    content_type = response.headers.get("content-type", "")
+                    if response.status_code < 400 and ("html" in content_type or "text" in content_type):
+                        body = bytearray()
+                        for chunk in response.iter_bytes():
+                            body += chunk[:self.max_page_bytes - len(body)]
+                            if len(body) >= self.max_page_bytes:
+                                break
+                        text = bytes(body).decode(response.encoding or "utf-8", errors="replace")
+                        page = extract_text(text) if "html" in content_type else ("", text)
+                    break
+        except Exception:
+            page = None
+        # 抓取失败也缓存，避免反复请求不可用的网页
+        self._page_cache.set(url, page or ("", ""))
+        return page
+
+    def fetch(self, urls: List[str]) -> Dict[str, Tuple[str, str]]:
+        """
+        并发抓取网页，最多等待fetch_timeout秒
+
+        超时未完成的网页会在后台继续抓取并写入缓存，供之后的检索使用。
+
+        Args:
+            urls: 网页地址列表
+
+        Returns:
+            网页地址到(标题, 正文)的映射，不包含失败和超时的网页
+        """
+        pages = {}
+        pending = []
+        for url in dict.fromkeys(urls):
+            cached = self._page_cache.get(url)
+            if cached is not None:
+                if cached[1]:
+                    pages[url] = cached
+            else:
+                pending.append(url)
+        if not pending:
+            return pages
+
+        with self._lock:
+            if self._executor is None:
+                self._http_client = httpx.Client(
+                    timeout=httpx.Timeout(self.fetch_timeout, connect=min(self.fetch_timeout, 2.0)),
+                    headers={"User-Agent": "Mozilla/5.0 (compatible; deepseek-client)"},
+                )
+                self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="deepseek-web-fetch")
+
+        futures = {self._executor.submit(self._fetch_page, url): url for url in pending}
+        done, _ = wait(futures, timeout=self.fetch_timeout)
+        for future in done:
+            page = future.result()
+            if page is not None and page[1]:
+                pages[futures[future]] = page
+        return pages
+
+    def retrieve(self, query: str) -> List[Passage]:
+        """
+        检索与查询相关的段落
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            在token预算内按相关性选出的段落
+        """
+        results = self.search(query)
+        urls = [r.url for r in results if r.content is None] if self.fetch_pages else []
+        pages = self.fetch(urls) if urls else {}
+
+        passages = []
+        for result in results:
+            title, text = pages.get(result.url, ("", ""))
+            text = result.content or text or result.snippet
+            for chunk in split_passages(text, self.passage_chars):
+                passages.append(Passage(chunk, result.title or title, result.url))
+
+        ranked = [passage for passage in rank_passages(query, passages) if passage.score > 0]
+        return pack_passages(ranked, self.token_budget)
+
     def apply_to_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         将联网搜索功能应用到消息中
 
+        以最后一条用户消息为查询进行检索，把选出的段落作为系统消息插入到这条用户消息之前；
+        检索失败时不影响对话，原样返回消息列表。
+
         Args:
             messages: 原始消息列表
 
         Returns:
             应用联网搜索后的消息列表
         """
-        if not self.enabled:
+        self.last_sources = []
+        if not self.enabled or self.provider is None:
             return messages
 
-        # 联网搜索模式下，在系统消息中添加指令
-        system_message_found = False
-        web_search_instruction = (
-            "你可以搜索互联网获取最新信息来回答问题。当需要事实性信息、"
-            "最新数据或特定知识时，请主动使用搜索功能。在回答中，请引用"
-            "你从搜索中获取的信息来源。"
-        )
+        query = last_user_text(messages)
+        if not query:
+            return messages
+
+        try:
+            passages = self.retrieve(query)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+            return messages
 
-        modified_messages = []
-        for message in messages:
-            if message["role"] == "system":
-                # 修改现有的系统消息
-                system_message_found = True
-                content = message["content"]
-                if web_search_instruction not in content:
-                    message["content"] = f"{content}\n\n{web_search_instruction}"
-            modified_messages.append(message)
-
-        # 如果没有系统消息，添加一个
-        if not system_message_found:
-            modified_messages.insert(0, {
-                "role": "system",
-                "content": web_search_instruction
-            })
-
-        return modified_messages
+        if not passages:
+            return messages
+        self.last_sources = passages
+        return inject_context(messages, format_passages(passages, CONTEXT_HEADER))
 
     def apply_to_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """
         将联网搜索功能应用到API参数中
 
+        对话接口没有联网搜索参数，检索结果通过消息注入，这里不修改参数。
+
         Args:
             params: 原始API参数
 
         Returns:
-            应用联网搜索后的API参数
-        """
-        if not self.enabled:
-            return params
-
-        # 联网搜索模式下，添加相关参数
-        modified_params = params.copy()
-        
-        # 添加web_search参数，告知API启用联网搜索
-        modified_params["web_search"] = True
-        
-        # 可能需要其他特定参数，根据DeepSeek API的实际要求添加
-        # 例如搜索引擎选择、搜索结果数量限制等
-        
-        return modified_params 
\ No newline at end of file
+            API参数
+        """
+        return params
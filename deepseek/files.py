@@ -7,26 +7,62 @@ DeepSeek 文件处理
 
 import os
 import mimetypes
-from typing import Dict, Any, Optional, List, Union, BinaryIO
+import uuid
+from typing import Dict, Any, Optional, List, Union, BinaryIO, Iterator
+import httpx
 import requests
 from tqdm import tqdm
 
+from .compression import UNSUPPORTED_MEDIA_TYPE, choose_encoding, iter_compressed
+from .concurrency import AdaptiveLimiter, OVERLOAD_STATUS_CODES
+from .exceptions import DeepSeekAPIError
+from .timeouts import Deadline, Timeouts
+
 
 class FileManager:
     """DeepSeek文件管理类"""
 
-    def __init__(self, api_key: str, base_url: str, timeout: int = 30):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        timeout: Union[int, float, Timeouts] = 30,
+        limiter: Optional[AdaptiveLimiter] = None,
+        http_client: Optional[httpx.Client] = None,
+        transport: Optional[httpx.BaseTransport] = None,
+        compression: Optional[str] = None,
+        compression_min_size: int = 1024,
+    ):
         """
         初始化文件管理器
 
         Args:
             api_key: DeepSeek API密钥
             base_url: API基础URL
-            timeout: 请求超时时间（秒）
+            timeout: 请求超时时间（秒），也可以传入分阶段的超时设置
+            limiter: 自适应并发限制器，为None时不限制并发
+            http_client: httpx客户端，例如启用HTTP/2的共享连接池，为None时使用requests的连接池
+            transport: 自定义的httpx传输层，例如录制或回放请求，没有传入http_client时使用
+            compression: 上传文件使用的压缩编码（"zstd"或"gzip"），None表示不压缩
+            compression_min_size: 压缩上传文件的最小字节数
         """
         self.api_key = api_key
         self.base_url = base_url
         self.timeout = timeout
+        self.timeouts = Timeouts.coerce(timeout)
+        self.limiter = limiter
+        self.compression = compression
+        self.compression_min_size = compression_min_size
+        if http_client is None and transport is not None:
+            http_client = httpx.Client(transport=transport)
+        self.http_client = http_client
+        # 没有httpx客户端时使用requests的会话，在请求之间复用连接
+        self.session: Optional[requests.Session] = None
+        if http_client is None:
+            self.session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=100)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
         self.files_endpoint = f"{self.base_url}/v1/files"
         self.headers = {
             "Authorization": f"Bearer {self.api_key}"
@@ -52,50 +88,200 @@ class FileManager:
         if not mime_type:
             mime_type = "application/octet-stream"
 
-        # 打开文件并上传
+        # 打开文件并上传，压缩后重新上传时两次上传共用同一个截止时间
+        deadline = Deadline(self.timeouts.total)
         with open(file_path, "rb") as file:
             # 使用tqdm显示上传进度
             with tqdm(total=file_size, unit="B", unit_scale=True, desc=f"上传 {os.path.basename(file_path)}") as pbar:
                 # 创建一个包装器来跟踪上传进度
-                file_wrapper = self._create_file_wrapper(file, pbar)
-                
-                # 准备上传请求
-                files = {
-                    "file": (os.path.basename(file_path), file_wrapper, mime_type)
-                }
-                data = {
-                    "purpose": purpose
-                }
-                
-                # 发送上传请求
-                response = requests.post(
-                    self.files_endpoint,
-                    headers=self.headers,
-                    files=files,
-                    data=data,
-                    timeout=self.timeout
-                )
+                file_wrapper = self._create_file_wrapper(file, pbar, deadline)
+
+                # 文本、JSON、CSV等可压缩的文件边读取边压缩
+                response = None
+                encoding = choose_encoding(self.compression, file_size, mime_type, self.compression_min_size)
+                if encoding is not None:
+                    response = self._upload_compressed(
+                        file_wrapper, os.path.basename(file_path), mime_type, purpose, encoding, deadline
+                    )
+                    if response.status_code == UNSUPPORTED_MEDIA_TYPE:
+                        # 服务端不接受压缩的请求体，重新上传，之后的上传不再压缩
+                        self.compression = None
+                        file.seek(0)
+                        pbar.reset()
+                        response = None
+
+                if response is None:
+                    # 准备上传请求
+                    files = {
+                        "file": (os.path.basename(file_path), file_wrapper, mime_type)
+                    }
+                    data = {
+                        "purpose": purpose
+                    }
+
+                    # 发送上传请求
+                    response = self._request(
+                        "POST",
+                        self.files_endpoint,
+                        deadline=deadline,
+                        files=files,
+                        data=data
+                    )
                 
                 # 检查响应
                 if response.status_code != 200:
                     error_msg = f"文件上传失败: {response.status_code} - {response.text}"
-                    raise Exception(error_msg)
+                    raise DeepSeekAPIError(error_msg, status_code=response.status_code)
                 
                 # 解析响应获取文件ID
                 response_data = response.json()
                 file_id = response_data.get("id")
                 if not file_id:
-                    raise Exception("上传成功但未返回文件ID")
+                    raise DeepSeekAPIError("上传成功但未返回文件ID", status_code=response.status_code)
                 
                 return file_id
 
-    def _create_file_wrapper(self, file: BinaryIO, progress_bar: tqdm) -> BinaryIO:
+    def _upload_compressed(
+        self,
+        file: BinaryIO,
+        file_name: str,
+        mime_type: str,
+        purpose: str,
+        encoding: str,
+        deadline: Optional[Deadline] = None,
+    ) -> Union[requests.Response, httpx.Response]:
+        """
+        以压缩的multipart请求体上传文件，请求体分块编码发送，文件不会整个读入内存
+
+        Args:
+            file: 文件对象
+            file_name: 文件名
+            mime_type: 文件的MIME类型
+            purpose: 文件用途
+            encoding: 压缩编码
+            deadline: 总截止时间
+
+        Returns:
+            HTTP响应
+        """
+        boundary = uuid.uuid4().hex
+        headers = {
+            **self.headers,
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+            "Content-Encoding": encoding,
+        }
+        body = iter_compressed(self._multipart_chunks(file, file_name, mime_type, purpose, boundary), encoding)
+        # requests以data参数、httpx以content参数接收生成器形式的请求体
+        body_argument = "content" if self.http_client is not None else "data"
+        return self._request(
+            "POST", self.files_endpoint, deadline=deadline, headers=headers, **{body_argument: body}
+        )
+
+    @staticmethod
+    def _multipart_chunks(
+        file: BinaryIO, file_name: str, mime_type: str, purpose: str, boundary: str, chunk_size: int = 64 * 1024
+    ) -> Iterator[bytes]:
+        """
+        逐块生成multipart/form-data请求体
+
+        Args:
+            file: 文件对象
+            file_name: 文件名
+            mime_type: 文件的MIME类型
+            purpose: 文件用途
+            boundary: 分隔符
+            chunk_size: 每次读取文件的字节数
+
+        Yields:
+            请求体的数据块
+        """
+        file_name = file_name.replace("\\", "\\\\").replace('"', "%22")
+        yield (
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="purpose"\r\n\r\n'
+            f"{purpose}\r\n"
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+            f"Content-Type: {mime_type}\r\n\r\n"
+        ).encode("utf-8")
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        yield f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+    def _request(
+        self, method: str, url: str, deadline: Optional[Deadline] = None, **kwargs
+    ) -> Union[requests.Response, httpx.Response]:
+        """
+        发送HTTP请求，启用并发限制时在限制器的槽位内执行
+
+        Args:
+            method: HTTP方法
+            url: 请求URL
+            deadline: 总截止时间，默认从现在开始计算
+            **kwargs: 传递给requests或httpx的其他参数
+
+        Returns:
+            HTTP响应
+
+        Raises:
+            DeadlineExceededError: 排队等待槽位或上传请求体时到达截止时间
+        """
+        kwargs.setdefault("headers", self.headers)
+        deadline = deadline or Deadline(self.timeouts.total)
+
+        def send() -> Union[requests.Response, httpx.Response]:
+            # 连接和读取超时分别设置，并且都不超过总截止时间的剩余时间，在获得槽位后计算
+            if self.http_client is not None:
+                kwargs.setdefault("timeout", self.timeouts.to_httpx(deadline=deadline))
+                return self.http_client.request(method, url, **kwargs)
+            kwargs.setdefault("timeout", self.timeouts.to_requests(deadline))
+            return self.session.request(method, url, **kwargs)
+
+        deadline.check()
+        if self.limiter is None:
+            return send()
+
+        # 上传的耗时取决于文件大小，只根据429/503调整并发数；其他文件请求的响应很小，以响应时间作为延迟
+        upload = method == "POST"
+        with self.limiter.slot("upload" if upload else "files", deadline=deadline) as slot:
+            response = send()
+            if not upload:
+                slot.mark_first_byte()
+            slot.overloaded = response.status_code in OVERLOAD_STATUS_CODES
+            return response
+
+    def ping(self) -> None:
+        """
+        请求开销最低的模型列表接口，用于预热和保持连接，不经过并发限制器
+
+        Raises:
+            DeepSeekAPIError: 请求失败
+        """
+        deadline = Deadline(self.timeouts.total)
+        url = f"{self.base_url.rstrip('/')}/models"
+        if self.http_client is not None:
+            response = self.http_client.get(url, headers=self.headers, timeout=self.timeouts.to_httpx(deadline=deadline))
+        else:
+            response = self.session.get(url, headers=self.headers, timeout=self.timeouts.to_requests(deadline))
+        if response.status_code >= 400:
+            raise DeepSeekAPIError(f"探测请求失败: {response.text}", status_code=response.status_code)
+
+    def _create_file_wrapper(
+        self, file: BinaryIO, progress_bar: tqdm, deadline: Optional[Deadline] = None
+    ) -> BinaryIO:
         """
         创建一个文件包装器来跟踪上传进度
 
+        连接和读取超时只限制单次网络操作，数据缓慢发出的上传可以远远超过总超时时间；
+        每次读取文件前检查截止时间，上传的总耗时不超过total_timeout。
+
         Args:
             file: 原始文件对象
             progress_bar: 进度条对象
+            deadline: 总截止时间，到达后读取文件抛出DeadlineExceededError
 
         Returns:
             包装后的文件对象
@@ -112,6 +298,8 @@ class FileManager:
                 self.bytes_read = 0
                 
             def read(self, size=-1):
+                if deadline is not None:
+                    deadline.check()
                 data = self.file.read(size)
                 self.bytes_read += len(data)
                 self.progress_bar.update(len(data))
@@ -129,15 +317,11 @@ class FileManager:
         Returns:
             文件列表
         """
-        response = requests.get(
-            self.files_endpoint,
-            headers=self.headers,
-            timeout=self.timeout
-        )
+        response = self._request("GET", self.files_endpoint)
         
         if response.status_code != 200:
             error_msg = f"获取文件列表失败: {response.status_code} - {response.text}"
-            raise Exception(error_msg)
+            raise DeepSeekAPIError(error_msg, status_code=response.status_code)
         
         response_data = response.json()
         return response_data.get("data", [])
@@ -152,15 +336,11 @@ class FileManager:
         Returns:
             文件信息
         """
-        response = requests.get(
-            f"{self.files_endpoint}/{file_id}",
-            headers=self.headers,
-            timeout=self.timeout
-        )
+        response = self._request("GET", f"{self.files_endpoint}/{file_id}")
         
         if response.status_code != 200:
             error_msg = f"获取文件信息失败: {response.status_code} - {response.text}"
-            raise Exception(error_msg)
+            raise DeepSeekAPIError(error_msg, status_code=response.status_code)
         
         return response.json()
 
@@ -174,14 +354,10 @@ class FileManager:
         Returns:
             是否删除成功
         """
-        response = requests.delete(
-            f"{self.files_endpoint}/{file_id}",
-            headers=self.headers,
-            timeout=self.timeout
-        )
+        response = self._request("DELETE", f"{self.files_endpoint}/{file_id}")
         
         if response.status_code != 200:
             error_msg = f"删除文件失败: {response.status_code} - {response.text}"
-            raise Exception(error_msg)
+            raise DeepSeekAPIError(error_msg, status_code=response.status_code)
         
         return True 
\ No newline at end of file
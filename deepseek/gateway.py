@@ -0,0 +1,729 @@
+"""
+DeepSeek 本地网关
+~~~~~~~~~~~~~~
+
+基于aiohttp的OpenAI兼容网关，提供 ``/v1/chat/completions`` 和 ``/v1/files`` 接口。
+多个服务通过网关共享同一个客户端的连接池、并发限制和配额，网关负责响应缓存、相同请求合并、
+按调用方限流以及按会话保存对话历史。
+
+请求头带有 ``X-Session-Id`` 时，网关保存该会话的历史消息，调用方每次只需发送新的消息；会话按租户隔离，
+不同租户使用相同的会话ID不会读到彼此的历史。
+客户端启用用量账本时，用量按 ``X-Tenant-Id`` 请求头记录到对应的租户，超出预算的租户收到429响应。
+"""
+
+import argparse
+import asyncio
+import contextvars
+import functools
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Callable, Tuple, Union
+
+from aiohttp import web
+
+from .client import DeepSeekClient
+from .conversation import Conversation
+from .exceptions import BudgetExceededError, DeepSeekError, DeadlineExceededError, get_status_code
+from .ledger import current_scope, usage_scope
+from .raw import dumps, loads
+from .response import ChatResult
+from .singleflight import SingleFlight, request_key
+from .timeouts import CancelToken
+
+# 流式响应在线程和事件循环之间传递的事件类型
+_ITEM = "item"
+_DONE = "done"
+_ERROR = "error"
+
+
+def completion_payload(
+    result: Union[ChatResult, List[ChatResult]], model: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    将对话结果转换为OpenAI兼容的响应格式
+
+    Args:
+        result: 对话结果，n > 1的请求为按index排序的结果列表，总用量记录在第一个结果中
+        model: 请求中的模型名称，结果中没有模型时使用
+
+    Returns:
+        chat.completion格式的响应
+    """
+    results = result if isinstance(result, list) else [result]
+    choices = []
+    for index, choice in enumerate(results):
+        # 只有工具调用、没有文本的回答与OpenAI一样返回null
+        message: Dict[str, Any] = {
+            "role": "assistant",
+            "content": choice.content if choice.content or not choice.tool_calls else None,
+        }
+        if choice.reasoning_content:
+            message["reasoning_content"] = choice.reasoning_content
+        if choice.tool_calls:
+            message["tool_calls"] = choice.tool_calls
+        finish_reason = choice.finish_reason or ("tool_calls" if choice.tool_calls else None)
+        choices.append({"index": index, "message": message, "finish_reason": finish_reason})
+
+    payload = {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": results[0].model or model,
+        "choices": choices,
+    }
+    if results[0].usage is not None:
+        payload["usage"] = results[0].usage.to_api()
+    return payload
+
+
+def json_response(payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> web.Response:
+    """
+    构造JSON响应，安装了orjson时使用orjson编码
+
+    Args:
+        payload: 响应内容
+        status: HTTP状态码
+        headers: 额外的响应头
+
+    Returns:
+        aiohttp响应
+    """
+    return web.Response(body=dumps(payload), status=status, headers=headers, content_type="application/json")
+
+
+def error_response(error: BaseException) -> web.Response:
+    """
+    将异常转换为OpenAI兼容的错误响应
+
+    上游返回的状态码原样透传，网络错误返回502，超过截止时间返回504，超出预算返回429。
+
+    Args:
+        error: 异常对象
+
+    Returns:
+        错误响应
+    """
+    if isinstance(error, BudgetExceededError):
+        return json_response({"error": {"message": str(error), "type": "insufficient_quota"}}, status=429)
+    if isinstance(error, DeadlineExceededError):
+        status = 504
+    else:
+        status = get_status_code(error) or 502
+    return json_response({"error": {"message": str(error), "type": "upstream_error"}}, status=status)
+
+
+class ResponseCache:
+    """带过期时间的LRU响应缓存，只在事件循环线程中使用"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0):
+        """
+        初始化响应缓存
+
+        Args:
+            max_size: 最多缓存的响应数
+            ttl: 缓存的有效时间（秒）
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查找缓存的响应
+
+        Args:
+            key: 请求键
+
+        Returns:
+            缓存的响应，不存在或已过期时返回None
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        缓存响应，超出容量时淘汰最久未使用的响应
+
+        Args:
+            key: 请求键
+            value: 响应
+        """
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def metrics(self) -> Dict[str, int]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            包含缓存条目数、命中数和未命中数的字典
+        """
+        return {"size": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+
+class RateLimiter:
+    """按调用方的令牌桶限流，只在事件循环线程中使用"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, max_callers: int = 10000):
+        """
+        初始化限流器
+
+        Args:
+            rate: 每个调用方每秒允许的请求数
+            burst: 允许的突发请求数，默认等于rate
+            max_callers: 最多记录的调用方数量，超出时淘汰最久未访问的调用方
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.max_callers = max_callers
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.rejected = 0
+
+    def acquire(self, caller: str) -> float:
+        """
+        尝试为调用方消耗一个令牌
+
+        Args:
+            caller: 调用方标识
+
+        Returns:
+            允许时返回0，否则返回建议的重试等待时间（秒）
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(caller)
+        if bucket is None:
+            bucket = self._buckets[caller] = [self.burst, now]
+            while len(self._buckets) > self.max_callers:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(caller)
+            bucket[0] = min(bucket[0] + (now - bucket[1]) * self.rate, self.burst)
+            bucket[1] = now
+
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        self.rejected += 1
+        return (1.0 - bucket[0]) / self.rate
+
+
+class _Session:
+    """一个会话的对话历史，同一会话的请求依次执行"""
+
+    __slots__ = ("conversation", "lock", "last_access")
+
+    def __init__(self):
+        self.conversation = Conversation()
+        self.lock = asyncio.Lock()
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """按(租户, 会话ID)保存对话历史，闲置超时或超出容量的会话会被淘汰"""
+
+    def __init__(self, ttl: float = 3600.0, max_sessions: int = 10000):
+        """
+        初始化会话存储
+
+        Args:
+            ttl: 会话闲置多久后过期（秒）
+            max_sessions: 最多保存的会话数
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[Tuple[str, str], _Session]" = OrderedDict()
+
+    def get(self, tenant: str, session_id: str) -> _Session:
+        """
+        获取会话，不存在或已过期时创建新会话
+
+        Args:
+            tenant: 租户
+            session_id: 会话ID
+
+        Returns:
+            会话
+        """
+        key = (tenant, session_id)
+        now = time.monotonic()
+        session = self._sessions.get(key)
+        if session is None or now - session.last_access > self.ttl:
+            session = self._sessions[key] = _Session()
+        session.last_access = now
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def delete(self, tenant: str, session_id: str) -> bool:
+        """
+        删除会话
+
+        Args:
+            tenant: 租户
+            session_id: 会话ID
+
+        Returns:
+            会话是否存在
+        """
+        return self._sessions.pop((tenant, session_id), None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class Gateway:
+    """OpenAI兼容的本地网关"""
+
+    def __init__(
+        self,
+        client: Optional[DeepSeekClient] = None,
+        cache_size: int = 1024,
+        cache_ttl: float = 300.0,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        session_ttl: float = 3600.0,
+        max_workers: int = 64,
+    ):
+        """
+        初始化网关
+
+        Args:
+            client: 所有请求共享的DeepSeekClient实例，默认根据环境变量创建
+            cache_size: 最多缓存的响应数，为0时不缓存
+            cache_ttl: 缓存的有效时间（秒）
+            rate: 每个调用方每秒允许的请求数，为None时不限流
+            burst: 每个调用方允许的突发请求数
+            session_ttl: 会话闲置多久后过期（秒）
+            max_workers: 执行阻塞调用的最大线程数，也是同时进行的最大流式请求数
+        """
+        self.client = client or DeepSeekClient()
+        self.cache = ResponseCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self.rate_limiter = RateLimiter(rate, burst) if rate else None
+        self.sessions = SessionStore(session_ttl)
+        self.single_flight = SingleFlight()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="deepseek-gateway")
+
+    def create_app(self) -> web.Application:
+        """
+        创建aiohttp应用
+
+        Returns:
+            aiohttp应用
+        """
+        app = web.Application(middlewares=[self._middleware])
+        app.add_routes([
+            web.post("/v1/chat/completions", self._chat_completions),
+            web.post("/v1/files", self._upload_file),
+            web.get("/v1/files", self._list_files),
+            web.get("/v1/files/{file_id}", self._get_file),
+            web.delete("/v1/files/{file_id}", self._delete_file),
+            web.delete("/v1/sessions/{session_id}", self._delete_session),
+            web.get("/metrics", self._metrics),
+        ])
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    def run(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        """
+        启动网关并阻塞运行
+
+        Args:
+            host: 监听地址
+            port: 监听端口
+        """
+        web.run_app(self.create_app(), host=host, port=port)
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler: Callable) -> web.StreamResponse:
+        """按调用方限流，设置用量所属的租户，并将上游错误转换为OpenAI兼容的错误响应"""
+        if self.rate_limiter is not None and request.path.startswith("/v1/"):
+            caller = request.headers.get("Authorization") or request.remote or ""
+            retry_after = self.rate_limiter.acquire(caller)
+            if retry_after:
+                return json_response(
+                    {"error": {"message": "请求过于频繁", "type": "rate_limit_exceeded"}},
+                    status=429,
+                    headers={"Retry-After": str(max(int(retry_after + 0.999), 1))},
+                )
+        try:
+            # 阻塞调用通过_executor_call在线程池中执行时带上当前上下文，用量记入请求头指定的租户
+            with usage_scope(request.headers.get("X-Tenant-Id"), request.headers.get("X-Session-Id")):
+                return await handler(request)
+        except DeepSeekError as e:
+            return error_response(e)
+
+    async def _run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        在网关的线程池中执行阻塞调用
+
+        Args:
+            fn: 阻塞函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            函数返回值
+        """
+        return await self._executor_call(functools.partial(fn, *args, **kwargs))
+
+    def _executor_call(self, fn: Callable) -> "asyncio.Future":
+        """
+        在网关的线程池中执行函数，并传递当前的上下文变量
+
+        Args:
+            fn: 无参数的阻塞函数
+
+        Returns:
+            函数返回值的Future
+        """
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.executor, contextvars.copy_context().run, fn)
+
+    async def _chat_completions(self, request: web.Request) -> web.StreamResponse:
+        """处理对话补全请求"""
+        try:
+            body = loads(await request.read())
+        except ValueError:
+            return json_response({"error": {"message": "请求体不是有效的JSON"}}, status=400)
+
+        messages = body.pop("messages", None) if isinstance(body, dict) else None
+        if not isinstance(messages, list) or not messages:
+            return json_response({"error": {"message": "messages必须是非空列表"}}, status=400)
+
+        stream = bool(body.pop("stream", False))
+        if not stream:
+            body.pop("stream_options", None)
+        params = body
+
+        n = params.get("n")
+        if n is None:
+            n = 1
+        elif isinstance(n, bool) or not isinstance(n, int) or n < 1:
+            return json_response({"error": {"message": "n必须是正整数"}}, status=400)
+
+        session_id = request.headers.get("X-Session-Id")
+        if session_id:
+            if n > 1:
+                return json_response({"error": {"message": "会话请求不支持n大于1"}}, status=400)
+            return await self._session_chat(request, session_id, messages, params, stream)
+
+        if stream:
+            return await self._stream(request, messages, params)
+
+        use_cache = (
+            self.cache is not None
+            and params.get("temperature") == 0
+            and "no-cache" not in request.headers.get("Cache-Control", "")
+        )
+        return await self._complete(messages, params, use_cache)
+
+    async def _complete(
+        self, messages: List[Dict[str, Any]], params: Dict[str, Any], use_cache: bool = False
+    ) -> web.Response:
+        """
+        执行非流式请求，相同的并发请求只调用一次上游
+
+        只缓存temperature为0的请求，其他请求的回答本身就是随机的。缓存和请求合并都按租户隔离：
+        每个租户的用量单独记账，超出软预算的租户的请求会被降级，不能复用其他租户的结果；
+        超出硬预算的租户在查找缓存之前就被拒绝。
+
+        Args:
+            messages: 消息列表
+            params: API参数
+            use_cache: 是否使用响应缓存
+
+        Returns:
+            响应
+        """
+        tenant = current_scope()[0] or self.client.config.tenant
+        if self.client.ledger is not None:
+            self.client.ledger.check(tenant)
+
+        key = request_key(messages, params, scope=tenant)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return json_response(cached, headers={"X-Cache": "HIT"})
+
+        n = params.pop("n", None) or 1
+        if n > 1:
+            call = functools.partial(self.client.complete_choices, messages, n, **params)
+        else:
+            call = functools.partial(self.client.complete, messages, **params)
+        result = await self.single_flight.do_async(key, lambda: self._executor_call(call))
+
+        payload = completion_payload(result, params.get("model"))
+        if use_cache:
+            self.cache.set(key, payload)
+        return json_response(payload, headers={"X-Cache": "MISS"} if use_cache else None)
+
+    async def _stream(
+        self,
+        request: web.Request,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        on_done: Optional[Callable[[ChatResult], Any]] = None,
+    ) -> web.StreamResponse:
+        """
+        执行流式请求，将上游的SSE事件帧原样写给调用方
+
+        阻塞的流式读取在线程池中进行；调用方断开连接时立即取消上游请求。
+
+        Args:
+            request: aiohttp请求
+            messages: 消息列表
+            params: API参数
+            on_done: 流式响应成功结束后以对话结果调用的回调
+
+        Returns:
+            响应
+        """
+        loop = asyncio.get_running_loop()
+        events: "asyncio.Queue" = asyncio.Queue()
+        token = CancelToken()
+
+        def _pump() -> None:
+            def emit(kind: str, value: Any) -> None:
+                loop.call_soon_threadsafe(events.put_nowait, (kind, value))
+
+            try:
+                frames = self.client.complete_passthrough(messages, cancel_token=token, **params)
+                while True:
+                    try:
+                        frame = next(frames)
+                    except StopIteration as stop:
+                        emit(_DONE, stop.value)
+                        return
+                    emit(_ITEM, frame)
+            except BaseException as e:
+                emit(_ERROR, e)
+
+        self._executor_call(_pump)
+
+        finished = False
+        try:
+            # 收到第一个事件前出错时，还可以返回正常的HTTP错误状态码
+            kind, value = await events.get()
+            if kind == _ERROR:
+                return error_response(value)
+
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+            await response.prepare(request)
+            while kind == _ITEM:
+                await response.write(value)
+                kind, value = await events.get()
+
+            if kind == _ERROR:
+                # 事件流已经开始，只能以SSE事件通知调用方
+                await response.write(b"data: " + dumps({"error": {"message": str(value)}}) + b"\n\n")
+            else:
+                finished = True
+                if on_done is not None:
+                    on_done(value)
+            await response.write_eof()
+        finally:
+            if not finished:
+                token.cancel()
+        return response
+
+    async def _session_chat(
+        self,
+        request: web.Request,
+        session_id: str,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        stream: bool,
+    ) -> web.StreamResponse:
+        """
+        在会话中执行请求：新消息追加到会话历史后以完整历史调用上游，成功后记录回答
+
+        同一会话的请求依次执行；调用失败时会话历史恢复到请求之前的状态。
+
+        Args:
+            request: aiohttp请求
+            session_id: 会话ID
+            messages: 本次请求的新消息
+            params: API参数
+            stream: 是否使用流式响应
+
+        Returns:
+            响应
+        """
+        # 会话ID由调用方提供，按租户隔离，避免猜到或重复使用ID的调用方读写其他租户的历史
+        tenant = current_scope()[0] or self.client.config.tenant
+        session = self.sessions.get(tenant, session_id)
+        async with session.lock:
+            # 在分支上追加本次的消息，请求成功后才替换会话的对话历史
+            conversation = session.conversation.fork()
+            for message in messages:
+                if message.get("role") == "system":
+                    conversation.add_system_message(message.get("content", ""))
+                else:
+                    conversation.add_message(dict(message))
+            history = [dict(m) for m in conversation.get_messages()]
+
+            completed: List[ChatResult] = []
+            try:
+                if stream:
+                    response = await self._stream(request, history, params, completed.append)
+                else:
+                    result = await self._run(self.client.complete, history, **params)
+                    completed.append(result)
+                    response = json_response(completion_payload(result, params.get("model")))
+            finally:
+                if completed:
+                    conversation.add_assistant_message(completed[0].content)
+                    session.conversation = conversation
+            return response
+
+    async def _upload_file(self, request: web.Request) -> web.Response:
+        """处理文件上传，先将上传内容写入临时文件再转发给上游"""
+        reader = await request.multipart()
+        purpose = "assistants"
+        path = filename = None
+        size = 0
+
+        directory = tempfile.mkdtemp(prefix="deepseek-gateway-")
+        try:
+            while True:
+                part = await reader.next()
+                if part is None:
+                    break
+                if part.name == "purpose":
+                    purpose = await part.text()
+                elif part.name == "file":
+                    filename = os.path.basename(part.filename or "upload")
+                    path = os.path.join(directory, filename)
+                    with open(path, "wb") as f:
+                        while True:
+                            chunk = await part.read_chunk()
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                            size += len(chunk)
+
+            if path is None:
+                return json_response({"error": {"message": "缺少file字段"}}, status=400)
+
+            file_id = await self._run(self.client.upload_file, path, purpose)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        return json_response({
+            "id": file_id,
+            "object": "file",
+            "bytes": size,
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+        })
+
+    async def _list_files(self, request: web.Request) -> web.Response:
+        """列出上传的文件"""
+        files = await self._run(self.client.list_files)
+        return json_response({"object": "list", "data": files})
+
+    async def _get_file(self, request: web.Request) -> web.Response:
+        """获取文件信息"""
+        return json_response(await self._run(self.client.get_file, request.match_info["file_id"]))
+
+    async def _delete_file(self, request: web.Request) -> web.Response:
+        """删除文件"""
+        file_id = request.match_info["file_id"]
+        deleted = await self._run(self.client.delete_file, file_id)
+        return json_response({"id": file_id, "object": "file", "deleted": deleted})
+
+    async def _delete_session(self, request: web.Request) -> web.Response:
+        """删除当前租户的会话及其对话历史"""
+        tenant = current_scope()[0] or self.client.config.tenant
+        deleted = self.sessions.delete(tenant, request.match_info["session_id"])
+        return json_response({"deleted": deleted})
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        """返回网关和共享客户端的运行指标"""
+        metrics = {
+            "sessions": len(self.sessions),
+            "single_flight": self.single_flight.metrics(),
+        }
+        if self.cache is not None:
+            metrics["cache"] = self.cache.metrics()
+        if self.rate_limiter is not None:
+            metrics["rate_limited"] = self.rate_limiter.rejected
+        if self.client.limiter is not None:
+            metrics["limiter"] = self.client.limiter.metrics()
+        if self.client.pool is not None:
+            metrics["endpoints"] = self.client.pool.metrics()
+        if self.client.ledger is not None:
+            metrics["usage"] = self.client.ledger.all_totals()
+        return json_response(metrics)
+
+    async def _on_cleanup(self, app: web.Application) -> None:
+        """关闭线程池和共享的客户端：写入剩余的用量记录，停止健康检查和连接保活并关闭连接池"""
+        self.executor.shutdown(wait=False)
+        await asyncio.get_running_loop().run_in_executor(None, self.client.close)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    网关命令行入口
+
+    Args:
+        argv: 命令行参数，默认读取sys.argv
+    """
+    parser = argparse.ArgumentParser(
+        prog="deepseek-gateway",
+        description="OpenAI兼容的DeepSeek本地网关，多个服务共享连接池和配额",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8080, help="监听端口")
+    parser.add_argument("--cache-size", type=int, default=1024, help="最多缓存的响应数，为0时不缓存")
+    parser.add_argument("--cache-ttl", type=float, default=300.0, help="缓存的有效时间（秒）")
+    parser.add_argument("--rate", type=float, help="每个调用方每秒允许的请求数，缺省时不限流")
+    parser.add_argument("--burst", type=float, help="每个调用方允许的突发请求数")
+    parser.add_argument("--session-ttl", type=float, default=3600.0, help="会话闲置多久后过期（秒）")
+    parser.add_argument("--workers", type=int, default=64, help="最大线程数，也是同时进行的最大流式请求数")
+    parser.add_argument("--adaptive", action="store_true", help="根据延迟和429/503响应自动调整上游并发数")
+    parser.add_argument("--http2", action="store_true", help="使用HTTP/2连接上游")
+    parser.add_argument("--raw", action="store_true", help="绕过OpenAI SDK直接解析上游响应")
+    parser.add_argument("--warmup", type=int, default=0, help="启动前预热的上游连接数，为0时不预热")
+    parser.add_argument("--keepalive", type=float, help="预热之后探测上游连接的间隔（秒）")
+    args = parser.parse_args(argv)
+
+    client = DeepSeekClient(
+        adaptive_concurrency=args.adaptive or None,
+        http2=args.http2 or None,
+        raw_mode=args.raw or None,
+    )
+    if args.warmup > 0:
+        client.warmup(connections=args.warmup, keepalive_interval=args.keepalive)
+    gateway = Gateway(
+        client,
+        cache_size=args.cache_size,
+        cache_ttl=args.cache_ttl,
+        rate=args.rate,
+        burst=args.burst,
+        session_ttl=args.session_ttl,
+        max_workers=args.workers,
+    )
+    gateway.run(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+DeepSeek 对冲请求
+~~~~~~~~~~~~~~
+
+降低交互式对话的尾延迟：如果在最近首token延迟（TTFT）的某个分位数内还没有收到首个token，
+就再发送一个相同的请求，使用先返回的那个并取消另一个。对冲请求受预算限制，
+额外负载不会超过设定的比例。
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, List, Callable, Generator
+
+from .timeouts import CancelToken
+
+# 请求执行过程中产生的事件类型
+_ITEM = "item"
+_DONE = "done"
+_ERROR = "error"
+
+
+class HedgePolicy:
+    """对冲策略，记录最近的首token延迟并控制对冲预算"""
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        budget_ratio: float = 0.05,
+        min_samples: int = 20,
+        min_delay: float = 0.05,
+        default_delay: float = 2.0,
+        window: int = 500,
+    ):
+        """
+        初始化对冲策略
+
+        Args:
+            percentile: 使用最近首token延迟的哪个分位数作为对冲等待时间
+            budget_ratio: 对冲请求占全部请求的最大比例
+            min_samples: 样本数不足时使用default_delay作为等待时间
+            min_delay: 对冲等待时间的下限（秒）
+            default_delay: 样本不足时的对冲等待时间（秒）
+            window: 统计首token延迟所使用的最近样本数
+        """
+        if not 0 < percentile < 1:
+            raise ValueError("percentile必须在0和1之间")
+
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+
+        self._samples = deque(maxlen=window)
+        # 每个请求为预算增加budget_ratio，每次对冲消耗1
+        self._budget = 0.0
+        self._max_budget = max(budget_ratio * window, 1.0)
+        self._requests = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """
+        获取当前的对冲等待时间
+
+        Returns:
+            等待时间（秒）
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default_delay
+            samples = sorted(self._samples)
+        index = min(int(len(samples) * self.percentile), len(samples) - 1)
+        return max(samples[index], self.min_delay)
+
+    def record_request(self) -> None:
+        """记录一个新请求，并为对冲预算充值"""
+        with self._lock:
+            self._requests += 1
+            self._budget = min(self._budget + self.budget_ratio, self._max_budget)
+
+    def try_hedge(self) -> bool:
+        """
+        尝试消耗一次对冲预算
+
+        Returns:
+            预算充足时返回True
+        """
+        with self._lock:
+            if self._budget < 1.0:
+                return False
+            self._budget -= 1.0
+            self._hedges += 1
+            return True
+
+    def record_ttft(self, seconds: float, hedged_win: bool = False) -> None:
+        """
+        记录一次首token延迟
+
+        Args:
+            seconds: 首token延迟（秒）
+            hedged_win: 是否由对冲请求胜出
+        """
+        with self._lock:
+            self._samples.append(seconds)
+            if hedged_win:
+                self._hedge_wins += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        获取对冲统计信息
+
+        Returns:
+            包含请求数、对冲数、对冲胜出数和当前等待时间的字典
+        """
+        delay = self.delay()
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "hedges": self._hedges,
+                "hedge_wins": self._hedge_wins,
+                "hedge_ratio": self._hedges / self._requests if self._requests else 0.0,
+                "delay": delay,
+            }
+
+
+class _Attempt:
+    """一次实际发出的请求，在后台线程中读取并缓冲输出"""
+
+    def __init__(
+        self,
+        index: int,
+        start: Callable[[CancelToken], Generator[Any, None, Any]],
+        events: "queue.Queue",
+    ):
+        self.index = index
+        self.token = CancelToken()
+        self.items: "queue.Queue" = queue.Queue()
+        self.started_at = time.monotonic()
+        self.ttft: Optional[float] = None
+        self.error: Optional[BaseException] = None
+        self._start = start
+        self._events = events
+        threading.Thread(target=self._run, name=f"deepseek-hedge-{index}", daemon=True).start()
+
+    def _run(self) -> None:
+        first = True
+        try:
+            generator = self._start(self.token)
+            while True:
+                try:
+                    item = next(generator)
+                except StopIteration as stop:
+                    self.items.put((_DONE, stop.value))
+                    if first:
+                        self.ttft = time.monotonic() - self.started_at
+                        self._events.put((self, _DONE))
+                    return
+                self.items.put((_ITEM, item))
+                if first:
+                    first = False
+                    self.ttft = time.monotonic() - self.started_at
+                    self._events.put((self, _ITEM))
+        except BaseException as e:
+            self.error = e
+            self.items.put((_ERROR, e))
+            if first:
+                self._events.put((self, _ERROR))
+
+
+def hedged_stream(
+    start: Callable[[CancelToken], Generator[Any, None, Any]],
+    policy: HedgePolicy,
+    cancel_token: Optional[CancelToken] = None,
+) -> Generator[Any, None, Any]:
+    """
+    以对冲方式执行流式调用
+
+    Args:
+        start: 接收取消令牌并返回生成器的函数，每次调用发出一个实际请求
+        policy: 对冲策略
+        cancel_token: 调用方的取消令牌，取消时会取消所有实际请求
+
+    Yields:
+        胜出请求的数据块
+
+    Returns:
+        胜出请求的生成器返回值
+    """
+    events: "queue.Queue" = queue.Queue()
+    attempts: List[_Attempt] = [_Attempt(0, start, events)]
+    policy.record_request()
+
+    def _cancel_all() -> None:
+        for attempt in attempts:
+            attempt.token.cancel()
+
+    if cancel_token is not None:
+        cancel_token.add_callback(_cancel_all)
+
+    finished = False
+    try:
+        delay = policy.delay()
+        hedge_considered = False
+        failed: List[_Attempt] = []
+        winner: Optional[_Attempt] = None
+
+        while winner is None:
+            timeout = None
+            if not hedge_considered:
+                timeout = max(delay - (time.monotonic() - attempts[0].started_at), 0.0)
+            try:
+                attempt, kind = events.get(timeout=timeout)
+            except queue.Empty:
+                # 等待时间内还没有首个token，在预算允许时发出对冲请求
+                hedge_considered = True
+                if policy.try_hedge():
+                    attempts.append(_Attempt(len(attempts), start, events))
+                continue
+
+            if kind != _ERROR:
+                winner = attempt
+                continue
+
+            failed.append(attempt)
+            # 所有已发出的请求都失败了才报错；只有一个请求时不再等待对冲
+            if len(failed) == len(attempts):
+                raise attempt.error
+
+        # 取消落后的请求，释放其连接
+        for attempt in attempts:
+            if attempt is not winner:
+                attempt.token.cancel()
+        policy.record_ttft(winner.ttft, hedged_win=winner.index > 0)
+
+        while True:
+            kind, value = winner.items.get()
+            # 胜出请求可能已经把剩余内容读入缓冲，取消后不再继续返回
+            if cancel_token is not None:
+                cancel_token.check()
+            if kind == _ITEM:
+                yield value
+            elif kind == _DONE:
+                finished = True
+                return value
+            else:
+                raise value
+    finally:
+        if cancel_token is not None:
+            cancel_token.remove_callback(_cancel_all)
+        if not finished:
+            _cancel_all()
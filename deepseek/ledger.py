@@ -0,0 +1,548 @@
+"""
+DeepSeek 用量账本
+~~~~~~~~~~~~~~
+
+按租户和会话记录每次调用的token用量和费用，并在发送请求前检查租户的预算。
+
+记录在调用线程中只更新内存中的累计值并放入队列，由后台线程批量写入本地sqlite，
+数据库写入不会增加请求的延迟。租户超过软预算时请求被降级（换用更便宜的模型或限制max_tokens），
+超过硬预算时在发送前拒绝并抛出BudgetExceededError。
+
+调用的租户和会话通过 ``usage_scope`` 设置，未设置时使用客户端的默认租户::
+
+    with usage_scope(tenant="team-a", session="job-42"):
+        client.chat("你好")
+"""
+
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import closing, contextmanager
+from typing import Dict, Any, Optional, List, Iterator, Tuple
+
+from .exceptions import BudgetExceededError
+from .response import Usage
+
+logger = logging.getLogger(__name__)
+
+# 每百万token的价格（美元）：(输入命中缓存, 输入未命中缓存, 输出)，价格调整时通过prices参数覆盖
+DEFAULT_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "deepseek-chat": (0.028, 0.28, 0.42),
+    "deepseek-reasoner": (0.028, 0.28, 0.42),
+}
+
+# 尚未关闭的持久化账本，进程退出时写入剩余的记录
+_open_ledgers: "weakref.WeakSet" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_ledgers() -> None:
+    for ledger in list(_open_ledgers):
+        ledger.close()
+
+
+_scope: contextvars.ContextVar = contextvars.ContextVar("deepseek_usage_scope", default=(None, None))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    ts REAL NOT NULL,
+    tenant TEXT NOT NULL,
+    session TEXT,
+    model TEXT,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    reasoning_tokens INTEGER NOT NULL,
+    cache_hit_tokens INTEGER NOT NULL,
+    cache_miss_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS usage_tenant_ts ON usage (tenant, ts);
+"""
+
+# 后台线程等待队列超时时的占位值
+_IDLE = object()
+
+_SUMS = (
+    "COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), SUM(reasoning_tokens), "
+    "SUM(cache_hit_tokens), SUM(cache_miss_tokens), SUM(cost)"
+)
+
+
+@contextmanager
+def usage_scope(tenant: Optional[str] = None, session: Optional[str] = None) -> Iterator[None]:
+    """
+    设置当前上下文中调用所属的租户和会话
+
+    在asyncio任务中设置时只影响该任务；在线程池中执行的调用需要用contextvars.copy_context()传递。
+
+    Args:
+        tenant: 租户，为None时使用客户端的默认租户
+        session: 会话
+    """
+    token = _scope.set((tenant, session))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> Tuple[Optional[str], Optional[str]]:
+    """
+    获取当前上下文的租户和会话
+
+    Returns:
+        (租户, 会话)，未设置的项为None
+    """
+    return _scope.get()
+
+
+class Budget:
+    """租户的预算"""
+
+    __slots__ = ("limit", "soft_limit", "metric", "downgrade_model", "max_tokens")
+
+    def __init__(
+        self,
+        limit: Optional[float] = None,
+        soft_limit: Optional[float] = None,
+        metric: str = "tokens",
+        downgrade_model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+    ):
+        """
+        初始化预算
+
+        Args:
+            limit: 硬预算，累计用量达到后拒绝请求，None表示不限制
+            soft_limit: 软预算，累计用量达到后降级请求，None表示不降级
+            metric: 预算的计量方式，"tokens"为总token数，"cost"为费用（美元）
+            downgrade_model: 降级时换用的模型
+            max_tokens: 降级时max_tokens的上限
+        """
+        if metric not in ("tokens", "cost"):
+            raise ValueError("metric必须是'tokens'或'cost'")
+        self.limit = limit
+        self.soft_limit = soft_limit
+        self.metric = metric
+        self.downgrade_model = downgrade_model
+        self.max_tokens = max_tokens
+
+    def __repr__(self) -> str:
+        return f"Budget(limit={self.limit!r}, soft_limit={self.soft_limit!r}, metric={self.metric!r})"
+
+
+class TenantTotals:
+    """租户的累计用量"""
+
+    __slots__ = ("calls", "usage", "cost")
+
+    def __init__(self, calls: int = 0, usage: Optional[Usage] = None, cost: float = 0.0):
+        """
+        初始化累计用量
+
+        Args:
+            calls: 调用次数
+            usage: 累计的token用量
+            cost: 累计费用（美元）
+        """
+        self.calls = calls
+        self.usage = usage or Usage()
+        self.cost = cost
+
+    def spent(self, metric: str) -> float:
+        """
+        按预算的计量方式获取已用量
+
+        Args:
+            metric: "tokens"或"cost"
+
+        Returns:
+            已用的token数或费用
+        """
+        return self.cost if metric == "cost" else self.usage.total_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为字典
+
+        Returns:
+            调用次数、各类token数和费用
+        """
+        return {"calls": self.calls, **self.usage.to_dict(), "cost": round(self.cost, 6)}
+
+    def __repr__(self) -> str:
+        return f"TenantTotals({self.to_dict()})"
+
+
+def _usage_from_row(row: Tuple[Any, ...]) -> Tuple[int, Usage, float]:
+    calls, prompt, completion, reasoning, hit, miss, cost = (value or 0 for value in row)
+    return calls, Usage(prompt, completion, prompt + completion, reasoning, hit, miss), float(cost)
+
+
+class UsageLedger:
+    """用量账本，线程安全"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        prices: Optional[Dict[str, Tuple[float, float, float]]] = None,
+        since: Optional[float] = None,
+        flush_interval: float = 1.0,
+        batch_size: int = 512,
+        max_pending: int = 100000,
+    ):
+        """
+        初始化账本
+
+        Args:
+            path: sqlite数据库路径，为None时只在内存中累计，不持久化
+            prices: 每百万token的价格表，键为模型名称，值为(输入命中缓存, 输入未命中缓存, 输出)
+            since: 从数据库恢复累计值时只统计该时间戳之后的记录，例如本月开始的时间；None表示全部记录
+            flush_interval: 后台线程两次写入之间的最长间隔（秒）
+            batch_size: 单次写入的最大记录数
+            max_pending: 写入失败时最多保留等待重试的记录数，超出时丢弃最早的记录
+        """
+        self.path = path
+        self.prices = {**DEFAULT_PRICES, **(prices or {})}
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        # 写入失败的次数、最近一次的错误以及等待重试的记录数
+        self.write_errors = 0
+        self.last_error: Optional[BaseException] = None
+        self._backlog = 0
+        self._totals: Dict[str, TenantTotals] = {}
+        self._budgets: Dict[str, Budget] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+
+        if path is not None:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            with closing(self._connect()) as connection:
+                connection.executescript(_SCHEMA)
+                rows = connection.execute(
+                    f"SELECT tenant, {_SUMS} FROM usage WHERE ts >= ? GROUP BY tenant", (since or 0,)
+                ).fetchall()
+            for tenant, *sums in rows:
+                self._totals[tenant] = TenantTotals(*_usage_from_row(sums))
+            # 后台写入线程是守护线程，没有调用close时由进程退出前的钩子写入剩余的记录
+            _open_ledgers.add(self)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        # WAL模式下读取统计时不会阻塞后台写入
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def cost(self, usage: Usage, model: Optional[str]) -> float:
+        """
+        计算一次调用的费用
+
+        Args:
+            usage: token用量
+            model: 模型名称，不在价格表中时费用为0
+
+        Returns:
+            费用（美元）
+        """
+        price = self.prices.get(model or "")
+        if price is None:
+            return 0.0
+        hit_price, miss_price, output_price = price
+        hit = usage.prompt_cache_hit_tokens
+        # 上游没有返回缓存命中情况时，输入token全部按未命中计费
+        miss = usage.prompt_cache_miss_tokens or max(usage.prompt_tokens - hit, 0)
+        return (hit * hit_price + miss * miss_price + usage.completion_tokens * output_price) / 1e6
+
+    def record(
+        self,
+        usage: Usage,
+        model: Optional[str] = None,
+        tenant: Optional[str] = None,
+        session: Optional[str] = None,
+    ) -> float:
+        """
+        记录一次调用，只更新内存中的累计值，数据库由后台线程批量写入
+
+        Args:
+            usage: token用量
+            model: 实际使用的模型
+            tenant: 租户，为None时使用"default"
+            session: 会话
+
+        Returns:
+            本次调用的费用
+        """
+        tenant = tenant or "default"
+        cost = self.cost(usage, model)
+        with self._lock:
+            totals = self._totals.get(tenant)
+            if totals is None:
+                totals = self._totals[tenant] = TenantTotals()
+            totals.calls += 1
+            totals.usage = totals.usage + usage
+            totals.cost += cost
+
+        if self.path is not None and not self._closed:
+            self._ensure_writer()
+            self._queue.put((
+                time.time(), tenant, session, model,
+                usage.prompt_tokens, usage.completion_tokens, usage.reasoning_tokens,
+                usage.prompt_cache_hit_tokens, usage.prompt_cache_miss_tokens, cost,
+            ))
+        return cost
+
+    def set_budget(self, tenant: str, budget: Optional[Budget]) -> None:
+        """
+        设置租户的预算
+
+        Args:
+            tenant: 租户
+            budget: 预算，为None时取消预算
+        """
+        with self._lock:
+            if budget is None:
+                self._budgets.pop(tenant, None)
+            else:
+                self._budgets[tenant] = budget
+
+    def check(self, tenant: Optional[str]) -> Optional[Budget]:
+        """
+        检查租户的预算
+
+        Args:
+            tenant: 租户
+
+        Returns:
+            超过软预算时返回预算，未超过时返回None
+
+        Raises:
+            BudgetExceededError: 超过硬预算
+        """
+        tenant = tenant or "default"
+        budget = self._budgets.get(tenant)
+        if budget is None:
+            return None
+        totals = self._totals.get(tenant)
+        spent = totals.spent(budget.metric) if totals is not None else 0
+        if budget.limit is not None and spent >= budget.limit:
+            raise BudgetExceededError(tenant, spent, budget.limit, budget.metric)
+        if budget.soft_limit is not None and spent >= budget.soft_limit:
+            return budget
+        return None
+
+    def apply_budget(self, tenant: Optional[str], params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        在发送请求前检查预算，超过软预算时降级请求参数
+
+        Args:
+            tenant: 租户
+            params: API参数
+
+        Returns:
+            可能被降级的API参数（不修改传入的字典）
+
+        Raises:
+            BudgetExceededError: 超过硬预算
+        """
+        budget = self.check(tenant)
+        if budget is None:
+            return params
+        params = dict(params)
+        if budget.downgrade_model:
+            params["model"] = budget.downgrade_model
+        if budget.max_tokens:
+            params["max_tokens"] = min(params.get("max_tokens") or budget.max_tokens, budget.max_tokens)
+        return params
+
+    def totals(self, tenant: Optional[str] = None) -> TenantTotals:
+        """
+        获取租户的累计用量
+
+        Args:
+            tenant: 租户，为None时使用"default"
+
+        Returns:
+            累计用量的副本
+        """
+        with self._lock:
+            totals = self._totals.get(tenant or "default") or TenantTotals()
+            return TenantTotals(totals.calls, totals.usage, totals.cost)
+
+    def all_totals(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取所有租户的累计用量
+
+        Returns:
+            以租户为键的累计用量字典
+        """
+        with self._lock:
+            return {tenant: totals.to_dict() for tenant, totals in self._totals.items()}
+
+    def reset(self, tenant: Optional[str] = None) -> None:
+        """
+        清零内存中的累计值，例如在新的计费周期开始时调用；数据库中的记录不受影响
+
+        Args:
+            tenant: 租户，为None时清零所有租户
+        """
+        with self._lock:
+            if tenant is None:
+                self._totals.clear()
+            else:
+                self._totals.pop(tenant, None)
+
+    def query(
+        self,
+        tenant: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        by_session: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        从数据库汇总用量，查询前先写入队列中的记录
+
+        Args:
+            tenant: 只统计该租户，为None时统计所有租户
+            since: 开始时间戳
+            until: 结束时间戳
+            by_session: 是否按会话分别汇总
+
+        Returns:
+            每个租户（或租户和会话）一项的汇总结果
+        """
+        if self.path is None:
+            raise ValueError("没有设置数据库路径的账本不能查询历史记录")
+        self.flush()
+
+        conditions, args = ["ts >= ?"], [since or 0]
+        if until is not None:
+            conditions.append("ts < ?")
+            args.append(until)
+        if tenant is not None:
+            conditions.append("tenant = ?")
+            args.append(tenant)
+        group = "tenant, session" if by_session else "tenant"
+        sql = f"SELECT {group}, {_SUMS} FROM usage WHERE {' AND '.join(conditions)} GROUP BY {group} ORDER BY {group}"
+
+        with closing(self._connect()) as connection:
+            rows = connection.execute(sql, args).fetchall()
+        results = []
+        for row in rows:
+            keys = row[:2] if by_session else row[:1]
+            calls, usage, cost = _usage_from_row(row[len(keys):])
+            item = {"tenant": keys[0], **TenantTotals(calls, usage, cost).to_dict()}
+            if by_session:
+                item["session"] = keys[1]
+            results.append(item)
+        return results
+
+    def _ensure_writer(self) -> None:
+        writer = self._writer
+        if writer is None or not writer.is_alive():
+            with self._lock:
+                if self._writer is writer and not self._closed:
+                    # 首次记录时启动后台线程，线程意外退出时重新启动，队列中的记录不会无人写入
+                    self._writer = threading.Thread(target=self._write_loop, name="deepseek-ledger", daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self) -> None:
+        """
+        后台线程：批量写入记录，收到刷新请求时立即写入并通知调用方
+
+        写入失败（数据库被锁定、磁盘已满等）时记录错误，保留失败的记录并在之后重试，
+        重新连接数据库前会重建表结构；刷新请求在每一批处理结束后总会得到通知。
+        """
+        connection: Optional[sqlite3.Connection] = None
+        pending: List[tuple] = []
+        retry_at = 0.0
+        stop = False
+        try:
+            while not stop:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = _IDLE
+
+                waiters, collected = [], 0
+                while item is not _IDLE:
+                    if item is None:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        pending.append(item)
+                        collected += 1
+                    if collected >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                # 写入失败后按flush_interval重试；刷新请求和关闭时立即重试
+                if pending and (waiters or stop or time.monotonic() >= retry_at):
+                    try:
+                        if connection is None:
+                            connection = self._connect()
+                            connection.executescript(_SCHEMA)
+                        with connection:
+                            connection.executemany("INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", pending)
+                        pending = []
+                    except Exception as e:
+                        self.write_errors += 1
+                        self.last_error = e
+                        logger.warning("写入用量账本失败，%d 条记录将在稍后重试: %s", len(pending), e)
+                        if connection is not None:
+                            connection.close()
+                            connection = None
+                        retry_at = time.monotonic() + self.flush_interval
+                        if len(pending) > self.max_pending:
+                            dropped = len(pending) - self.max_pending
+                            logger.error("用量账本等待重试的记录过多，丢弃最早的 %d 条", dropped)
+                            del pending[:dropped]
+
+                self._backlog = len(pending)
+                for waiter in waiters:
+                    waiter.set()
+            if pending:
+                logger.error("关闭用量账本时仍有 %d 条记录未能写入: %s", len(pending), self.last_error)
+        finally:
+            if connection is not None:
+                connection.close()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待队列中的记录写入数据库
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            是否在超时前写入了所有记录，写入失败时返回False
+        """
+        if self.path is None or self._closed:
+            return self._backlog == 0
+        self._ensure_writer()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout) and self._backlog == 0
+
+    def close(self) -> None:
+        """写入剩余的记录并停止后台线程"""
+        if self.path is not None and not self._queue.empty():
+            self._ensure_writer()
+        self._closed = True
+        _open_ledgers.discard(self)
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
@@ -0,0 +1,434 @@
+"""
+DeepSeek 原始响应模式
+~~~~~~~~~~~~~~~~~~
+
+绕过OpenAI SDK直接向 ``/chat/completions`` 发送请求：使用字节级的SSE解析器读取流式响应，
+可用时使用orjson解码JSON，结果直接构造为轻量的ChatResult和StreamDelta，
+避免SDK为每次调用和每个数据块构造pydantic模型的开销。
+"""
+
+import email.utils
+import json
+import threading
+import time
+from typing import Dict, Any, Optional, List, Callable, Iterable, Iterator
+
+import httpx
+
+from .exceptions import DeepSeekAPIError
+from .response import ChatResult, StreamDelta, ToolCallBuilder, Usage, tool_calls_from_api
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson是可选依赖
+    orjson = None
+
+# 流式响应结束标记
+DONE = b"[DONE]"
+
+
+def loads(data: bytes) -> Any:
+    """
+    解码JSON，安装了orjson时使用orjson
+
+    Args:
+        data: JSON字节串
+
+    Returns:
+        解码后的对象
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    编码JSON，安装了orjson时使用orjson
+
+    Args:
+        obj: 要编码的对象
+
+    Returns:
+        JSON字节串
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+    """
+    解析服务端建议的重试等待时间，与OpenAI SDK一致支持retry-after-ms、秒数和HTTP日期格式
+
+    Args:
+        headers: 响应头
+
+    Returns:
+        等待时间（秒），没有或无法解析时返回None
+    """
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return retry_at.timestamp() - time.time()
+
+
+def iter_sse_frames(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    将网络数据块切分为完整的SSE事件帧
+
+    帧保持原始字节不变（包含结尾的空行），可以直接转发给下游。
+
+    Args:
+        chunks: 网络数据块
+
+    Yields:
+        完整的SSE事件帧
+    """
+    buffer = b""
+    for chunk in chunks:
+        buffer = buffer + chunk if buffer else chunk
+        start = 0
+        while True:
+            # 事件之间以空行分隔，兼容LF和CRLF两种换行，取最先出现的分隔符
+            lf = buffer.find(b"\n\n", start)
+            crlf = buffer.find(b"\r\n\r\n", start, lf + 2 if lf >= 0 else len(buffer))
+            if crlf >= 0:
+                end = crlf + 4
+            elif lf >= 0:
+                end = lf + 2
+            else:
+                break
+            yield buffer[start:end]
+            start = end
+        if start:
+            buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer
+
+
+def frame_data(frame: bytes) -> Optional[bytes]:
+    """
+    提取SSE事件帧中的data字段
+
+    Args:
+        frame: SSE事件帧
+
+    Returns:
+        data字段的内容，多行data以换行连接；注释帧（例如keep-alive）返回None
+    """
+    if frame.startswith(b"data:"):
+        # 常见的单行data帧，避免逐行拆分
+        end = frame.find(b"\n")
+        if end < 0 or not frame[end:].strip():
+            data = frame[5:end if end >= 0 else None].rstrip(b"\r")
+            return data[1:] if data.startswith(b" ") else data
+
+    parts = []
+    for line in frame.splitlines():
+        if line.startswith(b"data:"):
+            line = line[5:]
+            parts.append(line[1:] if line.startswith(b" ") else line)
+    return b"\n".join(parts) if parts else None
+
+
+def iter_sse_data(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    逐个返回SSE事件的data字段
+
+    Args:
+        chunks: 网络数据块
+
+    Yields:
+        每个事件的data字段
+    """
+    for frame in iter_sse_frames(chunks):
+        data = frame_data(frame)
+        if data is not None:
+            yield data
+
+
+def _raise_for_error(payload: Any, status_code: Optional[int] = None) -> None:
+    """
+    如果响应中包含error字段则抛出异常
+
+    Args:
+        payload: 解码后的响应
+        status_code: HTTP状态码
+    """
+    if isinstance(payload, dict) and payload.get("error"):
+        error = payload["error"]
+        message = error.get("message") if isinstance(error, dict) else str(error)
+        raise DeepSeekAPIError(f"API调用失败: {message}", status_code=status_code)
+
+
+def parse_completion(data: bytes) -> ChatResult:
+    """
+    解析非流式对话补全响应
+
+    Args:
+        data: 响应体
+
+    Returns:
+        对话结果
+    """
+    return parse_choices(data)[0]
+
+
+def parse_choices(data: bytes) -> List[ChatResult]:
+    """
+    解析包含多个候选回答（n > 1）的非流式对话补全响应
+
+    token用量是所有候选的总量，只记录在第一个结果中。
+
+    Args:
+        data: 响应体
+
+    Returns:
+        按index排序的对话结果
+    """
+    payload = loads(data)
+    _raise_for_error(payload)
+    usage = Usage.from_api(payload.get("usage"))
+    results = []
+    for choice in sorted(payload["choices"], key=lambda choice: choice.get("index", 0)):
+        message = choice.get("message") or {}
+        results.append(ChatResult(
+            content=message.get("content") or "",
+            reasoning_content=message.get("reasoning_content"),
+            usage=usage if not results else None,
+            finish_reason=choice.get("finish_reason"),
+            model=payload.get("model"),
+            tool_calls=tool_calls_from_api(message.get("tool_calls")),
+        ))
+    return results
+
+
+class StreamAccumulator:
+    """逐个解析流式数据块并累积完整的对话结果"""
+
+    __slots__ = ("content_parts", "reasoning_parts", "usage", "finish_reason", "model", "tool_calls")
+
+    def __init__(self):
+        """初始化累积器"""
+        self.content_parts: List[str] = []
+        self.reasoning_parts: List[str] = []
+        self.usage: Optional[Usage] = None
+        self.finish_reason: Optional[str] = None
+        self.model: Optional[str] = None
+        self.tool_calls = ToolCallBuilder()
+
+    def add(self, data: bytes) -> List[StreamDelta]:
+        """
+        解析一个数据块
+
+        Args:
+            data: SSE事件的data字段
+
+        Returns:
+            该数据块中的增量内容，结束标记返回空列表
+        """
+        if data == DONE:
+            return []
+
+        chunk = loads(data)
+        _raise_for_error(chunk)
+        if chunk.get("usage"):
+            self.usage = Usage.from_api(chunk["usage"])
+        if chunk.get("model"):
+            self.model = chunk["model"]
+        choices = chunk.get("choices")
+        if not choices:
+            return []
+
+        choice = choices[0]
+        delta = choice.get("delta") or {}
+        deltas = []
+        reasoning = delta.get("reasoning_content")
+        if reasoning:
+            self.reasoning_parts.append(reasoning)
+            deltas.append(StreamDelta(StreamDelta.REASONING, reasoning))
+        content = delta.get("content")
+        if content:
+            self.content_parts.append(content)
+            deltas.append(StreamDelta(StreamDelta.CONTENT, content))
+        if delta.get("tool_calls"):
+            self.tool_calls.add(delta["tool_calls"])
+        if choice.get("finish_reason"):
+            self.finish_reason = choice["finish_reason"]
+        return deltas
+
+    def result(self) -> ChatResult:
+        """
+        获取累积的对话结果
+
+        Returns:
+            对话结果
+        """
+        return ChatResult(
+            content="".join(self.content_parts),
+            reasoning_content="".join(self.reasoning_parts) or None,
+            usage=self.usage,
+            finish_reason=self.finish_reason,
+            model=self.model,
+            tool_calls=self.tool_calls.result(),
+        )
+
+
+class RawChatClient:
+    """直接调用对话补全接口的轻量客户端"""
+
+    def __init__(
+        self,
+        http_client: Optional[httpx.Client],
+        base_url: str,
+        api_key: str,
+        client_factory: Optional[Callable[[], httpx.Client]] = None,
+    ):
+        """
+        初始化轻量客户端
+
+        Args:
+            http_client: httpx客户端，与SDK和文件管理器共享连接池；为None时第一次使用时通过client_factory创建
+            base_url: API基础URL
+            api_key: API密钥
+            client_factory: 创建单独的httpx客户端的函数
+        """
+        if http_client is None and client_factory is None:
+            raise ValueError("http_client和client_factory不能同时为None")
+        self._http_client = http_client
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+        self.url = f"{base_url.rstrip('/')}/chat/completions"
+        self.models_url = f"{base_url.rstrip('/')}/models"
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+
+    @property
+    def http_client(self) -> httpx.Client:
+        """发送请求使用的httpx客户端，不共享连接池时在第一次使用时创建"""
+        if self._http_client is None:
+            with self._lock:
+                if self._http_client is None:
+                    self._http_client = self._client_factory()
+        return self._http_client
+
+    def close(self) -> None:
+        """关闭httpx客户端，尚未创建时不做任何事"""
+        if self._http_client is not None:
+            self._http_client.close()
+
+    def _build_request(self, params: Dict[str, Any]) -> httpx.Request:
+        """
+        构造请求，兼容SDK风格的timeout、extra_body和extra_headers参数
+
+        Args:
+            params: API参数
+
+        Returns:
+            httpx请求
+        """
+        params = dict(params)
+        timeout = params.pop("timeout", None)
+        headers = self.headers
+        extra_headers = params.pop("extra_headers", None)
+        if extra_headers:
+            headers = {**headers, **extra_headers}
+        params.update(params.pop("extra_body", None) or {})
+
+        return self.http_client.build_request(
+            "POST",
+            self.url,
+            content=dumps(params),
+            headers=headers,
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+        )
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response) -> None:
+        """
+        检查响应状态码，失败时抛出带状态码和Retry-After建议等待时间的DeepSeekAPIError
+
+        Args:
+            response: 已读取响应体的httpx响应
+        """
+        if response.status_code < 400:
+            return
+        try:
+            _raise_for_error(loads(response.content), response.status_code)
+        except DeepSeekAPIError as e:
+            e.retry_after = parse_retry_after(response.headers)
+            raise
+        except ValueError:
+            pass
+        raise DeepSeekAPIError(
+            f"API调用失败: {response.status_code} - {response.text}",
+            status_code=response.status_code,
+            retry_after=parse_retry_after(response.headers),
+        )
+
+    def ping(self) -> None:
+        """请求开销最低的模型列表接口，用于预热和保持连接"""
+        response = self.http_client.get(self.models_url, headers=self.headers)
+        self._raise_for_status(response)
+
+    def create(self, **params) -> ChatResult:
+        """
+        发送非流式请求
+
+        Args:
+            **params: API参数，包括messages
+
+        Returns:
+            对话结果
+        """
+        return self.create_choices(**params)[0]
+
+    def create_choices(self, **params) -> List[ChatResult]:
+        """
+        发送非流式请求，返回所有候选回答
+
+        Args:
+            **params: API参数，包括messages和n
+
+        Returns:
+            对话结果列表
+        """
+        response = self.http_client.send(self._build_request(params))
+        self._raise_for_status(response)
+        return parse_choices(response.content)
+
+    def open_stream(self, **params) -> httpx.Response:
+        """
+        发送流式请求，返回尚未读取响应体的响应
+
+        Args:
+            **params: API参数，包括messages
+
+        Returns:
+            httpx响应，调用方读取完毕后需要关闭
+        """
+        response = self.http_client.send(self._build_request(params), stream=True)
+        if response.status_code >= 400:
+            try:
+                response.read()
+            finally:
+                response.close()
+            self._raise_for_status(response)
+        return response
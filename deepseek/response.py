@@ -0,0 +1,247 @@
+"""
+DeepSeek 响应数据
+~~~~~~~~~~~~~~
+
+定义对话调用的结果、token用量以及流式增量等轻量数据结构。
+"""
+
+from typing import Dict, Any, Optional, List, Iterable
+
+
+def _field(source: Any, name: str) -> Any:
+    """读取SDK对象的属性或字典的键"""
+    if source is None:
+        return None
+    if isinstance(source, dict):
+        return source.get(name)
+    return getattr(source, name, None)
+
+
+class Usage:
+    """单次调用的token用量"""
+
+    __slots__ = (
+        "prompt_tokens",
+        "completion_tokens",
+        "total_tokens",
+        "reasoning_tokens",
+        "prompt_cache_hit_tokens",
+        "prompt_cache_miss_tokens",
+    )
+
+    def __init__(
+        self,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        total_tokens: int = 0,
+        reasoning_tokens: int = 0,
+        prompt_cache_hit_tokens: int = 0,
+        prompt_cache_miss_tokens: int = 0,
+    ):
+        """
+        初始化token用量
+
+        Args:
+            prompt_tokens: 输入token数
+            completion_tokens: 输出token数（包含推理token）
+            total_tokens: 总token数
+            reasoning_tokens: 推理过程消耗的token数
+            prompt_cache_hit_tokens: 命中上下文缓存的输入token数
+            prompt_cache_miss_tokens: 未命中上下文缓存的输入token数
+        """
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = total_tokens
+        self.reasoning_tokens = reasoning_tokens
+        self.prompt_cache_hit_tokens = prompt_cache_hit_tokens
+        self.prompt_cache_miss_tokens = prompt_cache_miss_tokens
+
+    @classmethod
+    def from_api(cls, usage: Any) -> Optional["Usage"]:
+        """
+        从API返回的usage字段构造用量对象，兼容SDK对象和字典
+
+        Args:
+            usage: API返回的usage字段
+
+        Returns:
+            用量对象，如果usage为空则返回None
+        """
+        if usage is None:
+            return None
+
+        details = _field(usage, "completion_tokens_details")
+        return cls(
+            prompt_tokens=_field(usage, "prompt_tokens") or 0,
+            completion_tokens=_field(usage, "completion_tokens") or 0,
+            total_tokens=_field(usage, "total_tokens") or 0,
+            reasoning_tokens=_field(details, "reasoning_tokens") or 0,
+            prompt_cache_hit_tokens=_field(usage, "prompt_cache_hit_tokens") or 0,
+            prompt_cache_miss_tokens=_field(usage, "prompt_cache_miss_tokens") or 0,
+        )
+
+    def __add__(self, other: "Usage") -> "Usage":
+        return Usage(*(getattr(self, name) + getattr(other, name) for name in self.__slots__))
+
+    @property
+    def answer_tokens(self) -> int:
+        """最终回答消耗的token数（不含推理token）"""
+        return max(self.completion_tokens - self.reasoning_tokens, 0)
+
+    def to_dict(self) -> Dict[str, int]:
+        """
+        将用量转换为字典
+
+        Returns:
+            包含用量的字典
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_api(self) -> Dict[str, Any]:
+        """
+        转换为API响应中usage字段的格式
+
+        Returns:
+            与DeepSeek API结构相同的用量字典
+        """
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "prompt_cache_hit_tokens": self.prompt_cache_hit_tokens,
+            "prompt_cache_miss_tokens": self.prompt_cache_miss_tokens,
+            "completion_tokens_details": {"reasoning_tokens": self.reasoning_tokens},
+        }
+
+    def __repr__(self) -> str:
+        return f"Usage({self.to_dict()})"
+
+
+class ChatResult:
+    """单次对话调用的结果"""
+
+    __slots__ = ("content", "reasoning_content", "usage", "finish_reason", "model", "tool_calls")
+
+    def __init__(
+        self,
+        content: str = "",
+        reasoning_content: Optional[str] = None,
+        usage: Optional[Usage] = None,
+        finish_reason: Optional[str] = None,
+        model: Optional[str] = None,
+        tool_calls: Optional[List[Dict[str, Any]]] = None,
+    ):
+        """
+        初始化对话结果
+
+        Args:
+            content: 模型回答的文本
+            reasoning_content: 推理模型输出的思维链内容
+            usage: token用量
+            finish_reason: 结束原因
+            model: 实际使用的模型
+            tool_calls: 模型请求的工具调用，格式与API的tool_calls字段相同
+        """
+        self.content = content
+        self.reasoning_content = reasoning_content
+        self.usage = usage
+        self.finish_reason = finish_reason
+        self.model = model
+        self.tool_calls = tool_calls
+
+    def __repr__(self) -> str:
+        return f"ChatResult(content={self.content!r}, finish_reason={self.finish_reason!r})"
+
+
+def tool_calls_from_api(tool_calls: Optional[Iterable[Any]]) -> Optional[List[Dict[str, Any]]]:
+    """
+    将API返回的tool_calls字段转换为字典列表，兼容SDK对象和字典
+
+    Args:
+        tool_calls: API返回的tool_calls字段
+
+    Returns:
+        工具调用列表，没有工具调用时返回None
+    """
+    if not tool_calls:
+        return None
+    return [
+        {
+            "id": _field(call, "id"),
+            "type": _field(call, "type") or "function",
+            "function": {
+                "name": _field(_field(call, "function"), "name"),
+                "arguments": _field(_field(call, "function"), "arguments") or "",
+            },
+        }
+        for call in tool_calls
+    ]
+
+
+class ToolCallBuilder:
+    """按index合并流式响应中分段返回的工具调用"""
+
+    __slots__ = ("calls",)
+
+    def __init__(self):
+        """初始化合并器"""
+        self.calls: Dict[int, Dict[str, Any]] = {}
+
+    def add(self, deltas: Iterable[Any]) -> None:
+        """
+        合并一个数据块中的工具调用增量，兼容SDK对象和字典
+
+        Args:
+            deltas: delta中的tool_calls字段
+        """
+        for delta in deltas:
+            index = _field(delta, "index") or 0
+            call = self.calls.get(index)
+            if call is None:
+                call = self.calls[index] = {"id": None, "type": "function", "function": {"name": "", "arguments": ""}}
+            if _field(delta, "id"):
+                call["id"] = _field(delta, "id")
+            function = _field(delta, "function")
+            if _field(function, "name"):
+                call["function"]["name"] += _field(function, "name")
+            if _field(function, "arguments"):
+                call["function"]["arguments"] += _field(function, "arguments")
+
+    def result(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取合并后的工具调用
+
+        Returns:
+            按index排序的工具调用列表，没有工具调用时返回None
+        """
+        if not self.calls:
+            return None
+        return [self.calls[index] for index in sorted(self.calls)]
+
+
+class StreamDelta:
+    """流式响应中的一段增量内容"""
+
+    REASONING = "reasoning"
+    CONTENT = "content"
+
+    __slots__ = ("channel", "text")
+
+    def __init__(self, channel: str, text: str):
+        """
+        初始化流式增量
+
+        Args:
+            channel: 内容通道，"reasoning"表示推理过程，"content"表示最终回答
+            text: 增量文本
+        """
+        self.channel = channel
+        self.text = text
+
+    @property
+    def is_reasoning(self) -> bool:
+        """是否属于推理通道"""
+        return self.channel == self.REASONING
+
+    def __repr__(self) -> str:
+        return f"StreamDelta({self.channel!r}, {self.text!r})"
@@ -0,0 +1,340 @@
+"""
+DeepSeek 检索工具
+~~~~~~~~~~~~~~
+
+联网搜索和文档问答共用的文本处理工具：分词、BM25相关性评分、段落切分、
+近似重复段落去除、按token预算打包段落，以及线程安全的TTL缓存。
+"""
+
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+
+from .tokenizer import count_tokens
+
+# ASCII单词和数字，以及连续的中日韩文字（汉字、假名和韩文音节）
+_TERM_RE = re.compile(r"[a-z0-9]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+# 句末标点，用于在句子边界处切分过长的段落
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？!?；;.])\s*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    将文本切分为检索词
+
+    英文和数字按单词切分，中文没有空格分隔，使用相邻两个字组成的二元词。
+
+    Args:
+        text: 文本
+
+    Returns:
+        检索词列表
+    """
+    terms = []
+    for match in _TERM_RE.findall(text.lower()):
+        if match[0].isascii():
+            terms.append(match)
+        elif len(match) == 1:
+            terms.append(match)
+        else:
+            terms.extend(match[i:i + 2] for i in range(len(match) - 1))
+    return terms
+
+
+def split_passages(text: str, max_chars: int = 400) -> List[str]:
+    """
+    将文本切分为段落，过长的段落在句子边界处继续切分
+
+    Args:
+        text: 文本
+        max_chars: 每个段落的最大字符数
+
+    Returns:
+        段落列表
+    """
+    passages = []
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            passages.append(paragraph)
+            continue
+
+        current = ""
+        for sentence in _SENTENCE_END_RE.split(paragraph):
+            if not sentence:
+                continue
+            if current and len(current) + len(sentence) > max_chars:
+                passages.append(current)
+                current = ""
+            # 单个句子超过上限时直接按长度截断
+            while len(sentence) > max_chars:
+                passages.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            current += sentence
+        if current:
+            passages.append(current)
+    return passages
+
+
+class BM25:
+    """BM25相关性评分"""
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        """
+        初始化BM25评分
+
+        Args:
+            documents: 每个文档的检索词列表
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.avg_length = sum(self.lengths) / len(documents) if documents else 0.0
+        self.doc_freqs: Counter = Counter()
+        for freqs in self.term_freqs:
+            self.doc_freqs.update(freqs.keys())
+
+    def idf(self, term: str) -> float:
+        """
+        计算检索词的逆文档频率
+
+        Args:
+            term: 检索词
+
+        Returns:
+            逆文档频率
+        """
+        n = len(self.term_freqs)
+        df = self.doc_freqs.get(term, 0)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: List[str]) -> List[float]:
+        """
+        计算查询与每个文档的相关性
+
+        Args:
+            query: 查询的检索词列表
+
+        Returns:
+            每个文档的得分
+        """
+        scores = [0.0] * len(self.term_freqs)
+        if not self.avg_length:
+            return scores
+
+        for term in set(query):
+            if term not in self.doc_freqs:
+                continue
+            idf = self.idf(term)
+            for i, freqs in enumerate(self.term_freqs):
+                tf = freqs.get(term)
+                if tf:
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_length)
+                    scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+class Passage:
+    """检索得到的一个段落"""
+
+    __slots__ = ("text", "title", "source", "score")
+
+    def __init__(self, text: str, title: str = "", source: str = "", score: float = 0.0):
+        """
+        初始化段落
+
+        Args:
+            text: 段落文本
+            title: 来源标题
+            source: 来源地址或文件名
+            score: 相关性得分
+        """
+        self.text = text
+        self.title = title
+        self.source = source
+        self.score = score
+
+    def __repr__(self) -> str:
+        return f"Passage(source={self.source!r}, score={self.score:.3f}, text={self.text[:30]!r})"
+
+
+def rank_passages(query: str, passages: List[Passage]) -> List[Passage]:
+    """
+    按与查询的BM25相关性对段落排序
+
+    Args:
+        query: 查询文本
+        passages: 段落列表
+
+    Returns:
+        按得分从高到低排序的段落，得分写入Passage.score
+    """
+    if not passages:
+        return []
+    bm25 = BM25([tokenize(passage.text) for passage in passages])
+    for passage, score in zip(passages, bm25.scores(tokenize(query))):
+        passage.score = score
+    return sorted(passages, key=lambda passage: passage.score, reverse=True)
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def pack_passages(
+    passages: Iterable[Passage],
+    token_budget: int,
+    similarity_threshold: float = 0.7,
+) -> List[Passage]:
+    """
+    按顺序选取段落直到用完token预算，跳过与已选段落近似重复的段落
+
+    Args:
+        passages: 已按相关性排序的段落
+        token_budget: 可用的token预算
+        similarity_threshold: 检索词集合的Jaccard相似度超过该值视为重复
+
+    Returns:
+        选中的段落
+    """
+    selected: List[Passage] = []
+    selected_terms: List[frozenset] = []
+    seen = set()
+    used = 0
+    for passage in passages:
+        key = " ".join(passage.text.split()).lower()
+        if key in seen:
+            continue
+        seen.add(key)
+
+        cost = count_tokens(passage.text)
+        if used + cost > token_budget:
+            continue
+
+        terms = frozenset(tokenize(passage.text))
+        if any(_jaccard(terms, other) >= similarity_threshold for other in selected_terms):
+            continue
+
+        selected.append(passage)
+        selected_terms.append(terms)
+        used += cost
+    return selected
+
+
+class TTLCache:
+    """线程安全的带过期时间的LRU缓存"""
+
+    def __init__(self, max_size: int = 256, ttl: float = 600.0):
+        """
+        初始化缓存
+
+        Args:
+            max_size: 最多缓存的条目数
+            ttl: 条目的有效时间（秒）
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        """
+        查找缓存
+
+        Args:
+            key: 键
+
+        Returns:
+            缓存的值，不存在或已过期时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Any, value: Any) -> None:
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+
+        Args:
+            key: 键
+            value: 值
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def format_passages(passages: List[Passage], header: str) -> str:
+    """
+    将段落格式化为注入提示词的参考资料
+
+    Args:
+        passages: 段落列表
+        header: 参考资料前的说明
+
+    Returns:
+        格式化后的文本
+    """
+    lines = [header]
+    for index, passage in enumerate(passages, 1):
+        source = f"{passage.title} ({passage.source})" if passage.title else passage.source
+        lines.append(f"[{index}] {source}\n{passage.text}")
+    return "\n\n".join(lines)
+
+
+def inject_context(messages: List[Dict[str, Any]], context: str) -> List[Dict[str, Any]]:
+    """
+    将参考资料作为一条系统消息插入到最后一条用户消息之前，不修改原有的消息对象
+
+    参考资料随每轮问题变化，放在开头的系统提示词中会使服务端的前缀缓存从第一条消息起失效；
+    插入到本轮问题之前时，系统提示词和之前的对话保持逐字节不变，仍然可以命中缓存。
+
+    Args:
+        messages: 消息列表
+        context: 参考资料
+
+    Returns:
+        新的消息列表
+    """
+    context_message = {"role": "system", "content": context}
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].get("role") == "user":
+            return list(messages[:i]) + [context_message] + list(messages[i:])
+    return list(messages) + [context_message]
+
+
+def last_user_text(messages: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    获取最后一条用户消息的文本
+
+    Args:
+        messages: 消息列表
+
+    Returns:
+        最后一条用户消息的文本，没有时返回None
+    """
+    for message in reversed(messages):
+        if message.get("role") == "user" and isinstance(message.get("content"), str):
+            return message["content"]
+    return None
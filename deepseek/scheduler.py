@@ -0,0 +1,395 @@
+"""
+DeepSeek 请求调度
+~~~~~~~~~~~~~~
+
+在客户端之前放置一个带优先级的请求队列，使交互式请求和后台批量请求可以共用同一个进程：
+按优先级出队、为高优先级类别预留并发槽位、丢弃已无法按时完成的请求，并支持取消排队中的请求。
+"""
+
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, List, Callable, Sequence
+
+from .exceptions import DeadlineExceededError
+
+# 内置的优先级类别，越靠前优先级越高
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+
+
+class _ScheduledRequest:
+    """一个排队中的请求"""
+
+    __slots__ = ("priority", "fn", "args", "kwargs", "future", "deadline", "enqueued_at", "done", "context")
+
+    def __init__(
+        self,
+        priority: str,
+        fn: Callable[..., Any],
+        args: tuple,
+        kwargs: Dict[str, Any],
+        deadline: Optional[float],
+    ):
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        # 已出队或已被丢弃
+        self.done = False
+        # 提交时的上下文，工作线程在其中执行请求，用量归属等上下文变量与提交方一致
+        self.context = contextvars.copy_context()
+
+
+class RequestScheduler:
+    """带优先级和并发预留的请求调度器"""
+
+    def __init__(
+        self,
+        client: Any = None,
+        max_concurrency: int = 16,
+        priorities: Sequence[str] = (PRIORITY_INTERACTIVE, PRIORITY_BATCH),
+        reservations: Optional[Dict[str, int]] = None,
+        latency_window: int = 200,
+        duration_window: int = 50,
+        probe_interval: float = 1.0,
+    ):
+        """
+        初始化请求调度器
+
+        Args:
+            client: DeepSeekClient实例，使用chat方法时需要提供
+            max_concurrency: 同时执行的最大请求数
+            priorities: 优先级类别，越靠前优先级越高
+            reservations: 为各类别预留的并发槽位数，低优先级请求不能占用这些槽位
+            latency_window: 统计各类别延迟所使用的最近样本数
+            duration_window: 估计各类别执行时间所使用的最近样本数
+            probe_interval: 类别没有请求在执行、且超过这段时间（秒）没有开始新请求时，
+                放行一个未到截止时间的请求作为探测，避免偶发的慢请求使执行时间的估计长期偏高
+        """
+        reservations = reservations if reservations is not None else {priorities[0]: max(max_concurrency // 4, 1)}
+        unknown = set(reservations) - set(priorities)
+        if unknown:
+            raise ValueError(f"未知的优先级类别: {', '.join(sorted(unknown))}")
+        if sum(reservations.values()) > max_concurrency:
+            raise ValueError("预留的并发槽位数不能超过max_concurrency")
+
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.priorities = list(priorities)
+        self.reservations = {name: reservations.get(name, 0) for name in self.priorities}
+
+        self._queues: Dict[str, deque] = {name: deque() for name in self.priorities}
+        self._running: Dict[str, int] = {name: 0 for name in self.priorities}
+        self.probe_interval = probe_interval
+        self._durations: Dict[str, deque] = {name: deque(maxlen=duration_window) for name in self.priorities}
+        self._last_started: Dict[str, float] = {name: 0.0 for name in self.priorities}
+        self._latencies: Dict[str, deque] = {name: deque(maxlen=latency_window) for name in self.priorities}
+        self._dropped: Dict[str, int] = {name: 0 for name in self.priorities}
+        self._deadlines: List[tuple] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._shutdown = False
+
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"deepseek-scheduler-{i}", daemon=True)
+            for i in range(max_concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        priority: str = PRIORITY_BATCH,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> Future:
+        """
+        提交一个请求
+
+        Args:
+            fn: 要执行的函数
+            *args: 位置参数
+            priority: 优先级类别
+            timeout: 从提交开始计算的截止时间（秒），无法在截止时间前完成的请求会被丢弃
+            **kwargs: 关键字参数
+
+        Returns:
+            请求的Future，排队中的请求可以通过Future.cancel()取消
+        """
+        if priority not in self._queues:
+            raise ValueError(f"未知的优先级类别: {priority}")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        request = _ScheduledRequest(priority, fn, args, kwargs, deadline)
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("调度器已关闭")
+            self._queues[priority].append(request)
+            if deadline is not None:
+                heapq.heappush(self._deadlines, (deadline, next(self._sequence), request))
+            self._condition.notify()
+
+        return request.future
+
+    def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        priority: str = PRIORITY_BATCH,
+        timeout: Optional[float] = None,
+        **params
+    ) -> Future:
+        """
+        提交一次对话补全请求
+
+        Args:
+            messages: 完整的消息列表
+            priority: 优先级类别
+            timeout: 从提交开始计算的截止时间（秒）
+            **params: 传递给DeepSeekClient.complete的参数
+
+        Returns:
+            结果为ChatResult的Future
+        """
+        if self.client is None:
+            raise ValueError("未提供DeepSeekClient，无法提交对话请求")
+        return self.submit(self.client.complete, messages, priority=priority, timeout=timeout, **params)
+
+    def _expected_duration(self, priority: str) -> float:
+        """
+        获取类别的预计执行时间，取最近执行时间的中位数，个别慢请求不会拉高估计
+
+        Args:
+            priority: 优先级类别
+
+        Returns:
+            预计执行时间（秒），没有样本时为0
+        """
+        return _percentile(sorted(self._durations[priority]), 0.5) or 0.0
+
+    def _can_probe(self, request: _ScheduledRequest, now: float) -> bool:
+        """
+        判断请求是否可以作为探测放行，需要在持有锁时调用
+
+        执行时间的估计只在请求实际执行后更新，被丢弃的请求不会产生新样本；估计偏高时定期放行
+        一个请求，用它的实际执行时间修正估计。
+
+        Args:
+            request: 排队中的请求
+            now: 当前时间
+
+        Returns:
+            是否放行
+        """
+        name = request.priority
+        return (
+            now < request.deadline
+            and self._running[name] == 0
+            and now - self._last_started[name] >= self.probe_interval
+        )
+
+    def _drop_expired(self, now: float) -> None:
+        """
+        丢弃已无法在截止时间前完成的排队请求，需要在持有锁时调用
+
+        Args:
+            now: 当前时间
+        """
+        while self._deadlines:
+            deadline, _, request = self._deadlines[0]
+            if request.done:
+                heapq.heappop(self._deadlines)
+                continue
+            if now + self._expected_duration(request.priority) < deadline:
+                break
+            if self._can_probe(request, now):
+                # 保留探测请求，由_next_request放行
+                break
+            heapq.heappop(self._deadlines)
+            self._reject(request)
+
+    def _reject(self, request: _ScheduledRequest) -> None:
+        """
+        将请求标记为超时丢弃，需要在持有锁时调用
+
+        Args:
+            request: 被丢弃的请求
+        """
+        request.done = True
+        if request.future.set_running_or_notify_cancel():
+            self._dropped[request.priority] += 1
+            request.future.set_exception(DeadlineExceededError("请求无法在截止时间前完成，已被丢弃"))
+
+    def _can_start(self, index: int) -> bool:
+        """
+        判断某个类别当前是否可以占用一个并发槽位，需要在持有锁时调用
+
+        Args:
+            index: 类别在优先级列表中的位置
+
+        Returns:
+            是否可以开始执行
+        """
+        running_total = sum(self._running.values())
+        # 更高优先级类别尚未用完的预留槽位不能被占用
+        reserved = sum(
+            max(self.reservations[name] - self._running[name], 0)
+            for name in self.priorities[:index]
+        )
+        return running_total + reserved < self.max_concurrency
+
+    def _next_request(self) -> Optional[_ScheduledRequest]:
+        """
+        按优先级取出下一个可以执行的请求，需要在持有锁时调用
+
+        Returns:
+            下一个请求，没有可执行的请求时返回None
+        """
+        now = time.monotonic()
+        self._drop_expired(now)
+
+        while True:
+            request = None
+            for index, name in enumerate(self.priorities):
+                queue = self._queues[name]
+                while queue and queue[0].done:
+                    queue.popleft()
+                if queue and self._can_start(index):
+                    request = queue.popleft()
+                    break
+
+            if request is None:
+                return None
+
+            request.done = True
+            if (
+                request.deadline is not None
+                and now + self._expected_duration(request.priority) >= request.deadline
+                and not self._can_probe(request, now)
+            ):
+                self._reject(request)
+                continue
+            if not request.future.set_running_or_notify_cancel():
+                # 请求已被取消
+                continue
+            return request
+
+    def _wait_timeout(self) -> Optional[float]:
+        """
+        计算工作线程的等待时间，使带截止时间的请求能及时被丢弃
+
+        Returns:
+            等待时间（秒），没有带截止时间的请求时为None
+        """
+        if not self._deadlines:
+            return None
+        deadline, _, request = self._deadlines[0]
+        now = time.monotonic()
+        if self._can_probe(request, now):
+            # 探测请求等待空闲槽位，到截止时间时再检查
+            return max(deadline - now, 0.001)
+        return max(deadline - self._expected_duration(request.priority) - now, 0.001)
+
+    def _worker(self) -> None:
+        """工作线程主循环"""
+        while True:
+            with self._condition:
+                request = self._next_request()
+                while request is None:
+                    if self._shutdown:
+                        return
+                    self._condition.wait(self._wait_timeout())
+                    request = self._next_request()
+                self._running[request.priority] += 1
+                self._last_started[request.priority] = time.monotonic()
+
+            started_at = time.monotonic()
+            try:
+                result = request.context.run(request.fn, *request.args, **request.kwargs)
+            except BaseException as e:
+                request.future.set_exception(e)
+            else:
+                request.future.set_result(result)
+            finished_at = time.monotonic()
+
+            with self._condition:
+                name = request.priority
+                self._running[name] -= 1
+                self._durations[name].append(finished_at - started_at)
+                self._latencies[name].append(finished_at - request.enqueued_at)
+                self._condition.notify_all()
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        """
+        关闭调度器
+
+        Args:
+            wait: 是否等待正在执行和排队中的请求完成
+            cancel_pending: 是否取消所有排队中的请求
+        """
+        with self._condition:
+            self._shutdown = True
+            if cancel_pending:
+                for queue in self._queues.values():
+                    for request in queue:
+                        request.done = True
+                        request.future.cancel()
+                    queue.clear()
+            self._condition.notify_all()
+
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取各类别的调度指标
+
+        Returns:
+            以类别为键的字典，包含排队数、执行数、丢弃数和端到端延迟分位数
+        """
+        with self._condition:
+            result = {}
+            for name in self.priorities:
+                latencies = sorted(self._latencies[name])
+                result[name] = {
+                    "queued": sum(1 for request in self._queues[name] if not request.done),
+                    "running": self._running[name],
+                    "reserved": self.reservations[name],
+                    "dropped": self._dropped[name],
+                    "p50_latency": _percentile(latencies, 0.5),
+                    "p99_latency": _percentile(latencies, 0.99),
+                }
+            return result
+
+    def __enter__(self) -> "RequestScheduler":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.shutdown()
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    """
+    计算已排序样本的分位数
+
+    Args:
+        values: 已排序的样本
+        fraction: 分位比例
+
+    Returns:
+        分位数，没有样本时返回None
+    """
+    if not values:
+        return None
+    return values[min(int(len(values) * fraction), len(values) - 1)]
@@ -0,0 +1,394 @@
+"""
+DeepSeek 语义缓存
+~~~~~~~~~~~~~~
+
+精确匹配的缓存无法命中换了说法的常见问题。语义缓存先去掉问题中的大小写、标点、英文虚词和中文的
+语气词、人称等不影响含义的词，用本地的哈希n-gram向量表示剩下的内容，在NumPy矩阵上批量计算余弦相似度，
+相似度超过阈值时直接返回之前的回答。
+
+字面相似的问题可能只差一个词，答案却相反，例如"Is 17 a prime number?"和"Is 15 a prime number?"，
+"How do I enable two factor authentication?"和"How do I disable two factor authentication?"。
+因此除了相似度达到阈值，两个问题的实词（包括数字、名称和否定词）还必须完全相同，任何一个实词不同都不会命中；
+"如何开启双重认证"和"我应该如何开启双重认证"只差语气和人称，可以命中。
+
+缓存只对白名单中的系统提示词生效，并且只缓存单轮问答：多轮对话的回答依赖上下文，
+不能只根据最后一个问题复用。需要安装numpy。
+"""
+
+import hashlib
+import re
+import threading
+import zlib
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+
+# 标点、空白和下划线统一视为分隔符，使大小写和标点不同的问题得到相同的向量
+_NORMALIZE_RE = re.compile(r"[\W_]+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CJK_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+# 英文单词和数字，以及连续的非ASCII文字
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[^\sa-z0-9]+")
+
+# 不影响问题含义的英文虚词：冠词、人称代词、助动词和情态动词、客套话；
+# 疑问词、介词和否定词会改变问题的含义，不在其中
+_STOPWORDS = frozenset("""
+    a an the i me my mine you your yours we us our ours it its this that these those
+    is are was were be been being am do does did can could should would will shall may might must
+    please hi hello hey just
+""".split())
+# 同义的中文疑问词统一为一种写法
+_SYNONYMS = (("怎么样", "如何"), ("怎么", "如何"), ("怎样", "如何"))
+# 不影响问题含义的中文语气词、人称和客套话，较长的先去除
+_FILLERS = (
+    "请问", "我想知道", "我想", "我应该", "应该", "我要", "我们", "一下", "可以", "能否",
+    "我", "您", "你", "的", "了", "吗", "呢", "吧", "啊", "呀",
+)
+
+
+def _require_numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("语义缓存需要安装numpy: pip install numpy") from e
+    return numpy
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化文本：转为小写，把连续的标点和空白替换为一个空格
+
+    Args:
+        text: 文本
+
+    Returns:
+        规范化后的文本
+    """
+    return _NORMALIZE_RE.sub(" ", text.lower()).strip()
+
+
+def content_text(text: str) -> str:
+    """
+    去掉不影响问题含义的部分：大小写、标点、英文虚词以及中文的语气词、人称和客套话
+
+    >>> content_text("How do I reset my password?")
+    'how reset password'
+    >>> content_text("我应该如何开启双重认证？")
+    '如何开启双重认证'
+
+    Args:
+        text: 问题
+
+    Returns:
+        以空格分隔的实词
+    """
+    text = normalize_text(text)
+    for synonym, canonical in _SYNONYMS:
+        text = text.replace(synonym, canonical)
+    for filler in _FILLERS:
+        text = text.replace(filler, " ")
+    return " ".join(token for token in _TOKEN_RE.findall(text) if token not in _STOPWORDS)
+
+
+def key_tokens(text: str) -> frozenset:
+    """
+    提取问题中必须完全相同才能复用回答的实词，中文按单字比较
+
+    >>> sorted(key_tokens("Is 17 a prime number?"))
+    ['17', 'number', 'prime']
+    >>> key_tokens("How do I enable 2FA?") == key_tokens("How do I disable 2FA?")
+    False
+    >>> key_tokens("如何开启双重认证") == key_tokens("我应该如何开启双重认证")
+    True
+    >>> key_tokens("如何开启双重认证") == key_tokens("如何关闭双重认证")
+    False
+
+    Args:
+        text: 问题
+
+    Returns:
+        实词集合
+    """
+    tokens = set()
+    for token in content_text(text).split():
+        if token.isascii():
+            tokens.add(token)
+        else:
+            tokens.update(token)
+    return frozenset(tokens)
+
+
+class HashingEmbedder:
+    """哈希n-gram向量，不需要模型文件，对措辞和语序的小幅变化不敏感"""
+
+    def __init__(self, dim: int = 512, ngram_sizes: Tuple[int, ...] = (2, 3)):
+        """
+        初始化向量化器
+
+        Args:
+            dim: 向量维度
+            ngram_sizes: 使用的字符n-gram长度
+        """
+        self.np = _require_numpy()
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+
+    def features(self, text: str) -> List[str]:
+        """
+        提取文本的特征：字符n-gram、英文单词和单个汉字
+
+        中文问题换一种说法时字序变化较大，单个汉字使词序不同的问题仍有较高的相似度。
+
+        Args:
+            text: 文本
+
+        Returns:
+            特征列表
+        """
+        text = normalize_text(text)
+        padded = f" {text} "
+        features = [f"w:{word}" for word in _WORD_RE.findall(text)]
+        features.extend(_CJK_RE.findall(text))
+        for size in self.ngram_sizes:
+            features.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+        return features
+
+    def embed(self, texts: List[str]) -> Any:
+        """
+        批量计算文本的单位向量
+
+        每个特征哈希到一个维度并带有正负号，减少哈希冲突带来的偏差。
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            形状为(len(texts), dim)的float32矩阵，每行的L2范数为1（空文本为0向量）
+        """
+        np = self.np
+        rows, columns, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self.features(text):
+                digest = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                columns.append(digest % self.dim)
+                signs.append(1.0 if digest & 0x80000000 else -1.0)
+
+        flat = np.asarray(rows, dtype=np.int64) * self.dim + np.asarray(columns, dtype=np.int64)
+        vectors = np.bincount(
+            flat, weights=np.asarray(signs), minlength=len(texts) * self.dim
+        ).reshape(len(texts), self.dim).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+class SemanticCache:
+    """按语义相似度查找的回答缓存，线程安全"""
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries: int = 2048,
+        max_bytes: int = 32 * 1024 * 1024,
+        system_prompts: Optional[Iterable[Optional[str]]] = None,
+        embedder: Optional[HashingEmbedder] = None,
+    ):
+        """
+        初始化语义缓存
+
+        Args:
+            threshold: 去掉虚词后的余弦相似度阈值，达到该值并且实词完全相同才视为同一个问题
+            max_entries: 最多缓存的问答数
+            max_bytes: 向量和文本占用的内存上限（字节）
+            system_prompts: 允许缓存的系统提示词白名单，None表示没有系统提示词；
+                为None时只缓存没有系统提示词的对话
+            embedder: 向量化器，为None时使用默认的HashingEmbedder
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.system_prompts = set(system_prompts) if system_prompts is not None else {None}
+        self.embedder = embedder or HashingEmbedder()
+        np = self.embedder.np
+
+        capacity = min(max_entries, 64)
+        self._vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        self._scopes = np.zeros(capacity, dtype=np.int64)
+        # 最近一次使用的序号，-1表示空位
+        self._used = np.full(capacity, -1, dtype=np.int64)
+        # (问题, 回答, 占用字节数, 实词)
+        self._entries: List[Optional[Tuple[str, str, int, frozenset]]] = [None] * capacity
+        self._tick = 0
+        self._bytes = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def allows(self, system_prompt: Optional[str]) -> bool:
+        """
+        检查系统提示词是否在白名单中
+
+        Args:
+            system_prompt: 系统提示词，没有时为None
+
+        Returns:
+            是否允许缓存
+        """
+        return (system_prompt or None) in self.system_prompts
+
+    @staticmethod
+    def scope_key(*parts: Any) -> int:
+        """
+        计算缓存范围的键，只有范围相同的问题才会互相命中
+
+        Args:
+            *parts: 影响回答的因素，例如模型名称和系统提示词
+
+        Returns:
+            64位整数键
+        """
+        digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little", signed=True)
+
+    def lookup(self, prompt: str, scope: int) -> Optional[str]:
+        """
+        查找语义相同的问题的回答
+
+        即使阈值较低，只差一个实词的问题也不会命中：
+
+        >>> cache = SemanticCache(threshold=0.8)
+        >>> cache.store("Is 17 a prime number?", 0, "Yes")
+        >>> cache.lookup("Is 15 a prime number?", 0) is None
+        True
+        >>> cache.lookup("is 17 a prime number", 0)
+        'Yes'
+
+        Args:
+            prompt: 问题
+            scope: 缓存范围的键
+
+        Returns:
+            缓存的回答，未命中时返回None
+        """
+        return self.lookup_many([prompt], scope)[0]
+
+    def lookup_many(self, prompts: List[str], scope: int) -> List[Optional[str]]:
+        """
+        批量查找，所有问题与所有缓存条目的相似度通过一次矩阵乘法计算
+
+        相似度达到阈值的条目按相似度从高到低检查，采用第一个实词完全相同的条目。
+
+        Args:
+            prompts: 问题列表
+            scope: 缓存范围的键
+
+        Returns:
+            与问题一一对应的回答，未命中的位置为None
+        """
+        np = self.embedder.np
+        queries = self.embedder.embed([content_text(prompt) for prompt in prompts])
+        results: List[Optional[str]] = [None] * len(prompts)
+        with self._lock:
+            slots = np.flatnonzero((self._used >= 0) & (self._scopes == scope))
+            if len(slots):
+                similarities = queries @ self._vectors[slots].T
+                for i, row in enumerate(similarities):
+                    columns = np.flatnonzero(row >= self.threshold)
+                    if not len(columns):
+                        continue
+                    keys = key_tokens(prompts[i])
+                    for column in columns[np.argsort(-row[columns], kind="stable")]:
+                        slot = slots[column]
+                        if self._entries[slot][3] == keys:
+                            self._tick += 1
+                            self._used[slot] = self._tick
+                            results[i] = self._entries[slot][1]
+                            break
+            hits = sum(result is not None for result in results)
+            self.hits += hits
+            self.misses += len(prompts) - hits
+        return results
+
+    def store(self, prompt: str, scope: int, response: str) -> None:
+        """
+        缓存一个问答，超出条目数或内存上限时淘汰最久未使用的条目
+
+        Args:
+            prompt: 问题
+            scope: 缓存范围的键
+            response: 回答
+        """
+        vector = self.embedder.embed([content_text(prompt)])[0]
+        size = self._vectors.itemsize * self.embedder.dim + len(prompt.encode("utf-8")) + len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            while self._count and (self._count >= self.max_entries or self._bytes + size > self.max_bytes):
+                self._evict()
+            slot = self._free_slot()
+            self._vectors[slot] = vector
+            self._scopes[slot] = scope
+            self._tick += 1
+            self._used[slot] = self._tick
+            self._entries[slot] = (prompt, response, size, key_tokens(prompt))
+            self._bytes += size
+            self._count += 1
+
+    def _free_slot(self) -> int:
+        """
+        获取一个空位，矩阵已满时按倍数扩容，不超过max_entries
+
+        Returns:
+            空位的行号
+        """
+        np = self.embedder.np
+        free = np.flatnonzero(self._used < 0)
+        if len(free):
+            return int(free[0])
+
+        capacity = len(self._used)
+        new_capacity = min(capacity * 2, self.max_entries)
+        self._vectors = np.concatenate(
+            [self._vectors, np.zeros((new_capacity - capacity, self.embedder.dim), dtype=np.float32)]
+        )
+        self._scopes = np.concatenate([self._scopes, np.zeros(new_capacity - capacity, dtype=np.int64)])
+        self._used = np.concatenate([self._used, np.full(new_capacity - capacity, -1, dtype=np.int64)])
+        self._entries.extend([None] * (new_capacity - capacity))
+        return capacity
+
+    def _evict(self) -> None:
+        """淘汰最久未使用的条目"""
+        np = self.embedder.np
+        used = np.where(self._used >= 0, self._used, np.iinfo(np.int64).max)
+        slot = int(used.argmin())
+        self._bytes -= self._entries[slot][2]
+        self._entries[slot] = None
+        self._used[slot] = -1
+        self._count -= 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._used[:] = -1
+            self._entries = [None] * len(self._entries)
+            self._bytes = 0
+            self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def memory_bytes(self) -> int:
+        """缓存条目占用的内存（字节）"""
+        return self._bytes
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取缓存统计
+
+        Returns:
+            条目数、内存占用、命中和未命中次数
+        """
+        return {"entries": self._count, "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
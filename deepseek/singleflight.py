@@ -0,0 +1,267 @@
+"""
+DeepSeek 请求去重
+~~~~~~~~~~~~~~
+
+对同时发起的相同请求进行合并（single-flight），相同请求只向上游发送一次，
+其余调用方等待并共享该次调用的结果或流式输出。同时支持线程和asyncio调用方。
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import threading
+from typing import Dict, Any, Optional, List, Callable, Generator, Awaitable, Tuple
+
+
+def request_key(messages: List[Dict[str, Any]], params: Dict[str, Any], scope: str = "") -> str:
+    """
+    计算请求的去重键
+
+    Args:
+        messages: 最终发送的消息列表
+        params: 最终发送的API参数
+        scope: 附加的作用域，例如API基础URL
+
+    Returns:
+        请求内容的SHA-256摘要
+    """
+    payload = json.dumps(
+        {"scope": scope, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    """一次进行中的普通调用"""
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class _StreamCall:
+    """一次进行中的流式调用，缓存已收到的数据块供所有订阅者读取"""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.condition = threading.Condition()
+
+
+class SingleFlight:
+    """相同请求合并器"""
+
+    def __init__(self):
+        """初始化请求合并器"""
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _StreamCall] = {}
+        self._tasks: Dict[Tuple[int, str], asyncio.Future] = {}
+        self._upstream_calls = 0
+        self._shared_calls = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        执行调用，相同键的并发调用只执行一次
+
+        Args:
+            key: 请求去重键
+            fn: 实际发起调用的函数
+
+        Returns:
+            调用结果，所有等待者共享同一个结果对象
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._upstream_calls += 1
+            else:
+                self._shared_calls += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        在asyncio中执行调用，同一事件循环内相同键的并发调用只执行一次
+
+        上游调用运行在独立的任务中，单个等待者被取消不会影响其他等待者。
+
+        Args:
+            key: 请求去重键
+            fn: 返回awaitable的函数
+
+        Returns:
+            调用结果
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = asyncio.ensure_future(fn(), loop=loop)
+                self._tasks[task_key] = task
+                self._upstream_calls += 1
+
+                def _cleanup(_task: asyncio.Future) -> None:
+                    with self._lock:
+                        if self._tasks.get(task_key) is _task:
+                            del self._tasks[task_key]
+
+                task.add_done_callback(_cleanup)
+            else:
+                self._shared_calls += 1
+
+        return await asyncio.shield(task)
+
+    def stream(
+        self, key: str, fn: Callable[[], Generator[Any, None, Any]]
+    ) -> Generator[Any, None, Any]:
+        """
+        执行流式调用，相同键的并发调用共享同一个上游流
+
+        上游流由后台线程读取，所有订阅者（包括第一个）从共享缓冲区读取，
+        中途加入的订阅者会先重放已收到的数据块。所有订阅者都退出后上游流会被关闭。
+        后台线程在第一个调用方的上下文副本中运行，用量归属等上下文变量与调用方一致。
+
+        Args:
+            key: 请求去重键
+            fn: 返回生成器的函数，生成器的返回值会作为本方法的返回值
+
+        Yields:
+            上游流的数据块
+
+        Returns:
+            上游生成器的返回值
+        """
+        with self._lock:
+            call = self._streams.get(key)
+            leader = call is None
+            if leader:
+                call = _StreamCall()
+                self._streams[key] = call
+                self._upstream_calls += 1
+            else:
+                self._shared_calls += 1
+            with call.condition:
+                call.subscribers += 1
+
+        if leader:
+            context = contextvars.copy_context()
+            threading.Thread(
+                target=context.run, args=(self._pump, key, call, fn), daemon=True
+            ).start()
+
+        index = 0
+        try:
+            while True:
+                with call.condition:
+                    while index >= len(call.items) and not call.done:
+                        call.condition.wait()
+                    pending = call.items[index:]
+                    done = call.done
+                for item in pending:
+                    yield item
+                index += len(pending)
+                if done and index >= len(call.items):
+                    break
+        finally:
+            with call.condition:
+                call.subscribers -= 1
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _pump(self, key: str, call: _StreamCall, fn: Callable[[], Generator[Any, None, Any]]) -> None:
+        """
+        在后台线程中读取上游流并分发给订阅者
+
+        Args:
+            key: 请求去重键
+            call: 流式调用状态
+            fn: 返回生成器的函数
+        """
+        generator = None
+        try:
+            generator = fn()
+            while True:
+                try:
+                    item = next(generator)
+                except StopIteration as stop:
+                    call.result = stop.value
+                    break
+                with call.condition:
+                    call.items.append(item)
+                    call.condition.notify_all()
+                    abandoned = call.subscribers == 0
+                if abandoned:
+                    # 没有订阅者了，提前关闭上游连接
+                    generator.close()
+                    break
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                if self._streams.get(key) is call:
+                    del self._streams[key]
+            with call.condition:
+                call.done = True
+                call.condition.notify_all()
+
+    def in_flight(self) -> int:
+        """
+        获取当前进行中的上游调用数量
+
+        Returns:
+            进行中的上游调用数量
+        """
+        with self._lock:
+            return len(self._calls) + len(self._streams) + len(self._tasks)
+
+    def metrics(self) -> Dict[str, int]:
+        """
+        获取去重统计信息
+
+        Returns:
+            包含上游调用次数、共享次数和进行中调用数量的字典
+        """
+        with self._lock:
+            return {
+                "upstream_calls": self._upstream_calls,
+                "shared_calls": self._shared_calls,
+                "in_flight": len(self._calls) + len(self._streams) + len(self._tasks),
+            }
+
+
+# 进程内共享的默认合并器，使不同客户端实例之间的相同请求也能合并
+default_group = SingleFlight()
@@ -0,0 +1,342 @@
+"""
+DeepSeek 结构化输出
+~~~~~~~~~~~~~~~~
+
+增量解析流式返回的JSON。每收到一段文本就继续解析，对象的字段或数组的元素一旦完整就作为事件返回，
+下游可以在生成结束前开始处理已完成的部分；输出一旦出现语法错误立即报错，调用方可以中止请求，
+不再为无效的输出消耗token。
+
+已经扫描过的文本不会重复扫描，解析的总开销与输出长度成正比。
+"""
+
+import json
+import re
+from typing import Any, Optional, List, Iterable, Iterator, Tuple, Union
+
+from .exceptions import DeepSeekError
+
+# 路径中的一项：对象的键或数组的下标
+PathItem = Union[str, int]
+
+_WHITESPACE = " \t\r\n"
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?")
+_NUMBER_CHARS_RE = re.compile(r"[0-9+\-.eE]*")
+_LITERALS = {"t": ("true", True), "f": ("false", False), "n": ("null", None)}
+
+# 容器期待的下一个语法元素
+_VALUE = 0           # 一个值（数组的元素或对象字段的值）
+_VALUE_OR_END = 1    # 数组的第一个元素或 ]
+_KEY = 2             # 对象的键
+_KEY_OR_END = 3      # 对象的第一个键或 }
+_COLON = 4           # 键后面的冒号
+_COMMA_OR_END = 5    # 逗号或容器结束
+
+
+class StructuredOutputError(DeepSeekError):
+    """模型输出的JSON不完整或存在语法错误"""
+
+    def __init__(self, message: str, position: int, text: str = ""):
+        """
+        初始化异常
+
+        Args:
+            message: 错误信息
+            position: 出错位置在整个输出中的字符偏移
+            text: 出错位置附近的文本
+        """
+        super().__init__(f"{message}（位置 {position}）: {text!r}" if text else f"{message}（位置 {position}）")
+        self.position = position
+
+
+class JSONEvent:
+    """一个解析完成的JSON值"""
+
+    __slots__ = ("path", "value")
+
+    def __init__(self, path: Tuple[PathItem, ...], value: Any):
+        """
+        初始化事件
+
+        Args:
+            path: 值在文档中的路径，空元组表示整个文档已解析完成
+            value: 解析得到的值
+        """
+        self.path = path
+        self.value = value
+
+    @property
+    def is_document(self) -> bool:
+        """是否为整个文档"""
+        return not self.path
+
+    @property
+    def key(self) -> Optional[PathItem]:
+        """值在所在容器中的键或下标，整个文档为None"""
+        return self.path[-1] if self.path else None
+
+    def __repr__(self) -> str:
+        return f"JSONEvent({self.path!r}, {self.value!r})"
+
+
+class IncrementalJSONParser:
+    """增量JSON解析器"""
+
+    def __init__(self, max_depth: Optional[int] = None):
+        """
+        初始化解析器
+
+        Args:
+            max_depth: 返回事件的最大深度，例如1表示只返回顶层的字段或元素；None表示返回所有深度的值
+        """
+        self.max_depth = max_depth
+        self.document: Any = None
+        self.done = False
+        self._buffer = ""
+        # _buffer[0]在整个输出中的偏移，用于错误信息
+        self._offset = 0
+        # 未闭合的容器：[容器, 当前字段的键, 期待的语法元素]
+        self._stack: List[list] = []
+        self._path: List[PathItem] = []
+        # 正在读取的字符串中已确认没有结束引号的长度，避免重复扫描长字符串
+        self._string_scanned = 0
+
+    def feed(self, text: str) -> List[JSONEvent]:
+        """
+        输入一段文本
+
+        Args:
+            text: 新收到的文本
+
+        Returns:
+            本段文本使解析完成的值，按完成顺序排列
+
+        Raises:
+            StructuredOutputError: 文本存在语法错误
+        """
+        self._buffer += text
+        events: List[JSONEvent] = []
+        consumed = self._parse(events, final=False)
+        self._discard(consumed)
+        return events
+
+    def close(self) -> List[JSONEvent]:
+        """
+        结束输入，处理末尾的数字
+
+        Returns:
+            结束输入后完成的值
+
+        Raises:
+            StructuredOutputError: 文档不完整
+        """
+        events: List[JSONEvent] = []
+        consumed = self._parse(events, final=True)
+        self._discard(consumed)
+        if not self.done:
+            raise StructuredOutputError("JSON不完整", self._offset, self._buffer[-40:])
+        return events
+
+    def _discard(self, consumed: int) -> None:
+        if consumed:
+            self._buffer = self._buffer[consumed:]
+            self._offset += consumed
+            self._string_scanned = max(0, self._string_scanned - consumed)
+
+    def _error(self, message: str, pos: int) -> StructuredOutputError:
+        return StructuredOutputError(message, self._offset + pos, self._buffer[pos:pos + 20])
+
+    def _parse(self, events: List[JSONEvent], final: bool) -> int:
+        """
+        从缓冲区开头解析尽可能多的完整语法元素
+
+        Args:
+            events: 收集完成的值
+            final: 是否已经没有后续输入
+
+        Returns:
+            已经消费的字符数
+        """
+        buffer = self._buffer
+        length = len(buffer)
+        pos = 0
+        while pos < length:
+            char = buffer[pos]
+            if char in _WHITESPACE:
+                pos += 1
+                continue
+            if self.done:
+                raise self._error("JSON之后存在多余的内容", pos)
+
+            expect = self._stack[-1][2] if self._stack else _VALUE
+
+            if expect == _COLON:
+                if char != ":":
+                    raise self._error("缺少冒号", pos)
+                self._stack[-1][2] = _VALUE
+                pos += 1
+                continue
+
+            if expect == _COMMA_OR_END:
+                frame = self._stack[-1]
+                is_object = isinstance(frame[0], dict)
+                if char == ",":
+                    frame[2] = _KEY if is_object else _VALUE
+                    pos += 1
+                elif char == ("}" if is_object else "]"):
+                    pos += 1
+                    self._close_container(events)
+                else:
+                    raise self._error("缺少逗号或容器结束符", pos)
+                continue
+
+            if expect in (_KEY, _KEY_OR_END):
+                if char == "}" and expect == _KEY_OR_END:
+                    pos += 1
+                    self._close_container(events)
+                    continue
+                if char != '"':
+                    raise self._error("对象的键必须是字符串", pos)
+                end = self._scan_string(buffer, pos)
+                if end < 0:
+                    break
+                frame = self._stack[-1]
+                frame[1] = self._decode_string(buffer, pos, end)
+                frame[2] = _COLON
+                pos = end
+                continue
+
+            # 期待一个值
+            if char == "]" and expect == _VALUE_OR_END:
+                pos += 1
+                self._close_container(events)
+                continue
+            if char == "{" or char == "[":
+                self._open_container({} if char == "{" else [])
+                pos += 1
+                continue
+            if char == '"':
+                end = self._scan_string(buffer, pos)
+                if end < 0:
+                    break
+                self._add_value(self._decode_string(buffer, pos, end), events)
+                pos = end
+                continue
+            if char == "-" or char.isdigit():
+                # 数字可能在下一段文本中继续，读到数字字符之外的字符才能确定数字已经结束
+                end = _NUMBER_CHARS_RE.match(buffer, pos).end()
+                if end == length and not final:
+                    break
+                match = _NUMBER_RE.match(buffer, pos)
+                if match is None or match.end() != end:
+                    raise self._error("无效的数字", pos)
+                text = match.group()
+                self._add_value(float(text) if "." in text or "e" in text or "E" in text else int(text), events)
+                pos = end
+                continue
+            literal = _LITERALS.get(char)
+            if literal is not None:
+                word, value = literal
+                available = buffer[pos:pos + len(word)]
+                if not word.startswith(available):
+                    raise self._error("无效的字面量", pos)
+                if len(available) < len(word):
+                    if final:
+                        raise self._error("无效的字面量", pos)
+                    break
+                self._add_value(value, events)
+                pos += len(word)
+                continue
+            raise self._error("无效的字符", pos)
+        return pos
+
+    def _scan_string(self, buffer: str, start: int) -> int:
+        """
+        查找从start开始的字符串的结束位置
+
+        Args:
+            buffer: 缓冲区
+            start: 开始引号的位置
+
+        Returns:
+            结束引号之后的位置，字符串尚未结束时返回-1
+        """
+        search = max(start + 1, self._string_scanned)
+        while True:
+            quote = buffer.find('"', search)
+            if quote < 0:
+                # 末尾的反斜杠可能转义下一段文本的第一个字符，下次从它开始扫描
+                self._string_scanned = len(buffer) - 1 if buffer.endswith("\\") else len(buffer)
+                return -1
+            backslashes = 0
+            while buffer[quote - 1 - backslashes] == "\\":
+                backslashes += 1
+            if backslashes % 2 == 0:
+                self._string_scanned = 0
+                return quote + 1
+            search = quote + 1
+
+    def _decode_string(self, buffer: str, start: int, end: int) -> str:
+        try:
+            return json.loads(buffer[start:end])
+        except ValueError:
+            raise self._error("无效的字符串", start) from None
+
+    def _open_container(self, container: Any) -> None:
+        if self._stack:
+            self._path.append(self._current_key())
+        self._stack.append([container, None, _KEY_OR_END if isinstance(container, dict) else _VALUE_OR_END])
+
+    def _current_key(self) -> PathItem:
+        container, key, _ = self._stack[-1]
+        return key if isinstance(container, dict) else len(container)
+
+    def _close_container(self, events: List[JSONEvent]) -> None:
+        container = self._stack.pop()[0]
+        if self._stack:
+            self._path.pop()
+        self._add_value(container, events)
+
+    def _add_value(self, value: Any, events: List[JSONEvent]) -> None:
+        """
+        把完成的值放入所在的容器并生成事件
+
+        Args:
+            value: 完成的值
+            events: 收集完成的值
+        """
+        if not self._stack:
+            self.document = value
+            self.done = True
+            events.append(JSONEvent((), value))
+            return
+
+        frame = self._stack[-1]
+        container = frame[0]
+        key = self._current_key()
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
+        frame[2] = _COMMA_OR_END
+        if self.max_depth is None or len(self._path) < self.max_depth:
+            events.append(JSONEvent((*self._path, key), value))
+
+
+def parse_json_stream(chunks: Iterable[str], max_depth: Optional[int] = None) -> Iterator[JSONEvent]:
+    """
+    增量解析文本流中的JSON
+
+    Args:
+        chunks: 文本片段
+        max_depth: 返回事件的最大深度，None表示返回所有深度的值
+
+    Yields:
+        解析完成的值，最后一个事件的路径为空元组，值为整个文档
+
+    Raises:
+        StructuredOutputError: 文本存在语法错误或不完整
+    """
+    parser = IncrementalJSONParser(max_depth)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
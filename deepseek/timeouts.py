@@ -0,0 +1,249 @@
+"""
+DeepSeek 超时与取消
+~~~~~~~~~~~~~~~~
+
+定义分阶段的超时设置（连接、读取、流式数据块间隔、总截止时间），
+以及在请求之间传递截止时间和取消信号的工具类。
+"""
+
+import threading
+import time
+from typing import Any, Optional, Callable, List, Tuple, Union
+
+import httpx
+
+from .exceptions import DeadlineExceededError, RequestCancelledError
+
+
+class Timeouts:
+    """分阶段的超时设置"""
+
+    def __init__(
+        self,
+        connect: float = 10.0,
+        read: float = 30.0,
+        idle: Optional[float] = None,
+        total: Optional[float] = None,
+    ):
+        """
+        初始化超时设置
+
+        Args:
+            connect: 建立连接的超时时间（秒）
+            read: 等待响应数据的超时时间（秒）
+            idle: 流式响应中两个数据块之间的最长间隔（秒），为None时与read相同
+            total: 单次调用的总截止时间（秒），为None时不限制
+        """
+        self.connect = connect
+        self.read = read
+        self.idle = idle if idle is not None else read
+        self.total = total
+
+    @classmethod
+    def coerce(cls, timeout: Union["Timeouts", int, float, None]) -> "Timeouts":
+        """
+        将旧式的单一超时时间转换为超时设置
+
+        Args:
+            timeout: 超时设置或以秒为单位的超时时间
+
+        Returns:
+            超时设置
+        """
+        if isinstance(timeout, Timeouts):
+            return timeout
+        if timeout is None:
+            return cls()
+        return cls(connect=min(float(timeout), 10.0), read=float(timeout))
+
+    def to_httpx(self, stream: bool = False, deadline: Optional["Deadline"] = None) -> httpx.Timeout:
+        """
+        转换为httpx的超时设置
+
+        Args:
+            stream: 是否为流式请求，流式请求的读取超时使用数据块间隔超时
+            deadline: 本次调用的截止时间，各阶段超时不会超过剩余时间
+
+        Returns:
+            httpx超时设置
+        """
+        connect = self.connect
+        read = self.idle if stream else self.read
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None:
+            connect = min(connect, remaining)
+            read = min(read, remaining)
+        return httpx.Timeout(read, connect=connect, pool=connect)
+
+    def to_requests(self, deadline: Optional["Deadline"] = None) -> Tuple[float, float]:
+        """
+        转换为requests的(连接超时, 读取超时)元组
+
+        Args:
+            deadline: 本次调用的截止时间，各阶段超时不会超过剩余时间
+
+        Returns:
+            超时元组
+        """
+        connect, read = self.connect, self.read
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None:
+            connect = min(connect, remaining)
+            read = min(read, remaining)
+        return connect, read
+
+    def to_dict(self) -> dict:
+        """
+        将超时设置转换为字典
+
+        Returns:
+            包含各阶段超时的字典
+        """
+        return {
+            "connect": self.connect,
+            "read": self.read,
+            "idle": self.idle,
+            "total": self.total,
+        }
+
+    def __repr__(self) -> str:
+        return f"Timeouts({self.to_dict()})"
+
+
+class Deadline:
+    """单次调用的截止时间"""
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, seconds: Optional[float] = None):
+        """
+        初始化截止时间
+
+        Args:
+            seconds: 从现在开始的剩余时间（秒），为None时表示不限制
+        """
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> Optional[float]:
+        """
+        获取剩余时间
+
+        Returns:
+            剩余时间（秒），不限制时返回None
+        """
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        """
+        检查是否已经超过截止时间
+
+        Returns:
+            是否已超时
+        """
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self) -> None:
+        """检查截止时间，超时时抛出DeadlineExceededError"""
+        if self.expired():
+            raise DeadlineExceededError("请求超过了总截止时间")
+
+    def clamp(self, timeout: Union[httpx.Timeout, float, None]) -> Union[httpx.Timeout, float, None]:
+        """
+        把超时设置限制在剩余时间以内，每次重试前调用以免单次尝试超过截止时间
+
+        Args:
+            timeout: httpx超时设置或以秒为单位的超时时间，None表示不限制
+
+        Returns:
+            不超过剩余时间的超时设置
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if not isinstance(timeout, httpx.Timeout):
+            return remaining if timeout is None else min(float(timeout), remaining)
+
+        def _clamp(value: Optional[float]) -> float:
+            return remaining if value is None else min(value, remaining)
+
+        return httpx.Timeout(
+            connect=_clamp(timeout.connect),
+            read=_clamp(timeout.read),
+            write=_clamp(timeout.write),
+            pool=_clamp(timeout.pool),
+        )
+
+
+class CancelToken:
+    """
+    取消令牌
+
+    可以在其他线程中调用cancel()取消正在进行的流式调用，已注册的回调（例如关闭连接）会立即执行。
+    """
+
+    def __init__(self):
+        """初始化取消令牌"""
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], Any]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已取消"""
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """取消调用并执行所有已注册的回调"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def add_callback(self, callback: Callable[[], Any]) -> None:
+        """
+        注册取消时执行的回调，如果已经取消则立即执行
+
+        Args:
+            callback: 回调函数
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], Any]) -> None:
+        """
+        移除已注册的回调
+
+        Args:
+            callback: 回调函数
+        """
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def check(self) -> None:
+        """检查是否已取消，已取消时抛出RequestCancelledError"""
+        if self._event.is_set():
+            raise RequestCancelledError("请求已取消")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待取消信号
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            是否已取消
+        """
+        return self._event.wait(timeout)
@@ -0,0 +1,313 @@
+"""
+DeepSeek token计数
+~~~~~~~~~~~~~~~
+
+在本地计算文本和消息的token数，用于对话历史截断、检索内容的token预算和max_tokens估算。
+
+分词器按以下顺序查找，找到第一个即使用：
+
+1. ``DEEPSEEK_TOKENIZER_PATH`` 指向的 ``tokenizer.json`` （或包含它的目录），需要安装tokenizers；
+2. deepseek-tokenizer包中打包的DeepSeek ``tokenizer.json`` （``pip install "deepseek-client[tokenizer]"``
+   同时安装它和tokenizers），没有安装tokenizers时使用该包自带的纯Python实现，结果相同但较慢；
+3. 都没有时按DeepSeek公布的换算比例估算（1个中文字符约0.6个token，1个英文字符约0.3个token），
+   数字按每三位一组计数，比按字符数除以4的估算更接近中文文本的实际用量。
+
+每条消息的token数以内容为键缓存（字符串的哈希值由Python缓存在对象上，重复查找不需要重新计算），
+对话历史中没有变化的消息不会重复分词。
+"""
+
+import importlib.util
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Iterable
+
+# 每条消息的角色标记和结束标记占用的token数
+MESSAGE_OVERHEAD = 2
+# 请求末尾提示模型开始回答的标记占用的token数
+REPLY_PRIMING = 1
+
+# 按连续的同类字符匹配，比逐个字符匹配快得多
+_CJK_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff\u3000-\u303f\uff00-\uffef]+")
+_ASCII_TEXT_RE = re.compile(r"[A-Za-z!-/:-@\[-`{-~]+")
+_DIGITS_RE = re.compile(r"[0-9]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    按DeepSeek公布的换算比例估算文本的token数
+
+    中日韩文字和全角标点约0.6个token，英文字母和半角标点约0.3个token，
+    数字每三位一个token，其他字符（如表情和其他语言的文字）每个约1个token，空白不计。
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk = sum(map(len, _CJK_RE.findall(text)))
+    ascii_text = sum(map(len, _ASCII_TEXT_RE.findall(text)))
+    digit_runs = list(map(len, _DIGITS_RE.findall(text)))
+    spaces = sum(map(len, _SPACE_RE.findall(text)))
+    other = len(text) - cjk - ascii_text - sum(digit_runs) - spaces
+    numbers = sum((length + 2) // 3 for length in digit_runs)
+    return max(1, math.ceil(cjk * 0.6 + ascii_text * 0.3 + numbers + other))
+
+
+class EstimatingTokenizer:
+    """不依赖词表的token估算器"""
+
+    name = "estimate"
+
+    def count(self, text: str) -> int:
+        return estimate_tokens(text)
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        return [estimate_tokens(text) for text in texts]
+
+
+class HuggingFaceTokenizer:
+    """使用tokenizers库加载 ``tokenizer.json`` 精确计数"""
+
+    name = "tokenizer.json"
+
+    def __init__(self, path: str):
+        """
+        加载分词器
+
+        Args:
+            path: tokenizer.json文件路径，或包含该文件的目录
+        """
+        try:
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("使用tokenizer.json精确计数需要安装tokenizers: pip install tokenizers") from e
+
+        if os.path.isdir(path):
+            path = os.path.join(path, "tokenizer.json")
+        self.path = path
+        self._tokenizer = Tokenizer.from_file(path)
+
+    def count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        # tokenizers在多个线程中并行分词
+        return [len(encoding.ids) for encoding in self._tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+
+class BundledTokenizer:
+    """使用deepseek-tokenizer包的纯Python实现计数，没有安装tokenizers时使用"""
+
+    name = "deepseek-tokenizer"
+
+    def __init__(self):
+        """加载deepseek-tokenizer包中打包的分词器"""
+        from deepseek_tokenizer import ds_token
+
+        self._tokenizer = ds_token
+
+    def count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False))
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        return [self.count(text) for text in texts]
+
+
+def bundled_tokenizer_path() -> Optional[str]:
+    """
+    查找deepseek-tokenizer包中打包的tokenizer.json，不导入该包
+
+    Returns:
+        文件路径，没有安装该包时返回None
+    """
+    spec = importlib.util.find_spec("deepseek_tokenizer")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    for location in spec.submodule_search_locations:
+        path = os.path.join(location, "tokenizer.json")
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def load_tokenizer(path: Optional[str] = None) -> Any:
+    """
+    按查找顺序加载分词器
+
+    Args:
+        path: tokenizer.json文件或所在目录，为None时依次尝试DEEPSEEK_TOKENIZER_PATH和打包的分词器
+
+    Returns:
+        分词器，找不到任何分词器时返回估算器
+    """
+    path = path or os.getenv("DEEPSEEK_TOKENIZER_PATH")
+    if path:
+        return HuggingFaceTokenizer(path)
+
+    bundled = bundled_tokenizer_path()
+    if bundled is None:
+        return EstimatingTokenizer()
+    if importlib.util.find_spec("tokenizers") is not None:
+        return HuggingFaceTokenizer(bundled)
+    return BundledTokenizer()
+
+
+class TokenCounter:
+    """带缓存的token计数器，线程安全"""
+
+    def __init__(self, tokenizer: Optional[Any] = None, cache_size: int = 8192):
+        """
+        初始化计数器
+
+        Args:
+            tokenizer: 分词器，需要提供count和count_batch方法，为None时使用估算器
+            cache_size: 按内容哈希缓存的文本数
+        """
+        self.tokenizer = tokenizer or EstimatingTokenizer()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def exact(self) -> bool:
+        """是否使用与服务端一致的分词器"""
+        return not isinstance(self.tokenizer, EstimatingTokenizer)
+
+    def _put(self, text: str, count: int) -> None:
+        self._cache[text] = count
+        self._cache.move_to_end(text)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def count(self, text: str) -> int:
+        """
+        计算文本的token数
+
+        Args:
+            text: 文本
+
+        Returns:
+            token数
+        """
+        if not text:
+            return 0
+        with self._lock:
+            count = self._cache.get(text)
+            if count is not None:
+                self._cache.move_to_end(text)
+                return count
+        count = self.tokenizer.count(text)
+        with self._lock:
+            self._put(text, count)
+        return count
+
+    def count_batch(self, texts: Iterable[str]) -> List[int]:
+        """
+        批量计算token数，只对没有缓存的文本调用一次分词器
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与文本一一对应的token数
+        """
+        texts = list(texts)
+        counts = [0] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        with self._lock:
+            cache = self._cache
+            for i, text in enumerate(texts):
+                if not text:
+                    continue
+                count = cache.get(text)
+                if count is not None:
+                    cache.move_to_end(text)
+                    counts[i] = count
+                else:
+                    missing.setdefault(text, []).append(i)
+
+        if missing:
+            missing_counts = self.tokenizer.count_batch(list(missing))
+            with self._lock:
+                for (text, positions), count in zip(missing.items(), missing_counts):
+                    self._put(text, count)
+                    for i in positions:
+                        counts[i] = count
+        return counts
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        """
+        计算一条消息的token数，包括角色标记
+
+        Args:
+            message: 消息
+
+        Returns:
+            token数
+        """
+        content = message.get("content")
+        return MESSAGE_OVERHEAD + (self.count(content) if isinstance(content, str) else 0)
+
+    def count_messages(self, messages: List[Dict[str, Any]]) -> int:
+        """
+        计算消息列表作为一次请求输入的token数
+
+        Args:
+            messages: 消息列表
+
+        Returns:
+            token数
+        """
+        texts = [message.get("content") for message in messages]
+        texts = [text if isinstance(text, str) else "" for text in texts]
+        return sum(self.count_batch(texts)) + MESSAGE_OVERHEAD * len(messages) + REPLY_PRIMING
+
+    def cache_info(self) -> Dict[str, Any]:
+        """
+        获取计数器信息
+
+        Returns:
+            分词器类型和缓存的文本数
+        """
+        return {"tokenizer": self.tokenizer.name, "exact": self.exact, "cached": len(self._cache)}
+
+
+_default_counter: Optional[TokenCounter] = None
+_default_lock = threading.Lock()
+
+
+def get_token_counter() -> TokenCounter:
+    """
+    获取进程内共享的计数器
+
+    分词器的查找顺序见load_tokenizer，找不到分词器时使用估算器。
+
+    Returns:
+        计数器
+    """
+    global _default_counter
+    if _default_counter is None:
+        with _default_lock:
+            if _default_counter is None:
+                _default_counter = TokenCounter(load_tokenizer())
+    return _default_counter
+
+
+def count_tokens(text: str) -> int:
+    """
+    使用共享的计数器计算文本的token数
+
+    Args:
+        text: 文本
+
+    Returns:
+        token数
+    """
+    return get_token_counter().count(text)
@@ -0,0 +1,366 @@
+"""
+DeepSeek 工具调用
+~~~~~~~~~~~~~~
+
+注册可供模型调用的函数，并执行模型返回的工具调用。
+
+模型在一次回答中返回多个工具调用时，这些调用在线程池中并发执行，每个工具有独立的超时时间，
+一轮的耗时取决于最慢的工具而不是所有工具耗时之和。声明了cache_ttl的工具按参数缓存结果，
+重复的调用不会再次执行。工具结果序列化为紧凑的JSON并限制长度，减少后续请求的输入token数。
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, Optional, List, Callable, Iterable, Tuple
+
+from .retrieval import TTLCache
+
+# 参数类型注解到JSON Schema类型的映射
+_JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    tuple: "array",
+    dict: "object",
+}
+
+
+def parameters_from_signature(function: Callable) -> Dict[str, Any]:
+    """
+    根据函数签名生成参数的JSON Schema
+
+    只识别基本类型注解，没有注解或无法识别的参数不限制类型；没有默认值的参数为必填参数。
+
+    Args:
+        function: 工具函数
+
+    Returns:
+        参数的JSON Schema
+    """
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+    for name, parameter in inspect.signature(function).parameters.items():
+        if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            continue
+        annotation = getattr(parameter.annotation, "__origin__", parameter.annotation)
+        json_type = _JSON_TYPES.get(annotation)
+        properties[name] = {"type": json_type} if json_type else {}
+        if parameter.default is parameter.empty:
+            required.append(name)
+    return {"type": "object", "properties": properties, "required": required}
+
+
+def compact_json(value: Any) -> str:
+    """
+    将工具结果序列化为紧凑的JSON，字符串结果原样返回
+
+    Args:
+        value: 工具结果
+
+    Returns:
+        结果文本
+    """
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class Tool:
+    """一个可供模型调用的工具"""
+
+    def __init__(
+        self,
+        function: Callable,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        parameters: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = 30.0,
+        cache_ttl: float = 0.0,
+    ):
+        """
+        初始化工具
+
+        Args:
+            function: 工具函数，可以是普通函数或协程函数，以关键字参数接收模型给出的参数
+            name: 工具名称，默认使用函数名
+            description: 工具说明，默认使用函数文档字符串的第一段
+            parameters: 参数的JSON Schema，默认根据函数签名生成
+            timeout: 单次调用的超时时间（秒），None表示不限制
+            cache_ttl: 按参数缓存结果的时间（秒），0表示不缓存；只应对没有副作用的工具启用
+        """
+        self.function = function
+        self.name = name or function.__name__
+        self.description = description or (inspect.getdoc(function) or "").split("\n\n")[0].strip()
+        self.parameters = parameters or parameters_from_signature(function)
+        self.timeout = timeout
+        self.is_async = inspect.iscoroutinefunction(function)
+        self.cache: Optional[TTLCache] = TTLCache(max_size=256, ttl=cache_ttl) if cache_ttl > 0 else None
+
+    def schema(self) -> Dict[str, Any]:
+        """
+        获取API请求中tools参数的一项
+
+        Returns:
+            工具定义
+        """
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+        }
+
+    def run(self, arguments: Dict[str, Any]) -> Any:
+        """
+        在当前线程中调用工具，协程函数在新的事件循环中运行
+
+        Args:
+            arguments: 参数
+
+        Returns:
+            工具结果
+        """
+        if self.is_async:
+            return asyncio.run(self.function(**arguments))
+        return self.function(**arguments)
+
+    def __repr__(self) -> str:
+        return f"Tool({self.name!r})"
+
+
+class ToolRegistry:
+    """工具注册表，负责生成工具定义和并发执行工具调用"""
+
+    def __init__(self, max_workers: int = 8, max_result_chars: int = 4000):
+        """
+        初始化注册表
+
+        Args:
+            max_workers: 并发执行工具的最大线程数
+            max_result_chars: 单个工具结果的最大字符数，超出部分被截断
+        """
+        self.max_workers = max_workers
+        self.max_result_chars = max_result_chars
+        self._tools: Dict[str, Tool] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        function: Optional[Callable] = None,
+        *,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        parameters: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = 30.0,
+        cache_ttl: float = 0.0,
+    ) -> Callable:
+        """
+        注册工具，可以直接调用，也可以作为装饰器使用::
+
+            @client.tools.register(timeout=5, cache_ttl=60)
+            def get_weather(city: str) -> dict:
+                \"\"\"查询城市的当前天气\"\"\"
+
+        Args:
+            function: 工具函数
+            name: 工具名称，默认使用函数名
+            description: 工具说明，默认使用函数文档字符串的第一段
+            parameters: 参数的JSON Schema，默认根据函数签名生成
+            timeout: 单次调用的超时时间（秒），None表示不限制
+            cache_ttl: 按参数缓存结果的时间（秒），0表示不缓存
+
+        Returns:
+            原函数，作为装饰器使用时返回装饰器
+        """
+        def decorator(func: Callable) -> Callable:
+            self.add(Tool(func, name, description, parameters, timeout, cache_ttl))
+            return func
+
+        return decorator(function) if function is not None else decorator
+
+    def add(self, tool: Tool) -> None:
+        """
+        添加工具，同名工具会被替换
+
+        Args:
+            tool: 工具
+        """
+        self._tools[tool.name] = tool
+
+    def remove(self, name: str) -> None:
+        """
+        移除工具
+
+        Args:
+            name: 工具名称
+        """
+        self._tools.pop(name, None)
+
+    def get(self, name: str) -> Optional[Tool]:
+        """获取工具，不存在时返回None"""
+        return self._tools.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """
+        获取所有工具的定义
+
+        Returns:
+            API请求中的tools参数
+        """
+        return [tool.schema() for tool in self._tools.values()]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="deepseek-tool"
+                    )
+        return self._executor
+
+    def _resolve(self, call: Dict[str, Any]) -> Tuple[Optional[Tool], Dict[str, Any], Optional[Any], Optional[str]]:
+        """
+        解析一个工具调用
+
+        Args:
+            call: 工具调用
+
+        Returns:
+            (工具, 参数, 缓存的结果, 错误信息)；无法调用时工具为None并给出错误信息
+        """
+        function = call.get("function") or {}
+        tool = self._tools.get(function.get("name"))
+        if tool is None:
+            return None, {}, None, f"未知的工具: {function.get('name')}"
+        try:
+            arguments = json.loads(function.get("arguments") or "{}")
+        except ValueError as e:
+            return None, {}, None, f"参数不是有效的JSON: {e}"
+        if not isinstance(arguments, dict):
+            return None, {}, None, "参数必须是JSON对象"
+        cached = tool.cache.get(self._cache_key(arguments)) if tool.cache is not None else None
+        return tool, arguments, cached, None
+
+    @staticmethod
+    def _cache_key(arguments: Dict[str, Any]) -> str:
+        return json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=str)
+
+    def _tool_message(self, call: Dict[str, Any], content: str) -> Dict[str, Any]:
+        """
+        构造返回给模型的工具消息
+
+        Args:
+            call: 工具调用
+            content: 结果文本
+
+        Returns:
+            工具消息
+        """
+        if len(content) > self.max_result_chars:
+            content = content[:self.max_result_chars] + "…（结果过长，已截断）"
+        return {"role": "tool", "tool_call_id": call.get("id"), "content": content}
+
+    def _finish(self, call: Dict[str, Any], tool: Tool, arguments: Dict[str, Any], value: Any) -> Dict[str, Any]:
+        content = compact_json(value)
+        if tool.cache is not None:
+            tool.cache.set(self._cache_key(arguments), content)
+        return self._tool_message(call, content)
+
+    def _error(self, call: Dict[str, Any], error: str) -> Dict[str, Any]:
+        # 错误作为工具结果返回给模型，由模型决定重试或换一种方式回答
+        return self._tool_message(call, compact_json({"error": error}))
+
+    def execute(self, tool_calls: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        并发执行一轮工具调用
+
+        所有调用同时提交到线程池，每个调用从提交时开始计算超时。超时的调用返回错误结果，
+        但无法中断已在运行的函数，函数会在后台继续运行到结束。
+
+        Args:
+            tool_calls: 模型返回的工具调用
+
+        Returns:
+            与工具调用一一对应的工具消息
+        """
+        tool_calls = list(tool_calls)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(tool_calls)
+        pending = []
+        started = time.monotonic()
+        for i, call in enumerate(tool_calls):
+            tool, arguments, cached, error = self._resolve(call)
+            if error is not None:
+                results[i] = self._error(call, error)
+            elif cached is not None:
+                results[i] = self._tool_message(call, cached)
+            else:
+                pending.append((i, call, tool, arguments, self._get_executor().submit(tool.run, arguments)))
+
+        for i, call, tool, arguments, future in pending:
+            timeout = None
+            if tool.timeout is not None:
+                timeout = max(0.0, started + tool.timeout - time.monotonic())
+            try:
+                results[i] = self._finish(call, tool, arguments, future.result(timeout=timeout))
+            except FutureTimeoutError:
+                future.cancel()
+                results[i] = self._error(call, f"工具调用超时（{tool.timeout}秒）")
+            except Exception as e:
+                results[i] = self._error(call, f"{type(e).__name__}: {e}")
+        return results
+
+    async def aexecute(self, tool_calls: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        在asyncio中并发执行一轮工具调用
+
+        协程函数直接在当前事件循环中运行，超时后会被取消；普通函数在线程池中运行。
+
+        Args:
+            tool_calls: 模型返回的工具调用
+
+        Returns:
+            与工具调用一一对应的工具消息
+        """
+        loop = asyncio.get_running_loop()
+
+        async def _run(call: Dict[str, Any]) -> Dict[str, Any]:
+            tool, arguments, cached, error = self._resolve(call)
+            if error is not None:
+                return self._error(call, error)
+            if cached is not None:
+                return self._tool_message(call, cached)
+
+            if tool.is_async:
+                awaitable = tool.function(**arguments)
+            else:
+                awaitable = loop.run_in_executor(
+                    self._get_executor(), functools.partial(tool.function, **arguments)
+                )
+            try:
+                value = await asyncio.wait_for(awaitable, tool.timeout)
+            except asyncio.TimeoutError:
+                return self._error(call, f"工具调用超时（{tool.timeout}秒）")
+            except Exception as e:
+                return self._error(call, f"{type(e).__name__}: {e}")
+            return self._finish(call, tool, arguments, value)
+
+        return list(await asyncio.gather(*(_run(call) for call in tool_calls)))
+
+    def close(self) -> None:
+        """关闭执行工具的线程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,187 @@
+"""
+DeepSeek 连接预热
+~~~~~~~~~~~~~~
+
+在流量到来之前建立连接池中的连接，并在空闲时保持连接存活。
+
+部署后的第一批请求需要进行DNS解析、TCP握手和TLS握手，延迟明显高于稳定状态。预热时并发发送
+若干个开销最低的请求，使连接池建立相应数量的连接；之后后台定期发送同样的请求，在连接池的空闲
+超时之前复用每个连接。DNS解析结果按主机缓存，新建连接时不再重复解析，解析失败时在限定的时间内
+使用过期的结果。
+"""
+
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Callable, Iterable, Set, Tuple
+
+
+class DNSCache:
+    """按主机缓存DNS解析结果"""
+
+    def __init__(self, ttl: float = 300.0, max_stale: float = 600.0):
+        """
+        初始化DNS缓存
+
+        只缓存通过add注册的主机，其他主机的解析不受影响。
+
+        Args:
+            ttl: 解析结果的缓存时间（秒）
+            max_stale: 解析失败时过期结果的最长可用时间（秒），从过期时开始计算
+        """
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._hosts: Set[str] = set()
+        self._entries: Dict[Tuple[Any, ...], Tuple[float, List[Any]]] = {}
+        self._lock = threading.Lock()
+        self._original: Optional[Callable] = None
+
+    def add(self, host: str) -> None:
+        """
+        注册需要缓存解析结果的主机
+
+        Args:
+            host: 主机名
+        """
+        with self._lock:
+            self._hosts.add(host.lower())
+
+    def install(self) -> bool:
+        """
+        替换socket.getaddrinfo，重复调用没有影响
+
+        Returns:
+            是否由这次调用完成替换，已经替换过时返回False
+        """
+        with self._lock:
+            if self._original is not None:
+                return False
+            self._original = socket.getaddrinfo
+            socket.getaddrinfo = self._getaddrinfo
+            return True
+
+    def uninstall(self) -> None:
+        """恢复原来的socket.getaddrinfo并清空缓存"""
+        with self._lock:
+            if self._original is not None and socket.getaddrinfo == self._getaddrinfo:
+                socket.getaddrinfo = self._original
+            self._original = None
+            self._entries.clear()
+
+    def resolve(self, host: str, port: int) -> List[Any]:
+        """
+        预先解析主机并写入缓存
+
+        Args:
+            host: 主机名
+            port: 端口
+
+        Returns:
+            解析结果
+        """
+        self.add(host)
+        return self._getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+    def _getaddrinfo(self, host: Any, port: Any, family: int = 0, type: int = 0, proto: int = 0, flags: int = 0) -> List[Any]:
+        original = self._original or socket.getaddrinfo
+        if not isinstance(host, str) or host.lower() not in self._hosts:
+            return original(host, port, family, type, proto, flags)
+
+        key = (host.lower(), port, family, type, proto, flags)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        try:
+            result = original(host, port, family, type, proto, flags)
+        except socket.gaierror:
+            # DNS服务暂时不可用时短时间内继续使用过期的结果，由连接本身判断地址是否仍然有效；
+            # 过期太久的结果可能已经指向下线的地址，此时报告解析失败
+            if entry is not None and now - entry[0] <= self.max_stale:
+                return entry[1]
+            raise
+        with self._lock:
+            self._entries[key] = (now + self.ttl, result)
+        return result
+
+
+# 进程内共享的DNS缓存，socket.getaddrinfo只能在进程范围内替换
+dns_cache = DNSCache()
+
+
+def open_connections(ping: Callable[[], Any], connections: int) -> Tuple[int, List[BaseException]]:
+    """
+    并发发送多个探测请求，使连接池建立相应数量的连接
+
+    所有请求同时开始，每个请求在完成前占用一个连接，因此连接池会为每个请求建立或复用一个不同的
+    连接；服务端响应极快时部分请求可能复用同一个连接。HTTP/2在一个连接上复用所有请求。
+
+    Args:
+        ping: 发送一次探测请求的函数
+        connections: 连接数
+
+    Returns:
+        (成功的请求数, 失败的异常列表)
+    """
+    connections = max(1, connections)
+    barrier = threading.Barrier(connections)
+
+    def _run(_: int) -> Optional[BaseException]:
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        try:
+            ping()
+        except Exception as e:
+            return e
+        return None
+
+    with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="deepseek-warmup") as executor:
+        errors = [error for error in executor.map(_run, range(connections)) if error is not None]
+    return connections - len(errors), errors
+
+
+class KeepAlive:
+    """后台定期探测，在连接池的空闲超时之前复用预热的连接"""
+
+    def __init__(self, pings: Iterable[Callable[[], Any]], connections: int, interval: float):
+        """
+        初始化保活任务
+
+        Args:
+            pings: 每个连接池的探测函数
+            connections: 每个连接池保持的连接数
+            interval: 探测间隔（秒），应小于连接池的空闲超时时间
+        """
+        self.pings = list(pings)
+        self.connections = connections
+        self.interval = interval
+        self.rounds = 0
+        self.failures = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """启动后台线程，重复调用没有影响"""
+        if self._thread is not None:
+            return
+
+        def _run() -> None:
+            while not self._stop_event.wait(self.interval):
+                for ping in self.pings:
+                    # 探测失败不做处理，端点的故障由请求本身和健康检查发现
+                    _, errors = open_connections(ping, self.connections)
+                    self.failures += len(errors)
+                self.rounds += 1
+
+        self._thread = threading.Thread(target=_run, name="deepseek-keepalive", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
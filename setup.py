@@ -26,4 +26,19 @@ setup(
     ],
     python_requires=">=3.8",
     install_requires=requirements,
+    extras_require={
+        "http2": ["httpx[http2]"],
+        "fast": ["orjson"],
+        "benchmarks": ["hypercorn"],
+        "documents": ["pypdf"],
+        "semantic-cache": ["numpy"],
+        "tokenizer": ["tokenizers", "deepseek-tokenizer"],
+        "zstd": ["zstandard"],
+    },
+    entry_points={
+        "console_scripts": [
+            "deepseek-batch=deepseek.batch:main",
+            "deepseek-gateway=deepseek.gateway:main",
+        ],
+    },
 ) 
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+测试公共工具
+~~~~~~~~~~
+
+所有测试离线运行：对话和文件请求通过 ``httpx.MockTransport`` 交给 ``FakeUpstream`` 处理，
+不会访问网络。
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, List, Callable, Iterator, Union
+
+import httpx
+import pytest
+
+from deepseek.client import DeepSeekClient
+
+BASE_URL = "https://api.deepseek.test"
+
+# 会影响客户端默认配置的环境变量
+_CONFIG_ENV_PREFIXES = ("DEEPSEEK_", "API_", "WEB_SEARCH_", "SEMANTIC_CACHE", "SINGLE_FLIGHT", "REQUEST_")
+
+
+class FakeUpstream:
+    """模拟对话补全和模型列表接口的请求处理函数"""
+
+    def __init__(
+        self,
+        reply: Union[str, Callable[[Dict[str, Any]], str]] = "hello there",
+        usage: Optional[Dict[str, int]] = None,
+        delay: float = 0.0,
+        chunk_delay: float = 0.0,
+        tool_calls: Optional[List[Dict[str, Any]]] = None,
+        reasoning: Optional[str] = None,
+    ):
+        """
+        初始化模拟上游
+
+        Args:
+            reply: 回答文本，或者根据请求体生成回答的函数
+            usage: 每次回答的用量，默认为10个输入token和5个输出token
+            delay: 返回响应前的延迟（秒）
+            chunk_delay: 流式响应中两个数据块之间的间隔（秒）
+            tool_calls: 模型请求的工具调用，设置后回答的finish_reason为tool_calls
+            reasoning: 推理过程，设置后模拟推理模型，在回答之前返回reasoning_content
+        """
+        self.reply = reply
+        self.usage = usage or {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.tool_calls = tool_calls
+        self.reasoning = reasoning
+        # 按顺序返回的错误状态码，用完后正常响应
+        self.failures: List[Union[int, httpx.Response]] = []
+        self.requests: List[httpx.Request] = []
+        self.bodies: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def chat_calls(self) -> int:
+        """对话补全接口被调用的次数"""
+        return sum(1 for request in self.requests if request.url.path.endswith("/chat/completions"))
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.read() or b"{}") if request.method == "POST" else {}
+        with self._lock:
+            self.requests.append(request)
+            self.bodies.append(body)
+            failure = self.failures.pop(0) if self.failures else None
+
+        if request.url.path.endswith("/models"):
+            return httpx.Response(200, json={"object": "list", "data": [{"id": "deepseek-chat"}]})
+        if self.delay:
+            time.sleep(self.delay)
+        if isinstance(failure, httpx.Response):
+            return failure
+        if failure is not None:
+            return httpx.Response(failure, json={"error": {"message": f"status {failure}"}})
+
+        text = self.reply(body) if callable(self.reply) else self.reply
+        if body.get("stream"):
+            return httpx.Response(
+                200, headers={"content-type": "text/event-stream"}, content=self._sse(body, text)
+            )
+        return httpx.Response(200, json=self._completion(body, text))
+
+    def _completion(self, body: Dict[str, Any], text: str) -> Dict[str, Any]:
+        choices = []
+        for index in range(body.get("n") or 1):
+            message: Dict[str, Any] = {"role": "assistant", "content": None if self.tool_calls else text}
+            if self.tool_calls:
+                message["tool_calls"] = self.tool_calls
+            if self.reasoning is not None:
+                message["reasoning_content"] = self.reasoning
+            choices.append({
+                "index": index,
+                "message": message,
+                "finish_reason": "tool_calls" if self.tool_calls else "stop",
+            })
+        return {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model", "deepseek-chat"),
+            "choices": choices,
+            "usage": self.usage,
+        }
+
+    def _sse(self, body: Dict[str, Any], text: str) -> Iterator[bytes]:
+        model = body.get("model", "deepseek-chat")
+
+        def _event(choices: List[Dict[str, Any]], **extra: Any) -> bytes:
+            chunk = {"id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0,
+                     "model": model, "choices": choices, **extra}
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        if self.tool_calls:
+            deltas = [{"tool_calls": [{"index": i, **call}]} for i, call in enumerate(self.tool_calls)]
+        else:
+            deltas = [{"content": piece} for piece in _split(text)]
+        if self.reasoning is not None:
+            deltas = [{"reasoning_content": piece, "content": None} for piece in _split(self.reasoning)] + deltas
+        for delta in deltas:
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield _event([{"index": 0, "delta": delta, "finish_reason": None}])
+        finish_reason = "tool_calls" if self.tool_calls else "stop"
+        yield _event([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+        yield _event([], usage=self.usage)
+        yield b"data: [DONE]\n\n"
+
+
+def _split(text: str, size: int = 4) -> List[str]:
+    """把回答切分为流式数据块"""
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    """清除会影响默认配置的环境变量"""
+    for name in list(os.environ):
+        if name.startswith(_CONFIG_ENV_PREFIXES):
+            monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def upstream() -> FakeUpstream:
+    """默认的模拟上游"""
+    return FakeUpstream()
+
+
+@pytest.fixture
+def make_client(upstream: FakeUpstream) -> Iterator[Callable[..., DeepSeekClient]]:
+    """创建经过模拟上游发送请求的客户端，测试结束时关闭"""
+    clients: List[DeepSeekClient] = []
+
+    def _make(handler: Optional[Callable[[httpx.Request], httpx.Response]] = None, **kwargs: Any) -> DeepSeekClient:
+        kwargs.setdefault("api_key", "sk-test")
+        kwargs.setdefault("base_url", BASE_URL)
+        kwargs.setdefault("transport", httpx.MockTransport(handler or upstream))
+        client = DeepSeekClient(**kwargs)
+        clients.append(client)
+        return client
+
+    yield _make
+    for client in clients:
+        client.close()
@@ -0,0 +1,99 @@
+"""JSONL批量任务"""
+
+import json
+
+import pytest
+from tenacity import wait_none
+
+from deepseek import batch
+from deepseek.batch import BatchRunner
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(batch, "wait_exponential_jitter", lambda **kwargs: wait_none())
+
+
+def _write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records), encoding="utf-8")
+
+
+def _read_jsonl(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+@pytest.fixture
+def runner(make_client):
+    def _runner(**kwargs):
+        kwargs.setdefault("show_progress", False)
+        return BatchRunner(make_client(max_retries=0), **kwargs)
+    return _runner
+
+
+def test_runs_all_records(tmp_path, runner, upstream):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_jsonl(source, [{"id": "a", "prompt": "one"}, {"id": "b", "system": "s", "prompt": "two"}])
+    summary = runner().run(str(source), str(output))
+    assert summary["completed"] == 2
+    assert summary["prompt_tokens"] == 20
+    assert sorted(record["id"] for record in _read_jsonl(output)) == ["a", "b"]
+    assert upstream.bodies[0]["messages"][-1]["content"] in ("one", "two")
+
+
+def test_duplicate_ids_run_once(tmp_path, runner, upstream):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_jsonl(source, [{"id": "a", "prompt": "one"}, {"id": "a", "prompt": "one"}, {"id": "b", "prompt": "two"}])
+    summary = runner(max_workers=4).run(str(source), str(output))
+    assert upstream.chat_calls == 2
+    assert (summary["completed"], summary["skipped"]) == (2, 1)
+    assert len(_read_jsonl(output)) == 2
+
+
+def test_resume_skips_completed_and_truncates_partial_line(tmp_path, runner, upstream):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_jsonl(source, [{"id": str(i), "prompt": f"q{i}"} for i in range(4)])
+    # 上次运行完成了0和1，1只写入了输出还没有写检查点，2写了一半时进程退出
+    output.write_text('{"id": "0", "content": "x"}\n{"id": "1", "content": "y"}\n{"id": "2", "cont', encoding="utf-8")
+    (tmp_path / "out.jsonl.checkpoint").write_text("0\n", encoding="utf-8")
+
+    summary = runner().run(str(source), str(output))
+    assert (summary["completed"], summary["skipped"]) == (2, 2)
+    assert upstream.chat_calls == 2
+    assert sorted(record["id"] for record in _read_jsonl(output)) == ["0", "1", "2", "3"]
+
+    again = runner().run(str(source), str(output))
+    assert (again["completed"], again["skipped"]) == (0, 4)
+    assert upstream.chat_calls == 2
+
+
+def test_retries_are_not_stacked(tmp_path, runner, upstream):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_jsonl(source, [{"id": "a", "prompt": "one"}])
+    upstream.failures = [503] * 10
+    summary = runner(retries=3).run(str(source), str(output))
+    assert summary["failed"] == 1
+    assert upstream.chat_calls == 3
+
+
+def test_failed_and_invalid_lines_are_recorded(tmp_path, runner, upstream):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    source.write_text('{"id": "a", "prompt": "one"}\nnot json\n{"id": "b"}\n', encoding="utf-8")
+    upstream.failures = [400]
+    summary = runner().run(str(source), str(output))
+    assert summary["failed"] == 3
+    errors = _read_jsonl(tmp_path / "out.jsonl.errors")
+    assert sorted(error["id"] for error in errors) == ["2", "a", "b"]
+
+
+def test_cli_disables_client_retries(tmp_path, monkeypatch, make_client):
+    created = []
+
+    def _client(**kwargs):
+        created.append(kwargs)
+        return make_client(**kwargs)
+
+    monkeypatch.setattr(batch, "DeepSeekClient", _client)
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_jsonl(source, [{"id": "a", "prompt": "one"}])
+    assert batch.main([str(source), str(output), "--quiet"]) == 0
+    assert created[0]["max_retries"] == 0
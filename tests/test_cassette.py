@@ -0,0 +1,72 @@
+"""cassette录制与回放"""
+
+import httpx
+import pytest
+
+from deepseek.cassette import RecordingTransport, ReplayTransport, load_cassette
+from deepseek.exceptions import DeepSeekAPIError
+
+from .conftest import BASE_URL
+
+
+@pytest.fixture
+def cassette(tmp_path, upstream, make_client):
+    path = str(tmp_path / "chat.jsonl.gz")
+    transport = RecordingTransport(path, transport=httpx.MockTransport(upstream))
+    client = make_client(transport=transport)
+    client.chat("录制的问题")
+    client.chat("录制的问题", stream=True)
+    transport.close()
+    return path
+
+
+def test_records_interactions(cassette):
+    interactions = load_cassette(cassette)
+    assert len(interactions) == 2
+    assert all(interaction.status == 200 for interaction in interactions)
+
+
+def test_replays_matching_request(cassette, make_client):
+    transport = ReplayTransport(cassette, speed=0)
+    client = make_client(transport=transport)
+    assert client.chat("录制的问题") == "hello there"
+    assert client.chat("录制的问题", stream=True) == "hello there"
+    assert (transport.replayed, transport.unmatched, transport.fallbacks) == (2, 0, 0)
+
+
+def test_strict_match_rejects_different_body(cassette, make_client):
+    transport = ReplayTransport(cassette, speed=0)
+    client = make_client(transport=transport)
+    with pytest.raises(DeepSeekAPIError):
+        client.chat("完全不同的问题")
+    assert transport.replayed == 0
+    assert transport.unmatched >= 1
+    assert transport.fallbacks == 0
+
+
+def test_path_match_counts_fallbacks(cassette, make_client):
+    transport = ReplayTransport(cassette, speed=0, match="path")
+    assert make_client(transport=transport).chat("完全不同的问题") == "hello there"
+    assert make_client(transport=transport).chat("录制的问题") == "hello there"
+    assert transport.fallbacks == 1
+    assert transport.unmatched == 0
+
+
+def test_rejects_unknown_match_mode(cassette):
+    with pytest.raises(ValueError):
+        ReplayTransport(cassette, match="fuzzy")
+
+
+def test_unmatched_response_is_404(cassette):
+    transport = ReplayTransport(cassette, speed=0)
+    response = httpx.Client(transport=transport).post(f"{BASE_URL}/chat/completions", json={"model": "x"})
+    assert response.status_code == 404
+
+
+def test_path_match_keeps_stream_and_json_apart(cassette, make_client):
+    transport = ReplayTransport(cassette, speed=0, match="path")
+    client = make_client(transport=transport)
+    for _ in range(2):
+        assert client.chat("另一个问题") == "hello there"
+        assert client.chat("另一个问题", stream=True) == "hello there"
+    assert transport.fallbacks == 4
@@ -0,0 +1,103 @@
+"""并行生成多个候选回答"""
+
+import itertools
+import time
+
+import pytest
+
+from deepseek.exceptions import DeepSeekAPIError
+from deepseek.ledger import UsageLedger
+
+from .conftest import FakeUpstream
+
+
+def _numbered(upstream):
+    """每个请求返回带序号的回答"""
+    counter = itertools.count(1)
+    upstream.reply = lambda body: f"candidate {next(counter)}"
+
+
+def test_only_chosen_answer_enters_history(make_client, upstream):
+    _numbered(upstream)
+    ledger = UsageLedger()
+    client = make_client(ledger=ledger)
+    answer = client.chat_n("hi", n=3)
+
+    assert upstream.chat_calls == 3
+    assert all(body["stream"] for body in upstream.bodies)
+    assert len(client.last_candidates) == 3
+    assert answer == client.last_candidates[0].content
+    assert client.get_conversation_messages() == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": answer},
+    ]
+    assert client.last_usage.total_tokens == 45
+    assert ledger.totals("default").calls == 3
+
+
+def test_score_selector_picks_highest(make_client, upstream):
+    _numbered(upstream)
+    client = make_client()
+    answer = client.chat_n("hi", n=3, selector=lambda result: int(result.content.split()[-1]))
+    assert answer == "candidate 3"
+
+
+def test_rejected_candidates_fall_back_to_first(make_client, upstream):
+    client = make_client()
+    assert client.chat_n("hi", n=2, selector=lambda result: False) == "hello there"
+    assert len(client.last_candidates) == 2
+
+
+def test_accepting_a_candidate_cancels_the_rest(make_client):
+    fast = FakeUpstream(reply="quick")
+    slow = FakeUpstream(reply="a long answer that streams slowly " * 4, chunk_delay=0.02)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return fast(request) if len(calls) == 1 else slow(request)
+
+    client = make_client(handler)
+    started = time.monotonic()
+    answer = client.chat_n("hi", n=3, selector=lambda result: result.content == "quick")
+    assert answer == "quick"
+    # 慢候选需要约0.7秒才能完成，被接受的候选完成后立即返回
+    assert time.monotonic() - started < 0.5
+    assert len(client.last_candidates) == 1
+    assert client.get_conversation_messages()[-1] == {"role": "assistant", "content": "quick"}
+
+
+@pytest.mark.parametrize("raw_mode", [False, True])
+def test_n_param_uses_one_request(make_client, upstream, raw_mode):
+    client = make_client(raw_mode=raw_mode)
+    assert client.chat_n("hi", n=3, use_n_param=True) == "hello there"
+    assert upstream.chat_calls == 1
+    assert upstream.bodies[0]["n"] == 3
+    assert not upstream.bodies[0].get("stream")
+    assert len(client.last_candidates) == 3
+    assert len(client.get_conversation_messages()) == 2
+
+
+def test_all_candidates_failing_restores_history(make_client, upstream):
+    client = make_client(max_retries=0)
+    client.chat("first")
+    upstream.failures = [400, 400]
+    with pytest.raises(DeepSeekAPIError):
+        client.chat_n("second", n=2)
+    assert [m["content"] for m in client.get_conversation_messages()] == ["first", "hello there"]
+
+
+def test_invalid_n_is_rejected(make_client, upstream):
+    client = make_client()
+    with pytest.raises(ValueError):
+        client.chat_n("hi", n=0)
+    with pytest.raises(ValueError):
+        client.complete_choices([{"role": "user", "content": "hi"}], n=0)
+    assert upstream.chat_calls == 0
+
+
+def test_complete_choices_leaves_history_alone(make_client, upstream):
+    client = make_client()
+    choices = client.complete_choices([{"role": "user", "content": "hi"}], n=2)
+    assert [choice.content for choice in choices] == ["hello there", "hello there"]
+    assert client.get_conversation_messages() == []
@@ -0,0 +1,213 @@
+"""请求体压缩"""
+
+import json
+import os
+import zlib
+
+import httpx
+import pytest
+
+from deepseek import compression
+from deepseek.cassette import body_digest
+from deepseek.compression import (
+    CompressingTransport,
+    choose_encoding,
+    compress_bytes,
+    decompress_bytes,
+    is_compressible,
+    iter_compressed,
+    resolve_encoding,
+)
+from deepseek.files import FileManager
+
+from .conftest import BASE_URL
+
+pytest.importorskip("zstandard")
+
+ENCODINGS = ["gzip", "zstd"]
+LONG_TEXT = "The quick brown fox jumps over the lazy dog. " * 200
+
+
+def _decoded(request):
+    """返回解压后的请求，并记录请求体是否被压缩"""
+    body = request.read()
+    encoding = request.headers.get("content-encoding")
+    if not encoding:
+        return request, None
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in ("content-encoding", "content-length")}
+    return httpx.Request(request.method, request.url, headers=headers, content=decompress_bytes(body, encoding)), encoding
+
+
+def test_is_compressible():
+    assert is_compressible("text/plain; charset=utf-8")
+    assert is_compressible("application/json")
+    assert is_compressible("application/vnd.api+json")
+    assert not is_compressible("image/png")
+    assert not is_compressible("application/zip")
+    assert not is_compressible(None)
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip", 2048, "application/json", 1024) == "gzip"
+    assert choose_encoding("gzip", 100, "application/json", 1024) is None
+    assert choose_encoding("gzip", 2048, "image/jpeg", 1024) is None
+    assert choose_encoding(None, 2048, "application/json", 1024) is None
+
+
+def test_resolve_encoding(monkeypatch):
+    assert resolve_encoding(None) is None
+    assert resolve_encoding("GZIP") == "gzip"
+    assert resolve_encoding("auto") == "zstd"
+    with pytest.raises(ValueError):
+        resolve_encoding("brotli")
+    monkeypatch.setattr(compression, "zstandard", None)
+    assert resolve_encoding("auto") == "gzip"
+    with pytest.raises(ImportError, match="zstandard"):
+        resolve_encoding("zstd")
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_round_trip(encoding):
+    data = LONG_TEXT.encode("utf-8")
+    compressed = compress_bytes(data, encoding)
+    assert len(compressed) < len(data) // 10
+    assert decompress_bytes(compressed, encoding) == data
+    chunks = [data[i:i + 1000] for i in range(0, len(data), 1000)]
+    assert decompress_bytes(b"".join(iter_compressed(chunks, encoding)), encoding) == data
+
+
+def test_gzip_output_is_deterministic():
+    data = LONG_TEXT.encode("utf-8")
+    assert compress_bytes(data, "gzip") == compress_bytes(data, "gzip")
+    assert zlib.decompress(compress_bytes(data, "gzip"), 31) == data
+
+
+def _transport(encoding="gzip", status=None, min_size=1024):
+    seen = []
+
+    def handler(request):
+        decoded, used = _decoded(request)
+        seen.append((used, json.loads(decoded.read())))
+        if used and status is not None:
+            return httpx.Response(status)
+        return httpx.Response(200, json={"ok": True})
+
+    return CompressingTransport(httpx.MockTransport(handler), encoding, min_size), seen
+
+
+def _post(transport, payload):
+    with httpx.Client(transport=transport) as client:
+        return client.post("https://api.deepseek.test/chat/completions", json=payload)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_transport_compresses_large_json(encoding):
+    transport, seen = _transport(encoding)
+    payload = {"messages": [{"role": "user", "content": LONG_TEXT}]}
+    assert _post(transport, payload).status_code == 200
+    assert seen == [(encoding, payload)]
+    stats = transport.stats()
+    assert stats["compressed"] == 1 and stats["bytes_out"] < stats["bytes_in"] // 10
+
+
+def test_transport_skips_small_and_incompressible_bodies():
+    transport, seen = _transport()
+    _post(transport, {"content": "hi"})
+    assert seen[0][0] is None
+
+    encodings = []
+
+    def handler(request):
+        encodings.append(request.headers.get("content-encoding"))
+        return httpx.Response(200)
+
+    transport = CompressingTransport(httpx.MockTransport(handler), "gzip")
+    with httpx.Client(transport=transport) as client:
+        # 随机内容压缩后不会变小，原样发送
+        client.post("https://api.deepseek.test/upload", content=os.urandom(4096), headers={"content-type": "text/plain"})
+        client.post("https://api.deepseek.test/upload", content=LONG_TEXT.encode(), headers={"content-type": "image/png"})
+    assert encodings == [None, None]
+    assert transport.stats()["compressed"] == 0
+
+
+def test_transport_falls_back_on_415():
+    transport, seen = _transport(status=415)
+    payload = {"content": LONG_TEXT}
+    assert _post(transport, payload).status_code == 200
+    assert _post(transport, payload).status_code == 200
+    assert [used for used, _ in seen] == ["gzip", None, None]
+    assert not transport.enabled
+
+
+def test_client_compresses_chat_requests(make_client, upstream):
+    encodings = []
+
+    def handler(request):
+        decoded, used = _decoded(request)
+        encodings.append(used)
+        return upstream(decoded)
+
+    client = make_client(handler, compression="gzip", compression_min_size=512)
+    assert client.chat(LONG_TEXT) == "hello there"
+    assert client.complete([{"role": "user", "content": "hi"}]).content == "hello there"
+    assert encodings == ["gzip", None]
+    assert upstream.bodies[0]["messages"][-1]["content"] == LONG_TEXT
+
+
+def _upload_handler(status=None):
+    uploads = []
+
+    def handler(request):
+        decoded, used = _decoded(request)
+        uploads.append((used, request.headers.get("content-length"), decoded.read()))
+        if used and status is not None:
+            return httpx.Response(status)
+        return httpx.Response(200, json={"id": f"file-{len(uploads)}"})
+
+    return handler, uploads
+
+
+def test_upload_streams_compressed_body(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text(LONG_TEXT, encoding="utf-8")
+    handler, uploads = _upload_handler()
+    manager = FileManager("sk-test", BASE_URL, transport=httpx.MockTransport(handler), compression="gzip")
+    assert manager.upload_file(str(path)) == "file-1"
+    used, length, body = uploads[0]
+    assert used == "gzip"
+    # 压缩的请求体分块发送，事先不知道长度
+    assert length is None
+    assert LONG_TEXT.encode("utf-8") in body
+    assert b'name="purpose"\r\n\r\nassistants' in body
+
+
+def test_binary_upload_is_not_compressed(tmp_path):
+    path = tmp_path / "photo.png"
+    path.write_bytes(b"\x89PNG" + b"\0" * 4096)
+    handler, uploads = _upload_handler()
+    manager = FileManager("sk-test", BASE_URL, transport=httpx.MockTransport(handler), compression="gzip")
+    manager.upload_file(str(path))
+    assert uploads[0][0] is None
+
+
+def test_upload_falls_back_on_415(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("id,name\n" + "1,alice\n" * 500, encoding="utf-8")
+    handler, uploads = _upload_handler(status=415)
+    manager = FileManager("sk-test", BASE_URL, transport=httpx.MockTransport(handler), compression="gzip")
+    assert manager.upload_file(str(path)) == "file-2"
+    assert [used for used, _, _ in uploads] == ["gzip", None]
+    assert b"1,alice" in uploads[1][2]
+    assert manager.compression is None
+
+
+def test_cassette_digest_ignores_compression():
+    payload = json.dumps({"messages": [{"role": "user", "content": LONG_TEXT}]}).encode("utf-8")
+    url = "https://api.deepseek.test/chat/completions"
+    plain = httpx.Request("POST", url, headers={"content-type": "application/json"}, content=payload)
+    compressed = httpx.Request(
+        "POST", url,
+        headers={"content-type": "application/json", "content-encoding": "zstd"},
+        content=compress_bytes(payload, "zstd"),
+    )
+    assert body_digest(plain) == body_digest(compressed)
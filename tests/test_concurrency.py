@@ -0,0 +1,65 @@
+"""自适应并发控制"""
+
+import pytest
+
+from deepseek.concurrency import AdaptiveLimiter
+from deepseek.exceptions import DeepSeekAPIError
+
+
+def _complete(limiter, kind="chat", latency=None, overloaded=False):
+    slot = limiter.acquire(kind=kind)
+    slot.latency = latency
+    slot.overloaded = overloaded
+    limiter.release(slot)
+
+
+def test_overload_halves_limit():
+    limiter = AdaptiveLimiter(initial_limit=8, min_limit=1)
+    with pytest.raises(DeepSeekAPIError):
+        with limiter.slot():
+            raise DeepSeekAPIError("rate limited", status_code=429)
+    assert limiter.limit == 4
+    metrics = limiter.metrics()
+    assert (metrics["overloads"], metrics["decreases"]) == (1, 1)
+
+
+def test_limit_never_drops_below_minimum():
+    limiter = AdaptiveLimiter(initial_limit=2, min_limit=2)
+    _complete(limiter, overloaded=True)
+    assert limiter.limit == 2
+
+
+def test_limit_grows_only_when_saturated():
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=3)
+    for _ in range(10):
+        _complete(limiter)
+    assert limiter.limit == 2
+
+    for _ in range(10):
+        slots = [limiter.acquire() for _ in range(limiter.limit)]
+        for slot in slots:
+            limiter.release(slot)
+    assert limiter.limit == 3
+
+
+def test_latency_congestion_is_tracked_per_kind():
+    limiter = AdaptiveLimiter(initial_limit=8)
+    for _ in range(10):
+        _complete(limiter, kind="chat", latency=0.01)
+        _complete(limiter, kind="files", latency=1.0)
+    assert limiter.limit == 8
+
+    # 文件请求本来就慢，不影响对话请求的基线；对话请求的首字节延迟升高时才缩减
+    for _ in range(10):
+        _complete(limiter, kind="chat", latency=0.5)
+    assert limiter.limit < 8
+    assert set(limiter.metrics()["latency"]) == {"chat", "files"}
+
+
+def test_client_backs_off_on_429(make_client, upstream):
+    upstream.failures = [429]
+    client = make_client(adaptive_concurrency=True, max_retries=0)
+    with pytest.raises(DeepSeekAPIError):
+        client.complete([{"role": "user", "content": "hi"}])
+    assert client.limiter.metrics()["overloads"] == 1
+    assert client.limiter.limit < 8
@@ -0,0 +1,97 @@
+"""对话历史与分支"""
+
+import tracemalloc
+
+from deepseek.conversation import Conversation
+
+
+def _contents(conversation):
+    return [message["content"] for message in conversation.get_messages()]
+
+
+def test_fork_shares_prefix_and_diverges():
+    base = Conversation("system")
+    base.add_user_message("question")
+    branch = base.fork()
+    assert branch._tail is base._tail
+
+    base.add_assistant_message("answer a")
+    branch.add_assistant_message("answer b")
+    assert _contents(base) == ["system", "question", "answer a"]
+    assert _contents(branch) == ["system", "question", "answer b"]
+    assert len(base) == len(branch) == 3
+
+
+def test_branch_can_swap_system_message():
+    base = Conversation("translate to English")
+    base.add_user_message("你好")
+    branch = base.fork()
+    branch.add_system_message("translate to French")
+    assert base.get_messages()[0]["content"] == "translate to English"
+    assert branch.get_messages()[0]["content"] == "translate to French"
+    assert base.get_messages()[1] is branch.get_messages()[1]
+
+
+def test_returned_list_is_a_copy():
+    conversation = Conversation("system")
+    conversation.add_user_message("question")
+    messages = conversation.get_messages()
+    messages.append({"role": "user", "content": "injected"})
+    messages.pop(0)
+    assert _contents(conversation) == ["system", "question"]
+
+
+def test_messages_setter_splits_system_message():
+    conversation = Conversation()
+    conversation.messages = [
+        {"role": "system", "content": "system"},
+        {"role": "user", "content": "question"},
+    ]
+    assert conversation._system == {"role": "system", "content": "system"}
+    assert len(conversation) == 2
+    conversation.clear_messages()
+    assert _contents(conversation) == ["system"]
+    conversation.clear_messages(keep_system_message=False)
+    assert conversation.get_messages() == []
+
+
+def test_last_messages():
+    conversation = Conversation()
+    assert conversation.get_last_user_message() is None
+    conversation.add_user_message("first")
+    conversation.add_assistant_message("reply")
+    conversation.add_user_message("second")
+    assert conversation.get_last_user_message() == "second"
+    assert conversation.get_last_assistant_message() == "reply"
+
+
+def test_truncating_a_branch_keeps_the_original():
+    base = Conversation("system")
+    for index in range(6):
+        base.add_user_message(f"message {index}")
+    branch = base.fork()
+    branch.truncate_messages(3)
+    assert _contents(branch) == ["system", "message 4", "message 5"]
+    assert len(base) == 7
+
+
+def test_forks_share_memory():
+    base = Conversation("system")
+    for index in range(2000):
+        base.add_message({"role": "user" if index % 2 == 0 else "assistant", "content": f"message {index}"})
+    base.get_messages()
+
+    tracemalloc.start()
+    try:
+        branches = []
+        for index in range(1000):
+            branch = base.fork()
+            branch.add_user_message(f"variant {index}")
+            branches.append(branch)
+        used = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    # 复制整个历史时每个分支需要约16KB的列表，共享消息链时每个分支只多几个小对象
+    assert used < 1_000_000
+    assert len(branches[-1]) == 2002
+    assert branches[-1].get_messages()[-1]["content"] == "variant 999"
@@ -0,0 +1,73 @@
+"""多端点负载均衡与故障切换"""
+
+import httpx
+import pytest
+
+from deepseek.endpoints import STATE_OPEN, Endpoint, EndpointPool, is_failover_error
+from deepseek.exceptions import DeadlineExceededError, DeepSeekAPIError
+
+BACKUP_URL = "https://backup.deepseek.test"
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def _router(upstream, primary_status=None, backup_status=None):
+    """按主机名分别模拟主端点和备用端点"""
+    hits = {"api.deepseek.test": 0, "backup.deepseek.test": 0}
+
+    def handle(request):
+        host = request.url.host
+        hits[host] += 1
+        status = primary_status if host == "api.deepseek.test" else backup_status
+        if status is not None and request.url.path.endswith("/chat/completions"):
+            return httpx.Response(status, json={"error": {"message": f"status {status}"}})
+        return upstream(request)
+
+    return handle, hits
+
+
+@pytest.mark.parametrize("raw_mode", [False, True])
+def test_fails_over_to_healthy_endpoint(make_client, upstream, raw_mode):
+    handler, hits = _router(upstream, primary_status=503)
+    client = make_client(handler, endpoints=[(BACKUP_URL, "sk-backup")], max_retries=0, raw_mode=raw_mode)
+    for _ in range(4):
+        assert client.complete(MESSAGES).content == "hello there"
+    assert hits["backup.deepseek.test"] == 4
+    primary = client.pool.metrics()[0]
+    assert primary["total_failures"] == hits["api.deepseek.test"]
+
+
+def test_client_errors_do_not_fail_over(make_client, upstream):
+    handler, hits = _router(upstream, primary_status=400, backup_status=400)
+    client = make_client(handler, endpoints=[(BACKUP_URL, "sk-backup")], max_retries=0)
+    with pytest.raises(DeepSeekAPIError) as excinfo:
+        client.complete(MESSAGES)
+    assert excinfo.value.status_code == 400
+    assert sum(hits.values()) == 1
+
+
+def test_stream_fails_over_before_first_byte(make_client, upstream):
+    handler, hits = _router(upstream, primary_status=500)
+    client = make_client(handler, endpoints=[(BACKUP_URL, "sk-backup")], max_retries=0)
+    for _ in range(3):
+        assert client.complete(MESSAGES, stream=True).content == "hello there"
+    assert sum(metrics["outstanding"] for metrics in client.pool.metrics()) == 0
+
+
+def test_pool_ejects_after_consecutive_failures():
+    first, second = Endpoint("https://a", "sk-aaaa"), Endpoint("https://b", "sk-bbbb")
+    pool = EndpointPool([first, second], failure_threshold=2, ejection_seconds=60)
+    failure = DeepSeekAPIError("unavailable", status_code=503)
+    for _ in range(2):
+        pool.acquire(exclude=(second,)).release(failure)
+    assert first.state == STATE_OPEN
+    # 被摘除的端点不再分到请求
+    assert all(pool.acquire().endpoint is second for _ in range(5))
+
+
+def test_failover_error_classification():
+    assert is_failover_error(DeepSeekAPIError("x", status_code=503))
+    assert is_failover_error(DeepSeekAPIError("x", status_code=401))
+    assert not is_failover_error(DeepSeekAPIError("x", status_code=400))
+    assert not is_failover_error(DeadlineExceededError("x"))
+    assert is_failover_error(httpx.ConnectError("refused"))
+    assert not is_failover_error(ValueError("bad argument"))
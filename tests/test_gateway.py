@@ -0,0 +1,164 @@
+"""OpenAI兼容的本地网关"""
+
+import asyncio
+import json
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from deepseek.gateway import Gateway
+from deepseek.ledger import UsageLedger
+
+TOOL_CALLS = [{
+    "id": "call_1",
+    "type": "function",
+    "function": {"name": "get_weather", "arguments": "{\"city\": \"Paris\"}"},
+}]
+
+
+def _serve(gateway, scenario):
+    async def _run():
+        async with TestClient(TestServer(gateway.create_app())) as http:
+            return await scenario(http)
+    return asyncio.run(_run())
+
+
+def _chat(http, headers=None, **body):
+    body.setdefault("model", "deepseek-chat")
+    body.setdefault("messages", [{"role": "user", "content": "hi"}])
+    return http.post("/v1/chat/completions", json=body, headers=headers or {})
+
+
+def _sse_events(text):
+    return [
+        json.loads(line[len("data: "):])
+        for line in text.splitlines()
+        if line.startswith("data: ") and line != "data: [DONE]"
+    ]
+
+
+def test_completion(make_client, upstream):
+    gateway = Gateway(make_client())
+
+    async def scenario(http):
+        response = await _chat(http)
+        return response.status, await response.json()
+
+    status, payload = _serve(gateway, scenario)
+    assert status == 200
+    assert payload["choices"][0]["message"] == {"role": "assistant", "content": "hello there"}
+    assert payload["usage"]["total_tokens"] == 15
+
+
+def test_tool_calls_are_returned(make_client, upstream):
+    upstream.tool_calls = TOOL_CALLS
+    gateway = Gateway(make_client())
+
+    async def scenario(http):
+        response = await _chat(http, tools=[{"type": "function", "function": {"name": "get_weather"}}])
+        return await response.json()
+
+    choice = _serve(gateway, scenario)["choices"][0]
+    assert choice["finish_reason"] == "tool_calls"
+    assert choice["message"]["content"] is None
+    assert choice["message"]["tool_calls"] == TOOL_CALLS
+
+
+def test_stream_passes_tool_call_deltas(make_client, upstream):
+    upstream.tool_calls = TOOL_CALLS
+    gateway = Gateway(make_client())
+
+    async def scenario(http):
+        response = await _chat(http, stream=True)
+        return await response.text()
+
+    events = _sse_events(_serve(gateway, scenario))
+    deltas = [event["choices"][0] for event in events if event["choices"]]
+    assert deltas[0]["delta"]["tool_calls"][0]["function"]["name"] == "get_weather"
+    assert deltas[-1]["finish_reason"] == "tool_calls"
+
+
+def test_n_returns_one_choice_each(make_client, upstream):
+    gateway = Gateway(make_client())
+
+    async def scenario(http):
+        response = await _chat(http, n=3)
+        return await response.json()
+
+    payload = _serve(gateway, scenario)
+    assert [choice["index"] for choice in payload["choices"]] == [0, 1, 2]
+    assert upstream.bodies[-1]["n"] == 3
+
+
+def test_invalid_n_is_rejected(make_client, upstream):
+    gateway = Gateway(make_client())
+
+    async def scenario(http):
+        invalid = await _chat(http, n=0)
+        session = await _chat(http, headers={"X-Session-Id": "s"}, n=2)
+        return invalid.status, session.status
+
+    assert _serve(gateway, scenario) == (400, 400)
+    assert upstream.chat_calls == 0
+
+
+def test_sessions_are_scoped_per_tenant(make_client, upstream):
+    gateway = Gateway(make_client())
+
+    async def scenario(http):
+        first = {"X-Session-Id": "shared", "X-Tenant-Id": "team-a"}
+        second = {"X-Session-Id": "shared", "X-Tenant-Id": "team-b"}
+        await _chat(http, headers=first, messages=[{"role": "user", "content": "secret of team a"}])
+        await _chat(http, headers=second, messages=[{"role": "user", "content": "hello from team b"}])
+        await _chat(http, headers=first, messages=[{"role": "user", "content": "follow up"}])
+
+    _serve(gateway, scenario)
+    contents = [[message["content"] for message in body["messages"]] for body in upstream.bodies]
+    assert contents[1] == ["hello from team b"]
+    assert contents[2] == ["secret of team a", "hello there", "follow up"]
+
+
+def test_cache_is_scoped_per_tenant(make_client, upstream):
+    gateway = Gateway(make_client())
+
+    async def scenario(http):
+        statuses = []
+        for tenant in ("team-a", "team-a", "team-b"):
+            response = await _chat(http, headers={"X-Tenant-Id": tenant}, temperature=0)
+            statuses.append(response.headers["X-Cache"])
+        return statuses
+
+    assert _serve(gateway, scenario) == ["MISS", "HIT", "MISS"]
+    assert upstream.chat_calls == 2
+
+
+def test_cleanup_closes_client(make_client, tmp_path):
+    ledger_path = str(tmp_path / "usage.db")
+    client = make_client(ledger_path=ledger_path)
+    gateway = Gateway(client)
+
+    async def scenario(http):
+        response = await _chat(http, headers={"X-Tenant-Id": "team-a"})
+        assert response.status == 200
+        assert not client.http_client.is_closed
+
+    _serve(gateway, scenario)
+    assert client.http_client.is_closed
+    # 关闭时写入剩余的记录，重新打开的账本能恢复累计值
+    assert UsageLedger(ledger_path).totals("team-a").calls == 1
+
+
+def test_failed_session_turn_leaves_history_unchanged(make_client, upstream):
+    gateway = Gateway(make_client(max_retries=0))
+    upstream.failures = [400]
+
+    async def scenario(http):
+        headers = {"X-Session-Id": "rollback"}
+        failed = await _chat(http, headers=headers, messages=[{"role": "user", "content": "rejected"}])
+        await _chat(http, headers=headers, messages=[{"role": "user", "content": "accepted"}])
+        await _chat(http, headers=headers, messages=[{"role": "user", "content": "follow up"}])
+        return failed.status
+
+    assert _serve(gateway, scenario) >= 400
+    contents = [[message["content"] for message in body["messages"]] for body in upstream.bodies]
+    assert contents[1] == ["accepted"]
+    assert contents[2] == ["accepted", "hello there", "follow up"]
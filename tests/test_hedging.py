@@ -0,0 +1,107 @@
+"""对冲请求"""
+
+import threading
+import time
+
+import pytest
+
+from deepseek.exceptions import RequestCancelledError
+from deepseek.hedging import HedgePolicy, hedged_stream
+from deepseek.timeouts import CancelToken
+
+
+def _starter(first_delay, items=("a", "b")):
+    """第一个请求在first_delay秒后才返回首个数据块，之后的请求立即返回"""
+    started, cancelled = [], []
+    lock = threading.Lock()
+
+    def start(token):
+        with lock:
+            index = len(started)
+            started.append(token)
+
+        def generator():
+            if index == 0 and token.wait(first_delay):
+                cancelled.append(index)
+                raise RequestCancelledError("请求已取消")
+            for item in items:
+                yield f"{item}{index}"
+            return f"done{index}"
+
+        return generator()
+
+    return start, started, cancelled
+
+
+def _drain(stream):
+    items = []
+    while True:
+        try:
+            items.append(next(stream))
+        except StopIteration as stop:
+            return items, stop.value
+
+
+def test_slow_request_is_hedged_and_cancelled():
+    policy = HedgePolicy(budget_ratio=1.0, default_delay=0.05)
+    start, started, cancelled = _starter(first_delay=2.0)
+    began = time.monotonic()
+    items, result = _drain(hedged_stream(start, policy))
+    assert time.monotonic() - began < 1.0
+    assert (items, result) == (["a1", "b1"], "done1")
+    assert len(started) == 2
+    assert started[0].cancelled
+    metrics = policy.metrics()
+    assert (metrics["hedges"], metrics["hedge_wins"]) == (1, 1)
+
+
+def test_fast_request_is_not_hedged():
+    policy = HedgePolicy(budget_ratio=1.0, default_delay=1.0)
+    start, started, _ = _starter(first_delay=0.0)
+    assert _drain(hedged_stream(start, policy)) == (["a0", "b0"], "done0")
+    assert len(started) == 1
+    assert policy.metrics()["hedges"] == 0
+
+
+def test_budget_limits_hedges():
+    policy = HedgePolicy(budget_ratio=0.0, default_delay=0.02)
+    start, started, _ = _starter(first_delay=0.2)
+    assert _drain(hedged_stream(start, policy)) == (["a0", "b0"], "done0")
+    assert len(started) == 1
+
+
+def test_delay_follows_observed_ttft_percentile():
+    policy = HedgePolicy(percentile=0.5, min_samples=4, min_delay=0.01, default_delay=3.0)
+    assert policy.delay() == 3.0
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        policy.record_ttft(seconds)
+    assert policy.delay() == 0.3
+
+
+def test_caller_cancellation_stops_all_attempts():
+    policy = HedgePolicy(budget_ratio=1.0, default_delay=5.0)
+    start, started, _ = _starter(first_delay=5.0)
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel).start()
+    with pytest.raises(RequestCancelledError):
+        _drain(hedged_stream(start, policy, token))
+    assert all(attempt.cancelled for attempt in started)
+
+
+def test_client_hedges_slow_first_token(make_client, upstream):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            time.sleep(0.5)
+        return upstream(request)
+
+    client = make_client(handler, hedging=True)
+    client.hedge_policy = HedgePolicy(budget_ratio=1.0, default_delay=0.05)
+    began = time.monotonic()
+    assert client.complete([{"role": "user", "content": "hi"}]).content == "hello there"
+    assert time.monotonic() - began < 0.45
+    # 两个请求的线程谁先到达上游不确定，只检查发出了对冲请求且没有等待慢请求
+    assert client.hedge_policy.metrics()["hedges"] == 1
+    assert len(calls) == 2
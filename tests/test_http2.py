@@ -0,0 +1,124 @@
+"""HTTP/2多路复用传输"""
+
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from deepseek.client import DeepSeekClient
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+
+def _pool(client):
+    """httpx客户端底层的httpcore连接池"""
+    return client._transport._pool
+
+
+def test_http2_shares_one_client_for_chat_and_files():
+    client = DeepSeekClient(api_key="sk-test", base_url="https://api.deepseek.test", http2=True)
+    try:
+        assert client.http_client is not None
+        assert client.client._client is client.http_client
+        assert client.file_manager.http_client is client.http_client
+        pool = _pool(client.http_client)
+        # HTTPS端点通过ALPN协商，服务端不支持HTTP/2时仍可回退到HTTP/1.1
+        assert pool._http2 and pool._http1
+    finally:
+        client.close()
+
+
+def test_plaintext_endpoint_uses_prior_knowledge():
+    client = DeepSeekClient(api_key="sk-test", base_url="http://127.0.0.1:9", http2=True)
+    try:
+        pool = _pool(client.http_client)
+        assert pool._http2 and not pool._http1
+    finally:
+        client.close()
+
+
+def test_http2_is_off_by_default():
+    client = DeepSeekClient(api_key="sk-test", base_url="https://api.deepseek.test")
+    try:
+        assert client.http_client is None
+        assert client.file_manager.http_client is None
+    finally:
+        client.close()
+
+
+def test_missing_h2_raises_install_hint(monkeypatch):
+    monkeypatch.setitem(sys.modules, "h2", None)
+    with pytest.raises(ImportError, match=r"httpx\[http2\]"):
+        DeepSeekClient(api_key="sk-test", base_url="https://api.deepseek.test", http2=True)
+
+
+def test_each_endpoint_gets_its_own_http2_client():
+    client = DeepSeekClient(
+        api_key="sk-test",
+        base_url="https://api.deepseek.test",
+        endpoints=[("http://127.0.0.1:9", "sk-backup")],
+        http2=True,
+    )
+    try:
+        primary, backup = client.pool.endpoints
+        assert primary.client._client is client.http_client
+        assert backup.client._client is not client.http_client
+        assert not _pool(backup.client._client)._http1
+    finally:
+        client.close()
+
+
+@pytest.fixture
+def mock_upstream():
+    """在后台线程中运行benchmarks里的模拟上游，只监听本机回环地址"""
+    pytest.importorskip("hypercorn")
+    sys.path.insert(0, BENCHMARKS_DIR)
+    try:
+        from mock_upstream import MockUpstream, serve
+    finally:
+        sys.path.remove(BENCHMARKS_DIR)
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    app = MockUpstream(latency=0.05, tokens=4)
+    threading.Thread(target=serve, args=(app, "127.0.0.1", port), daemon=True).start()
+
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{base_url}/stats")
+            break
+        except httpx.TransportError:
+            time.sleep(0.05)
+    else:
+        pytest.fail("模拟上游启动失败")
+    httpx.delete(f"{base_url}/stats")
+    return base_url
+
+
+def test_concurrent_requests_share_one_connection(mock_upstream):
+    client = DeepSeekClient(api_key="sk-test", base_url=mock_upstream, http2=True)
+    try:
+        # 先建立连接，之后的并发请求都在这条连接上复用
+        client.list_files()
+
+        def one(index):
+            if index % 4 == 0:
+                return client.list_files()
+            return client.complete([{"role": "user", "content": f"hi {index}"}], stream=True).content
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(one, range(16)))
+        assert all(result is not None for result in results)
+    finally:
+        client.close()
+
+    stats = httpx.delete(f"{mock_upstream}/stats").json()
+    assert stats["http_versions"] == ["2"]
+    assert stats["connections"] == 1
@@ -0,0 +1,90 @@
+"""用量账本与预算"""
+
+import threading
+
+import pytest
+
+from deepseek.exceptions import BudgetExceededError
+from deepseek.ledger import Budget, UsageLedger, usage_scope
+
+
+def _run_concurrently(target, count):
+    barrier = threading.Barrier(count)
+    results = []
+
+    def _run():
+        barrier.wait()
+        results.append(target())
+
+    threads = [threading.Thread(target=_run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_records_usage_per_tenant(make_client):
+    ledger = UsageLedger()
+    client = make_client(ledger=ledger)
+
+    with usage_scope(tenant="team-a", session="s1"):
+        client.chat("hi")
+    client.chat("hi again")
+
+    assert ledger.totals("team-a").calls == 1
+    assert ledger.totals("team-a").usage.total_tokens == 15
+    assert ledger.totals("default").calls == 1
+
+
+def test_single_flight_records_usage_once(make_client, upstream):
+    upstream.delay = 0.3
+    ledger = UsageLedger()
+    client = make_client(ledger=ledger, single_flight=True)
+    messages = [{"role": "user", "content": "merged non-stream question"}]
+
+    results = _run_concurrently(lambda: client.complete(messages), 5)
+
+    assert [result.content for result in results] == ["hello there"] * 5
+    assert upstream.chat_calls == 1
+    assert ledger.totals().calls == 1
+    assert ledger.totals().usage.total_tokens == 15
+
+
+def test_single_flight_stream_records_usage_once(make_client, upstream):
+    upstream.chunk_delay = 0.05
+    ledger = UsageLedger()
+    client = make_client(ledger=ledger, single_flight=True)
+    messages = [{"role": "user", "content": "merged stream question"}]
+
+    results = _run_concurrently(lambda: client.complete(messages, stream=True), 4)
+
+    assert all(result.content == "hello there" for result in results)
+    assert upstream.chat_calls == 1
+    assert ledger.totals().calls == 1
+
+
+def test_hard_budget_rejects_before_sending(make_client, upstream):
+    ledger = UsageLedger()
+    ledger.set_budget("team-b", Budget(limit=20))
+    client = make_client(ledger=ledger)
+
+    with usage_scope(tenant="team-b"):
+        client.chat("first")
+        client.chat("second")
+        with pytest.raises(BudgetExceededError):
+            client.chat("third")
+    assert upstream.chat_calls == 2
+
+
+def test_aborted_stream_is_billed(make_client, upstream):
+    upstream.reply = "a long answer that is streamed in many chunks"
+    ledger = UsageLedger()
+    client = make_client(ledger=ledger)
+
+    stream = client.chat_stream("stop early")
+    next(stream)
+    stream.close()
+
+    assert ledger.totals().calls == 1
+    assert ledger.totals().usage.completion_tokens > 0
@@ -0,0 +1,96 @@
+"""SSE透传流式模式"""
+
+import threading
+
+import pytest
+
+from deepseek.exceptions import RequestCancelledError
+from deepseek.ledger import UsageLedger
+from deepseek.timeouts import CancelToken
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def _drain(stream):
+    frames = []
+    while True:
+        try:
+            frames.append(next(stream))
+        except StopIteration as stop:
+            return frames, stop.value
+
+
+@pytest.mark.parametrize("raw_mode", [False, True])
+def test_frames_are_upstream_bytes(make_client, upstream, raw_mode):
+    client = make_client(raw_mode=raw_mode)
+    frames = list(client.chat_passthrough("hi"))
+    assert all(isinstance(frame, bytes) and frame.endswith(b"\n\n") for frame in frames)
+    assert b"".join(frames) == b"".join(upstream._sse(upstream.bodies[0], "hello there"))
+
+
+def test_side_channel_updates_history_and_usage(make_client):
+    ledger = UsageLedger()
+    client = make_client(ledger=ledger)
+    list(client.chat_passthrough("hi"))
+    assert client.get_conversation_messages()[-1] == {"role": "assistant", "content": "hello there"}
+    assert client.last_usage.total_tokens == 15
+    assert ledger.totals("default").calls == 1
+
+
+def test_complete_passthrough_leaves_history_alone(make_client):
+    client = make_client()
+    frames, result = _drain(client.complete_passthrough(MESSAGES))
+    assert frames[-1] == b"data: [DONE]\n\n"
+    assert result.content == "hello there"
+    assert client.get_conversation_messages() == []
+
+
+def test_concurrent_passthrough_shares_one_upstream_call(make_client, upstream):
+    upstream.delay = 0.2
+    client = make_client(single_flight=True)
+    results = []
+
+    def one():
+        results.append(b"".join(client.complete_passthrough([{"role": "user", "content": "shared"}])))
+
+    threads = [threading.Thread(target=one) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert upstream.chat_calls == 1
+    assert len(set(results)) == 1 and len(results) == 3
+
+
+def test_passthrough_and_parsed_streams_are_not_merged(make_client, upstream):
+    upstream.delay = 0.2
+    client = make_client(single_flight=True)
+    messages = [{"role": "user", "content": "mixed"}]
+    results = {}
+
+    def frames():
+        results["frames"] = list(client.complete_passthrough(messages))
+
+    def deltas():
+        results["result"] = client.complete(messages, stream=True)
+
+    threads = [threading.Thread(target=frames), threading.Thread(target=deltas)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert upstream.chat_calls == 2
+    assert all(isinstance(frame, bytes) for frame in results["frames"])
+    assert results["result"].content == "hello there"
+
+
+def test_cancel_stops_passthrough(make_client, upstream):
+    upstream.chunk_delay = 0.05
+    client = make_client()
+    token = CancelToken()
+    stream = client.chat_passthrough("hi", cancel_token=token)
+    next(stream)
+    token.cancel()
+    with pytest.raises(RequestCancelledError):
+        list(stream)
+    assert client.get_conversation_messages()[-1]["role"] == "user"
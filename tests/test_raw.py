@@ -0,0 +1,87 @@
+"""原始响应模式"""
+
+import time
+
+import httpx
+import pytest
+
+from deepseek.exceptions import DeepSeekAPIError
+from deepseek.raw import parse_retry_after
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def _unavailable(status=503, **headers):
+    return httpx.Response(status, headers={"retry-after-ms": "1", **headers}, json={"error": {"message": "busy"}})
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_raw_mode_matches_sdk(make_client, stream):
+    sdk = make_client().complete(MESSAGES, stream=stream)
+    raw = make_client(raw_mode=True).complete(MESSAGES, stream=stream)
+    assert (raw.content, raw.finish_reason, raw.usage.total_tokens) == (sdk.content, sdk.finish_reason, sdk.usage.total_tokens)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_raw_mode_retries_transient_errors(make_client, upstream, stream):
+    upstream.failures = [_unavailable(503), _unavailable(429)]
+    client = make_client(raw_mode=True)
+    assert client.complete(MESSAGES, stream=stream).content == "hello there"
+    assert upstream.chat_calls == 3
+
+
+def test_raw_mode_gives_up_after_max_retries(make_client, upstream):
+    upstream.failures = [_unavailable(503)] * 3
+    client = make_client(raw_mode=True, max_retries=1)
+    with pytest.raises(DeepSeekAPIError) as excinfo:
+        client.complete(MESSAGES)
+    assert excinfo.value.status_code == 503
+    assert upstream.chat_calls == 2
+
+
+def test_raw_mode_does_not_retry_client_errors(make_client, upstream):
+    upstream.failures = [400]
+    client = make_client(raw_mode=True)
+    with pytest.raises(DeepSeekAPIError) as excinfo:
+        client.complete(MESSAGES)
+    assert excinfo.value.status_code == 400
+    assert upstream.chat_calls == 1
+
+
+def test_raw_mode_honours_retry_after(make_client, upstream):
+    upstream.failures = [httpx.Response(429, headers={"retry-after": "0.3"}, json={"error": {"message": "slow down"}})]
+    client = make_client(raw_mode=True)
+    started = time.monotonic()
+    assert client.complete(MESSAGES).content == "hello there"
+    assert time.monotonic() - started >= 0.3
+
+
+def test_raw_mode_retries_connection_errors(make_client, upstream):
+    attempts = []
+
+    def flaky(request):
+        attempts.append(request)
+        if len(attempts) == 1:
+            raise httpx.ConnectError("connection refused", request=request)
+        return upstream(request)
+
+    client = make_client(flaky, raw_mode=True)
+    assert client.complete(MESSAGES).content == "hello there"
+    assert len(attempts) == 2
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(httpx.Headers({"retry-after-ms": "250"})) == 0.25
+    assert parse_retry_after(httpx.Headers({"retry-after": "3"})) == 3.0
+    assert 0 < parse_retry_after(httpx.Headers({"retry-after": "Wed, 21 Oct 2099 07:28:00 GMT"}))
+    assert parse_retry_after(httpx.Headers({"retry-after": "soon"})) is None
+    assert parse_retry_after(httpx.Headers()) is None
+
+
+@pytest.mark.parametrize("total_timeout", [None, 5])
+def test_sdk_path_uses_same_retry_budget(make_client, upstream, total_timeout):
+    upstream.failures = [_unavailable(503)] * 3
+    client = make_client(max_retries=1, total_timeout=total_timeout)
+    with pytest.raises(DeepSeekAPIError):
+        client.complete(MESSAGES)
+    assert upstream.chat_calls == 2
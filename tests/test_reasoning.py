@@ -0,0 +1,45 @@
+"""推理模型与推理内容的流式输出"""
+
+import pytest
+
+from deepseek.response import StreamDelta
+
+from .conftest import FakeUpstream
+
+
+@pytest.fixture
+def upstream():
+    return FakeUpstream(reply="The answer is 42.", reasoning="Let me think step by step.")
+
+
+def test_deep_thinking_switches_model_and_drops_sampling_params(make_client, upstream):
+    client = make_client(deep_thinking=True)
+    client.chat("question", temperature=0.3, top_p=0.9)
+    body = upstream.bodies[0]
+    assert body["model"] == "deepseek-reasoner"
+    assert "temperature" not in body and "top_p" not in body
+
+
+@pytest.mark.parametrize("raw_mode", [False, True])
+def test_stream_separates_reasoning_from_answer(make_client, upstream, raw_mode):
+    client = make_client(deep_thinking=True, raw_mode=raw_mode)
+    deltas = list(client.chat_stream("question"))
+    reasoning = "".join(d.text for d in deltas if d.channel == StreamDelta.REASONING)
+    content = "".join(d.text for d in deltas if d.channel == StreamDelta.CONTENT)
+    assert reasoning == "Let me think step by step."
+    assert content == "The answer is 42."
+    # 推理过程全部在回答之前
+    channels = [d.channel for d in deltas]
+    assert channels == sorted(channels, key=lambda channel: channel != StreamDelta.REASONING)
+    assert client.last_reasoning == reasoning
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_reasoning_is_not_sent_back_in_history(make_client, upstream, stream):
+    client = make_client(deep_thinking=True)
+    assert client.chat("first", stream=stream) == "The answer is 42."
+    assert client.last_reasoning == "Let me think step by step."
+    client.chat("second", stream=stream)
+    history = upstream.bodies[1]["messages"]
+    assert [m["role"] for m in history] == ["user", "assistant", "user"]
+    assert all("reasoning_content" not in message for message in history)
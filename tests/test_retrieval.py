@@ -0,0 +1,65 @@
+"""检索到的参考资料注入对话"""
+
+from deepseek.documents import CONTEXT_HEADER as DOCUMENT_HEADER
+from deepseek.features.web_search import CONTEXT_HEADER as SEARCH_HEADER, LocalSearchProvider
+from deepseek.retrieval import inject_context
+
+SYSTEM = "你是一个简洁的助手。"
+
+
+def test_inject_context_inserts_before_last_user_turn():
+    messages = [
+        {"role": "system", "content": SYSTEM},
+        {"role": "user", "content": "第一个问题"},
+        {"role": "assistant", "content": "第一个回答"},
+        {"role": "user", "content": "第二个问题"},
+    ]
+    injected = inject_context(messages, "参考资料")
+    assert injected[:3] == messages[:3]
+    assert injected[3] == {"role": "system", "content": "参考资料"}
+    assert injected[4] == messages[3]
+    assert messages[0]["content"] == SYSTEM
+    assert len(messages) == 4
+
+
+def test_inject_context_without_user_message_appends():
+    assert inject_context([], "参考资料") == [{"role": "system", "content": "参考资料"}]
+
+
+def _assert_context_before_question(body, header, question):
+    messages = body["messages"]
+    assert messages[0] == {"role": "system", "content": SYSTEM}
+    assert messages[-1] == {"role": "user", "content": question}
+    assert messages[-2]["role"] == "system"
+    assert messages[-2]["content"].startswith(header)
+
+
+def test_web_search_keeps_system_prompt_stable(make_client, upstream):
+    provider = LocalSearchProvider([
+        {"title": "Python 3.13", "url": "https://example.com/py", "content": "Python 3.13 was released in October 2024."},
+        {"title": "Rust 1.80", "url": "https://example.com/rust", "content": "Rust 1.80 stabilised LazyCell."},
+    ])
+    client = make_client(web_search=True, search_provider=provider)
+    client.chat("When was Python 3.13 released?", system_message=SYSTEM)
+    client.chat("What did Rust 1.80 stabilise?")
+
+    first, second = upstream.bodies
+    _assert_context_before_question(first, SEARCH_HEADER, "When was Python 3.13 released?")
+    _assert_context_before_question(second, SEARCH_HEADER, "What did Rust 1.80 stabilise?")
+    # 上一轮的参考资料不会留在对话历史中，之前的对话保持不变
+    assert second["messages"][:3] == [
+        {"role": "system", "content": SYSTEM},
+        {"role": "user", "content": "When was Python 3.13 released?"},
+        {"role": "assistant", "content": "hello there"},
+    ]
+
+
+def test_documents_keep_system_prompt_stable(make_client, upstream, tmp_path):
+    document = tmp_path / "notes.txt"
+    document.write_text("The staging database is backed up every night at 02:00 UTC.", encoding="utf-8")
+    client = make_client(documents_dir=str(tmp_path / "index"))
+    client.index_file("file-1", str(document))
+    client.chat("When is the staging database backed up?", system_message=SYSTEM, file_ids=["file-1"])
+
+    _assert_context_before_question(upstream.bodies[0], DOCUMENT_HEADER, "When is the staging database backed up?")
+    assert "02:00 UTC" in upstream.bodies[0]["messages"][-2]["content"]
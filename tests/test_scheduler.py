@@ -0,0 +1,117 @@
+"""优先级请求调度"""
+
+import contextvars
+import threading
+import time
+
+import pytest
+
+from deepseek.exceptions import DeadlineExceededError
+from deepseek.ledger import UsageLedger, usage_scope
+from deepseek.scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, RequestScheduler
+
+REQUEST_ID = contextvars.ContextVar("request_id", default=None)
+
+
+def test_worker_runs_request_in_submitter_context():
+    with RequestScheduler(max_concurrency=2) as scheduler:
+        token = REQUEST_ID.set("req-1")
+        try:
+            future = scheduler.submit(REQUEST_ID.get)
+        finally:
+            REQUEST_ID.reset(token)
+        assert future.result(timeout=5) == "req-1"
+        assert scheduler.submit(REQUEST_ID.get).result(timeout=5) is None
+
+
+def test_scheduled_chat_is_billed_to_submitting_tenant(make_client):
+    ledger = UsageLedger()
+    client = make_client(ledger=ledger)
+    with RequestScheduler(client, max_concurrency=2) as scheduler:
+        with usage_scope(tenant="acme"):
+            future = scheduler.chat([{"role": "user", "content": "hi"}], priority=PRIORITY_INTERACTIVE)
+        assert future.result(timeout=5).content == "hello there"
+    assert ledger.totals("acme").calls == 1
+    assert ledger.totals("default").calls == 0
+
+
+def _blocker(scheduler, priority):
+    """提交一个在release之前一直占用槽位的请求"""
+    started, release = threading.Event(), threading.Event()
+
+    def _run():
+        started.set()
+        release.wait(5)
+
+    future = scheduler.submit(_run, priority=priority)
+    assert started.wait(5)
+    return future, release
+
+
+def test_higher_priority_runs_first():
+    order = []
+    with RequestScheduler(max_concurrency=1, reservations={}) as scheduler:
+        blocker, release = _blocker(scheduler, PRIORITY_BATCH)
+        batch = scheduler.submit(order.append, "batch", priority=PRIORITY_BATCH)
+        interactive = scheduler.submit(order.append, "interactive", priority=PRIORITY_INTERACTIVE)
+        release.set()
+        for future in (blocker, batch, interactive):
+            future.result(timeout=5)
+    assert order == ["interactive", "batch"]
+
+
+def test_batch_cannot_take_reserved_slots():
+    with RequestScheduler(max_concurrency=2, reservations={PRIORITY_INTERACTIVE: 1}) as scheduler:
+        _, release_batch = _blocker(scheduler, PRIORITY_BATCH)
+        queued = scheduler.submit(lambda: "batch", priority=PRIORITY_BATCH)
+        time.sleep(0.05)
+        assert not queued.done()
+        assert scheduler.metrics()[PRIORITY_BATCH]["queued"] == 1
+        # 预留的槽位仍然可以立即执行交互式请求
+        assert scheduler.submit(lambda: "now", priority=PRIORITY_INTERACTIVE).result(timeout=5) == "now"
+        release_batch.set()
+        assert queued.result(timeout=5) == "batch"
+
+
+def test_requests_that_cannot_meet_deadline_are_dropped():
+    with RequestScheduler(max_concurrency=1, reservations={}) as scheduler:
+        _, release = _blocker(scheduler, PRIORITY_BATCH)
+        late = scheduler.submit(lambda: "late", priority=PRIORITY_INTERACTIVE, timeout=0.05)
+        time.sleep(0.1)
+        release.set()
+        with pytest.raises(DeadlineExceededError):
+            late.result(timeout=5)
+        assert scheduler.metrics()[PRIORITY_INTERACTIVE]["dropped"] == 1
+
+
+def test_slow_class_estimate_drops_hopeless_requests():
+    with RequestScheduler(max_concurrency=2, reservations={}, probe_interval=60) as scheduler:
+        for _ in range(3):
+            scheduler.submit(time.sleep, 0.1, priority=PRIORITY_BATCH).result(timeout=5)
+        # 该类别的请求通常需要0.1秒，0.02秒的截止时间不可能满足，不会被执行
+        calls = []
+        hopeless = scheduler.submit(calls.append, "ran", priority=PRIORITY_BATCH, timeout=0.02)
+        with pytest.raises(DeadlineExceededError):
+            hopeless.result(timeout=5)
+        assert calls == []
+
+
+def test_shutdown_can_cancel_pending_requests():
+    scheduler = RequestScheduler(max_concurrency=1, reservations={})
+    _, release = _blocker(scheduler, PRIORITY_BATCH)
+    pending = scheduler.submit(lambda: None)
+    release.set()
+    scheduler.shutdown(cancel_pending=True)
+    assert pending.cancelled() or pending.done()
+    with pytest.raises(RuntimeError):
+        scheduler.submit(lambda: None)
+
+
+def test_rejects_invalid_configuration():
+    with pytest.raises(ValueError):
+        RequestScheduler(max_concurrency=2, reservations={PRIORITY_INTERACTIVE: 3})
+    with pytest.raises(ValueError):
+        RequestScheduler(reservations={"unknown": 1})
+    with RequestScheduler(max_concurrency=1) as scheduler:
+        with pytest.raises(ValueError):
+            scheduler.submit(lambda: None, priority="unknown")
@@ -0,0 +1,80 @@
+"""语义缓存"""
+
+import pytest
+
+from deepseek.semantic_cache import SemanticCache, key_tokens
+
+pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache()
+
+
+def test_default_threshold_is_strict(cache):
+    assert cache.threshold >= 0.95
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("How do I enable two factor authentication?", "How do I disable two factor authentication?"),
+    ("Is 17 a prime number?", "Is 15 a prime number?"),
+    ("Should I buy Apple stock?", "Should I not buy Apple stock?"),
+    ("What is the capital of France?", "What is the capital of Spain?"),
+    ("如何开启双重认证", "如何关闭双重认证"),
+    ("17是质数吗", "15是质数吗"),
+])
+def test_differing_content_word_misses(cache, stored, asked):
+    cache.store(stored, 0, "cached answer")
+    assert cache.lookup(asked, 0) is None
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("How do I reset my password?", "how do i reset my password"),
+    ("How do I reset my password?", "How can I reset my password?"),
+    ("如何开启双重认证", "我应该如何开启双重认证"),
+    ("如何重置密码？", "请问怎么重置密码"),
+])
+def test_paraphrase_hits(cache, stored, asked):
+    cache.store(stored, 0, "cached answer")
+    assert cache.lookup(asked, 0) == "cached answer"
+
+
+def test_scopes_are_isolated(cache):
+    cache.store("How do I reset my password?", 1, "scope one")
+    assert cache.lookup("How do I reset my password?", 2) is None
+
+
+def test_key_tokens_keep_negations():
+    assert key_tokens("Why can't I log in?") != key_tokens("Why can I log in?")
+
+
+def test_lookup_many_matches_lookup(cache):
+    cache.store("How do I reset my password?", 0, "reset")
+    cache.store("How do I delete my account?", 0, "delete")
+    assert cache.lookup_many(
+        ["how can I reset my password", "how do I delete my account", "how do I rename my account"], 0
+    ) == ["reset", "delete", None]
+
+
+def test_evicts_least_recently_used():
+    cache = SemanticCache(max_entries=2)
+    cache.store("first question", 0, "1")
+    cache.store("second question", 0, "2")
+    cache.lookup("first question", 0)
+    cache.store("third question", 0, "3")
+    assert len(cache) == 2
+    assert cache.lookup("second question", 0) is None
+    assert cache.lookup("first question", 0) == "1"
+
+
+def test_client_reuses_answer_for_paraphrase(make_client, upstream):
+    client = make_client(semantic_cache=True)
+
+    assert client.chat("如何开启双重认证？") == "hello there"
+    client.clear_conversation()
+    assert client.chat("我应该如何开启双重认证") == "hello there"
+    client.clear_conversation()
+    client.chat("如何关闭双重认证？")
+
+    assert upstream.chat_calls == 2
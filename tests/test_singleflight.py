@@ -0,0 +1,75 @@
+"""请求去重"""
+
+import contextvars
+import threading
+import time
+
+from deepseek.ledger import UsageLedger, usage_scope
+from deepseek.singleflight import SingleFlight, request_key
+
+REQUEST_ID = contextvars.ContextVar("request_id", default=None)
+
+
+def test_stream_pump_runs_in_leader_context():
+    group = SingleFlight()
+
+    def upstream():
+        yield REQUEST_ID.get()
+        return "done"
+
+    token = REQUEST_ID.set("req-1")
+    try:
+        stream = group.stream("key", upstream)
+        items = []
+        while True:
+            try:
+                items.append(next(stream))
+            except StopIteration as stop:
+                result = stop.value
+                break
+    finally:
+        REQUEST_ID.reset(token)
+    assert items == ["req-1"]
+    assert result == "done"
+
+
+def test_do_shares_result_between_concurrent_callers():
+    group = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "shared"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(group.do("key", slow)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(group.do("key", slow)))
+    follower.start()
+    while group.metrics()["shared_calls"] < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join()
+    follower.join()
+    assert results == ["shared", "shared"]
+    assert len(calls) == 1
+
+
+def test_request_key_depends_on_scope():
+    messages = [{"role": "user", "content": "hi"}]
+    assert request_key(messages, {}, scope="a") != request_key(messages, {}, scope="b")
+    assert request_key(messages, {"temperature": 0}, scope="a") == request_key(messages, {"temperature": 0}, scope="a")
+
+
+def test_shared_stream_is_billed_to_tenant(make_client):
+    ledger = UsageLedger()
+    client = make_client(ledger=ledger)
+    with usage_scope(tenant="acme"):
+        assert client.chat("hi", stream=True) == "hello there"
+    assert ledger.totals("acme").calls == 1
+    assert ledger.totals("default").calls == 0
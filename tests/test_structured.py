@@ -0,0 +1,111 @@
+"""流式JSON输出的增量解析"""
+
+import json
+import time
+
+import pytest
+
+from deepseek.structured import IncrementalJSONParser, StructuredOutputError, parse_json_stream
+
+DOCUMENTS = [
+    '{"name": "Ada", "tags": ["math", "code"], "born": 1815, "alive": false, "spouse": null}',
+    '[1, -2.5, 3e2, {"a": {"b": [true, []]}}, {}, "x"]',
+    '{"quote": "she said \\"hi\\"\\n", "unicode": "\\u4f60\\u597d \\ud83d\\ude00", "slash": "a\\/b"}',
+    '  {"nested": [[[["deep"]]]], "empty": ""}  ',
+    '"just a string"',
+    '42',
+]
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_matches_json_loads(document, size):
+    events = list(parse_json_stream(_chunks(document, size)))
+    assert events[-1].is_document
+    assert events[-1].value == json.loads(document)
+
+
+def test_events_follow_completion_order():
+    events = list(parse_json_stream(_chunks('{"a": 1, "b": [10, {"c": 2}], "d": "x"}', 2)))
+    assert [(event.path, event.value) for event in events] == [
+        (("a",), 1),
+        (("b", 0), 10),
+        (("b", 1, "c"), 2),
+        (("b", 1), {"c": 2}),
+        (("b",), [10, {"c": 2}]),
+        (("d",), "x"),
+        ((), {"a": 1, "b": [10, {"c": 2}], "d": "x"}),
+    ]
+
+
+def test_fields_are_emitted_before_the_document_ends():
+    parser = IncrementalJSONParser()
+    assert [event.key for event in parser.feed('{"title": "Report", "items": [1, ')] == ["title", 0]
+    assert [event.key for event in parser.feed('2]')] == [1, "items"]
+    assert not parser.done
+    assert parser.feed("}")[-1].is_document
+
+
+def test_max_depth_limits_events():
+    events = list(parse_json_stream(['{"a": {"b": 1}, "c": [2, 3]}'], max_depth=1))
+    assert [event.path for event in events] == [("a",), ("c",), ()]
+
+
+@pytest.mark.parametrize("text, position", [
+    ('{"a" 1}', 5),
+    ('{"a": 1,, "b": 2}', 8),
+    ('[1, 2] extra', 7),
+    ('{"a": tru}', 6),
+])
+def test_syntax_errors_report_position(text, position):
+    with pytest.raises(StructuredOutputError) as error:
+        list(parse_json_stream(_chunks(text, 2)))
+    assert error.value.position == position
+
+
+def test_truncated_output_is_incomplete():
+    with pytest.raises(StructuredOutputError, match="JSON不完整"):
+        list(parse_json_stream(['{"a": [1, 2']))
+
+
+def test_chat_json_stream_yields_fields(make_client, upstream):
+    upstream.reply = json.dumps({"title": "Report", "items": [1, 2, 3]})
+    client = make_client()
+    events = list(client.chat_json_stream("Return a JSON report", max_depth=1))
+    assert [event.key for event in events] == ["title", "items", None]
+    assert upstream.bodies[0]["response_format"] == {"type": "json_object"}
+    assert upstream.bodies[0]["stream"] is True
+    assert client.get_conversation_messages()[-1] == {"role": "assistant", "content": upstream.reply}
+
+
+def test_invalid_output_cancels_the_request(make_client, upstream):
+    upstream.reply = '{"ok": 1} trailing garbage' + " and more text" * 50
+    upstream.chunk_delay = 0.01
+    client = make_client()
+    started = time.monotonic()
+    with pytest.raises(StructuredOutputError):
+        list(client.chat_json_stream("Return JSON"))
+    # 完整读完无效的输出需要约2秒
+    assert time.monotonic() - started < 0.5
+    assert client.get_conversation_messages() == []
+
+
+def test_truncated_reply_leaves_history_unchanged(make_client, upstream):
+    upstream.reply = '{"items": [1, 2'
+    client = make_client()
+    with pytest.raises(StructuredOutputError, match="JSON不完整"):
+        list(client.chat_json_stream("Return JSON"))
+    assert client.get_conversation_messages() == []
+
+
+def test_abandoned_stream_leaves_history_unchanged(make_client, upstream):
+    upstream.reply = json.dumps({"a": 1, "b": 2})
+    client = make_client()
+    stream = client.chat_json_stream("Return JSON")
+    assert next(stream).key == "a"
+    stream.close()
+    assert client.get_conversation_messages() == []
@@ -0,0 +1,83 @@
+"""总截止时间：并发槽位排队和文件上传都计入截止时间"""
+
+import time
+
+import httpx
+import pytest
+
+from deepseek.concurrency import AdaptiveLimiter
+from deepseek.exceptions import DeadlineExceededError
+from deepseek.files import FileManager
+from deepseek.timeouts import Deadline, Timeouts
+
+from .conftest import BASE_URL
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def _saturate(limiter: AdaptiveLimiter) -> list:
+    """占满限制器的所有槽位"""
+    return [limiter.acquire() for _ in range(limiter.limit)]
+
+
+def test_limiter_slot_honours_deadline():
+    limiter = AdaptiveLimiter(initial_limit=1, min_limit=1)
+    held = _saturate(limiter)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        with limiter.slot(deadline=Deadline(0.1)):
+            pass
+    assert time.monotonic() - started < 1.0
+    limiter.release(held[0])
+    with limiter.slot(deadline=Deadline(0.1)):
+        assert limiter.metrics()["in_flight"] == 1
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_chat_waiting_for_slot_is_bounded(make_client, upstream, stream):
+    client = make_client(adaptive_concurrency=True, total_timeout=0.2, single_flight=False)
+    held = _saturate(client.limiter)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        client.complete(MESSAGES, stream=stream)
+    assert time.monotonic() - started < 1.5
+    assert upstream.chat_calls == 0
+    for slot in held:
+        client.limiter.release(slot)
+    assert client.complete(MESSAGES, stream=stream).content == "hello there"
+
+
+def test_file_request_waiting_for_slot_is_bounded():
+    limiter = AdaptiveLimiter(initial_limit=1, min_limit=1)
+    _saturate(limiter)
+    calls = []
+    manager = FileManager(
+        "sk-test", BASE_URL, timeout=Timeouts(total=0.1), limiter=limiter,
+        transport=httpx.MockTransport(lambda request: calls.append(request) or httpx.Response(200, json={"data": []})),
+    )
+    with pytest.raises(DeadlineExceededError):
+        manager.list_files()
+    assert calls == []
+
+
+def test_slow_upload_is_bounded_by_total_timeout(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"\0" * (1024 * 1024))
+
+    class TrickleTransport(httpx.BaseTransport):
+        """缓慢接收请求体的服务端，MockTransport会先一次读完请求体，这里逐块读取"""
+
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            for _ in request.stream:
+                time.sleep(0.05)
+            return httpx.Response(200, json={"id": "file-1"})
+
+    manager = FileManager("sk-test", BASE_URL, timeout=Timeouts(total=0.3), transport=TrickleTransport())
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        manager.upload_file(str(path))
+    assert time.monotonic() - started < 1.0
+
+    fast = FileManager("sk-test", BASE_URL, timeout=Timeouts(total=5),
+                       transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"id": "file-1"})))
+    assert fast.upload_file(str(path)) == "file-1"
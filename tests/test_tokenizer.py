@@ -0,0 +1,69 @@
+"""token计数"""
+
+import os
+
+import pytest
+
+from deepseek import tokenizer
+from deepseek.tokenizer import (
+    MESSAGE_OVERHEAD,
+    REPLY_PRIMING,
+    EstimatingTokenizer,
+    HuggingFaceTokenizer,
+    TokenCounter,
+    bundled_tokenizer_path,
+    estimate_tokens,
+    load_tokenizer,
+)
+
+
+def test_estimate_follows_published_ratios():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("你好世界啊") == 3
+    assert estimate_tokens("hello world") == 3
+    assert estimate_tokens("1234567") == 3
+
+
+def test_lookup_prefers_env_path(monkeypatch):
+    path = bundled_tokenizer_path()
+    if path is None:
+        pytest.skip("没有安装deepseek-tokenizer")
+    pytest.importorskip("tokenizers")
+    monkeypatch.setenv("DEEPSEEK_TOKENIZER_PATH", os.path.dirname(path))
+    monkeypatch.setattr(tokenizer, "bundled_tokenizer_path", lambda: None)
+    assert isinstance(load_tokenizer(), HuggingFaceTokenizer)
+
+
+def test_lookup_uses_bundled_tokenizer(monkeypatch):
+    if bundled_tokenizer_path() is None:
+        pytest.skip("没有安装deepseek-tokenizer")
+    counter = TokenCounter(load_tokenizer())
+    assert counter.exact
+    assert counter.count("Hello, world!") < estimate_tokens("Hello, world!" * 3)
+
+
+def test_lookup_falls_back_to_estimate(monkeypatch):
+    monkeypatch.setattr(tokenizer, "bundled_tokenizer_path", lambda: None)
+    assert isinstance(load_tokenizer(), EstimatingTokenizer)
+    assert not TokenCounter(load_tokenizer()).exact
+
+
+class _CountingTokenizer(EstimatingTokenizer):
+    def __init__(self):
+        self.batches = []
+
+    def count_batch(self, texts):
+        self.batches.append(list(texts))
+        return super().count_batch(texts)
+
+
+def test_counter_caches_messages():
+    inner = _CountingTokenizer()
+    counter = TokenCounter(inner, cache_size=2)
+    messages = [{"role": "user", "content": "first"}, {"role": "assistant", "content": "second"}]
+    total = counter.count_messages(messages)
+    assert total == sum(estimate_tokens(m["content"]) for m in messages) + 2 * MESSAGE_OVERHEAD + REPLY_PRIMING
+    assert counter.count_messages(messages) == total
+    assert inner.batches == [["first", "second"]]
+    counter.count("third")
+    assert counter.cache_info()["cached"] == 2
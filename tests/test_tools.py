@@ -0,0 +1,217 @@
+"""工具调用"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from deepseek.exceptions import DeepSeekAPIError
+from deepseek.tools import Tool, ToolRegistry, parameters_from_signature
+
+from .conftest import FakeUpstream
+
+
+def _call(name, arguments, call_id=None):
+    return {
+        "id": call_id or f"call_{name}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments)},
+    }
+
+
+TOOL_CALLS = [_call("get_weather", {"city": "Paris"}), _call("get_time", {"city": "Paris"})]
+
+
+def _registry(delay=0.0):
+    registry = ToolRegistry()
+
+    @registry.register
+    def get_weather(city: str) -> dict:
+        """查询城市的当前天气"""
+        time.sleep(delay)
+        return {"city": city, "weather": "sunny"}
+
+    @registry.register
+    def get_time(city: str) -> str:
+        """查询城市的当前时间"""
+        time.sleep(delay)
+        return "12:00"
+
+    return registry
+
+
+def _results(messages):
+    return [json.loads(m["content"]) if m["content"].startswith("{") else m["content"] for m in messages]
+
+
+def test_schema_from_signature():
+    def search(query: str, limit: int = 5, exact: bool = False, filters=None):
+        """搜索文档
+
+        更长的说明不会出现在工具定义中。
+        """
+
+    assert parameters_from_signature(search) == {
+        "type": "object",
+        "properties": {
+            "query": {"type": "string"},
+            "limit": {"type": "integer"},
+            "exact": {"type": "boolean"},
+            "filters": {},
+        },
+        "required": ["query"],
+    }
+    assert Tool(search).schema()["function"]["description"] == "搜索文档"
+
+
+def test_calls_run_concurrently_in_order():
+    registry = _registry(delay=0.2)
+    started = time.monotonic()
+    messages = registry.execute(TOOL_CALLS)
+    assert time.monotonic() - started < 0.35
+    assert [m["tool_call_id"] for m in messages] == ["call_get_weather", "call_get_time"]
+    assert messages[0]["content"] == '{"city":"Paris","weather":"sunny"}'
+    assert messages[1]["content"] == "12:00"
+    registry.close()
+
+
+def test_errors_are_returned_to_the_model():
+    registry = ToolRegistry()
+
+    @registry.register(timeout=0.05)
+    def slow() -> str:
+        time.sleep(0.3)
+        return "late"
+
+    @registry.register
+    def broken() -> str:
+        raise RuntimeError("boom")
+
+    calls = [
+        _call("slow", {}),
+        _call("broken", {}),
+        _call("missing", {}),
+        {"id": "call_bad", "function": {"name": "slow", "arguments": "{not json"}},
+        {"id": "call_list", "function": {"name": "slow", "arguments": "[1, 2]"}},
+    ]
+    errors = [result["error"] for result in _results(registry.execute(calls))]
+    assert "超时" in errors[0]
+    assert errors[1] == "RuntimeError: boom"
+    assert "missing" in errors[2]
+    assert "JSON" in errors[3]
+    assert "JSON对象" in errors[4]
+    registry.close()
+
+
+def test_results_are_cached_by_arguments():
+    registry = ToolRegistry()
+    calls = []
+
+    @registry.register(cache_ttl=60)
+    def lookup(key: str) -> str:
+        calls.append(key)
+        return key.upper()
+
+    registry.execute([_call("lookup", {"key": "a"})])
+    assert _results(registry.execute([_call("lookup", {"key": "a"}), _call("lookup", {"key": "b"})])) == ["A", "B"]
+    assert calls == ["a", "b"]
+    registry.close()
+
+
+def test_long_results_are_truncated():
+    registry = ToolRegistry(max_result_chars=10)
+    registry.register(lambda: "x" * 100, name="long")
+    content = registry.execute([_call("long", {})])[0]["content"]
+    assert content.startswith("x" * 10) and "截断" in content
+    registry.close()
+
+
+def test_aexecute_cancels_slow_coroutines():
+    registry = ToolRegistry()
+    finished = []
+
+    @registry.register(timeout=0.05)
+    async def slow() -> str:
+        await asyncio.sleep(0.3)
+        finished.append("slow")
+        return "late"
+
+    @registry.register
+    async def fast() -> str:
+        return "ok"
+
+    results = _results(asyncio.run(registry.aexecute([_call("slow", {}), _call("fast", {})])))
+    assert "超时" in results[0]["error"]
+    assert results[1] == "ok"
+    assert finished == []
+
+
+def _tool_loop(always_call_tools=False):
+    """第一轮返回两个工具调用，收到工具结果后返回最终回答"""
+    tools = FakeUpstream(tool_calls=TOOL_CALLS)
+    answer = FakeUpstream(reply="It is sunny in Paris at noon.")
+    bodies = []
+
+    def handler(request):
+        bodies.append(json.loads(request.read()))
+        last = bodies[-1]["messages"][-1]
+        return answer(request) if last["role"] == "tool" and not always_call_tools else tools(request)
+
+    return handler, bodies
+
+
+@pytest.mark.parametrize("raw_mode", [False, True])
+def test_chat_with_tools_runs_the_loop(make_client, raw_mode):
+    handler, bodies = _tool_loop()
+    client = make_client(handler, raw_mode=raw_mode)
+    client.tools = _registry()
+
+    assert client.chat_with_tools("What is the weather in Paris?") == "It is sunny in Paris at noon."
+    assert len(bodies) == 2
+    assert [tool["function"]["name"] for tool in bodies[0]["tools"]] == ["get_weather", "get_time"]
+    roles = [m["role"] for m in bodies[1]["messages"]]
+    assert roles == ["user", "assistant", "tool", "tool"]
+    assert bodies[1]["messages"][1]["tool_calls"][0]["function"]["name"] == "get_weather"
+
+    history = client.get_conversation_messages()
+    assert [m["role"] for m in history] == ["user", "assistant", "tool", "tool", "assistant"]
+    assert history[-1]["content"] == "It is sunny in Paris at noon."
+    assert client.last_usage.total_tokens == 30
+
+
+def test_last_round_disables_tools(make_client):
+    handler, bodies = _tool_loop(always_call_tools=True)
+    client = make_client(handler)
+    client.tools = _registry()
+    client.chat_with_tools("loop forever", max_rounds=1)
+    assert len(bodies) == 2
+    assert "tool_choice" not in bodies[0]
+    assert bodies[1]["tool_choice"] == "none"
+
+
+def test_failed_round_restores_history(make_client):
+    handler, bodies = _tool_loop()
+
+    def failing(request):
+        # 第一轮正常返回工具调用，带着工具结果的第二轮请求失败
+        if bodies:
+            return httpx.Response(400, json={"error": {"message": "bad request"}})
+        return handler(request)
+
+    client = make_client(failing, max_retries=0)
+    client.tools = _registry()
+    with pytest.raises(DeepSeekAPIError):
+        client.chat_with_tools("What is the weather in Paris?")
+    assert client.get_conversation_messages() == []
+
+
+def test_achat_with_tools(make_client):
+    handler, bodies = _tool_loop()
+    client = make_client(handler)
+    client.tools = _registry(delay=0.2)
+    started = time.monotonic()
+    assert asyncio.run(client.achat_with_tools("What is the weather in Paris?")) == "It is sunny in Paris at noon."
+    assert time.monotonic() - started < 0.35
+    assert [m["role"] for m in client.get_conversation_messages()][-3:] == ["tool", "tool", "assistant"]
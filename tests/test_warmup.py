@@ -0,0 +1,144 @@
+"""连接预热、保活和DNS缓存"""
+
+import socket
+import threading
+import time
+
+import httpx
+import pytest
+
+from deepseek import warmup
+from deepseek.warmup import DNSCache, KeepAlive, open_connections
+
+ADDRESS = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("93.184.216.34", 443))]
+
+
+class FakeResolver:
+    """可以模拟DNS故障的解析函数"""
+
+    def __init__(self):
+        self.lookups = []
+        self.down = False
+
+    def __call__(self, host, port, family=0, type=0, proto=0, flags=0):
+        self.lookups.append(host)
+        if self.down:
+            raise socket.gaierror("temporary failure in name resolution")
+        return ADDRESS
+
+
+@pytest.fixture
+def resolver(monkeypatch):
+    """用假的解析函数代替socket.getaddrinfo，测试结束后恢复"""
+    fake = FakeResolver()
+    monkeypatch.setattr(socket, "getaddrinfo", fake)
+    return fake
+
+
+def test_dns_cache_serves_registered_hosts(resolver):
+    cache = DNSCache(ttl=60)
+    assert cache.install()
+    try:
+        assert not cache.install()
+        cache.resolve("api.deepseek.test", 443)
+        assert socket.getaddrinfo("API.deepseek.test", 443, 0, socket.SOCK_STREAM) == ADDRESS
+        socket.getaddrinfo("other.test", 443)
+        socket.getaddrinfo("other.test", 443)
+        assert resolver.lookups == ["api.deepseek.test", "other.test", "other.test"]
+    finally:
+        cache.uninstall()
+    assert socket.getaddrinfo is resolver
+
+
+def test_dns_cache_bounds_stale_entries(resolver):
+    cache = DNSCache(ttl=0.01, max_stale=0.1)
+    cache.resolve("api.deepseek.test", 443)
+    resolver.down = True
+    time.sleep(0.02)
+    # 过期不久的结果在DNS故障时继续使用
+    assert cache.resolve("api.deepseek.test", 443) == ADDRESS
+    time.sleep(0.15)
+    with pytest.raises(socket.gaierror):
+        cache.resolve("api.deepseek.test", 443)
+
+
+def test_open_connections_runs_pings_concurrently():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def ping():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+
+    assert open_connections(ping, 4) == (4, [])
+    assert peak[0] == 4
+
+
+def test_open_connections_collects_errors():
+    calls = []
+
+    def ping():
+        calls.append(1)
+        if len(calls) % 2:
+            raise ConnectionError("refused")
+
+    opened, errors = open_connections(ping, 4)
+    assert opened == 2
+    assert all(isinstance(error, ConnectionError) for error in errors)
+
+
+def test_keepalive_repeats_pings_until_stopped():
+    pings = []
+    keepalive = KeepAlive([lambda: pings.append(1)], connections=2, interval=0.02)
+    keepalive.start()
+    time.sleep(0.15)
+    keepalive.stop()
+    rounds = keepalive.rounds
+    assert rounds >= 2
+    assert len(pings) == rounds * 2
+    time.sleep(0.05)
+    assert keepalive.rounds == rounds
+
+
+def _model_requests(upstream):
+    return sum(1 for request in upstream.requests if request.url.path.endswith("/models"))
+
+
+def test_warmup_opens_connections_per_pool(make_client, upstream):
+    client = make_client()
+    result = client.warmup(connections=4, dns_ttl=None)
+    # 传入传输层时SDK、文件管理器和轻量客户端共享同一个连接池，只探测一次
+    assert (result["requests"], result["pools"], result["errors"]) == (4, 1, [])
+    assert _model_requests(upstream) == 4
+
+
+def test_warmup_pings_every_endpoint(make_client, upstream):
+    client = make_client(endpoints=[("https://backup.deepseek.test", "sk-backup")])
+    result = client.warmup(connections=2, dns_ttl=None)
+    assert result["pools"] == 2
+    assert {request.url.host for request in upstream.requests} == {"api.deepseek.test", "backup.deepseek.test"}
+
+
+def test_warmup_raises_when_every_ping_fails(make_client):
+    client = make_client(lambda request: httpx.Response(401, json={"error": {"message": "bad key"}}), max_retries=0)
+    with pytest.raises(Exception, match="bad key"):
+        client.warmup(connections=2, dns_ttl=None)
+
+
+def test_keepalive_and_dns_cache_stop_on_close(make_client, upstream, resolver):
+    client = make_client()
+    client.warmup(connections=1, keepalive_interval=0.02)
+    assert socket.getaddrinfo == warmup.dns_cache._getaddrinfo
+    assert resolver.lookups == ["api.deepseek.test"]
+    time.sleep(0.1)
+    assert _model_requests(upstream) > 1
+
+    client.close()
+    assert socket.getaddrinfo is resolver
+    pings = _model_requests(upstream)
+    time.sleep(0.05)
+    assert _model_requests(upstream) == pings
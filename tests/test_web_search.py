@@ -0,0 +1,188 @@
+"""联网搜索检索流程"""
+
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from deepseek.features.web_search import (
+    CONTEXT_HEADER,
+    HTTPSearchProvider,
+    SearchProvider,
+    SearchResult,
+    WebSearch,
+    extract_text,
+    is_public_url,
+)
+
+# 测试中使用的域名及其解析地址
+HOSTS = {
+    "news.example": "93.184.216.34",
+    "metadata.example": "169.254.169.254",
+    "intranet.example": "10.0.0.5",
+}
+
+PAGE = """<html><head><title>Python 3.13</title><script>var tracking = "python";</script></head>
+<body><nav>Home | Python | Docs</nav><p>Python 3.13 was released on 7 October 2024.</p>
+<p>It ships an experimental free-threaded build.</p><footer>Python footer</footer></body></html>"""
+
+
+@pytest.fixture(autouse=True)
+def fake_dns(monkeypatch):
+    """把测试域名解析到固定地址，不访问真实的DNS"""
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host not in HOSTS:
+            raise socket.gaierror(f"unknown host {host}")
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (HOSTS[host], port))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+
+
+class StaticProvider(SearchProvider):
+    """返回固定结果并记录调用次数的搜索服务"""
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = 0
+
+    def search(self, query, max_results=5):
+        self.calls += 1
+        return self.results[:max_results]
+
+
+def _web_search(handler, results, **kwargs):
+    """创建通过模拟传输层抓取网页的联网搜索"""
+    search = WebSearch(enabled=True, provider=StaticProvider(results), **kwargs)
+    search._http_client = httpx.Client(transport=httpx.MockTransport(handler))
+    search._executor = ThreadPoolExecutor(max_workers=4)
+    return search
+
+
+def _html(request):
+    return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, text=PAGE)
+
+
+def test_http_provider_sends_query_and_parses_results():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json={"results": [
+            {"title": "A", "url": "https://news.example/a", "content": "first"},
+            {"title": "no url"},
+            {"title": "B", "url": "https://news.example/b", "snippet": "second"},
+            {"title": "C", "url": "https://news.example/c", "content": "third"},
+        ]})
+
+    provider = HTTPSearchProvider(
+        "https://search.example/", api_key="key", http_client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+    results = provider.search("python release", max_results=3)
+    assert [(r.title, r.snippet) for r in results] == [("A", "first"), ("B", "second")]
+    assert seen[0].url.path == "/search"
+    assert seen[0].url.params["q"] == "python release"
+    assert seen[0].url.params["format"] == "json"
+    assert seen[0].headers["authorization"] == "Bearer key"
+
+
+def test_extract_text_skips_scripts_and_navigation():
+    title, text = extract_text(PAGE)
+    assert title == "Python 3.13"
+    assert "released on 7 October 2024" in text
+    assert "tracking" not in text and "Home" not in text and "footer" not in text
+
+
+def test_is_public_url():
+    assert is_public_url("https://news.example/a")
+    assert not is_public_url("http://metadata.example/latest/meta-data/")
+    assert not is_public_url("http://intranet.example/")
+    assert not is_public_url("ftp://news.example/file")
+    assert not is_public_url("https://unknown.example/")
+
+
+def test_pages_are_fetched_and_ranked():
+    search = _web_search(_html, [SearchResult("Python", "https://news.example/py", "snippet only")])
+    passages = search.retrieve("When was Python 3.13 released?")
+    assert passages
+    assert "7 October 2024" in passages[0].text
+    assert passages[0].source == "https://news.example/py"
+
+
+def test_private_addresses_are_not_fetched():
+    fetched = []
+
+    def handler(request):
+        fetched.append(str(request.url))
+        return _html(request)
+
+    search = _web_search(handler, [SearchResult("Metadata", "http://metadata.example/", "python metadata snippet")])
+    passages = search.retrieve("python metadata")
+    assert fetched == []
+    assert [p.text for p in passages] == ["python metadata snippet"]
+
+
+def test_redirect_to_private_address_is_refused():
+    fetched = []
+
+    def handler(request):
+        fetched.append(request.url.host)
+        return httpx.Response(302, headers={"location": "http://intranet.example/secret"})
+
+    search = _web_search(handler, [SearchResult("Moved", "https://news.example/moved", "python moved snippet")])
+    passages = search.retrieve("python moved")
+    assert fetched == ["news.example"]
+    assert [p.text for p in passages] == ["python moved snippet"]
+
+
+def test_page_size_is_capped():
+    def handler(request):
+        return httpx.Response(200, headers={"content-type": "text/plain"}, text="python " * 10_000)
+
+    search = _web_search(handler, [SearchResult("Big", "https://news.example/big", "")], max_page_bytes=1000)
+    search.retrieve("python")
+    _, text = search._page_cache.get("https://news.example/big")
+    assert len(text.encode()) <= 1000
+
+
+def test_slow_pages_fall_back_to_snippet():
+    def handler(request):
+        time.sleep(0.5)
+        return _html(request)
+
+    search = _web_search(
+        handler, [SearchResult("Slow", "https://news.example/slow", "Python 3.13 snippet")], fetch_timeout=0.1
+    )
+    started = time.monotonic()
+    passages = search.retrieve("Python 3.13")
+    assert time.monotonic() - started < 0.4
+    assert [p.text for p in passages] == ["Python 3.13 snippet"]
+
+
+def test_search_results_are_cached():
+    results = [SearchResult("Python", "https://news.example/py", "Python 3.13 snippet", content="Python 3.13 body")]
+    search = WebSearch(enabled=True, provider=StaticProvider(results))
+    search.retrieve("Python 3.13")
+    search.retrieve("Python 3.13")
+    assert search.provider.calls == 1
+
+
+def test_search_failure_does_not_block_chat(make_client, upstream):
+    class BrokenProvider(SearchProvider):
+        def search(self, query, max_results=5):
+            raise httpx.ConnectError("search service down")
+
+    client = make_client(web_search=True, search_provider=BrokenProvider())
+    assert client.chat("When was Python 3.13 released?") == "hello there"
+    assert isinstance(client.web_search.last_error, httpx.ConnectError)
+    assert not any(CONTEXT_HEADER in (m.get("content") or "") for m in upstream.bodies[0]["messages"])
+
+
+def test_disabled_web_search_does_not_search(make_client, upstream):
+    provider = StaticProvider([SearchResult("Python", "https://news.example/py", "", content="Python 3.13 body")])
+    client = make_client(web_search=True, search_provider=provider)
+    client.disable_web_search()
+    client.chat("Python 3.13?")
+    assert provider.calls == 0
+    assert len(upstream.bodies[0]["messages"]) == 1